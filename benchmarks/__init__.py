@@ -0,0 +1,6 @@
+"""
+Benchmarks Package
+
+Performance benchmarks for the Personal Finance Tracker pipeline.
+Run with ``python -m benchmarks`` from the repository root.
+"""
@@ -0,0 +1,93 @@
+"""
+Benchmark Runner
+
+Command line entry point for the benchmark suite.
+
+Examples:
+    python -m benchmarks --output results.json
+    python -m benchmarks --sizes 1000 --baseline baseline.json --threshold 0.2
+    python -m benchmarks --large
+    python -m benchmarks --memory --output results.json
+"""
+
+import argparse
+import sys
+from typing import List, Optional
+
+from benchmarks.harness import (
+    DEFAULT_THRESHOLD,
+    compare_results,
+    format_comparison,
+    load_results,
+    run_benchmarks,
+    save_results,
+)
+import benchmarks.bench_pipeline  # noqa: F401  (registers benchmarks)
+import benchmarks.bench_store  # noqa: F401
+
+DEFAULT_SIZES = [1_000, 100_000]
+LARGE_SIZE = 10_000_000
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """
+    Parses the benchmark runner options.
+
+    Args:
+        argv (Optional[List[str]]): Arguments to parse (defaults to sys.argv)
+
+    Returns:
+        argparse.Namespace: The parsed options
+    """
+    parser = argparse.ArgumentParser(description="Run the Personal Finance Tracker benchmarks")
+    parser.add_argument("--sizes", type=lambda value: [int(size) for size in value.split(",")],
+                        default=DEFAULT_SIZES, help="comma separated dataset sizes (default: 1000,100000)")
+    parser.add_argument("--large", action="store_true",
+                        help=f"also run at {LARGE_SIZE:,} rows (needs several GB of memory)")
+    parser.add_argument("--repeat", type=int, default=3, help="timed repetitions per case")
+    parser.add_argument("--only", action="append", metavar="NAME", help="only run the named benchmark")
+    parser.add_argument("--output", metavar="PATH", help="save results as JSON")
+    parser.add_argument("--baseline", metavar="PATH", help="compare against stored results")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed relative slowdown before flagging a regression (default: 0.10)")
+    parser.add_argument("--memory", action="store_true",
+                        help="also record and compare the peak memory of every case")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Runs the benchmarks and optionally saves and compares the results.
+
+    Args:
+        argv (Optional[List[str]]): Command line arguments (defaults to sys.argv)
+
+    Returns:
+        int: Exit status (1 if a time or memory regression was detected, 0 otherwise)
+    """
+    args = parse_args(argv)
+    sizes = list(args.sizes)
+    if args.large and LARGE_SIZE not in sizes:
+        sizes.append(LARGE_SIZE)
+
+    results = run_benchmarks(sizes, repeat=args.repeat, names=args.only, progress=print,
+                             memory=args.memory)
+
+    if args.output:
+        save_results(results, args.output)
+        print(f"Results saved to: {args.output}")
+
+    if args.baseline:
+        comparisons = compare_results(results, load_results(args.baseline), args.threshold)
+        print()
+        print(format_comparison(comparisons))
+        regressions = [entry for entry in comparisons if entry["regression"] or entry.get("memory_regression")]
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}")
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,301 @@
+"""
+Pipeline Benchmarks
+
+Benchmarks for loading, aggregating, rendering and writing data.
+Datasets are generated once per size with a fixed seed.
+"""
+
+import io
+import os
+import random
+import tempfile
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+from benchmarks.harness import benchmark
+
+import main
+from models.validation import validate_transactions, validate_users
+from services.anomaly import AnomalyDetector
+from services.aggregation import TransactionColumns, aggregate_sharded, aggregate_transactions
+from services.categorizer import DEFAULT_RULES, Categorizer
+from services.currency import RateTable
+from services.data_context import DataContext
+from services.data_service import generate_transactions, generate_users
+from services.dedup_service import BloomFilter, Deduplicator
+from services.import_service import export_transactions
+from services.ingest import DirectoryTailer
+from services.ledger import Ledger
+from services.partitions import PartitionedStore
+from services.recurring import detect_recurring
+from services.snapshot import Snapshot, build_snapshot, load_context
+from services.wal import WriteAheadLog
+from services.report_formats import write_transactions_csv, write_transactions_jsonl
+from services.report_service import generate_transaction_summary, generate_user_report
+from utils.file_ops import write_file
+from utils.math_ops import calculate_average, percentage_change
+
+SEED = 42
+
+
+@lru_cache(maxsize=1)
+def _transactions(size):
+    return generate_transactions(size, user_count=max(1, size // 100), seed=SEED)
+
+
+@lru_cache(maxsize=1)
+def _users(size):
+    return generate_users(size, seed=SEED)
+
+
+@lru_cache(maxsize=1)
+def _amounts(size):
+    return [transaction.amount for transaction in _transactions(size)]
+
+
+@lru_cache(maxsize=1)
+def _columns(size):
+    return TransactionColumns.from_transactions(_transactions(size))
+
+
+def _report_content(size):
+    return "\n".join(f"line {i}: {'x' * 40}" for i in range(size))
+
+
+@benchmark("load_transactions", setup=lambda size: size)
+def bench_load_transactions(size):
+    generate_transactions(size, user_count=max(1, size // 100), seed=SEED)
+
+
+@benchmark("generate_transaction_summary", setup=_transactions)
+def bench_transaction_summary(transactions):
+    generate_transaction_summary(transactions)
+
+
+@benchmark("generate_user_report", setup=_users)
+def bench_user_report(users):
+    generate_user_report(users)
+
+
+@benchmark("analyze_spending_patterns", setup=_transactions)
+def bench_analyze_spending_patterns(transactions):
+    main.analyze_spending_patterns(DataContext(users=[], transactions=transactions))
+
+
+@benchmark("aggregate_transactions", setup=_columns)
+def bench_aggregate_transactions(columns):
+    aggregate_transactions(columns)
+
+
+@benchmark("aggregate_sharded", setup=_columns)
+def bench_aggregate_sharded(columns):
+    aggregate_sharded(columns, workers=os.cpu_count() or 1)
+
+
+@benchmark("aggregate_sharded.split", setup=_columns)
+def bench_aggregate_sharded_split(columns):
+    # The parent's share of a sharded run on 8 cores
+    columns.split(8)
+
+
+@benchmark("ledger.build", setup=_transactions)
+def bench_ledger_build(transactions):
+    Ledger(transactions)
+
+
+def _ledger_queries(size):
+    transactions = _transactions(size)
+    return Ledger(transactions), [(t.user_id, t.created_at) for t in transactions[:10_000]]
+
+
+@benchmark("ledger.balance_at", setup=_ledger_queries)
+def bench_ledger_balance_at(args):
+    ledger, queries = args
+    for user_id, when in queries:
+        ledger.balance_at(user_id, when)
+
+
+@benchmark("dedup.filter", setup=_transactions)
+def bench_dedup_filter(transactions):
+    for _ in Deduplicator(bloom=BloomFilter(capacity=max(1, len(transactions)))).filter(transactions):
+        pass
+
+
+@benchmark("recurring.detect", setup=_transactions)
+def bench_recurring_detect(transactions):
+    detect_recurring(transactions)
+
+
+@benchmark("anomaly.observe", setup=_transactions)
+def bench_anomaly_observe(transactions):
+    AnomalyDetector().observe_many(transactions)
+
+
+def _multi_currency(size):
+    # A third each of USD, EUR and GBP rows, with a rate for every day of the data
+    transactions = generate_transactions(size, user_count=max(1, size // 100), seed=SEED)
+    for i, transaction in enumerate(transactions):
+        transaction.currency = ("USD", "EUR", "GBP")[i % 3]
+    first = min(t.created_at for t in transactions).date()
+    rates = RateTable()
+    for day in range((max(t.created_at for t in transactions).date() - first).days + 1):
+        rates.add_rate("EUR", first + timedelta(days=day), 1.08 + day * 1e-4)
+        rates.add_rate("GBP", first + timedelta(days=day), 1.26 - day * 1e-4)
+    return rates, TransactionColumns.from_transactions(transactions)
+
+
+@benchmark("currency.convert_columns", setup=_multi_currency)
+def bench_convert_columns(args):
+    rates, columns = args
+    rates.convert_columns(columns)
+
+
+@lru_cache(maxsize=1)
+def _descriptions(size):
+    # Card-statement style descriptions: a merchant, a store number and a city,
+    # with a share of descriptions no rule matches
+    rng = random.Random(SEED)
+    merchants = [keyword for keywords in DEFAULT_RULES.values() for keyword in keywords]
+    merchants += ["acme corp", "misc purchase", "pos debit", "atm withdrawal"]
+    cities = ["seattle", "austin", "boston", "denver", "chicago"]
+    return [f"{rng.choice(merchants).upper()} #{rng.randrange(20)} {rng.choice(cities).title()}"
+            for _ in range(size)]
+
+
+@benchmark("categorizer.categorize", setup=_descriptions)
+def bench_categorize(descriptions):
+    categorize = Categorizer().categorize
+    for description in descriptions:
+        categorize(description)
+
+
+@benchmark("categorizer.categorize_uncached", setup=_descriptions)
+def bench_categorize_uncached(descriptions):
+    categorize = Categorizer(cache_size=0).categorize
+    for description in descriptions:
+        categorize(description)
+
+
+@lru_cache(maxsize=1)
+def _temp_dir():
+    # Kept alive by the cache and removed at interpreter exit
+    return tempfile.TemporaryDirectory()
+
+
+@lru_cache(maxsize=1)
+def _snapshot_file(size):
+    path = os.path.join(_temp_dir().name, f"snapshot_{size}.snap")
+    with open(path, "wb") as file:
+        file.write(build_snapshot(DataContext(users=[], transactions=_transactions(size))))
+    return path
+
+
+@benchmark("snapshot.build", setup=_transactions)
+def bench_snapshot_build(transactions):
+    build_snapshot(DataContext(users=[], transactions=transactions))
+
+
+@benchmark("snapshot.load_analyze", setup=_snapshot_file)
+def bench_snapshot_load_analyze(path):
+    main.analyze_spending_patterns(load_context(path))
+
+
+@benchmark("snapshot.load_columns", setup=_snapshot_file)
+def bench_snapshot_load_columns(path):
+    Snapshot(path).columns()
+
+
+@benchmark("snapshot.load_transactions", setup=_snapshot_file)
+def bench_snapshot_load_transactions(path):
+    Snapshot(path).transactions()
+
+
+@lru_cache(maxsize=1)
+def _partitioned_store(size):
+    # Two years of history in 8 user buckets per month
+    transactions = generate_transactions(size, user_count=max(1, size // 100), seed=SEED)
+    start = datetime(2023, 1, 1)
+    for position, transaction in enumerate(transactions):
+        transaction.created_at = start + timedelta(minutes=position * 1051200 // size)
+    store = PartitionedStore(os.path.join(_temp_dir().name, f"partitions_{size}"), user_buckets=8)
+    store.add(transactions)
+    return store
+
+
+@benchmark("partitions.user_last_30_days", setup=_partitioned_store)
+def bench_partitions_user_last_30_days(store):
+    store.summary(datetime(2024, 12, 2), datetime(2025, 1, 1), user_id=42)
+
+
+@benchmark("partitions.year_summary", setup=_partitioned_store)
+def bench_partitions_year_summary(store):
+    store.summary(datetime(2024, 1, 1), datetime(2025, 1, 1))
+
+
+def _tailed_directory(size):
+    # A drop file whose size existing rows have been read, plus 100 rows to append per run
+    directory = tempfile.mkdtemp(dir=_temp_dir().name)
+    path = os.path.join(directory, "bank.csv")
+    export_transactions(_transactions(size), path)
+    tailer = DirectoryTailer(directory)
+    tailer.poll()
+    with open(path, "r", encoding="utf-8") as file:
+        appended = "".join(file.readlines()[1:101])
+    return tailer, path, appended
+
+
+@benchmark("ingest.poll_appended", setup=_tailed_directory)
+def bench_ingest_poll_appended(args):
+    tailer, path, appended = args
+    with open(path, "a", encoding="utf-8") as file:
+        file.write(appended)
+    tailer.poll()
+
+
+@benchmark("wal.append_commit", setup=_transactions)
+def bench_wal_append_commit(transactions):
+    # Group commit: one write and fsync per 256 records
+    path = os.path.join(_temp_dir().name, "bench.wal")
+    if os.path.exists(path):
+        os.remove(path)
+    with WriteAheadLog(path) as wal:
+        for position, transaction in enumerate(transactions, 1):
+            wal.append_insert(transaction)
+            if not position % 256:
+                wal.commit()
+
+
+@benchmark("validation.users", setup=_users)
+def bench_validate_users(users):
+    validate_users(users)
+
+
+@benchmark("validation.transactions", setup=_transactions)
+def bench_validate_transactions(transactions):
+    validate_transactions(transactions)
+
+
+@benchmark("report.transactions_jsonl", setup=_transactions)
+def bench_transactions_jsonl(transactions):
+    write_transactions_jsonl(transactions, io.StringIO())
+
+
+@benchmark("report.transactions_csv", setup=_transactions)
+def bench_transactions_csv(transactions):
+    write_transactions_csv(transactions, io.StringIO())
+
+
+@benchmark("math_ops.calculate_average", setup=_amounts)
+def bench_calculate_average(amounts):
+    calculate_average(amounts)
+
+
+@benchmark("math_ops.percentage_change", setup=_amounts)
+def bench_percentage_change(amounts):
+    [percentage_change(old, new) for old, new in zip(amounts, amounts[1:])]
+
+
+@benchmark("file_ops.write_file", setup=_report_content)
+def bench_write_file(content):
+    with tempfile.TemporaryDirectory() as directory:
+        write_file(os.path.join(directory, "report.txt"), content)
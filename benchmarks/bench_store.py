@@ -0,0 +1,172 @@
+"""
+Transaction Store Benchmarks
+
+Batched commit and bulk settlement benchmarks for the registered suite,
+plus a stress test measuring status transition throughput against the
+number of writer threads while a reader keeps taking snapshots.
+
+Examples:
+    python -m benchmarks.bench_store --threads 1,2,4,8
+    python -m benchmarks.bench_store --threads 8 --stripes 1
+"""
+
+import argparse
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Sequence
+
+from benchmarks.harness import benchmark
+
+from models.transaction import TransactionStatus
+from services.data_service import generate_transactions
+from services.transaction_store import DEFAULT_STRIPES, TransactionStore
+
+SEED = 42
+
+
+def _pending_store(size):
+    transactions = generate_transactions(size, user_count=max(1, size // 100), seed=SEED)
+    for transaction in transactions:
+        transaction.status = TransactionStatus.PENDING
+    return transactions
+
+
+@benchmark("transaction_store.commit", setup=_pending_store)
+def bench_store_commit(transactions):
+    store = TransactionStore(transactions)
+    store.commit((t.transaction_id, TransactionStatus.PENDING, TransactionStatus.COMPLETED)
+                 for t in transactions)
+    # Leave the shared dataset pending for the next repetition
+    for transaction in transactions:
+        transaction.status = TransactionStatus.PENDING
+
+
+@benchmark("transaction_store.complete_many", setup=_pending_store)
+def bench_store_complete_many(transactions):
+    store = TransactionStore(transactions)
+    store.complete_many(store.ids_with_status(TransactionStatus.PENDING))
+    for transaction in transactions:
+        transaction.status = TransactionStatus.PENDING
+
+
+def run_store_stress(thread_counts: Sequence[int], operations: int = 20_000,
+                     stripes: int = DEFAULT_STRIPES, batch_size: int = 1) -> List[Dict[str, object]]:
+    """
+    Measures transition throughput for several writer thread counts.
+
+    Every writer owns its own users and completes or cancels their pending
+    transactions, batch_size transitions per commit. One extra thread takes
+    snapshots throughout to show that readers do not stall the writers.
+
+    Args:
+        thread_counts (Sequence[int]): Writer thread counts to measure
+        operations (int): Transitions per writer thread
+        stripes (int): Lock stripes of the store
+        batch_size (int): Transitions per commit
+
+    Returns:
+        List[Dict[str, object]]: One result per thread count with throughput and snapshot count
+    """
+    results = []
+    for threads in thread_counts:
+        users_per_thread = 16
+        transactions = generate_transactions(operations * threads, user_count=users_per_thread * threads,
+                                             seed=SEED)
+        for transaction in transactions:
+            transaction.status = TransactionStatus.PENDING
+        store = TransactionStore(transactions, stripes=stripes)
+
+        # Writer i owns the users congruent to i modulo the thread count
+        work = [[] for _ in range(threads)]
+        for transaction in transactions:
+            work[(transaction.user_id - 1) % threads].append(transaction.transaction_id)
+
+        done = threading.Event()
+        snapshots = [0]
+        barrier = threading.Barrier(threads + 1)
+
+        def reader():
+            while not done.is_set():
+                store.snapshot().status_counts()
+                snapshots[0] += 1
+
+        def writer(ids):
+            barrier.wait()
+            for start in range(0, len(ids), batch_size):
+                store.commit([
+                    (transaction_id, TransactionStatus.PENDING,
+                     TransactionStatus.CANCELLED if transaction_id % 7 == 0 else TransactionStatus.COMPLETED)
+                    for transaction_id in ids[start:start + batch_size]
+                ])
+
+        workers = [threading.Thread(target=writer, args=(ids,)) for ids in work]
+        reader_thread = threading.Thread(target=reader)
+        for worker in workers:
+            worker.start()
+        reader_thread.start()
+        barrier.wait()
+        start = time.perf_counter()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+        done.set()
+        reader_thread.join()
+
+        total = sum(len(ids) for ids in work)
+        results.append({
+            "threads": threads,
+            "stripes": stripes,
+            "batch_size": batch_size,
+            "transitions": total,
+            "seconds": elapsed,
+            "transitions_per_second": total / elapsed if elapsed > 0 else None,
+            "snapshots": snapshots[0],
+            "pending_left": store.snapshot().status_counts()[TransactionStatus.PENDING],
+        })
+    return results
+
+
+def format_stress(results: List[Dict[str, object]]) -> str:
+    """
+    Formats stress results as a fixed-width table.
+
+    Args:
+        results (List[Dict[str, object]]): Output of run_store_stress
+
+    Returns:
+        str: The results table
+    """
+    lines = [f"{'Threads':>7} {'Stripes':>7} {'Batch':>6} {'Transitions':>12} {'Per second':>12} {'Snapshots':>10}"]
+    for result in results:
+        lines.append(
+            f"{result['threads']:>7} {result['stripes']:>7} {result['batch_size']:>6} "
+            f"{result['transitions']:>12} {result['transitions_per_second']:>12.0f} {result['snapshots']:>10}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Runs the store stress test from the command line.
+
+    Args:
+        argv (Optional[List[str]]): Command line arguments (defaults to sys.argv)
+
+    Returns:
+        int: Exit status
+    """
+    parser = argparse.ArgumentParser(description="Stress the transaction store with concurrent writers")
+    parser.add_argument("--threads", type=lambda value: [int(count) for count in value.split(",")],
+                        default=[1, 2, 4, 8], help="comma separated writer thread counts (default: 1,2,4,8)")
+    parser.add_argument("--operations", type=int, default=20_000, help="transitions per writer thread")
+    parser.add_argument("--stripes", type=int, default=DEFAULT_STRIPES, help="lock stripes")
+    parser.add_argument("--batch-size", type=int, default=1, help="transitions per commit")
+    args = parser.parse_args(argv)
+
+    print(format_stress(run_store_stress(args.threads, args.operations, args.stripes, args.batch_size)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,276 @@
+"""
+Benchmark Harness
+
+Minimal stdlib benchmark runner built on time.perf_counter.
+Benchmarks are registered with the @benchmark decorator, run at several
+dataset sizes, saved as JSON and compared against a stored baseline.
+Runs can also record the peak traced memory of every case, which is
+compared against the baseline the same way as the timings.
+"""
+
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Sequence
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+# Default regression threshold: 10% slower than the baseline median
+DEFAULT_THRESHOLD = 0.10
+
+_BENCHMARKS = []  # type: List[Benchmark]
+
+
+class Benchmark:
+    """
+    A registered benchmark.
+
+    The setup function receives the dataset size and returns the argument
+    passed to the measured function, so dataset construction is excluded
+    from the timings.
+    """
+
+    def __init__(self, name: str, func: Callable, setup: Callable[[int], object]):
+        """
+        Initialize a new Benchmark instance.
+
+        Args:
+            name (str): Unique benchmark name
+            func (Callable): The function to measure, called with the setup result
+            setup (Callable[[int], object]): Builds the input for a given size
+        """
+        self.name = name
+        self.func = func
+        self.setup = setup
+
+
+def benchmark(name: str, setup: Callable[[int], object]) -> Callable[[Callable], Callable]:
+    """
+    Decorator that registers a function as a benchmark.
+
+    Args:
+        name (str): Unique benchmark name
+        setup (Callable[[int], object]): Builds the input for a given size
+
+    Returns:
+        Callable[[Callable], Callable]: The decorator
+    """
+    def decorator(func: Callable) -> Callable:
+        _BENCHMARKS.append(Benchmark(name, func, setup))
+        return func
+    return decorator
+
+
+def registered_benchmarks() -> List[Benchmark]:
+    """
+    Returns all registered benchmarks in registration order.
+
+    Returns:
+        List[Benchmark]: The registered benchmarks
+    """
+    return list(_BENCHMARKS)
+
+
+def time_call(func: Callable, arg: object, repeat: int) -> List[float]:
+    """
+    Times repeated calls of a function.
+
+    Args:
+        func (Callable): The function to call
+        arg (object): The argument passed to every call
+        repeat (int): Number of timed calls
+
+    Returns:
+        List[float]: Wall time of every call in seconds
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(arg)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def peak_memory_call(func: Callable, arg: object) -> int:
+    """
+    Measures the peak memory allocated by one call of a function.
+
+    The call is traced with tracemalloc, which slows it down, so it is
+    made separately from the timed calls.
+
+    Args:
+        func (Callable): The function to call
+        arg (object): The argument passed to the call
+
+    Returns:
+        int: Peak traced bytes allocated during the call
+    """
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    if hasattr(tracemalloc, "reset_peak"):
+        tracemalloc.reset_peak()
+    baseline = tracemalloc.get_traced_memory()[0]
+    try:
+        func(arg)
+        return max(tracemalloc.get_traced_memory()[1] - baseline, 0)
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+
+
+def run_benchmarks(sizes: Sequence[int], repeat: int = 3,
+                   names: Optional[Sequence[str]] = None,
+                   progress: Optional[Callable[[str], None]] = None,
+                   memory: bool = False) -> Dict[str, object]:
+    """
+    Runs the registered benchmarks at every requested size.
+
+    Args:
+        sizes (Sequence[int]): Dataset sizes (rows) to run
+        repeat (int): Timed repetitions per benchmark and size
+        names (Optional[Sequence[str]]): Only run benchmarks with these names
+        progress (Optional[Callable[[str], None]]): Called with a line per finished measurement
+        memory (bool): Also record each case's peak memory ("peak_bytes") with an extra untimed call
+
+    Returns:
+        Dict[str, object]: Results document with metadata and per-case statistics
+    """
+    results = {}
+    for bench in registered_benchmarks():
+        if names and bench.name not in names:
+            continue
+        for size in sizes:
+            arg = bench.setup(size)
+            timings = time_call(bench.func, arg, repeat)
+            key = f"{bench.name}[{size}]"
+            results[key] = {
+                "benchmark": bench.name,
+                "size": size,
+                "repeat": repeat,
+                "min": min(timings),
+                "median": statistics.median(timings),
+                "mean": statistics.mean(timings),
+                "rows_per_second": size / min(timings) if min(timings) > 0 else None,
+            }
+            line = f"{key:<48} median {results[key]['median'] * 1000:10.2f} ms"
+            if memory:
+                results[key]["peak_bytes"] = peak_memory_call(bench.func, arg)
+                line += f"  peak {results[key]['peak_bytes'] / 1024 / 1024:10.2f} MiB"
+            del arg
+            if progress:
+                progress(line)
+
+    return {
+        "meta": {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+
+
+def save_results(results: Dict[str, object], path: str) -> None:
+    """
+    Saves a results document as JSON.
+
+    Args:
+        results (Dict[str, object]): Results returned by run_benchmarks
+        path (str): Destination file
+    """
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(results, file, indent=2, sort_keys=True)
+
+
+def load_results(path: str) -> Dict[str, object]:
+    """
+    Loads a results document saved with save_results.
+
+    Args:
+        path (str): Source file
+
+    Returns:
+        Dict[str, object]: The results document
+    """
+    with open(path, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+def compare_results(current: Dict[str, object], baseline: Dict[str, object],
+                    threshold: float = DEFAULT_THRESHOLD) -> List[Dict[str, object]]:
+    """
+    Compares current results with a baseline by median time.
+
+    Cases present in only one of the documents are ignored. When both
+    documents recorded the peak memory of a case, it is compared as well
+    and a growth beyond the threshold is flagged as a memory regression.
+
+    Args:
+        current (Dict[str, object]): Results of the current run
+        baseline (Dict[str, object]): Stored baseline results
+        threshold (float): Allowed relative slowdown (0.10 means 10%)
+
+    Returns:
+        List[Dict[str, object]]: One entry per shared case with the ratio and a regression flag,
+            plus "memory_ratio" and "memory_regression" when peak memory was recorded
+    """
+    comparisons = []
+    baseline_results = baseline.get("results", {})
+    for key, result in sorted(current.get("results", {}).items()):
+        previous = baseline_results.get(key)
+        if previous is None or not previous["median"]:
+            continue
+        ratio = result["median"] / previous["median"]
+        entry = {
+            "case": key,
+            "baseline_median": previous["median"],
+            "current_median": result["median"],
+            "ratio": ratio,
+            "regression": ratio > 1.0 + threshold,
+        }
+        if result.get("peak_bytes") is not None and previous.get("peak_bytes"):
+            memory_ratio = result["peak_bytes"] / previous["peak_bytes"]
+            entry.update({
+                "baseline_peak_bytes": previous["peak_bytes"],
+                "current_peak_bytes": result["peak_bytes"],
+                "memory_ratio": memory_ratio,
+                "memory_regression": memory_ratio > 1.0 + threshold,
+            })
+        comparisons.append(entry)
+    return comparisons
+
+
+def format_comparison(comparisons: List[Dict[str, object]]) -> str:
+    """
+    Formats a comparison as a fixed-width table.
+
+    Args:
+        comparisons (List[Dict[str, object]]): Output of compare_results
+
+    Returns:
+        str: The comparison table
+    """
+    with_memory = any("memory_ratio" in entry for entry in comparisons)
+    header = f"{'Case':<48} {'Baseline ms':>12} {'Current ms':>12} {'Ratio':>7}"
+    if with_memory:
+        header += f" {'Memory':>7}"
+    lines = [header]
+    for entry in comparisons:
+        line = (f"{entry['case']:<48} {entry['baseline_median'] * 1000:>12.2f} "
+                f"{entry['current_median'] * 1000:>12.2f} {entry['ratio']:>7.2f}")
+        if with_memory:
+            line += f" {entry['memory_ratio']:>7.2f}" if "memory_ratio" in entry else f" {'-':>7}"
+        if entry["regression"]:
+            line += "  REGRESSION"
+        if entry.get("memory_regression"):
+            line += "  MEMORY REGRESSION"
+        lines.append(line)
+    return "\n".join(lines)
@@ -13,6 +13,7 @@ setup(
     author_email="finance@example.com",
     url="https://github.com/yourorg/personal-finance-tracker",
     packages=find_packages(where="src"),
+    py_modules=["cli", "main"],
     package_dir={"": "src"},
     python_requires=">=3.7",
     install_requires=[
@@ -41,7 +42,7 @@ setup(
     ],
     entry_points={
         "console_scripts": [
-            "finance-tracker=main:main",
+            "finance-tracker=cli:main",
         ],
     },
     keywords="finance, personal finance, money management, budgeting, expenses, income tracking",
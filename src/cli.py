@@ -0,0 +1,488 @@
+"""
+Personal Finance Tracker - Command Line Interface
+
+Provides the ``finance-tracker`` console script with subcommands for
+individual reports, CSV import/export, directory ingest, binary
+snapshots, partitioned storage, spending analysis, a long-running report
+server and benchmarks.
+
+Only argparse is imported up front: every subcommand imports the services
+it needs inside its handler, so cheap commands start quickly.
+"""
+
+import argparse
+import os
+import sys
+from typing import List, Optional
+
+# services.report_formats.OUTPUT_FORMATS, repeated so that parsing arguments imports no services
+REPORT_FORMATS = ("text", "json", "jsonl", "csv")
+
+
+def _load_transactions(input_path: Optional[str]):
+    """Loads transactions from a CSV file, or the sample data if no file is given."""
+    if input_path:
+        from services.import_service import import_transactions
+        return import_transactions(input_path)
+    from services.data_service import load_transactions
+    return load_transactions()
+
+
+def _emit(content: str, output_path: Optional[str]) -> int:
+    """Writes content to a file, or to stdout if no file is given."""
+    if output_path:
+        from utils.file_ops import write_file
+        return 0 if write_file(output_path, content) else 1
+    print(content)
+    return 0
+
+
+def _emit_structured(render, output_format: str, output_path: Optional[str]) -> int:
+    """Streams a machine-readable report to a file, or to stdout if no file is given."""
+    if output_path:
+        from services.report_service import save_report
+        return 0 if save_report(output_path, render, output_format) else 1
+    render(sys.stdout)
+    return 0
+
+
+def cmd_report_users(args: argparse.Namespace) -> int:
+    """Prints or saves the user report."""
+    from services.data_service import load_users
+    if args.format != "text":
+        from services.report_formats import user_report_writer
+        return _emit_structured(user_report_writer(load_users(), args.format), args.format, args.output)
+    from services.report_service import generate_user_report
+    return _emit(generate_user_report(load_users()), args.output)
+
+
+def cmd_report_transactions(args: argparse.Namespace) -> int:
+    """Prints or saves the transaction summary."""
+    from services.report_service import generate_transaction_summary
+    transactions = _load_transactions(args.input)
+    recurring = None
+    if args.recurring:
+        from services.recurring import detect_recurring
+        recurring = detect_recurring(transactions)
+    anomalies = None
+    if args.anomalies:
+        from services.anomaly import AnomalyDetector
+        anomalies = AnomalyDetector().observe_many(sorted(transactions, key=lambda t: t.created_at))
+    rates = None
+    if args.rates:
+        from services.currency import RateTable
+        try:
+            rates = RateTable.load(args.rates, base=args.base)
+        except (OSError, ValueError) as e:
+            print(f"Error loading exchange rates: {e}", file=sys.stderr)
+            return 1
+    try:
+        if args.format != "text":
+            from services.report_formats import transaction_report_writer
+            render = transaction_report_writer(transactions, args.format, args.workers, recurring, anomalies, rates)
+            return _emit_structured(render, args.format, args.output)
+        summary = generate_transaction_summary(transactions, args.workers, recurring, anomalies, rates)
+    except ValueError as e:
+        print(f"Error converting currencies: {e}", file=sys.stderr)
+        return 1
+    return _emit(summary, args.output)
+
+
+def _load_deduplicator(args: argparse.Namespace, known=()):
+    """Builds the deduplicator asked for by --dedup, --history and --bloom, or returns None."""
+    if not (args.dedup or args.history or args.bloom):
+        return None
+    from services.dedup_service import BloomFilter, Deduplicator, FingerprintIndex
+    history = bloom = None
+    if args.history:
+        history = FingerprintIndex.load(args.history) if os.path.exists(args.history) else FingerprintIndex()
+    if args.bloom:
+        bloom = BloomFilter.load(args.bloom) if os.path.exists(args.bloom) else BloomFilter()
+    return Deduplicator(known=known, history=history, bloom=bloom, drop_probable=args.drop_probable)
+
+
+def _save_deduplicator(args: argparse.Namespace, deduplicator) -> None:
+    """Adds the kept fingerprints to the --history and --bloom files."""
+    if args.history:
+        deduplicator.remember()
+        deduplicator.history.save(args.history)
+    if args.bloom:
+        deduplicator.bloom.save(args.bloom)
+
+
+def cmd_import(args: argparse.Namespace) -> int:
+    """Imports a CSV file and reports what was read."""
+    from services.import_service import import_transactions
+    try:
+        deduplicator = _load_deduplicator(args)
+    except (OSError, ValueError) as e:
+        print(f"Error loading deduplication state: {e}", file=sys.stderr)
+        return 1
+    try:
+        transactions = import_transactions(args.file, deduplicator=deduplicator, validate=args.validate)
+    except (OSError, ValueError) as e:
+        print(f"Error importing '{args.file}': {e}", file=sys.stderr)
+        return 1
+
+    print(f"Imported {len(transactions)} transactions from {args.file}")
+    if deduplicator is not None:
+        print(f"Dropped {deduplicator.dropped} duplicate transactions "
+              f"({deduplicator.previously_imported} from earlier imports)")
+        if deduplicator.probable:
+            action = "dropped" if args.drop_probable else "kept"
+            print(f"{deduplicator.probable} transactions may be from earlier imports ({action})")
+        _save_deduplicator(args, deduplicator)
+    if args.summary:
+        from services.report_service import generate_transaction_summary
+        print(generate_transaction_summary(transactions))
+    return 0
+
+
+def cmd_export(args: argparse.Namespace) -> int:
+    """Exports sample transactions to a CSV file."""
+    from services.data_service import generate_transactions
+    from services.import_service import export_transactions
+    transactions = generate_transactions(args.count, user_count=args.users, seed=args.seed)
+    count = export_transactions(transactions, args.file)
+    print(f"Exported {count} transactions to {args.file}")
+    return 0
+
+
+def cmd_analyze(args: argparse.Namespace) -> int:
+    """Prints the spending analysis as JSON."""
+    import json
+    from main import analyze_spending_patterns
+    from services.data_context import DataContext
+    if args.snapshot:
+        from services.snapshot import load_context
+        try:
+            context = load_context(args.snapshot, args.wal)
+        except (OSError, ValueError) as e:
+            print(f"Error loading snapshot '{args.snapshot}': {e}", file=sys.stderr)
+            return 1
+    else:
+        context = DataContext(users=[], transactions=_load_transactions(args.input))
+    try:
+        analysis = analyze_spending_patterns(context, args.workers)
+    except ValueError as e:
+        print(f"Error analyzing spending: {e}", file=sys.stderr)
+        return 1
+    print(json.dumps(analysis, indent=2))
+    return 0
+
+
+def cmd_snapshot(args: argparse.Namespace) -> int:
+    """Saves the transactions to a snapshot file."""
+    from services.data_context import DataContext
+    from services.data_service import load_users
+    from services.snapshot import save_snapshot
+    context = DataContext(users=load_users(), transactions=_load_transactions(args.input))
+    try:
+        saved = save_snapshot(context, args.file)
+    except ValueError as e:
+        print(f"Error saving snapshot: {e}", file=sys.stderr)
+        return 1
+    if not saved:
+        return 1
+    print(f"Saved {len(context.transactions)} transactions to {args.file}")
+    return 0
+
+
+def cmd_compact(args: argparse.Namespace) -> int:
+    """Folds a write-ahead log into its snapshot."""
+    from services.snapshot import compact_log
+    from services.wal import WriteAheadLog
+    try:
+        with WriteAheadLog(args.wal) as wal:
+            compacted = compact_log(args.file, wal, min_log_bytes=args.min_bytes)
+            seq = wal.last_seq
+    except (OSError, ValueError) as e:
+        print(f"Error compacting '{args.wal}': {e}", file=sys.stderr)
+        return 1
+    if compacted:
+        print(f"Compacted {args.wal} into {args.file} through record {seq}")
+    else:
+        print(f"{args.wal} is smaller than {args.min_bytes} bytes; nothing to do")
+    return 0
+
+
+def cmd_partition(args: argparse.Namespace) -> int:
+    """Adds transactions to a partitioned store."""
+    from services.partitions import PartitionedStore
+    try:
+        store = PartitionedStore(args.directory, user_buckets=args.user_buckets)
+        count = store.add(_load_transactions(args.input))
+    except (OSError, ValueError) as e:
+        print(f"Error writing partitions to '{args.directory}': {e}", file=sys.stderr)
+        return 1
+    print(f"Added {count} transactions to {args.directory} ({len(store.partitions())} partitions)")
+    return 0
+
+
+def cmd_query(args: argparse.Namespace) -> int:
+    """Prints the summary of the transactions in a partitioned store matching a query."""
+    import json
+    from datetime import datetime
+    from services.partitions import PartitionedStore
+    try:
+        since = datetime.fromisoformat(args.since) if args.since else None
+        until = datetime.fromisoformat(args.until) if args.until else None
+        store = PartitionedStore(args.directory)
+        summary = store.summary(since, until, args.user)
+    except (OSError, ValueError) as e:
+        print(f"Error querying '{args.directory}': {e}", file=sys.stderr)
+        return 1
+    print(json.dumps(summary.to_dict(), indent=2))
+    return 0
+
+
+def cmd_ingest(args: argparse.Namespace) -> int:
+    """
+    Imports rows appended to the CSV files in a directory as they arrive.
+
+    Without --wal the totals only cover the rows ingested by this process;
+    with it every batch is logged before it is counted, and a restart
+    restores the earlier batches (on top of --snapshot, if given).
+    """
+    from services.data_context import DataContext
+    from services.ingest import DirectoryTailer, watch
+    if args.snapshot and not args.wal:
+        print("Error: --snapshot requires --wal", file=sys.stderr)
+        return 1
+    wal = None
+    try:
+        if args.snapshot and os.path.exists(args.snapshot):
+            from services.snapshot import Snapshot, load_context
+            start_seq = Snapshot(args.snapshot).wal_seq
+            context = load_context(args.snapshot, args.wal)
+        else:
+            start_seq = 0
+            transactions = []
+            if args.wal and os.path.exists(args.wal):
+                from services.wal import read_log, replay
+                replay(transactions, read_log(args.wal))
+            context = DataContext(users=[], transactions=transactions)
+        if args.wal:
+            from services.wal import WriteAheadLog
+            wal = WriteAheadLog(args.wal, start_seq=start_seq)
+        # Restored transactions are known, so a file read again from the start is not counted twice
+        deduplicator = _load_deduplicator(args, known=context.transactions)
+        tailer = DirectoryTailer(args.directory, pattern=args.pattern, state_path=args.state,
+                                 deduplicator=deduplicator, validate=args.validate)
+    except (OSError, ValueError) as e:
+        print(f"Error restoring ingest state: {e}", file=sys.stderr)
+        if wal is not None:
+            wal.close()
+        return 1
+    detector = context.anomaly_detector
+
+    def ingest(batch):
+        if wal is not None:
+            for transaction in batch:
+                wal.append_insert(transaction)
+            wal.commit()
+        if deduplicator is not None:
+            _save_deduplicator(args, deduplicator)
+        flagged = len(detector.flagged)
+        context.add_transactions(batch)
+        aggregate = context.aggregate()
+        print(f"Ingested {len(batch)} transactions (total {aggregate.total_count}, "
+              f"completed total {aggregate.completed_total:.2f}, "
+              f"{len(detector.flagged) - flagged} newly flagged)", flush=True)
+
+    try:
+        watch(tailer, ingest, interval=args.interval, max_polls=1 if args.once else None)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if wal is not None:
+            wal.close()
+    return 0
+
+
+def cmd_serve(args: argparse.Namespace) -> int:
+    """Serves reports from warm in-memory data until interrupted."""
+    import logging
+    from services.report_server import serve
+    from utils.memory import enable_memory_diagnostics, memory_diagnostics_requested
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
+    if memory_diagnostics_requested():
+        # Serves /debug/memory
+        enable_memory_diagnostics()
+    transactions = _load_transactions(args.input) if args.input else None
+    serve(args.host, args.port, transactions)
+    return 0
+
+
+def cmd_bench(args: argparse.Namespace) -> int:
+    """Runs the benchmark suite from a source checkout."""
+    repo_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+    if not os.path.isdir(os.path.join(repo_root, "benchmarks")):
+        print("Benchmarks are only available from a source checkout", file=sys.stderr)
+        return 1
+    sys.path.insert(0, repo_root)
+    from benchmarks.__main__ import main as run_benchmarks
+    return run_benchmarks(args.extra_args)
+
+
+def cmd_demo(args: argparse.Namespace) -> int:
+    """Runs the full demonstration pipeline."""
+    from main import main as run_demo
+    run_demo(args.extra_args)
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """
+    Builds the argument parser with all subcommands.
+
+    Returns:
+        argparse.ArgumentParser: The configured parser
+    """
+    parser = argparse.ArgumentParser(
+        prog="finance-tracker",
+        description="Personal Finance Tracker (runs the demo pipeline when no command is given)"
+    )
+    commands = parser.add_subparsers(dest="command", metavar="COMMAND")
+
+    report = commands.add_parser("report", help="generate a single report")
+    reports = report.add_subparsers(dest="report", metavar="REPORT")
+    reports.required = True
+    users = reports.add_parser("users", help="user report")
+    users.add_argument("--output", metavar="PATH", help="save the report instead of printing it")
+    users.add_argument("--format", choices=REPORT_FORMATS, default="text",
+                       help="json: summary; jsonl, csv: one row per user (default: text)")
+    users.set_defaults(handler=cmd_report_users)
+    transactions = reports.add_parser("transactions", help="transaction summary")
+    transactions.add_argument("--input", metavar="CSV", help="read transactions from a CSV file")
+    transactions.add_argument("--output", metavar="PATH", help="save the report instead of printing it")
+    transactions.add_argument("--format", choices=REPORT_FORMATS, default="text",
+                              help="json: summary; jsonl, csv: one row per transaction (default: text)")
+    transactions.add_argument("--workers", type=int, metavar="N",
+                              help="aggregate in N processes, each over a range of rows (default: 1)")
+    transactions.add_argument("--recurring", action="store_true",
+                              help="list recurring payments such as rent and subscriptions")
+    transactions.add_argument("--anomalies", action="store_true",
+                              help="list transactions far above the user's usual amounts")
+    transactions.add_argument("--rates", metavar="CSV",
+                              help="exchange rates (currency,date,rate) to report in one currency")
+    transactions.add_argument("--base", default="USD", help="currency the rates convert into (default: USD)")
+    transactions.set_defaults(handler=cmd_report_transactions)
+
+    import_parser = commands.add_parser("import", help="import transactions from a CSV file")
+    import_parser.add_argument("file", help="CSV file to import")
+    import_parser.add_argument("--summary", action="store_true", help="print a transaction summary")
+    import_parser.add_argument("--dedup", action="store_true", help="drop duplicate transactions")
+    import_parser.add_argument("--validate", action="store_true",
+                               help="reject the file if a transaction fails validation (e.g. a non-positive amount)")
+    import_parser.add_argument("--history", metavar="PATH",
+                               help="fingerprint file of earlier imports, updated afterwards (implies --dedup)")
+    import_parser.add_argument("--bloom", metavar="PATH",
+                               help="Bloom filter file used as a prefilter for earlier imports (implies --dedup)")
+    import_parser.add_argument("--drop-probable", action="store_true",
+                               help="without --history, drop transactions the Bloom filter reports as seen")
+    import_parser.set_defaults(handler=cmd_import)
+
+    export = commands.add_parser("export", help="export sample transactions to a CSV file")
+    export.add_argument("file", help="CSV file to write")
+    export.add_argument("--count", type=int, default=15, help="number of transactions (default: 15)")
+    export.add_argument("--users", type=int, default=5, help="number of users (default: 5)")
+    export.add_argument("--seed", type=int, help="random seed for reproducible data")
+    export.set_defaults(handler=cmd_export)
+
+    analyze = commands.add_parser("analyze", help="print the spending analysis as JSON")
+    analyze.add_argument("--input", metavar="CSV", help="read transactions from a CSV file")
+    analyze.add_argument("--workers", type=int, metavar="N",
+                         help="aggregate in N processes, each over a range of rows (default: 1)")
+    analyze.add_argument("--snapshot", metavar="PATH", help="restore the data from a snapshot file")
+    analyze.add_argument("--wal", metavar="PATH", help="write-ahead log to replay on top of --snapshot")
+    analyze.set_defaults(handler=cmd_analyze)
+
+    snapshot = commands.add_parser("snapshot", help="save transactions to a binary snapshot for fast startup")
+    snapshot.add_argument("file", help="snapshot file to write")
+    snapshot.add_argument("--input", metavar="CSV", help="read transactions from a CSV file")
+    snapshot.set_defaults(handler=cmd_snapshot)
+
+    compact = commands.add_parser("compact", help="fold a write-ahead log into its snapshot")
+    compact.add_argument("file", help="snapshot file to update (created if missing)")
+    compact.add_argument("wal", help="write-ahead log to fold in and trim")
+    compact.add_argument("--min-bytes", type=int, default=0, metavar="N",
+                         help="only compact logs of at least N bytes (default: 0)")
+    compact.set_defaults(handler=cmd_compact)
+
+    partition = commands.add_parser("partition", help="add transactions to a store partitioned by month and user")
+    partition.add_argument("directory", help="store directory (created if missing)")
+    partition.add_argument("--input", metavar="CSV", help="read transactions from a CSV file")
+    partition.add_argument("--user-buckets", type=int, default=1, metavar="N",
+                           help="user hash buckets per month for a new store (default: 1)")
+    partition.set_defaults(handler=cmd_partition)
+
+    query = commands.add_parser("query", help="summarize a partitioned store, opening only matching partitions")
+    query.add_argument("directory", help="store directory")
+    query.add_argument("--since", metavar="DATE", help="earliest creation time, ISO format (inclusive)")
+    query.add_argument("--until", metavar="DATE", help="latest creation time, ISO format (exclusive)")
+    query.add_argument("--user", type=int, metavar="ID", help="only this user's transactions")
+    query.set_defaults(handler=cmd_query)
+
+    ingest = commands.add_parser("ingest", help="import rows appended to CSV files in a directory as they arrive")
+    ingest.add_argument("directory", help="drop directory to watch")
+    ingest.add_argument("--pattern", default="*.csv", help="file name pattern (default: *.csv)")
+    ingest.add_argument("--interval", type=float, default=0.25, metavar="SECONDS",
+                        help="seconds between polls (default: 0.25)")
+    ingest.add_argument("--state", metavar="PATH", help="file that keeps read offsets across restarts")
+    ingest.add_argument("--wal", metavar="PATH",
+                        help="write-ahead log of ingested transactions, replayed on restart so totals "
+                             "include earlier runs (without it, totals cover this run only)")
+    ingest.add_argument("--snapshot", metavar="PATH", help="snapshot the --wal continues (see compact)")
+    ingest.add_argument("--dedup", action="store_true", help="drop duplicate transactions")
+    ingest.add_argument("--history", metavar="PATH",
+                        help="fingerprint file of earlier imports, updated after every batch (implies --dedup)")
+    ingest.add_argument("--bloom", metavar="PATH",
+                        help="Bloom filter file used as a prefilter for earlier imports (implies --dedup)")
+    ingest.add_argument("--drop-probable", action="store_true",
+                        help="without --history, drop transactions the Bloom filter reports as seen")
+    ingest.add_argument("--once", action="store_true", help="poll once and exit")
+    ingest.add_argument("--validate", action="store_true",
+                        help="skip transactions that fail validation (e.g. a non-positive amount)")
+    ingest.set_defaults(handler=cmd_ingest)
+
+    serve = commands.add_parser("serve", help="serve reports over HTTP from warm in-memory data")
+    serve.add_argument("--host", default="127.0.0.1", help="interface to bind (default: 127.0.0.1)")
+    serve.add_argument("--port", type=int, default=8080, help="port to bind (default: 8080)")
+    serve.add_argument("--input", metavar="CSV", help="read transactions from a CSV file")
+    serve.set_defaults(handler=cmd_serve)
+
+    # Options of these commands are passed through to the underlying runner
+    bench = commands.add_parser("bench", help="run the benchmark suite (source checkout only)",
+                                add_help=False)
+    bench.set_defaults(handler=cmd_bench, passthrough=True)
+
+    demo = commands.add_parser("demo", help="run the full demonstration pipeline (e.g. demo --profile)",
+                               add_help=False)
+    demo.set_defaults(handler=cmd_demo, passthrough=True)
+
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Command line entry point.
+
+    Args:
+        argv (Optional[List[str]]): Command line arguments (defaults to sys.argv)
+
+    Returns:
+        int: Exit status
+    """
+    parser = build_parser()
+    args, extra_args = parser.parse_known_args(argv)
+    if extra_args and not getattr(args, "passthrough", False):
+        parser.error(f"unrecognized arguments: {' '.join(extra_args)}")
+    args.extra_args = extra_args
+    if args.command is None:
+        return cmd_demo(args)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,13 +6,53 @@ It orchestrates the loading of financial data, generation of reports, and demons
 of key financial calculations.
 """
 
-from services.data_service import load_users, load_transactions
+import argparse
+import logging
+from typing import List, Optional
+
+from services.data_context import DataContext
 from services.report_service import generate_user_report, generate_transaction_summary
 from utils.file_ops import write_file
-from utils.math_ops import add, multiply, calculate_average
+from utils.math_ops import add, multiply
+from utils.memory import (
+    MEMORY_ENV_VAR,
+    enable_memory_diagnostics,
+    memory_diagnostics_requested,
+)
+from utils.profiling import PROFILE_ENV_VAR, enable_profiling, get_profiler
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """
+    Parses the command line options of the application.
+    
+    Args:
+        argv (Optional[List[str]]): Arguments to parse (defaults to sys.argv)
+    
+    Returns:
+        argparse.Namespace: The parsed options
+    """
+    parser = argparse.ArgumentParser(description="Personal Finance Tracker")
+    parser.add_argument(
+        "--profile", action="store_true",
+        help=f"record per-stage timings (also enabled by {PROFILE_ENV_VAR}=1)"
+    )
+    parser.add_argument(
+        "--profile-output", metavar="PATH",
+        help="write the per-stage profile as JSON to PATH (implies --profile)"
+    )
+    parser.add_argument(
+        "--memory", action="store_true",
+        help=f"snapshot memory after every stage and estimate footprints (also enabled by {MEMORY_ENV_VAR}=1)"
+    )
+    parser.add_argument(
+        "--memory-output", metavar="PATH",
+        help="write the memory diagnostics as JSON to PATH (implies --memory)"
+    )
+    return parser.parse_args(argv)
 
 
-def main():
+def main(argv: Optional[List[str]] = None):
     """
     Main application function that orchestrates the personal finance workflow.
     
@@ -21,13 +61,29 @@ def main():
     2. Generates comprehensive financial reports
     3. Saves reports to output files
     4. Demonstrates financial calculations
+    
+    Args:
+        argv (Optional[List[str]]): Command line arguments (defaults to sys.argv)
     """
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s %(name)s: %(message)s")
+    args = parse_args(argv)
+    
+    profiler = get_profiler()
+    if args.profile or args.profile_output:
+        enable_profiling()
+    memory = None
+    if args.memory or args.memory_output or memory_diagnostics_requested():
+        memory = enable_memory_diagnostics()
+        memory.reset()
+    profiler.reset()
+    
     print("🏦 Starting Personal Finance Tracker...")
     print("=" * 50)
     
-    # Load financial data
-    users = load_users()
-    transactions = load_transactions()
+    # Load financial data once and share it across reports and analyses
+    context = DataContext()
+    users = context.users
+    transactions = context.transactions
     
     print(f"📊 Loaded {len(users)} users and {len(transactions)} transactions")
     
@@ -53,8 +109,32 @@ def main():
     investment_result = calculate_compound_growth(1000, 0.07, 10)
     print(f"   Investment Growth: $1,000 → ${investment_result:.2f} (7% over 10 years)")
     
+    spending = analyze_spending_patterns(context)
+    if "error" not in spending:
+        print(f"   Completed Volume: ${spending['total_spending']:.2f} "
+              f"across {spending['transaction_count']} transactions")
+    
+    if memory is not None:
+        context.record_memory_footprints(memory, {"user_report": user_report,
+                                                  "transaction_summary": transaction_summary})
+    
     print("\n✅ Personal Finance Tracker completed successfully!")
     print("📄 Reports saved to: user_report.txt, transaction_summary.txt")
+    
+    if profiler.enabled:
+        print("\n⏱️  Pipeline Profile:")
+        print(profiler.format_table())
+        if args.profile_output:
+            profile_json = profiler.to_json()
+            write_file(args.profile_output, profile_json)
+            print(f"📄 Profile saved to: {args.profile_output}")
+    
+    if memory is not None:
+        print("\n🧠 Memory Diagnostics:")
+        print(memory.format_table())
+        if args.memory_output:
+            write_file(args.memory_output, memory.to_json())
+            print(f"📄 Memory diagnostics saved to: {args.memory_output}")
 
 
 def calculate_savings_rate(income: float, expenses: float) -> float:
@@ -90,38 +170,23 @@ def calculate_compound_growth(principal: float, rate: float, years: int) -> floa
     return principal * ((1 + rate) ** years)
 
 
-def analyze_spending_patterns():
+def analyze_spending_patterns(context: Optional[DataContext] = None, workers: Optional[int] = None):
     """
     Analyzes spending patterns from transaction data and provides insights.
     
+    Args:
+        context (Optional[DataContext]): Shared data context (a new one is loaded if omitted)
+        workers (Optional[int]): Aggregate in this many processes, each over a range of rows
+    
     Returns:
         dict: Dictionary containing spending analysis results
+    
+    Raises:
+        ValueError: If the transactions are in several currencies
     """
-    transactions = load_transactions()
-    
-    # Filter completed transactions only
-    completed_transactions = [t for t in transactions if t.is_completed()]
-    
-    if not completed_transactions:
-        return {"error": "No completed transactions found"}
-    
-    # Calculate spending metrics
-    amounts = [t.amount for t in completed_transactions]
-    total_spending = sum(amounts)
-    average_transaction = calculate_average(amounts)
-    
-    # Group by transaction type
-    spending_by_type = {}
-    for transaction in completed_transactions:
-        trans_type = transaction.transaction_type.value
-        spending_by_type[trans_type] = spending_by_type.get(trans_type, 0) + transaction.amount
-    
-    return {
-        "total_spending": total_spending,
-        "average_transaction": average_transaction,
-        "transaction_count": len(completed_transactions),
-        "spending_by_type": spending_by_type
-    }
+    if context is None:
+        context = DataContext()
+    return context.spending_analysis(workers)
 
 
 if __name__ == "__main__":
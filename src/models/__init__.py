@@ -5,6 +5,9 @@ Contains data model classes representing the core entities in the application.
 """
 
 from .user import User
+from .string_pool import DESCRIPTIONS, StringPool
 from .transaction import Transaction
+from .validation import ValidationResult, validate_transactions, validate_users
 
-__all__ = ["User", "Transaction"]
\ No newline at end of file
+__all__ = ["User", "Transaction", "StringPool", "DESCRIPTIONS", "ValidationResult", "validate_users",
+           "validate_transactions"]
\ No newline at end of file
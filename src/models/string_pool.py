@@ -0,0 +1,128 @@
+"""
+String Pool
+
+Dictionary encoding for repetitive strings.
+
+A StringPool assigns every distinct string a small integer code, once,
+and keeps one copy of it. Transactions store the code of their
+description instead of their own string: real histories repeat the same
+merchants over and over, so millions of rows share a few thousand
+strings, and grouping or matching descriptions can work on the codes
+and compute per-string results once per distinct description.
+
+Codes are never reused or reassigned, so results keyed by code stay
+valid for the life of the process. Since pooled strings are never freed,
+a pool holds at most max_size strings: once it is full, encode returns
+new strings themselves instead of a code. Such unpooled values decode to
+themselves, so callers never need to tell the two apart, and a
+long-running server or ingest process that keeps seeing new one-off
+descriptions stops growing the pool instead of growing it forever.
+Codes are process-local: anything persisted or sent to another process
+must carry the decoded strings.
+"""
+
+import threading
+from typing import Dict, Iterable, Iterator, List, Union
+
+# Default maximum number of strings per pool
+DEFAULT_POOL_SIZE = 1 << 18
+
+# A pool code, or an unpooled string that decodes to itself
+Code = Union[int, str]
+
+
+class StringPool:
+    """
+    Append-only table of distinct strings and their codes.
+    """
+
+    __slots__ = ("max_size", "_codes", "_values", "_lock")
+
+    def __init__(self, max_size: int = DEFAULT_POOL_SIZE):
+        """
+        Initialize a new StringPool instance.
+
+        Args:
+            max_size (int): Maximum number of pooled strings
+        """
+        self.max_size = max_size
+        self._codes = {}  # type: Dict[str, int]
+        self._values = []  # type: List[str]
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __contains__(self, value: str) -> bool:
+        return value in self._codes
+
+    @property
+    def values(self) -> List[str]:
+        """The pooled strings, indexed by code (must not be modified)."""
+        return self._values
+
+    def encode(self, value: str) -> Code:
+        """
+        Returns the code of a string, adding the string on first use.
+
+        Args:
+            value (str): The string
+
+        Returns:
+            Code: Its code, or the string itself if it is new and the pool is full
+        """
+        code = self._codes.get(value)
+        if code is None:
+            with self._lock:
+                code = self._codes.get(value)
+                if code is None:
+                    if len(self._values) >= self.max_size:
+                        return value
+                    code = self._codes[value] = len(self._values)
+                    self._values.append(value)
+        return code
+
+    def encode_all(self, values: Iterable[str]) -> List[Code]:
+        """
+        Returns the codes of several strings.
+
+        Args:
+            values (Iterable[str]): The strings
+
+        Returns:
+            List[Code]: Their codes, in order
+        """
+        return list(map(self.encode, values))
+
+    def decode(self, code: Code) -> str:
+        """
+        Returns the string of a code.
+
+        Args:
+            code (Code): A code returned by encode
+
+        Returns:
+            str: The pooled string
+
+        Raises:
+            IndexError: If the code is not in the pool
+        """
+        if isinstance(code, str):
+            return code
+        return self._values[code]
+
+    def decode_all(self, codes: Iterable[Code]) -> Iterator[str]:
+        """
+        Returns the strings of several codes, lazily.
+
+        Args:
+            codes (Iterable[Code]): Codes returned by encode
+
+        Returns:
+            Iterator[str]: The strings, in order
+        """
+        return map(self.decode, codes)
+
+
+# Process-wide pool of transaction descriptions
+DESCRIPTIONS = StringPool()
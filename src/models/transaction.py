@@ -3,11 +3,44 @@ Transaction Model
 
 Defines the Transaction class representing a financial transaction in the system.
 Contains transaction details and methods for transaction operations.
+
+Descriptions are dictionary encoded: a transaction stores the code of its
+description in the shared DESCRIPTIONS pool, and the reason it failed
+separately, so failing a transaction does not create a new string.
+Pickled transactions carry the description text, since codes are only
+meaningful within one process.
 """
 
 from datetime import datetime
 from enum import Enum
-from typing import Optional
+from operator import attrgetter
+from typing import Callable, Dict, List, Optional, Sequence
+
+from .string_pool import DESCRIPTIONS
+
+
+# Currency of transactions that do not specify one (ISO 4217 code)
+DEFAULT_CURRENCY = "USD"
+
+# Symbols used when formatting amounts; other currencies are shown by code
+CURRENCY_SYMBOLS = {"USD": "$", "EUR": "€", "GBP": "£", "JPY": "¥"}
+
+
+def format_amount(amount: float, currency: str = DEFAULT_CURRENCY) -> str:
+    """
+    Formats an amount in a currency.
+    
+    Args:
+        amount (float): The amount
+        currency (str): ISO 4217 currency code
+    
+    Returns:
+        str: The formatted amount, e.g. "$12.50" or "12.50 CHF"
+    """
+    symbol = CURRENCY_SYMBOLS.get(currency)
+    if symbol is None:
+        return f"{amount:.2f} {currency}"
+    return f"{symbol}{amount:.2f}"
 
 
 class TransactionType(Enum):
@@ -34,9 +67,13 @@ class Transaction:
     transaction-related operations such as validation and status management.
     """
     
+    __slots__ = ("transaction_id", "user_id", "amount", "transaction_type", "description_code",
+                 "failure_reason", "created_at", "status", "category", "currency")
+    
     def __init__(self, transaction_id: int, user_id: int, amount: float,
                  transaction_type: TransactionType, description: str = "",
-                 created_at: Optional[datetime] = None):
+                 created_at: Optional[datetime] = None, category: Optional[str] = None,
+                 currency: str = DEFAULT_CURRENCY):
         """
         Initialize a new Transaction instance.
         
@@ -47,14 +84,42 @@ class Transaction:
             transaction_type (TransactionType): Type of the transaction
             description (str): Optional description of the transaction
             created_at (Optional[datetime]): When the transaction was created (defaults to now)
+            category (Optional[str]): Spending category (None until categorized)
+            currency (str): ISO 4217 code of the amount's currency (defaults to USD)
         """
         self.transaction_id = transaction_id
         self.user_id = user_id
         self.amount = amount
         self.transaction_type = transaction_type
-        self.description = description
+        self.description_code = DESCRIPTIONS.encode(description)
+        self.failure_reason = ""
         self.created_at = created_at or datetime.now()
         self.status = TransactionStatus.PENDING
+        self.category = category
+        self.currency = currency
+    
+    @property
+    def description(self) -> str:
+        """Description of the transaction, followed by the failure reason if it failed with one."""
+        description = DESCRIPTIONS.decode(self.description_code)
+        if self.failure_reason:
+            return f"{description} [Failed: {self.failure_reason}]"
+        return description
+    
+    @description.setter
+    def description(self, description: str) -> None:
+        self.description_code = DESCRIPTIONS.encode(description)
+        self.failure_reason = ""
+    
+    def __getstate__(self) -> Dict[str, object]:
+        state = {slot: getattr(self, slot) for slot in self.__slots__}
+        state["description_code"] = DESCRIPTIONS.decode(self.description_code)
+        return state
+    
+    def __setstate__(self, state: Dict[str, object]) -> None:
+        for slot, value in state.items():
+            setattr(self, slot, value)
+        self.description_code = DESCRIPTIONS.encode(state["description_code"])
     
     def is_valid_amount(self) -> bool:
         """
@@ -81,7 +146,11 @@ class Transaction:
         """
         self.status = TransactionStatus.FAILED
         if reason:
-            self.description += f" [Failed: {reason}]"
+            if self.failure_reason:
+                # Failed again: the earlier reason becomes part of the description,
+                # which is kept unpooled since it is specific to this transaction
+                self.description_code = self.description
+            self.failure_reason = reason
     
     def cancel_transaction(self) -> bool:
         """
@@ -102,7 +171,7 @@ class Transaction:
         Returns:
             str: The amount formatted as a currency string
         """
-        return f"${self.amount:.2f}"
+        return format_amount(self.amount, self.currency)
     
     def is_completed(self) -> bool:
         """
@@ -132,4 +201,41 @@ class Transaction:
         """
         return (f"Transaction(transaction_id={self.transaction_id}, user_id={self.user_id}, "
                 f"amount={self.amount}, type={self.transaction_type}, "
-                f"status={self.status}, created_at={self.created_at})")
\ No newline at end of file
+                f"status={self.status}, created_at={self.created_at})")
+
+
+_description_codes = attrgetter("description_code")
+_failure_reasons = attrgetter("failure_reason")
+
+
+def transaction_descriptions(transactions: Sequence[Transaction],
+                             transform: Optional[Callable[[str], str]] = None) -> List[str]:
+    """
+    Returns the descriptions of transactions, decoding each distinct description once.
+    
+    Args:
+        transactions (Sequence[Transaction]): The transactions
+        transform (Optional[Callable[[str], str]]): Applied to every description, e.g. an
+            escaping function; it runs once per distinct description
+    
+    Returns:
+        List[str]: The (transformed) descriptions, in order
+    """
+    codes = list(map(_description_codes, transactions))
+    if transform is None:
+        try:
+            descriptions = list(map(DESCRIPTIONS.values.__getitem__, codes))
+        except TypeError:
+            # Unpooled descriptions among them
+            descriptions = list(DESCRIPTIONS.decode_all(codes))
+    else:
+        decode = DESCRIPTIONS.decode
+        table = {code: transform(decode(code)) for code in set(codes)}
+        descriptions = list(map(table.__getitem__, codes))
+    reasons = list(map(_failure_reasons, transactions))
+    if any(reasons):
+        for position, reason in enumerate(reasons):
+            if reason:
+                description = transactions[position].description
+                descriptions[position] = description if transform is None else transform(description)
+    return descriptions
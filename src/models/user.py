@@ -8,6 +8,8 @@ Contains basic user information and methods for user operations.
 from datetime import datetime
 from typing import Optional
 
+from .validation import is_valid_email_address
+
 
 class User:
     """
@@ -54,7 +56,7 @@ class User:
         Returns:
             bool: True if the email format is valid, False otherwise
         """
-        return "@" in self.email and "." in self.email.split("@")[1]
+        return is_valid_email_address(self.email)
     
     def deactivate(self) -> None:
         """
@@ -78,7 +80,7 @@ class User:
         Returns:
             bool: True if the email was updated successfully, False otherwise
         """
-        if "@" in new_email and "." in new_email.split("@")[1]:
+        if is_valid_email_address(new_email):
             self.email = new_email
             return True
         return False
@@ -0,0 +1,175 @@
+"""
+Validation
+
+Bulk validators for users and transactions.
+
+Validators run over a whole column of values at once and return a
+ValidationResult: a byte mask with one entry per value (1 = valid) and
+the reason for every invalid position. Email addresses are checked with
+a single precompiled pattern and the result is memoized per address,
+since the same addresses are validated again by every report run: a
+warm column is validated with C-level dictionary lookups only.
+"""
+
+import operator
+import re
+import threading
+from itertools import compress, repeat
+from typing import TYPE_CHECKING, Dict, Iterable, List, Sequence, TypeVar
+
+if TYPE_CHECKING:
+    from .transaction import Transaction
+    from .user import User
+
+T = TypeVar("T")
+
+# An "@" followed by a "." before any further "@"
+EMAIL_PATTERN = re.compile(r"[^@]*@[^@]*\.")
+
+# Memoized results are dropped all at once when the memo outgrows this;
+# unlike LRU eviction, that costs nothing per lookup
+EMAIL_MEMO_SIZE = 1 << 18
+
+_email_memo = {}  # type: Dict[str, bool]
+_email_memo_lock = threading.Lock()
+
+
+def _remember_emails(emails: List[str]) -> None:
+    """Matches addresses that are not memoized yet and memoizes the results."""
+    results = map(operator.is_not, map(EMAIL_PATTERN.match, emails), repeat(None))
+    if len(_email_memo) + len(emails) > EMAIL_MEMO_SIZE:
+        _email_memo.clear()
+    _email_memo.update(zip(emails, results))
+
+
+def is_valid_email_address(email: str) -> bool:
+    """
+    Validates the format of an email address.
+
+    Args:
+        email (str): The email address
+
+    Returns:
+        bool: True if the address contains an "@" with a "." in the domain part
+    """
+    valid = _email_memo.get(email)
+    if valid is None:
+        with _email_memo_lock:
+            _remember_emails([email])
+            valid = _email_memo[email]
+    return valid
+
+
+class ValidationResult:
+    """
+    Outcome of validating a column of values.
+    """
+
+    __slots__ = ("mask", "reasons")
+
+    def __init__(self, mask: bytes, reasons: Dict[int, str]):
+        """
+        Initialize a new ValidationResult instance.
+
+        Args:
+            mask (bytes): 1 for every valid position, 0 for every invalid one
+            reasons (Dict[int, str]): Why each invalid position failed
+        """
+        self.mask = mask
+        self.reasons = reasons
+
+    def __len__(self) -> int:
+        return len(self.mask)
+
+    @property
+    def all_valid(self) -> bool:
+        """Whether every value passed."""
+        return not self.reasons
+
+    @property
+    def valid_count(self) -> int:
+        """Number of values that passed."""
+        return len(self.mask) - len(self.reasons)
+
+    def select(self, items: Iterable[T]) -> List[T]:
+        """
+        Keeps the items at valid positions.
+
+        Args:
+            items (Iterable[T]): Items in the order they were validated
+
+        Returns:
+            List[T]: The valid items
+        """
+        return list(compress(items, self.mask))
+
+
+def _invalid_positions(mask: bytes) -> List[int]:
+    """Positions of the zero bytes of a mask, found at C speed."""
+    positions = []
+    position = mask.find(0)
+    while position >= 0:
+        positions.append(position)
+        position = mask.find(0, position + 1)
+    return positions
+
+
+def validate_emails(emails: Sequence[str]) -> ValidationResult:
+    """
+    Validates a column of email addresses.
+
+    Args:
+        emails (Sequence[str]): The addresses
+
+    Returns:
+        ValidationResult: The mask and reasons
+    """
+    results = list(map(_email_memo.get, emails))
+    if None in results:
+        with _email_memo_lock:
+            _remember_emails([email for email, valid in zip(emails, results) if valid is None])
+            results = [_email_memo[email] if valid is None else valid for email, valid in zip(emails, results)]
+    mask = bytes(results)
+    return ValidationResult(mask, {position: f"invalid email address {emails[position]!r}"
+                                   for position in _invalid_positions(mask)})
+
+
+def validate_amounts(amounts: Sequence[float]) -> ValidationResult:
+    """
+    Validates a column of transaction amounts (they must be positive).
+
+    Args:
+        amounts (Sequence[float]): The amounts, e.g. TransactionColumns.amounts
+
+    Returns:
+        ValidationResult: The mask and reasons
+    """
+    mask = bytes(map(operator.gt, amounts, repeat(0.0)))
+    return ValidationResult(mask, {position: f"amount must be positive, got {amounts[position]!r}"
+                                   for position in _invalid_positions(mask)})
+
+
+def validate_users(users: Sequence["User"]) -> ValidationResult:
+    """
+    Validates the email addresses of users.
+
+    Args:
+        users (Sequence[User]): The users
+
+    Returns:
+        ValidationResult: The mask and reasons, by position in users
+    """
+    return validate_emails([user.email for user in users])
+
+
+def validate_transactions(transactions: Sequence["Transaction"]) -> ValidationResult:
+    """
+    Validates the amounts of transactions.
+
+    Args:
+        transactions (Sequence[Transaction]): The transactions
+
+    Returns:
+        ValidationResult: The mask and reasons, by position in transactions
+    """
+    return validate_amounts([transaction.amount for transaction in transactions])
@@ -2,16 +2,58 @@
 Services Package
 
 Contains business logic services for data loading and report generation.
+
+Submodules are imported lazily on first attribute access so that
+command line tools only pay for the services they actually use.
 """
 
-from .data_service import load_users, load_transactions, create_sample_user, create_sample_transaction
-from .report_service import generate_user_report, generate_transaction_summary
-
-__all__ = [
-    "load_users", 
-    "load_transactions", 
-    "create_sample_user", 
-    "create_sample_transaction",
-    "generate_user_report", 
-    "generate_transaction_summary"
-]
\ No newline at end of file
+import importlib
+
+# Public name -> submodule that defines it
+_EXPORTS = {
+    "load_users": "data_service",
+    "load_transactions": "data_service",
+    "generate_users": "data_service",
+    "generate_transactions": "data_service",
+    "create_sample_user": "data_service",
+    "create_sample_transaction": "data_service",
+    "DataContext": "data_context",
+    "aggregate_transactions": "aggregation",
+    "aggregate_sharded": "aggregation",
+    "TransactionStore": "transaction_store",
+    "Ledger": "ledger",
+    "Categorizer": "categorizer",
+    "RecurringDetector": "recurring",
+    "detect_recurring": "recurring",
+    "AnomalyDetector": "anomaly",
+    "RateTable": "currency",
+    "save_snapshot": "snapshot",
+    "load_context": "snapshot",
+    "compact_log": "snapshot",
+    "WriteAheadLog": "wal",
+    "PartitionedStore": "partitions",
+    "async_load": "async_data_service",
+    "async_load_context": "async_data_service",
+    "aiter_transactions": "async_data_service",
+    "import_transactions": "import_service",
+    "export_transactions": "import_service",
+    "generate_user_report": "report_service",
+    "generate_transaction_summary": "report_service",
+    "user_summary_data": "report_formats",
+    "transaction_summary_data": "report_formats",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module_name}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,486 @@
+"""
+Aggregation Service
+
+Computes transaction statistics (counts, sums, per-type totals and the most
+recent transactions) from a compact columnar representation.
+
+Aggregates are built from mergeable partial results, so the same code runs
+on a single core or sharded across a process pool: the columns are split
+into contiguous row ranges, each worker aggregates its range and ships
+back plain lists and tuples, and the partials are merged exactly.
+Sums are carried as exact floating point expansions and only rounded once
+after merging, so sharded and single-core results are identical.
+"""
+
+import heapq
+import math
+import operator
+from array import array
+from datetime import datetime, timedelta, timezone
+from itertools import compress
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from models.transaction import DEFAULT_CURRENCY, Transaction, TransactionStatus, TransactionType
+
+# Stable integer codes for the enums (a kind byte packs type and status)
+TYPE_ORDER = list(TransactionType)
+STATUS_ORDER = list(TransactionStatus)
+TYPE_CODES = {transaction_type: code for code, transaction_type in enumerate(TYPE_ORDER)}
+STATUS_CODES = {status: code for code, status in enumerate(STATUS_ORDER)}
+_STATUS_BITS = 2
+_KINDS = len(TYPE_ORDER) << _STATUS_BITS
+_COMPLETED = STATUS_CODES[TransactionStatus.COMPLETED]
+
+# Number of most recent transactions kept by default
+DEFAULT_TOP_K = 5
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+# bytes.translate tables mapping one kind code to 1 and all others to 0
+_SELECTORS = [bytes(1 if code == kind else 0 for code in range(256)) for kind in range(_KINDS)]
+
+# Currency codes are packed one byte per row up to this many currencies
+MAX_BYTE_CURRENCIES = 256
+
+
+def pack_currency_codes(codes: List[int], currency_count: int) -> Union[bytes, array]:
+    """
+    Packs per-row currency codes as compactly as the number of currencies allows.
+
+    Args:
+        codes (List[int]): Index into the currencies per row
+        currency_count (int): Number of currencies the codes index
+
+    Returns:
+        Union[bytes, array]: One byte per row, or an 'I' array past MAX_BYTE_CURRENCIES
+    """
+    return bytes(codes) if currency_count <= MAX_BYTE_CURRENCIES else array("I", codes)
+
+
+def single_currency(currencies: Iterable[str]) -> str:
+    """
+    Returns the currency of amounts that are about to be added up.
+
+    Args:
+        currencies (Iterable[str]): The currencies the rows are in
+
+    Returns:
+        str: Their only currency (the default currency if there are no rows)
+
+    Raises:
+        ValueError: If the rows are in several currencies
+    """
+    currencies = sorted(set(currencies))
+    if len(currencies) > 1:
+        raise ValueError(f"Transactions are in several currencies ({', '.join(currencies)}); "
+                         f"exchange rates are needed to total them")
+    return currencies[0] if currencies else DEFAULT_CURRENCY
+
+
+def kind_code(transaction_type: TransactionType, status: TransactionStatus) -> int:
+    """
+    Packs a transaction type and status into a single byte code.
+
+    Args:
+        transaction_type (TransactionType): The transaction type
+        status (TransactionStatus): The transaction status
+
+    Returns:
+        int: The packed kind code
+    """
+    return (TYPE_CODES[transaction_type] << _STATUS_BITS) | STATUS_CODES[status]
+
+
+_KINDS_BY_VALUES = {
+    (transaction_type.value, status.value): kind_code(transaction_type, status)
+    for transaction_type in TYPE_ORDER for status in STATUS_ORDER
+}
+
+
+def datetime_to_micros(value: datetime) -> int:
+    """
+    Converts a datetime to integer microseconds since 1970-01-01.
+
+    Unlike datetime.timestamp(), the conversion ignores the local time zone,
+    so ordering is exactly preserved. Aware datetimes are converted to UTC
+    first, so they read back as naive UTC datetimes.
+
+    Args:
+        value (datetime): The datetime to convert
+
+    Returns:
+        int: Microseconds since the epoch
+    """
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - _EPOCH) // _MICROSECOND
+
+
+def micros_to_datetime(value: int) -> datetime:
+    """
+    Converts microseconds since 1970-01-01 back to a naive datetime.
+
+    Args:
+        value (int): Microseconds since the epoch
+
+    Returns:
+        datetime: The corresponding datetime
+    """
+    return _EPOCH + timedelta(microseconds=value)
+
+
+def exact_partials(values: Sequence[float]) -> List[float]:
+    """
+    Returns non-overlapping floats whose exact sum equals the sum of values.
+
+    The expansion is built with math.fsum: each term is the correctly
+    rounded remainder of the previous ones, so math.fsum() over the
+    concatenated partials of several groups equals math.fsum() over all
+    of their values.
+
+    Args:
+        values (Sequence[float]): Values to sum
+
+    Returns:
+        List[float]: The exact sum as a short list of floats, or the plain
+            sum alone if it is not finite (NaN, infinite or overflowing values)
+    """
+    values = list(values)
+    try:
+        total = math.fsum(values)
+    except (ValueError, OverflowError):
+        return [sum(values)]
+    if not math.isfinite(total):
+        return [total]
+    partials = []
+    while True:
+        remainder = math.fsum(values + [-partial for partial in partials])
+        if remainder == 0.0:
+            return partials
+        partials.append(remainder)
+
+
+def _sum_partials(partials: List[float]) -> float:
+    """Exact sum of merged exact_partials, or their plain sum if some are not finite."""
+    try:
+        return math.fsum(partials)
+    except (ValueError, OverflowError):
+        return sum(partials)
+
+
+class TransactionColumns:
+    """
+    Column-oriented copy of a list of transactions.
+
+    Amounts and timestamps are stored in typed arrays and the type and
+    status of each row are packed into one byte, which keeps the data
+    compact to hold, pickle and scan. Currencies are dictionary encoded:
+    one byte per row indexes the currencies tuple, or an unsigned int per
+    row ('I' array) if there are more than MAX_BYTE_CURRENCIES of them.
+    """
+
+    __slots__ = ("row_ids", "transaction_ids", "user_ids", "amounts", "kinds", "created_at",
+                 "currency_codes", "currencies")
+
+    def __init__(self, row_ids: array, transaction_ids: array, user_ids: array,
+                 amounts: array, kinds: bytes, created_at: array,
+                 currency_codes: Optional[Union[bytes, array]] = None,
+                 currencies: Sequence[str] = (DEFAULT_CURRENCY,)):
+        """
+        Initialize a new TransactionColumns instance.
+
+        Args:
+            row_ids (array): Position of each row in the source list ('q')
+            transaction_ids (array): Transaction IDs ('q')
+            user_ids (array): User IDs ('q')
+            amounts (array): Amounts ('d')
+            kinds (bytes): Packed type/status code per row
+            created_at (array): Creation times in microseconds since the epoch ('q')
+            currency_codes (Optional[Union[bytes, array]]): Index into currencies per row
+                (defaults to all 0)
+            currencies (Sequence[str]): Currency codes used by the rows
+        """
+        self.row_ids = row_ids
+        self.transaction_ids = transaction_ids
+        self.user_ids = user_ids
+        self.amounts = amounts
+        self.kinds = kinds
+        self.created_at = created_at
+        self.currency_codes = currency_codes if currency_codes is not None else bytes(len(kinds))
+        self.currencies = tuple(currencies)
+
+    @classmethod
+    def from_transactions(cls, transactions: Sequence[Transaction], first_row: int = 0) -> "TransactionColumns":
+        """
+        Builds columns from Transaction objects.
+
+        Args:
+            transactions (Sequence[Transaction]): The transactions to convert
+            first_row (int): Row ID of the first transaction, e.g. its position
+                in a longer list the transactions were appended to
+
+        Returns:
+            TransactionColumns: The columnar copy
+        """
+        # Keyed by the enums' plain _value_ strings: hashing Enum members runs Python code
+        kinds = _KINDS_BY_VALUES
+        epoch, micro = _EPOCH, _MICROSECOND
+        try:
+            created_at = array("q", [(t.created_at - epoch) // micro for t in transactions])
+        except TypeError:
+            # Aware datetimes among them: convert each one
+            created_at = array("q", [datetime_to_micros(t.created_at) for t in transactions])
+        currency_index = {DEFAULT_CURRENCY: 0}
+        currency_codes = pack_currency_codes([currency_index.setdefault(t.currency, len(currency_index))
+                                              for t in transactions], len(currency_index))
+        return cls(
+            array("q", range(first_row, first_row + len(transactions))),
+            array("q", [t.transaction_id for t in transactions]),
+            array("q", [t.user_id for t in transactions]),
+            array("d", [t.amount for t in transactions]),
+            bytes([kinds[t.transaction_type._value_, t.status._value_] for t in transactions]),
+            created_at,
+            currency_codes,
+            list(currency_index),
+        )
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    def take(self, positions: Sequence[int]) -> "TransactionColumns":
+        """
+        Returns the rows at the given positions, in that order.
+
+        Args:
+            positions (Sequence[int]): Row positions to keep
+
+        Returns:
+            TransactionColumns: The selected rows
+        """
+        kinds = self.kinds
+        return TransactionColumns(
+            array("q", [self.row_ids[i] for i in positions]),
+            array("q", [self.transaction_ids[i] for i in positions]),
+            array("q", [self.user_ids[i] for i in positions]),
+            array("d", [self.amounts[i] for i in positions]),
+            bytes([kinds[i] for i in positions]),
+            array("q", [self.created_at[i] for i in positions]),
+            pack_currency_codes([self.currency_codes[i] for i in positions], len(self.currencies)),
+            self.currencies,
+        )
+
+    def used_currencies(self) -> List[str]:
+        """
+        Returns the currencies at least one row is in.
+
+        Returns:
+            List[str]: Currency codes in the order of the currencies tuple
+        """
+        currencies = self.currencies
+        if len(currencies) == 1:
+            return list(currencies) if len(self) else []
+        return [currencies[code] for code in sorted(set(self.currency_codes))]
+
+    def with_amounts(self, amounts: array, currency: str) -> "TransactionColumns":
+        """
+        Returns the same rows with replaced amounts, all in one currency.
+
+        Args:
+            amounts (array): New amount per row ('d')
+            currency (str): Currency of the new amounts
+
+        Returns:
+            TransactionColumns: The rows with the new amounts (other columns are shared)
+        """
+        return TransactionColumns(self.row_ids, self.transaction_ids, self.user_ids, amounts,
+                                  self.kinds, self.created_at, None, (currency,))
+
+    def split(self, parts: int) -> List["TransactionColumns"]:
+        """
+        Splits the rows into contiguous ranges of (nearly) equal size.
+
+        Slicing copies each column in C, so no Python code runs per row.
+
+        Args:
+            parts (int): Number of ranges (empty ranges are left out)
+
+        Returns:
+            List[TransactionColumns]: The ranges in row order
+        """
+        size = -(-len(self) // parts) if len(self) else 0
+        return [
+            TransactionColumns(self.row_ids[start:start + size], self.transaction_ids[start:start + size],
+                               self.user_ids[start:start + size], self.amounts[start:start + size],
+                               self.kinds[start:start + size], self.created_at[start:start + size],
+                               self.currency_codes[start:start + size], self.currencies)
+            for start in range(0, len(self), size or 1)
+        ]
+
+
+# A partial aggregate: (kind counts, first row per kind, completed amount
+# expansions per type, recent (created_at, -row) pairs). Only lists, ints
+# and floats, so it pickles compactly.
+Partial = Tuple[List[int], List[int], List[List[float]], List[Tuple[int, int]]]
+
+
+def aggregate_partial(columns: TransactionColumns, top_k: int = DEFAULT_TOP_K) -> Partial:
+    """
+    Computes the partial aggregate of a set of rows.
+
+    All per-row work is done by C-level helpers (bytes.count/find,
+    itertools.compress, heapq), so no Python code runs per row.
+
+    Args:
+        columns (TransactionColumns): The rows to aggregate
+        top_k (int): Number of most recent rows to keep
+
+    Returns:
+        Partial: The mergeable partial aggregate
+    """
+    kinds = columns.kinds
+    row_ids = columns.row_ids
+    kind_counts = [0] * _KINDS
+    kind_first = [-1] * _KINDS
+    for kind in set(kinds):
+        kind_counts[kind] = kinds.count(kind)
+        kind_first[kind] = row_ids[kinds.find(kind)]
+
+    completed = []
+    for type_code in range(len(TYPE_ORDER)):
+        completed_kind = (type_code << _STATUS_BITS) | _COMPLETED
+        if kind_counts[completed_kind]:
+            mask = kinds.translate(_SELECTORS[completed_kind])
+            completed.append(exact_partials(list(compress(columns.amounts, mask))))
+        else:
+            completed.append([])
+
+    recent = heapq.nlargest(top_k, zip(columns.created_at, map(operator.neg, row_ids)))
+    return kind_counts, kind_first, completed, recent
+
+
+def merge_partials(partials: Iterable[Partial], top_k: int = DEFAULT_TOP_K) -> Partial:
+    """
+    Merges partial aggregates of disjoint row sets.
+
+    Args:
+        partials (Iterable[Partial]): The partial aggregates
+        top_k (int): Number of most recent rows to keep
+
+    Returns:
+        Partial: The combined partial aggregate
+    """
+    kind_counts = [0] * _KINDS
+    kind_first = [-1] * _KINDS
+    completed = [[] for _ in TYPE_ORDER]
+    recent = []
+    for counts, firsts, sums, rows in partials:
+        for kind in range(_KINDS):
+            kind_counts[kind] += counts[kind]
+            if firsts[kind] >= 0 and (kind_first[kind] < 0 or firsts[kind] < kind_first[kind]):
+                kind_first[kind] = firsts[kind]
+        for type_code, type_partials in enumerate(sums):
+            completed[type_code].extend(type_partials)
+        recent.extend(rows)
+    return kind_counts, kind_first, completed, heapq.nlargest(top_k, recent)
+
+
+class TransactionAggregate:
+    """
+    Final statistics for a set of transactions.
+
+    Per-type dictionaries are ordered by first appearance in the source
+    list, matching a single pass over the transactions.
+    """
+
+    def __init__(self, partial: Partial):
+        """
+        Initialize a TransactionAggregate from a (merged) partial aggregate.
+
+        Args:
+            partial (Partial): The partial aggregate covering all rows
+        """
+        kind_counts, kind_first, completed, recent = partial
+        type_count = len(TYPE_ORDER)
+        status_count = len(STATUS_ORDER)
+
+        def kind(type_code, status_code):
+            return (type_code << _STATUS_BITS) | status_code
+
+        self.total_count = sum(kind_counts)
+        self.status_counts = {
+            status: sum(kind_counts[kind(t, s)] for t in range(type_count))
+            for s, status in enumerate(STATUS_ORDER)
+        }  # type: Dict[TransactionStatus, int]
+
+        type_first = {}
+        for t in range(type_count):
+            firsts = [kind_first[kind(t, s)] for s in range(status_count) if kind_first[kind(t, s)] >= 0]
+            if firsts:
+                type_first[t] = min(firsts)
+        self.type_counts = {
+            TYPE_ORDER[t]: sum(kind_counts[kind(t, s)] for s in range(status_count))
+            for t in sorted(type_first, key=type_first.get)
+        }  # type: Dict[TransactionType, int]
+
+        completed_first = {t: kind_first[kind(t, _COMPLETED)] for t in range(type_count)
+                           if kind_first[kind(t, _COMPLETED)] >= 0}
+        self.completed_type_totals = {
+            TYPE_ORDER[t]: _sum_partials(completed[t]) for t in sorted(completed_first, key=completed_first.get)
+        }  # type: Dict[TransactionType, float]
+        self.completed_count = self.status_counts[TransactionStatus.COMPLETED]
+        self.completed_total = _sum_partials([p for type_partials in completed for p in type_partials])
+        self.recent_rows = [-row for _, row in recent]  # type: List[int]
+
+    @property
+    def completed_average(self) -> float:
+        """Average completed amount (0.0 if nothing is completed)."""
+        return self.completed_total / self.completed_count if self.completed_count else 0.0
+
+
+def _as_columns(transactions: Union[Sequence[Transaction], TransactionColumns]) -> TransactionColumns:
+    if isinstance(transactions, TransactionColumns):
+        return transactions
+    return TransactionColumns.from_transactions(transactions)
+
+
+def aggregate_transactions(transactions: Union[Sequence[Transaction], TransactionColumns],
+                           top_k: int = DEFAULT_TOP_K) -> TransactionAggregate:
+    """
+    Aggregates transactions on the current core.
+
+    Args:
+        transactions (Union[Sequence[Transaction], TransactionColumns]): Transactions or their columns
+        top_k (int): Number of most recent rows to keep
+
+    Returns:
+        TransactionAggregate: The aggregate
+    """
+    return TransactionAggregate(aggregate_partial(_as_columns(transactions), top_k))
+
+
+def aggregate_sharded(transactions: Union[Sequence[Transaction], TransactionColumns],
+                      workers: int, shards: Optional[int] = None,
+                      top_k: int = DEFAULT_TOP_K) -> TransactionAggregate:
+    """
+    Aggregates transactions in a process pool, sharded into contiguous row ranges.
+
+    Args:
+        transactions (Union[Sequence[Transaction], TransactionColumns]): Transactions or their columns
+        workers (int): Number of worker processes (1 or less aggregates in-process)
+        shards (Optional[int]): Number of row ranges (defaults to workers)
+        top_k (int): Number of most recent rows to keep
+
+    Returns:
+        TransactionAggregate: The aggregate, identical to aggregate_transactions()
+    """
+    columns = _as_columns(transactions)
+    if workers <= 1:
+        return TransactionAggregate(aggregate_partial(columns, top_k))
+
+    # Imported on demand: multiprocessing is costly at CLI startup
+    from concurrent.futures import ProcessPoolExecutor
+    parts = columns.split(shards or workers)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        partials = list(pool.map(aggregate_partial, parts, [top_k] * len(parts)))
+    return TransactionAggregate(merge_partials(partials, top_k))
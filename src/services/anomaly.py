@@ -0,0 +1,210 @@
+"""
+Anomaly Detection
+
+Flags transactions whose amount is far above the user's norm as they
+arrive, instead of in a nightly batch.
+
+Every user has a small state record: a running mean and variance of
+outgoing amounts (Welford's algorithm) and an exponentially weighted
+moving average (EWMA) that follows recent spending. A transaction is
+scored against the state before it is folded in, so scoring and updating
+are both O(1). It is flagged when its z-score exceeds the threshold and
+it is also a multiple of the recent average, which keeps users whose
+spending slowly rises from being flagged on every transaction.
+
+User states live in an LRU table: when it is full, the user seen least
+recently is evicted and starts from scratch when seen again.
+"""
+
+import math
+import threading
+from collections import OrderedDict, deque
+from typing import Deque, Iterable, List, Optional
+
+from models.transaction import Transaction, TransactionType
+from utils.metrics import get_registry
+
+_metrics = get_registry()
+_scored = _metrics.counter("anomaly.transactions_scored", "Transactions scored for anomalies")
+_flagged = _metrics.counter("anomaly.transactions_flagged", "Transactions flagged as anomalous")
+_evicted = _metrics.counter("anomaly.users_evicted", "User states evicted from the anomaly table")
+
+# Types that move money out of the user's account; deposits are not scored
+SCORED_TYPES = frozenset((TransactionType.WITHDRAWAL, TransactionType.PAYMENT, TransactionType.TRANSFER))
+
+DEFAULT_Z_THRESHOLD = 3.0
+DEFAULT_EWMA_RATIO = 2.0
+DEFAULT_EWMA_ALPHA = 0.1
+DEFAULT_MIN_HISTORY = 5
+DEFAULT_MAX_USERS = 100_000
+DEFAULT_MAX_FLAGGED = 1000
+
+
+class UserStats:
+    """
+    Running amount statistics of a single user.
+    """
+
+    __slots__ = ("count", "mean", "m2", "ewma")
+
+    def __init__(self):
+        """
+        Initialize a new UserStats instance.
+        """
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.ewma = 0.0
+
+    def update(self, amount: float, alpha: float) -> None:
+        """
+        Folds an amount into the statistics.
+
+        Args:
+            amount (float): The amount
+            alpha (float): EWMA weight of the new amount
+        """
+        self.count += 1
+        delta = amount - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (amount - self.mean)
+        self.ewma = amount if self.count == 1 else self.ewma + alpha * (amount - self.ewma)
+
+    @property
+    def std(self) -> float:
+        """Sample standard deviation (0.0 with fewer than two amounts)."""
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+
+class Anomaly:
+    """
+    A flagged transaction with the statistics it was scored against.
+    """
+
+    __slots__ = ("transaction", "z_score", "mean", "ewma")
+
+    def __init__(self, transaction: Transaction, z_score: float, mean: float, ewma: float):
+        """
+        Initialize a new Anomaly instance.
+
+        Args:
+            transaction (Transaction): The flagged transaction
+            z_score (float): Standard deviations above the user's mean
+            mean (float): The user's mean amount before the transaction
+            ewma (float): The user's recent average amount before the transaction
+        """
+        self.transaction = transaction
+        self.z_score = z_score
+        self.mean = mean
+        self.ewma = ewma
+
+    def __repr__(self) -> str:
+        return (f"Anomaly(transaction={self.transaction.transaction_id}, "
+                f"amount={self.transaction.amount:.2f}, z={self.z_score:.1f})")
+
+
+class AnomalyDetector:
+    """
+    Online per-user anomaly detector.
+    """
+
+    def __init__(self, z_threshold: float = DEFAULT_Z_THRESHOLD,
+                 ewma_ratio: float = DEFAULT_EWMA_RATIO,
+                 ewma_alpha: float = DEFAULT_EWMA_ALPHA,
+                 min_history: int = DEFAULT_MIN_HISTORY,
+                 max_users: int = DEFAULT_MAX_USERS,
+                 max_flagged: int = DEFAULT_MAX_FLAGGED):
+        """
+        Initialize a new AnomalyDetector instance.
+
+        Args:
+            z_threshold (float): Flag amounts more than this many standard deviations above the mean
+            ewma_ratio (float): ...and at least this multiple of the recent average (0 disables)
+            ewma_alpha (float): Weight of the newest amount in the recent average (0 < alpha <= 1)
+            min_history (int): Amounts seen for a user before their transactions are scored
+            max_users (int): User states kept before the least recently seen is evicted
+            max_flagged (int): Most recent anomalies kept in flagged
+
+        Raises:
+            ValueError: If a parameter is out of range
+        """
+        if not 0 < ewma_alpha <= 1:
+            raise ValueError("ewma_alpha must be in (0, 1]")
+        if min_history < 2:
+            raise ValueError("min_history must be at least 2")
+        if max_users < 1:
+            raise ValueError("max_users must be positive")
+        self.z_threshold = z_threshold
+        self.ewma_ratio = ewma_ratio
+        self.ewma_alpha = ewma_alpha
+        self.min_history = min_history
+        self.max_users = max_users
+        self.flagged = deque(maxlen=max_flagged)  # type: Deque[Anomaly]
+        self._users = OrderedDict()  # type: OrderedDict
+        self._lock = threading.Lock()
+
+    def observe(self, transaction: Transaction) -> Optional[Anomaly]:
+        """
+        Scores a transaction against the user's history, then adds it to the history.
+
+        Args:
+            transaction (Transaction): The incoming transaction
+
+        Returns:
+            Optional[Anomaly]: The anomaly if the transaction was flagged, otherwise None
+        """
+        if transaction.transaction_type not in SCORED_TYPES:
+            return None
+        amount = transaction.amount
+        with self._lock:
+            users = self._users
+            stats = users.get(transaction.user_id)
+            if stats is None:
+                stats = users[transaction.user_id] = UserStats()
+                if len(users) > self.max_users:
+                    users.popitem(last=False)
+                    _evicted.inc()
+            else:
+                users.move_to_end(transaction.user_id)
+
+            anomaly = None
+            if stats.count >= self.min_history:
+                std = stats.std
+                z_score = (amount - stats.mean) / std if std > 0 else (math.inf if amount > stats.mean else 0.0)
+                if z_score > self.z_threshold and amount >= self.ewma_ratio * stats.ewma:
+                    anomaly = Anomaly(transaction, z_score, stats.mean, stats.ewma)
+                    self.flagged.append(anomaly)
+            stats.update(amount, self.ewma_alpha)
+
+        _scored.inc()
+        if anomaly is not None:
+            _flagged.inc()
+        return anomaly
+
+    def observe_many(self, transactions: Iterable[Transaction]) -> List[Anomaly]:
+        """
+        Scores several transactions in arrival order.
+
+        Args:
+            transactions (Iterable[Transaction]): The incoming transactions
+
+        Returns:
+            List[Anomaly]: The flagged transactions
+        """
+        observe = self.observe
+        return [anomaly for anomaly in map(observe, transactions) if anomaly is not None]
+
+    def stats(self, user_id: int) -> Optional[UserStats]:
+        """
+        Returns a user's statistics without refreshing their LRU position.
+
+        Args:
+            user_id (int): The ID of the user
+
+        Returns:
+            Optional[UserStats]: The statistics, or None if the user is not tracked
+        """
+        return self._users.get(user_id)
+
+    def __len__(self) -> int:
+        return len(self._users)
@@ -0,0 +1,244 @@
+"""
+Async Data Service
+
+Provides asyncio counterparts of the data service functions for embedding
+in asyncio applications. Blocking loaders and file reads run on a bounded
+thread pool; the number of in-flight jobs and buffered batches is capped,
+so a slow consumer applies back-pressure instead of growing memory.
+"""
+
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Callable, Iterable, List, Optional, Tuple, TypeVar
+
+from models.user import User
+from models.transaction import Transaction
+from services.data_context import DataContext
+from services.data_service import (
+    get_transactions_by_user,
+    get_user_by_id,
+    load_transactions,
+    load_users,
+)
+
+T = TypeVar("T")
+
+# Sentinel marking the end of a batch stream
+_END = object()
+
+
+class BoundedExecutor:
+    """
+    Thread pool wrapper that caps the number of queued and running jobs.
+
+    run() waits for a free slot before submitting, so callers are slowed
+    down rather than piling up work when the pool is saturated.
+    """
+
+    def __init__(self, max_workers: int = 4, max_pending: Optional[int] = None):
+        """
+        Initialize a new BoundedExecutor instance.
+
+        Args:
+            max_workers (int): Number of worker threads
+            max_pending (Optional[int]): Maximum submitted jobs (defaults to 2 * max_workers)
+        """
+        self.max_workers = max_workers
+        self.max_pending = max_pending or 2 * max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix="finance-io")
+        self._async_slots = {}  # event loop -> asyncio.Semaphore
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        semaphore = self._async_slots.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_pending)
+            self._async_slots = {loop: semaphore}
+        return semaphore
+
+    async def run(self, func: Callable[..., T], *args, **kwargs) -> T:
+        """
+        Runs a blocking function on the pool once a slot is free.
+
+        Args:
+            func (Callable[..., T]): The blocking function
+            *args: Positional arguments for the function
+            **kwargs: Keyword arguments for the function
+
+        Returns:
+            T: The function's return value
+        """
+        async with self._semaphore():
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    def shutdown(self, wait: bool = True) -> None:
+        """
+        Shuts down the worker threads.
+
+        Args:
+            wait (bool): Whether to wait for running jobs to finish
+        """
+        self._executor.shutdown(wait=wait)
+
+
+_default_executor = None  # type: Optional[BoundedExecutor]
+_default_executor_lock = threading.Lock()
+
+
+def get_executor() -> BoundedExecutor:
+    """
+    Returns the shared executor used when no executor is passed.
+
+    Returns:
+        BoundedExecutor: The process-wide I/O executor
+    """
+    global _default_executor
+    if _default_executor is None:
+        with _default_executor_lock:
+            if _default_executor is None:
+                _default_executor = BoundedExecutor()
+    return _default_executor
+
+
+async def async_load(user_loader: Callable[[], List[User]] = load_users,
+                     transaction_loader: Callable[[], List[Transaction]] = load_transactions,
+                     executor: Optional[BoundedExecutor] = None) -> Tuple[List[User], List[Transaction]]:
+    """
+    Loads users and transactions concurrently.
+
+    Args:
+        user_loader (Callable[[], List[User]]): Blocking user loader
+        transaction_loader (Callable[[], List[Transaction]]): Blocking transaction loader
+        executor (Optional[BoundedExecutor]): Executor for the blocking calls
+
+    Returns:
+        Tuple[List[User], List[Transaction]]: The loaded users and transactions
+    """
+    executor = executor or get_executor()
+    users, transactions = await asyncio.gather(
+        executor.run(user_loader),
+        executor.run(transaction_loader),
+    )
+    return users, transactions
+
+
+async def async_load_context(user_loader: Callable[[], List[User]] = load_users,
+                             transaction_loader: Callable[[], List[Transaction]] = load_transactions,
+                             executor: Optional[BoundedExecutor] = None) -> DataContext:
+    """
+    Loads users and transactions concurrently into a DataContext.
+
+    Args:
+        user_loader (Callable[[], List[User]]): Blocking user loader
+        transaction_loader (Callable[[], List[Transaction]]): Blocking transaction loader
+        executor (Optional[BoundedExecutor]): Executor for the blocking calls
+
+    Returns:
+        DataContext: A context with users and transactions already loaded
+    """
+    users, transactions = await async_load(user_loader, transaction_loader, executor)
+    return DataContext(users=users, transactions=transactions)
+
+
+async def aiter_transactions(source: Callable[[], Iterable[Transaction]], batch_size: int = 1000,
+                             max_buffered_batches: int = 4,
+                             executor: Optional[BoundedExecutor] = None) -> AsyncIterator[List[Transaction]]:
+    """
+    Streams transactions from a blocking source in batches.
+
+    The source is iterated on a worker thread. At most max_buffered_batches
+    batches are buffered; when the consumer falls behind, the worker blocks
+    until a batch has been taken.
+
+    Args:
+        source (Callable[[], Iterable[Transaction]]): Returns the blocking iterable,
+            e.g. functools.partial(iter_transactions_csv, path)
+        batch_size (int): Transactions per batch
+        max_buffered_batches (int): Maximum batches held in memory
+        executor (Optional[BoundedExecutor]): Executor running the source
+
+    Yields:
+        List[Transaction]: Batches of up to batch_size transactions
+    """
+    if batch_size <= 0:
+        raise ValueError("batch_size must be positive")
+
+    executor = executor or get_executor()
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    # Free buffer slots; the worker takes one per batch and the consumer returns it
+    slots = threading.Semaphore(max_buffered_batches)
+    stopped = threading.Event()
+
+    def put(item, bounded: bool = True) -> bool:
+        # Block the worker thread until the consumer has room for the item
+        while bounded and not slots.acquire(timeout=0.1):
+            if stopped.is_set():
+                return False
+        loop.call_soon_threadsafe(queue.put_nowait, item)
+        return True
+
+    def produce() -> None:
+        try:
+            batch = []
+            for transaction in source():
+                batch.append(transaction)
+                if len(batch) >= batch_size:
+                    if not put(batch):
+                        return
+                    batch = []
+            if batch and not put(batch):
+                return
+            put(_END, bounded=False)
+        except BaseException as e:
+            put(e, bounded=False)
+
+    producer = asyncio.ensure_future(executor.run(produce))
+    try:
+        while True:
+            item = await queue.get()
+            if item is _END:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            slots.release()
+            yield item
+    finally:
+        stopped.set()
+        await producer
+
+
+async def async_get_user_by_id(user_id: int, context: Optional[DataContext] = None,
+                               executor: Optional[BoundedExecutor] = None) -> Optional[User]:
+    """
+    Retrieves a user by their ID without blocking the event loop.
+
+    Args:
+        user_id (int): The ID of the user to retrieve
+        context (Optional[DataContext]): Shared data context to look the user up in
+        executor (Optional[BoundedExecutor]): Executor for the blocking lookup
+
+    Returns:
+        Optional[User]: The user, or None if not found
+    """
+    return await (executor or get_executor()).run(get_user_by_id, user_id, context)
+
+
+async def async_get_transactions_by_user(user_id: int, context: Optional[DataContext] = None,
+                                         executor: Optional[BoundedExecutor] = None) -> List[Transaction]:
+    """
+    Retrieves all transactions for a user without blocking the event loop.
+
+    Args:
+        user_id (int): The ID of the user
+        context (Optional[DataContext]): Shared data context to look the transactions up in
+        executor (Optional[BoundedExecutor]): Executor for the blocking lookup
+
+    Returns:
+        List[Transaction]: The user's transactions
+    """
+    return await (executor or get_executor()).run(get_transactions_by_user, user_id, context)
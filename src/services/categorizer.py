@@ -0,0 +1,245 @@
+"""
+Categorizer
+
+Assigns spending categories to transactions from their descriptions.
+
+Rules are keywords (matched case-insensitively on word boundaries) or
+regular expressions (matched anywhere, even mid-word). All rules are
+compiled into one regular expression: keywords are merged into a trie so
+that the pattern branches on the next character instead of trying every
+keyword in turn, and every rule ends in an empty named group that
+identifies it. Each description is therefore
+scanned once regardless of the number of rules, and results for repeated
+descriptions come from a memo cache. Transactions are categorized by
+description code, so each distinct description of a batch is looked up
+once.
+
+The leftmost match in a description wins; at the same position, longer
+keywords win over shorter ones and keywords over regex rules. Rule order
+only breaks the remaining ties: between regex rules matching at the same
+position, and between rules with the same keyword. Regex rules share the
+combined pattern's group numbering, so they cannot use numbered
+backreferences (named ones work).
+"""
+
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from models.string_pool import DESCRIPTIONS, Code
+from models.transaction import Transaction
+
+# Category of descriptions no rule matches
+UNCATEGORIZED = "uncategorized"
+
+# Size of the per-categorizer description cache
+DEFAULT_CACHE_SIZE = 65536
+
+# Escapes, and the group reference of a conditional such as (?(1)a|b)
+_ESCAPE = re.compile(r"\\(.)|\(\?\((\d)", re.DOTALL)
+
+# Built-in keyword rules: category -> keywords
+DEFAULT_RULES = {
+    "groceries": ["grocery", "groceries", "supermarket", "whole foods", "trader joe's", "aldi", "kroger"],
+    "dining": ["restaurant", "cafe", "coffee", "starbucks", "pizza", "mcdonald's", "bistro", "bar & grill"],
+    "transport": ["uber", "lyft", "taxi", "fuel", "gas station", "parking", "metro", "airline"],
+    "utilities": ["electric", "electricity", "water bill", "internet", "phone bill", "utility"],
+    "housing": ["rent", "mortgage", "landlord", "hoa"],
+    "entertainment": ["netflix", "spotify", "cinema", "movie", "concert", "steam"],
+    "shopping": ["amazon", "ebay", "target", "walmart", "ikea"],
+    "health": ["pharmacy", "doctor", "dentist", "hospital", "gym"],
+    "income": ["salary", "payroll", "refund", "interest", "dividend"],
+}  # type: Dict[str, List[str]]
+
+
+class Rule:
+    """
+    A single categorization rule.
+    """
+
+    __slots__ = ("category", "pattern", "is_regex")
+
+    def __init__(self, category: str, pattern: str, is_regex: bool = False):
+        """
+        Initialize a new Rule instance.
+
+        Args:
+            category (str): Category assigned when the rule matches
+            pattern (str): Keyword or regular expression
+            is_regex (bool): Whether pattern is a regular expression (matched case-insensitively)
+        """
+        self.category = category
+        self.pattern = pattern
+        self.is_regex = is_regex
+
+    def __repr__(self) -> str:
+        kind = "regex" if self.is_regex else "keyword"
+        return f"Rule({self.category!r}, {kind}={self.pattern!r})"
+
+
+def rules_from_keywords(keywords: Dict[str, Iterable[str]]) -> List[Rule]:
+    """
+    Builds keyword rules from a category -> keywords mapping.
+
+    Args:
+        keywords (Dict[str, Iterable[str]]): Keywords per category
+
+    Returns:
+        List[Rule]: One rule per keyword
+    """
+    return [Rule(category, keyword) for category, words in keywords.items() for keyword in words]
+
+
+def _trie_pattern(node: Dict[str, object]) -> str:
+    """Converts a keyword trie into a regex; a "" key marks the end of a keyword."""
+    branches = [re.escape(char) + _trie_pattern(node[char]) for char in sorted(key for key in node if key)]
+    if "" in node:
+        # Tried after the longer continuations, so the longest keyword wins
+        name, needs_boundary = node[""]
+        branches.append((r"\b" if needs_boundary else "") + f"(?P<{name}>)")
+    if len(branches) == 1:
+        return branches[0]
+    return "(?:" + "|".join(branches) + ")"
+
+
+class Categorizer:
+    """
+    Compiles categorization rules into a single pattern and applies it.
+    """
+
+    def __init__(self, rules: Optional[Sequence[Rule]] = None, default: str = UNCATEGORIZED,
+                 cache_size: int = DEFAULT_CACHE_SIZE):
+        """
+        Initialize a new Categorizer instance.
+
+        Args:
+            rules (Optional[Sequence[Rule]]): Rules (defaults to DEFAULT_RULES); their order
+                only breaks ties between matches at the same position
+            default (str): Category for descriptions no rule matches
+            cache_size (int): Number of distinct descriptions to memoize (0 disables the cache)
+
+        Raises:
+            ValueError: If a regex rule does not compile, uses a numbered backreference
+                or reuses a group name
+        """
+        self.rules = list(rules) if rules is not None else rules_from_keywords(DEFAULT_RULES)
+        self.default = default
+        self._categories = {}  # type: Dict[str, str]
+        self._pattern = self._compile(self.rules)
+        self._lookup = lru_cache(maxsize=cache_size)(self._categorize) if cache_size else self._categorize
+
+    def _compile(self, rules: Sequence[Rule]):
+        trie = {}  # type: Dict[str, object]
+        regex_branches = []
+        for number, rule in enumerate(rules):
+            name = f"r{number}"
+            if rule.is_regex:
+                try:
+                    re.compile(rule.pattern)
+                except re.error as e:
+                    raise ValueError(f"Invalid pattern in {rule!r}: {e}") from None
+                if any(match.group(2) or match.group(1) in "123456789"
+                       for match in _ESCAPE.finditer(rule.pattern)):
+                    raise ValueError(f"Numbered backreferences are not supported in {rule!r}; "
+                                     f"use a named group and (?P=name)")
+                regex_branches.append(f"(?:{rule.pattern})(?P<{name}>)")
+            else:
+                keyword = rule.pattern.casefold()
+                if not keyword:
+                    continue
+                node = trie
+                for char in keyword:
+                    node = node.setdefault(char, {})
+                if "" in node:
+                    # Same keyword twice: the first rule keeps it
+                    continue
+                # Keywords ending in a word character must end on a word boundary
+                node[""] = (name, keyword[-1].isalnum() or keyword[-1] == "_")
+            self._categories[name] = rule.category
+
+        branches = []
+        if trie:
+            # Keywords start at a word start; regex rules match wherever they match
+            branches.append(r"(?<!\w)" + _trie_pattern(trie))
+        branches.extend(regex_branches)
+        if not branches:
+            return None
+        try:
+            return re.compile("|".join(branches), re.IGNORECASE)
+        except re.error as e:
+            # e.g. two regex rules defining the same group name
+            raise ValueError(f"Rules cannot be combined: {e}") from None
+
+    def _categorize(self, description: str) -> str:
+        match = self._pattern.search(description.casefold()) if self._pattern is not None else None
+        if match is None:
+            return self.default
+        return self._categories[match.lastgroup]
+
+    def categorize(self, description: str) -> str:
+        """
+        Returns the category of a description.
+
+        Args:
+            description (str): Free-text transaction description
+
+        Returns:
+            str: The category of the leftmost matching rule, or the default category
+        """
+        return self._lookup(description)
+
+    def categorize_transactions(self, transactions: Iterable[Transaction],
+                                overwrite: bool = False) -> int:
+        """
+        Sets the category of every transaction.
+
+        Transactions are categorized by their description without the
+        failure reason.
+
+        Args:
+            transactions (Iterable[Transaction]): Transactions to categorize
+            overwrite (bool): Also recategorize transactions that already have a category
+
+        Returns:
+            int: Number of transactions categorized
+        """
+        lookup = self._lookup
+        decode = DESCRIPTIONS.decode
+        by_code = {}  # type: Dict[Code, str]
+        count = 0
+        for transaction in transactions:
+            if overwrite or transaction.category is None:
+                code = transaction.description_code
+                category = by_code.get(code)
+                if category is None:
+                    category = by_code[code] = lookup(decode(code))
+                transaction.category = category
+                count += 1
+        return count
+
+    def cache_info(self) -> Tuple[int, int, Optional[int], int]:
+        """
+        Returns statistics of the description cache.
+
+        Returns:
+            Tuple[int, int, Optional[int], int]: hits, misses, maxsize and current size
+                (all zero when the cache is disabled)
+        """
+        info = getattr(self._lookup, "cache_info", None)
+        return tuple(info()) if info is not None else (0, 0, 0, 0)
+
+
+_default_categorizer = None  # type: Optional[Categorizer]
+
+
+def get_categorizer() -> Categorizer:
+    """
+    Returns the shared categorizer built from DEFAULT_RULES.
+
+    Returns:
+        Categorizer: The default categorizer
+    """
+    global _default_categorizer
+    if _default_categorizer is None:
+        _default_categorizer = Categorizer()
+    return _default_categorizer
@@ -0,0 +1,215 @@
+"""
+Currency Service
+
+Converts transaction amounts between currencies using a table of daily
+exchange rates.
+
+A RateTable holds, per currency, the days on which a rate was published
+and the rates themselves in two sorted lists. The rate for a date is the
+latest one published on or before it, found by binary search, and
+looked-up rates are memoized per (currency, day). Batch conversion works
+on TransactionColumns: days come straight from the integer timestamps
+and rows are selected per currency with C-level helpers, so no datetime
+objects or per-row dictionaries are created.
+"""
+
+import csv
+from array import array
+from bisect import bisect_right
+from datetime import date, datetime
+from itertools import repeat
+from operator import add, floordiv, mul
+from typing import Dict, Iterable, List, Tuple, Union
+
+from models.transaction import DEFAULT_CURRENCY
+from services.aggregation import TransactionColumns
+
+_MICROS_PER_DAY = 86_400_000_000
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+# Row keys are code * _CODE_STRIDE + day + _DAY_OFFSET (days may be negative)
+_DAY_OFFSET = 1 << 31
+_CODE_STRIDE = 1 << 32
+
+
+def _day(when: Union[date, datetime]) -> int:
+    """Days since 1970-01-01, the unit rates are indexed by."""
+    return when.toordinal() - _EPOCH_ORDINAL
+
+
+class RateTable:
+    """
+    Daily exchange rates into a base currency.
+
+    A rate is the amount of base currency one unit of the currency buys.
+    """
+
+    def __init__(self, base: str = DEFAULT_CURRENCY):
+        """
+        Initialize a new RateTable instance.
+
+        Args:
+            base (str): Currency that amounts are converted into
+        """
+        self.base = base
+        self._days = {}  # type: Dict[str, List[int]]
+        self._rates = {}  # type: Dict[str, List[float]]
+        self._memo = {}  # type: Dict[Tuple[str, int], float]
+
+    def add_rate(self, currency: str, when: Union[date, datetime], rate: float) -> None:
+        """
+        Records the rate of a currency from a date on.
+
+        Args:
+            currency (str): ISO 4217 currency code
+            when (Union[date, datetime]): First day the rate applies
+            rate (float): Units of base currency per unit of the currency
+
+        Raises:
+            ValueError: If the rate is not positive
+        """
+        if not rate > 0:
+            raise ValueError(f"Invalid rate for {currency}: {rate!r}")
+        day = _day(when)
+        days = self._days.setdefault(currency, [])
+        rates = self._rates.setdefault(currency, [])
+        position = bisect_right(days, day)
+        if position and days[position - 1] == day:
+            rates[position - 1] = rate
+        else:
+            days.insert(position, day)
+            rates.insert(position, rate)
+        self._memo.clear()
+
+    def add_rates(self, rates: Iterable[Tuple[str, Union[date, datetime], float]]) -> int:
+        """
+        Records several rates.
+
+        Args:
+            rates (Iterable[Tuple[str, Union[date, datetime], float]]): (currency, date, rate) triples
+
+        Returns:
+            int: Number of rates recorded
+        """
+        count = 0
+        for currency, when, rate in rates:
+            self.add_rate(currency, when, rate)
+            count += 1
+        return count
+
+    def _rate_on_day(self, currency: str, day: int) -> float:
+        key = (currency, day)
+        rate = self._memo.get(key)
+        if rate is None:
+            if currency == self.base:
+                rate = 1.0
+            else:
+                days = self._days.get(currency)
+                if not days:
+                    raise ValueError(f"No exchange rate for {currency}")
+                position = bisect_right(days, day)
+                if not position:
+                    raise ValueError(f"No exchange rate for {currency} on or before "
+                                     f"{date.fromordinal(day + _EPOCH_ORDINAL).isoformat()}")
+                rate = self._rates[currency][position - 1]
+            self._memo[key] = rate
+        return rate
+
+    def rate(self, currency: str, when: Union[date, datetime]) -> float:
+        """
+        Returns the rate that applies to a currency on a date.
+
+        Args:
+            currency (str): ISO 4217 currency code
+            when (Union[date, datetime]): The date
+
+        Returns:
+            float: Units of base currency per unit of the currency
+
+        Raises:
+            ValueError: If no rate was published on or before the date
+        """
+        return self._rate_on_day(currency, _day(when))
+
+    def convert(self, amount: float, currency: str, when: Union[date, datetime]) -> float:
+        """
+        Converts an amount into the base currency.
+
+        Args:
+            amount (float): The amount
+            currency (str): Currency of the amount
+            when (Union[date, datetime]): Date whose rate applies
+
+        Returns:
+            float: The amount in the base currency
+
+        Raises:
+            ValueError: If no rate was published on or before the date
+        """
+        return amount * self._rate_on_day(currency, _day(when))
+
+    def convert_columns(self, columns: TransactionColumns) -> TransactionColumns:
+        """
+        Converts the amounts of a column set into the base currency.
+
+        Args:
+            columns (TransactionColumns): Rows in any currencies
+
+        Returns:
+            TransactionColumns: The same rows with amounts in the base currency
+
+        Raises:
+            ValueError: If a row has no rate on or before its date
+        """
+        currencies = columns.currencies
+        if all(currency == self.base for currency in currencies):
+            return columns.with_amounts(columns.amounts, self.base)
+
+        # One integer key per row packs the currency code and the day, so the
+        # rates are looked up once per distinct key and mapped onto the rows
+        # by C-level iteration: no Python code runs per row
+        days = map(floordiv, columns.created_at, repeat(_MICROS_PER_DAY))
+        key_bases = [code * _CODE_STRIDE + _DAY_OFFSET for code in range(len(currencies))]
+        keys = list(map(add, days, map(key_bases.__getitem__, columns.currency_codes)))
+        rate_on_day = self._rate_on_day
+        rates = {key: rate_on_day(currencies[key // _CODE_STRIDE], key % _CODE_STRIDE - _DAY_OFFSET)
+                 for key in set(keys)}
+        amounts = array("d", map(mul, columns.amounts, map(rates.__getitem__, keys)))
+        return columns.with_amounts(amounts, self.base)
+
+    def currencies(self) -> List[str]:
+        """
+        Returns the currencies with at least one rate.
+
+        Returns:
+            List[str]: Currency codes in sorted order
+        """
+        return sorted(self._days)
+
+    @classmethod
+    def load(cls, file_path: str, base: str = DEFAULT_CURRENCY, encoding: str = "utf-8") -> "RateTable":
+        """
+        Loads rates from a CSV file with currency, date and rate columns.
+
+        Args:
+            file_path (str): The CSV file to read
+            base (str): Currency the rates convert into
+            encoding (str): The file encoding (default: utf-8)
+
+        Returns:
+            RateTable: The loaded rates
+
+        Raises:
+            ValueError: If a row cannot be parsed (the line number is included)
+        """
+        table = cls(base)
+        with open(file_path, "r", encoding=encoding, newline="") as file:
+            reader = csv.DictReader(file)
+            for row in reader:
+                try:
+                    table.add_rate(row["currency"].strip().upper(), date.fromisoformat(row["date"].strip()),
+                                   float(row["rate"]))
+                except (KeyError, AttributeError, ValueError) as e:
+                    raise ValueError(f"{file_path}:{reader.line_num}: invalid rate row {row!r}: {e}") from None
+        return table
+
@@ -0,0 +1,351 @@
+"""
+Data Context
+
+Provides a session object that loads users and transactions once and
+caches derived views (completed-only, by type, by user) so that several
+reports and analyses can share a single load.
+"""
+
+import math
+import threading
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Optional
+
+from models.string_pool import DESCRIPTIONS
+from models.user import User
+from models.transaction import Transaction, TransactionType
+from services.anomaly import Anomaly, AnomalyDetector
+from services.aggregation import (
+    TransactionAggregate,
+    TransactionColumns,
+    aggregate_partial,
+    aggregate_sharded,
+    exact_partials,
+    merge_partials,
+    single_currency,
+)
+from services.categorizer import Categorizer, get_categorizer
+from services.data_service import load_users, load_transactions
+from services.ledger import Ledger
+from services.recurring import RecurringDetector, RecurringSeries
+
+if TYPE_CHECKING:
+    from utils.memory import MemoryDiagnostics
+
+
+class DataContext:
+    """
+    Shared, lazily loaded view of the application data.
+
+    Users and transactions are loaded on first access and kept for the
+    lifetime of the context. Derived views are computed on first use and
+    cached until the underlying data changes.
+    """
+
+    def __init__(self, users: Optional[List[User]] = None,
+                 transactions: Optional[List[Transaction]] = None,
+                 user_loader: Callable[[], List[User]] = load_users,
+                 transaction_loader: Callable[[], List[Transaction]] = load_transactions,
+                 categorizer: Optional[Categorizer] = None):
+        """
+        Initialize a new DataContext instance.
+
+        Args:
+            users (Optional[List[User]]): Preloaded users (skips the user loader)
+            transactions (Optional[List[Transaction]]): Preloaded transactions (skips the transaction
+                loader; copied, since add_transactions appends to the context's list)
+            user_loader (Callable[[], List[User]]): Loads users on first access
+            transaction_loader (Callable[[], List[Transaction]]): Loads transactions on first access
+            categorizer (Optional[Categorizer]): Categorizes transactions without a category
+                (defaults to the shared rule set)
+        """
+        self._users = users
+        self._transactions = list(transactions) if transactions is not None else None
+        self._user_loader = user_loader
+        self._transaction_loader = transaction_loader
+        self._categorizer = categorizer
+        self._views = {}  # type: Dict[str, object]
+        self._view_sources = {}  # type: Dict[str, Callable[[], object]]
+        self._lock = threading.RLock()
+
+    @property
+    def users(self) -> List[User]:
+        """All users, loaded on first access."""
+        if self._users is None:
+            with self._lock:
+                if self._users is None:
+                    self._users = self._user_loader()
+        return self._users
+
+    @property
+    def transactions(self) -> List[Transaction]:
+        """All transactions, loaded on first access."""
+        if self._transactions is None:
+            with self._lock:
+                if self._transactions is None:
+                    self._transactions = self._transaction_loader()
+        return self._transactions
+
+    def _view(self, name: str, build: Callable[[], object]):
+        view = self._views.get(name)
+        if view is None:
+            with self._lock:
+                view = self._views.get(name)
+                if view is None:
+                    view = self._view_sources.pop(name, build)()
+                    self._views[name] = view
+        return view
+
+    def provide_view(self, name: str, source: Callable[[], object]) -> None:
+        """
+        Registers a cheaper way to build a derived view, e.g. from a snapshot.
+
+        The source is used instead of the view's own builder the first time
+        the view is needed, as long as the data has not changed since.
+
+        Args:
+            name (str): The view name ("columns", "partial", "completed_by_category", ...)
+            source (Callable[[], object]): Builds the view
+        """
+        with self._lock:
+            self._view_sources[name] = source
+
+    @property
+    def completed_transactions(self) -> List[Transaction]:
+        """Completed transactions in load order."""
+        return self._view("completed", lambda: [t for t in self.transactions if t.is_completed()])
+
+    @property
+    def transactions_by_type(self) -> Dict[TransactionType, List[Transaction]]:
+        """Transactions grouped by type, in first-seen order."""
+        def build():
+            groups = {}
+            for transaction in self.transactions:
+                groups.setdefault(transaction.transaction_type, []).append(transaction)
+            return groups
+        return self._view("by_type", build)
+
+    @property
+    def transactions_by_user(self) -> Dict[int, List[Transaction]]:
+        """Transactions grouped by user ID."""
+        def build():
+            groups = {}
+            for transaction in self.transactions:
+                groups.setdefault(transaction.user_id, []).append(transaction)
+            return groups
+        return self._view("by_user", build)
+
+    @property
+    def users_by_id(self) -> Dict[int, User]:
+        """Users keyed by user ID."""
+        return self._view("users_by_id", lambda: {user.user_id: user for user in self.users})
+
+    @property
+    def columns(self) -> TransactionColumns:
+        """Columnar copy of the transactions used for aggregation."""
+        return self._view("columns", lambda: TransactionColumns.from_transactions(self.transactions))
+
+    @property
+    def currencies(self) -> List[str]:
+        """Currencies at least one transaction is in."""
+        return self._view("currencies", lambda: self.columns.used_currencies())
+
+    def _category_partials(self, transactions: List[Transaction]) -> Dict[str, List[float]]:
+        completed = [t for t in transactions if t.is_completed()]
+        (self._categorizer or get_categorizer()).categorize_transactions(completed)
+        amounts = {}
+        for transaction in completed:
+            amounts.setdefault(transaction.category, []).append(transaction.amount)
+        return {category: exact_partials(values) for category, values in amounts.items()}
+
+    @property
+    def completed_by_category(self) -> Dict[str, float]:
+        """Completed amounts per category, in first-seen order."""
+        def build():
+            partials = self._view("category_partials", lambda: self._category_partials(self.transactions))
+            return {category: math.fsum(values) for category, values in partials.items()}
+        return self._view("completed_by_category", build)
+
+    @property
+    def recurring_detector(self) -> RecurringDetector:
+        """Recurring transaction detector fed with the completed transactions."""
+        return self._view("recurring_detector", lambda: RecurringDetector(self.transactions))
+
+    @property
+    def recurring(self) -> List[RecurringSeries]:
+        """Recurring series among the completed transactions."""
+        return self._view("recurring", lambda: self.recurring_detector.detect())
+
+    @property
+    def anomaly_detector(self) -> AnomalyDetector:
+        """Anomaly detector that has seen every transaction, the initial ones in time order."""
+        def build():
+            detector = AnomalyDetector()
+            detector.observe_many(sorted(self.transactions, key=lambda t: t.created_at))
+            return detector
+        return self._view("anomaly_detector", build)
+
+    @property
+    def anomalies(self) -> List[Anomaly]:
+        """Most recently flagged transactions, oldest first."""
+        return self._view("anomalies", lambda: list(self.anomaly_detector.flagged))
+
+    @property
+    def ledger(self) -> Ledger:
+        """Per-user running balances of the completed transactions."""
+        return self._view("ledger", lambda: Ledger(self.transactions))
+
+    def aggregate(self, workers: Optional[int] = None) -> TransactionAggregate:
+        """
+        Returns the transaction aggregate, computed once per data change.
+
+        Args:
+            workers (Optional[int]): Aggregate in this many processes, each over a range of rows
+                (None or 1 aggregates on the current core)
+
+        Returns:
+            TransactionAggregate: Counts, sums, per-type totals and recent rows
+        """
+        if workers and workers > 1:
+            return self._view(f"aggregate:{workers}", lambda: aggregate_sharded(self.columns, workers))
+        return self._view("aggregate", lambda: TransactionAggregate(
+            self._view("partial", lambda: aggregate_partial(self.columns))))
+
+    def spending_analysis(self, workers: Optional[int] = None) -> dict:
+        """
+        Summarizes spending over the completed transactions.
+
+        Args:
+            workers (Optional[int]): Aggregate in this many processes, each over a range of rows
+
+        Returns:
+            dict: Totals overall, by type and by category and their currency, or an
+                error if none completed
+
+        Raises:
+            ValueError: If the transactions are in several currencies
+        """
+        currency = single_currency(self.currencies)
+        # Only completed transactions count; the aggregate is cached
+        aggregate = self.aggregate(workers)
+
+        if not aggregate.completed_count:
+            return {"error": "No completed transactions found"}
+
+        spending_by_type = {
+            trans_type.value: total for trans_type, total in aggregate.completed_type_totals.items()
+        }
+
+        return {
+            "total_spending": aggregate.completed_total,
+            "average_transaction": aggregate.completed_average,
+            "transaction_count": aggregate.completed_count,
+            "spending_by_type": spending_by_type,
+            "spending_by_category": dict(self.completed_by_category),
+            "currency": currency,
+        }
+
+    def get_user(self, user_id: int) -> Optional[User]:
+        """
+        Retrieves a user by their ID.
+
+        Args:
+            user_id (int): The ID of the user to retrieve
+
+        Returns:
+            Optional[User]: The user, or None if not found
+        """
+        return self.users_by_id.get(user_id)
+
+    def get_transactions_for_user(self, user_id: int) -> List[Transaction]:
+        """
+        Retrieves all transactions for a specific user.
+
+        Args:
+            user_id (int): The ID of the user
+
+        Returns:
+            List[Transaction]: The user's transactions (empty if none)
+        """
+        return list(self.transactions_by_user.get(user_id, []))
+
+    def add_transactions(self, transactions: Iterable[Transaction]) -> int:
+        """
+        Appends transactions and invalidates the derived views. The
+        recurring and anomaly detectors, the ledger and the currencies are
+        kept and fed the new transactions, and the aggregate partial and the
+        per-category completed amounts are merged with the new rows', so none
+        of them is rebuilt from the full history.
+
+        Args:
+            transactions (Iterable[Transaction]): Transactions to add
+
+        Returns:
+            int: Number of transactions added
+        """
+        new_transactions = list(transactions)
+        with self._lock:
+            first_row = len(self.transactions)
+            self.transactions.extend(new_transactions)
+            recurring = self._views.get("recurring_detector")
+            anomalies = self._views.get("anomaly_detector")
+            ledger = self._views.get("ledger")
+            currencies = self._views.get("currencies")
+            partial = self._views.get("partial")
+            category_partials = self._views.get("category_partials")
+            if category_partials is None and "completed_by_category" in self._views:
+                # Provided totals (e.g. from a snapshot) are exact partials of themselves
+                category_partials = {category: [total]
+                                     for category, total in self._views["completed_by_category"].items()}
+            self._views.clear()
+            self._view_sources.clear()
+            if partial is not None and new_transactions:
+                kind_counts, kind_first, completed, recent = merge_partials(
+                    [partial, aggregate_partial(TransactionColumns.from_transactions(new_transactions, first_row))])
+                # Re-expanding keeps the exact partials short however many batches are merged
+                self._views["partial"] = (kind_counts, kind_first,
+                                          [exact_partials(type_partials) for type_partials in completed], recent)
+            elif partial is not None:
+                self._views["partial"] = partial
+            if recurring is not None:
+                recurring.add_many(new_transactions)
+                self._views["recurring_detector"] = recurring
+            if anomalies is not None:
+                anomalies.observe_many(new_transactions)
+                self._views["anomaly_detector"] = anomalies
+            if ledger is not None:
+                ledger.add_many(new_transactions)
+                self._views["ledger"] = ledger
+            if currencies is not None:
+                self._views["currencies"] = currencies + sorted(
+                    {t.currency for t in new_transactions}.difference(currencies))
+            if category_partials is not None:
+                for category, values in self._category_partials(new_transactions).items():
+                    category_partials[category] = exact_partials(category_partials.get(category, []) + values)
+                self._views["category_partials"] = category_partials
+        return len(new_transactions)
+
+    def record_memory_footprints(self, memory: "MemoryDiagnostics",
+                                 reports: Optional[Dict[str, str]] = None) -> None:
+        """
+        Estimates the footprint of the loaded data and rendered reports.
+
+        Users and transactions are estimated with their attributes; transaction
+        descriptions are estimated as the shared pool of distinct descriptions.
+
+        Args:
+            memory (MemoryDiagnostics): Diagnostics to record the footprints in
+            reports (Optional[Dict[str, str]]): Rendered reports by name
+        """
+        memory.add_footprint("users", self.users)
+        memory.add_footprint("transactions", self.transactions)
+        memory.add_footprint("descriptions", DESCRIPTIONS.values)
+        for name, report in (reports or {}).items():
+            memory.add_buffer(f"buffer:{name}", report)
+
+    def invalidate(self) -> None:
+        """
+        Drops all cached derived views, e.g. after transactions changed status.
+        """
+        with self._lock:
+            self._views.clear()
+            self._view_sources.clear()
@@ -6,13 +6,15 @@ In a real application, this would connect to a database or external API.
 """
 
 from datetime import datetime, timedelta
-from typing import List
+from typing import List, Optional
 import random
 
 from models.user import User
 from models.transaction import Transaction, TransactionType
+from utils.profiling import profiled
 
 
+@profiled("load_users", rows="result")
 def load_users() -> List[User]:
     """
     Loads a list of sample users.
@@ -38,6 +40,7 @@ def load_users() -> List[User]:
     return sample_users
 
 
+@profiled("load_transactions", rows="result")
 def load_transactions() -> List[Transaction]:
     """
     Loads a list of sample transactions.
@@ -47,32 +50,74 @@ def load_transactions() -> List[Transaction]:
     Returns:
         List[Transaction]: A list of sample Transaction objects
     """
+    return generate_transactions(15, user_count=5)
+
+
+def generate_users(count: int, seed: Optional[int] = None) -> List[User]:
+    """
+    Generates a list of synthetic users, e.g. for benchmarks.
+    
+    Args:
+        count (int): Number of users to generate
+        seed (Optional[int]): Seed for reproducible data (None uses the global random state)
+    
+    Returns:
+        List[User]: Users with IDs 1..count
+    """
+    rng = random.Random(seed) if seed is not None else random
+    base_date = datetime.now() - timedelta(days=365)
+    users = []
+    for i in range(1, count + 1):
+        user = User(i, f"user_{i}", f"user{i}@example.com", f"First{i}", f"Last{i}",
+                    created_at=base_date + timedelta(days=rng.randint(0, 364)))
+        if i % 10 == 0:
+            user.deactivate()
+        users.append(user)
+    return users
+
+
+def generate_transactions(count: int, user_count: int = 5,
+                          seed: Optional[int] = None) -> List[Transaction]:
+    """
+    Generates a list of synthetic transactions.
+    
+    Every third transaction is completed and creation dates fall within
+    the last 30 days.
+    
+    Args:
+        count (int): Number of transactions to generate
+        user_count (int): Transactions are spread over user IDs 1..user_count
+        seed (Optional[int]): Seed for reproducible data (None uses the global random state)
+    
+    Returns:
+        List[Transaction]: Transactions with IDs 1..count
+    """
+    rng = random.Random(seed) if seed is not None else random
     transaction_types = [TransactionType.DEPOSIT, TransactionType.WITHDRAWAL, 
                         TransactionType.TRANSFER, TransactionType.PAYMENT]
+    now = datetime.now()
     
     sample_transactions = []
     
-    # Create 15 sample transactions
-    for i in range(1, 16):
-        user_id = random.randint(1, 5)
-        amount = round(random.uniform(10.0, 1000.0), 2)
-        transaction_type = random.choice(transaction_types)
+    for i in range(1, count + 1):
+        user_id = rng.randint(1, user_count)
+        amount = round(rng.uniform(10.0, 1000.0), 2)
+        transaction_type = rng.choice(transaction_types)
         
         transaction = Transaction(
             transaction_id=i,
             user_id=user_id,
             amount=amount,
             transaction_type=transaction_type,
-            description=f"Sample {transaction_type.value} transaction #{i}"
+            description=f"Sample {transaction_type.value} transaction #{i}",
+            # Set creation date in the past
+            created_at=now - timedelta(days=rng.randint(1, 30))
         )
         
         # Set some transactions as completed
         if i % 3 == 0:
             transaction.complete_transaction()
         
-        # Set creation date in the past
-        transaction.created_at = datetime.now() - timedelta(days=random.randint(1, 30))
-        
         sample_transactions.append(transaction)
     
     return sample_transactions
@@ -114,16 +159,20 @@ def create_sample_transaction(transaction_id: int, user_id: int, amount: float,
     return Transaction(transaction_id, user_id, amount, transaction_type, description)
 
 
-def get_user_by_id(user_id: int) -> User:
+def get_user_by_id(user_id: int, context=None) -> User:
     """
     Retrieves a user by their ID.
     
     Args:
         user_id (int): The ID of the user to retrieve
+        context (Optional[DataContext]): Shared data context to look the user up in
+            (without one, users are loaded again)
     
     Returns:
         User: The user with the specified ID, or None if not found
     """
+    if context is not None:
+        return context.get_user(user_id)
     users = load_users()
     for user in users:
         if user.user_id == user_id:
@@ -131,15 +180,19 @@ def get_user_by_id(user_id: int) -> User:
     return None
 
 
-def get_transactions_by_user(user_id: int) -> List[Transaction]:
+def get_transactions_by_user(user_id: int, context=None) -> List[Transaction]:
     """
     Retrieves all transactions for a specific user.
     
     Args:
         user_id (int): The ID of the user whose transactions to retrieve
+        context (Optional[DataContext]): Shared data context to look the transactions up in
+            (without one, transactions are loaded again)
     
     Returns:
         List[Transaction]: A list of transactions for the specified user
     """
+    if context is not None:
+        return context.get_transactions_for_user(user_id)
     all_transactions = load_transactions()
     return [transaction for transaction in all_transactions if transaction.user_id == user_id]
\ No newline at end of file
@@ -0,0 +1,474 @@
+"""
+Deduplication Service
+
+Detects transactions that were already imported, e.g. when overlapping
+bank exports are imported one after another.
+
+Every transaction is reduced to a fingerprint of its user, amount, type,
+date and normalized description. Fingerprints of the current import are
+kept as 64-bit integers in a hash set. Fingerprints of earlier imports can
+be persisted in a sorted FingerprintIndex, with an optional Bloom filter in
+front of it so that most new transactions skip the index lookup.
+"""
+
+import hashlib
+import heapq
+import math
+import re
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from functools import lru_cache
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from models.string_pool import DESCRIPTIONS, Code
+from models.transaction import DEFAULT_CURRENCY, Transaction
+from utils.file_ops import write_file_atomic
+from utils.metrics import get_registry
+
+_metrics = get_registry()
+_checked = _metrics.counter("dedup.transactions_checked", "Transactions checked for duplicates")
+_dropped = _metrics.counter("dedup.duplicates_dropped", "Duplicate transactions dropped")
+
+_FAILURE_NOTE = re.compile(r"\s*\[failed:[^\]]*\]$")
+
+# Blocked Bloom filter layout: 64-bit blocks, 8 bit positions per fingerprint
+_BLOCK_BITS = 64
+_HASH_COUNT = 8
+
+_BLOOM_MAGIC = b"FTBLOOM1"
+_BLOOM_HEADER = struct.Struct(">8sQQ")  # magic, block count, items added
+
+_INDEX_MAGIC = b"FTFPIDX1"
+_INDEX_HEADER = struct.Struct(">8sQ")  # magic, fingerprint count
+
+
+def normalize_description(description: str) -> str:
+    """
+    Normalizes a description for comparison.
+
+    Case and runs of whitespace are ignored, as is the failure note that
+    Transaction.fail_transaction appends.
+
+    Args:
+        description (str): The raw description
+
+    Returns:
+        str: The normalized description
+    """
+    text = " ".join(description.casefold().split())
+    if "[failed:" in text:
+        text = _FAILURE_NOTE.sub("", text)
+    return text
+
+
+@lru_cache(maxsize=65536)
+def normalized_description(code: Code) -> str:
+    """
+    Normalizes a pooled description, once per description code.
+
+    Failure reasons are not part of the pooled description, and
+    normalize_description drops them anyway.
+
+    Args:
+        code (Code): Code of the description in models.string_pool.DESCRIPTIONS
+
+    Returns:
+        str: The normalized description
+    """
+    return normalize_description(DESCRIPTIONS.decode(code))
+
+
+def fingerprint(transaction: Transaction) -> int:
+    """
+    Computes the deduplication fingerprint of a transaction.
+
+    Transactions are duplicates when user, amount (to the cent), currency,
+    type, date and normalized description agree; IDs and times of day are
+    ignored because they differ between exports.
+
+    Args:
+        transaction (Transaction): The transaction
+
+    Returns:
+        int: A 64-bit fingerprint
+    """
+    # The day number stands in for the date; it is cheaper to format
+    key = (f"{transaction.user_id}|{transaction.amount:.2f}|{transaction.transaction_type.value}|"
+           f"{transaction.created_at.toordinal()}|{normalized_description(transaction.description_code)}")
+    if transaction.currency != DEFAULT_CURRENCY:
+        # Appended only for other currencies, so fingerprints saved before
+        # transactions had a currency stay valid
+        key += f"|{transaction.currency}"
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+def _blocked_error_rate(items_per_block: float) -> float:
+    """False positive rate of a blocked Bloom filter with the given average load."""
+    # Block loads are Poisson distributed; sum the per-load rates until negligible
+    rate = 0.0
+    probability = math.exp(-items_per_block)
+    load = 0
+    while load < items_per_block + 20 * math.sqrt(items_per_block) + 20:
+        set_fraction = 1 - (1 - 1 / _BLOCK_BITS) ** (_HASH_COUNT * load)
+        rate += probability * set_fraction ** _HASH_COUNT
+        load += 1
+        probability *= items_per_block / load
+    return rate
+
+
+# Pairs of bit positions within a block, indexed by a 12-bit slice of the hash
+_BIT_PAIRS = [(1 << (chunk & 63)) | (1 << (chunk >> 6)) for chunk in range(4096)]
+
+
+class BloomFilter:
+    """
+    Fixed-size blocked Bloom filter over 64-bit fingerprints.
+
+    Each fingerprint maps to one 64-bit block and sets up to 8 bits in it,
+    so a lookup is a single word access and mask test instead of 8
+    scattered bit probes. Blocking raises the false positive rate a
+    little, which the sizing makes up for with extra bits.
+
+    Membership tests never miss an added fingerprint; they wrongly report
+    an absent one with roughly the configured error rate.
+    """
+
+    def __init__(self, capacity: int = 1_000_000, error_rate: float = 0.001):
+        """
+        Initialize a new, empty BloomFilter instance.
+
+        Args:
+            capacity (int): Number of fingerprints the filter is sized for
+            error_rate (float): Target false positive rate at capacity
+        """
+        if capacity <= 0 or not 0 < error_rate < 1:
+            raise ValueError("capacity must be positive and error_rate between 0 and 1")
+        # Bisect the average block load that meets the error rate
+        low, high = 0.0, 64.0
+        for _ in range(40):
+            middle = (low + high) / 2
+            if _blocked_error_rate(middle) <= error_rate:
+                low = middle
+            else:
+                high = middle
+        self.block_count = max(1, math.ceil(capacity / max(low, 1e-9)))
+        self.count = 0
+        self._blocks = array("Q", bytes(8 * self.block_count))
+
+    @property
+    def size_bytes(self) -> int:
+        """Memory used by the bit array."""
+        return 8 * self.block_count
+
+    def _locate(self, value: int) -> Tuple[int, int]:
+        # The remainder picks the block; the quotient, which is independent
+        # of it for uniform fingerprints, is mixed and sliced into bit pairs
+        block, rest = value % self.block_count, value // self.block_count
+        mixed = (rest * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF
+        mask = (_BIT_PAIRS[mixed >> 52] | _BIT_PAIRS[(mixed >> 40) & 4095]
+                | _BIT_PAIRS[(mixed >> 28) & 4095] | _BIT_PAIRS[(mixed >> 16) & 4095])
+        return block, mask
+
+    def add(self, value: int) -> bool:
+        """
+        Adds a fingerprint.
+
+        Args:
+            value (int): The fingerprint
+
+        Returns:
+            bool: True if the fingerprint was (probably) present already
+        """
+        block, mask = self._locate(value)
+        word = self._blocks[block]
+        if word & mask == mask:
+            return True
+        self._blocks[block] = word | mask
+        self.count += 1
+        return False
+
+    def __contains__(self, value: int) -> bool:
+        block, mask = self._locate(value)
+        return self._blocks[block] & mask == mask
+
+    def to_bytes(self) -> bytes:
+        """
+        Serializes the filter.
+
+        Returns:
+            bytes: Header followed by the little-endian blocks
+        """
+        blocks = self._blocks
+        if sys.byteorder == "big":
+            blocks = array("Q", blocks)
+            blocks.byteswap()
+        return _BLOOM_HEADER.pack(_BLOOM_MAGIC, self.block_count, self.count) + blocks.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "BloomFilter":
+        """
+        Restores a filter serialized with to_bytes().
+
+        Args:
+            data (bytes): The serialized filter
+
+        Returns:
+            BloomFilter: The restored filter
+
+        Raises:
+            ValueError: If the data is not a serialized Bloom filter
+        """
+        if len(data) < _BLOOM_HEADER.size:
+            raise ValueError("Bloom filter data is truncated")
+        magic, block_count, count = _BLOOM_HEADER.unpack_from(data)
+        if magic != _BLOOM_MAGIC or len(data) != _BLOOM_HEADER.size + 8 * block_count:
+            raise ValueError("Not a Bloom filter file or file is truncated")
+        bloom = cls.__new__(cls)
+        bloom.block_count = block_count
+        bloom.count = count
+        bloom._blocks = array("Q")
+        bloom._blocks.frombytes(data[_BLOOM_HEADER.size:])
+        if sys.byteorder == "big":
+            bloom._blocks.byteswap()
+        return bloom
+
+    def save(self, file_path: str) -> bool:
+        """
+        Saves the filter, replacing the file atomically.
+
+        Args:
+            file_path (str): Destination file
+
+        Returns:
+            bool: True if the file was written successfully
+        """
+        return write_file_atomic(file_path, self.to_bytes())
+
+    @classmethod
+    def load(cls, file_path: str) -> "BloomFilter":
+        """
+        Loads a filter saved with save().
+
+        Args:
+            file_path (str): Source file
+
+        Returns:
+            BloomFilter: The loaded filter
+
+        Raises:
+            OSError: If the file cannot be read
+            ValueError: If the file is not a valid Bloom filter
+        """
+        with open(file_path, "rb") as file:
+            return cls.from_bytes(file.read())
+
+
+class FingerprintIndex:
+    """
+    Sorted set of fingerprints from earlier imports, 8 bytes per entry.
+    """
+
+    def __init__(self, values: Iterable[int] = ()):
+        """
+        Initialize a new FingerprintIndex instance.
+
+        Args:
+            values (Iterable[int]): Initial fingerprints
+        """
+        self._values = array("Q", sorted(set(values)))
+
+    def __contains__(self, value: int) -> bool:
+        values = self._values
+        position = bisect_left(values, value)
+        return position < len(values) and values[position] == value
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def update(self, values: Iterable[int]) -> int:
+        """
+        Adds fingerprints to the index.
+
+        Args:
+            values (Iterable[int]): Fingerprints to add
+
+        Returns:
+            int: Number of fingerprints that were not indexed yet
+        """
+        new_values = sorted({value for value in values if value not in self})
+        if new_values:
+            self._values = array("Q", heapq.merge(self._values, new_values))
+        return len(new_values)
+
+    def to_bytes(self) -> bytes:
+        """
+        Serializes the index.
+
+        Returns:
+            bytes: Header followed by the little-endian fingerprints
+        """
+        values = self._values
+        if sys.byteorder == "big":
+            values = array("Q", values)
+            values.byteswap()
+        return _INDEX_HEADER.pack(_INDEX_MAGIC, len(values)) + values.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "FingerprintIndex":
+        """
+        Restores an index serialized with to_bytes().
+
+        Args:
+            data (bytes): The serialized index
+
+        Returns:
+            FingerprintIndex: The restored index
+
+        Raises:
+            ValueError: If the data is not a serialized fingerprint index
+        """
+        if len(data) < _INDEX_HEADER.size:
+            raise ValueError("Fingerprint index data is truncated")
+        magic, count = _INDEX_HEADER.unpack_from(data)
+        if magic != _INDEX_MAGIC or len(data) != _INDEX_HEADER.size + 8 * count:
+            raise ValueError("Not a fingerprint index file or file is truncated")
+        index = cls()
+        index._values.frombytes(data[_INDEX_HEADER.size:])
+        if sys.byteorder == "big":
+            index._values.byteswap()
+        return index
+
+    def save(self, file_path: str) -> bool:
+        """
+        Saves the index, replacing the file atomically.
+
+        Args:
+            file_path (str): Destination file
+
+        Returns:
+            bool: True if the file was written successfully
+        """
+        return write_file_atomic(file_path, self.to_bytes())
+
+    @classmethod
+    def load(cls, file_path: str) -> "FingerprintIndex":
+        """
+        Loads an index saved with save().
+
+        Args:
+            file_path (str): Source file
+
+        Returns:
+            FingerprintIndex: The loaded index
+
+        Raises:
+            OSError: If the file cannot be read
+            ValueError: If the file is not a valid fingerprint index
+        """
+        with open(file_path, "rb") as file:
+            return cls.from_bytes(file.read())
+
+
+class Deduplicator:
+    """
+    Streaming duplicate filter for imported transactions.
+
+    A transaction is a duplicate if its fingerprint was seen earlier in
+    this run, belongs to a known transaction, or is in the history index
+    of earlier imports. With a Bloom filter attached, the history index is
+    only consulted when the filter reports the fingerprint.
+
+    Without a history index, fingerprints the Bloom filter reports are
+    probable duplicates: they are kept and counted unless drop_probable
+    is set, since the filter has a small false positive rate.
+    """
+
+    def __init__(self, known: Iterable[Transaction] = (), history: Optional[FingerprintIndex] = None,
+                 bloom: Optional[BloomFilter] = None, drop_probable: bool = False):
+        """
+        Initialize a new Deduplicator instance.
+
+        Args:
+            known (Iterable[Transaction]): Transactions already present (never re-imported)
+            history (Optional[FingerprintIndex]): Fingerprints of earlier imports
+            bloom (Optional[BloomFilter]): Prefilter holding the fingerprints of earlier imports
+            drop_probable (bool): Drop transactions only the Bloom filter has seen
+        """
+        self.history = history
+        self.bloom = bloom
+        self.drop_probable = drop_probable
+        self._seen = {fingerprint(transaction) for transaction in known}
+        self.kept = []  # type: List[int]
+        self.checked = 0
+        self.dropped = 0
+        self.previously_imported = 0
+        self.probable = 0
+        self.probable_ids = []  # type: List[int]
+
+    def is_duplicate(self, transaction: Transaction) -> bool:
+        """
+        Checks a transaction and remembers it if it is new.
+
+        Args:
+            transaction (Transaction): The transaction to check
+
+        Returns:
+            bool: True if the transaction should be dropped
+        """
+        self.checked += 1
+        value = fingerprint(transaction)
+        if value in self._seen:
+            self.dropped += 1
+            return True
+        self._seen.add(value)
+
+        bloom = self.bloom
+        maybe_seen = bloom is None or bloom.add(value)
+        if maybe_seen:
+            if self.history is not None:
+                if value in self.history:
+                    self.dropped += 1
+                    self.previously_imported += 1
+                    return True
+            elif bloom is not None:
+                self.probable += 1
+                self.probable_ids.append(transaction.transaction_id)
+                if self.drop_probable:
+                    self.dropped += 1
+                    return True
+
+        self.kept.append(value)
+        return False
+
+    def filter(self, transactions: Iterable[Transaction]) -> Iterator[Transaction]:
+        """
+        Streams the transactions that are not duplicates.
+
+        Args:
+            transactions (Iterable[Transaction]): Transactions to check
+
+        Yields:
+            Transaction: Every transaction not seen before
+        """
+        checked, dropped = self.checked, self.dropped
+        try:
+            for transaction in transactions:
+                if not self.is_duplicate(transaction):
+                    yield transaction
+        finally:
+            _checked.inc(self.checked - checked)
+            _dropped.inc(self.dropped - dropped)
+
+    def remember(self) -> int:
+        """
+        Adds the fingerprints kept so far to the history index.
+
+        Returns:
+            int: Number of fingerprints added (0 without a history index)
+        """
+        added = self.history.update(self.kept) if self.history is not None else 0
+        self.kept = []
+        return added
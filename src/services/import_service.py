@@ -0,0 +1,187 @@
+"""
+Import Service
+
+Provides functions for importing and exporting transactions as CSV files.
+Rows are parsed lazily so large bank exports can be streamed, optionally
+through a deduplication stage (see services.dedup_service).
+"""
+
+import csv
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional
+
+from models.transaction import DEFAULT_CURRENCY, Transaction, TransactionStatus, TransactionType
+from models.validation import validate_transactions
+
+if TYPE_CHECKING:
+    from services.dedup_service import Deduplicator
+
+# Column order used when exporting transactions
+CSV_FIELDS = ["transaction_id", "user_id", "amount", "type", "status", "description", "created_at",
+              "currency"]
+
+_TYPES_BY_VALUE = {transaction_type.value: transaction_type for transaction_type in TransactionType}
+_STATUSES_BY_VALUE = {status.value: status for status in TransactionStatus}
+
+# Rows parsed before each bulk validation pass
+_VALIDATION_BATCH = 4096
+
+
+def parse_transaction_row(row: Dict[str, str]) -> Transaction:
+    """
+    Builds a Transaction from a CSV row.
+
+    The status, description and currency columns are optional; missing
+    statuses default to pending, missing dates to now and missing
+    currencies to DEFAULT_CURRENCY.
+
+    Args:
+        row (Dict[str, str]): Column values keyed by CSV_FIELDS names
+
+    Returns:
+        Transaction: The parsed transaction
+
+    Raises:
+        ValueError: If a required column is missing or has an invalid value
+    """
+    try:
+        transaction_type = _TYPES_BY_VALUE[row["type"].strip().lower()]
+        status_value = (row.get("status") or TransactionStatus.PENDING.value).strip().lower()
+        status = _STATUSES_BY_VALUE[status_value]
+        created_at = row.get("created_at")
+        transaction = Transaction(
+            transaction_id=int(row["transaction_id"]),
+            user_id=int(row["user_id"]),
+            amount=float(row["amount"]),
+            transaction_type=transaction_type,
+            description=row.get("description") or "",
+            created_at=datetime.fromisoformat(created_at) if created_at else None,
+            currency=(row.get("currency") or DEFAULT_CURRENCY).strip().upper(),
+        )
+    except KeyError as e:
+        raise ValueError(f"Invalid transaction row {row!r}: missing or unknown value {e}") from None
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid transaction row {row!r}: {e}") from None
+
+    transaction.status = status
+    return transaction
+
+
+def _validated(batch: List[Transaction], lines: List[int], file_path: str) -> List[Transaction]:
+    """Checks a batch of parsed rows, raising for the first invalid one."""
+    result = validate_transactions(batch)
+    if not result.all_valid:
+        position = min(result.reasons)
+        raise ValueError(f"{file_path}:{lines[position]}: {result.reasons[position]}")
+    return batch
+
+
+def iter_transactions_csv(file_path: str, encoding: str = "utf-8",
+                          deduplicator: Optional["Deduplicator"] = None,
+                          validate: bool = False) -> Iterator[Transaction]:
+    """
+    Streams transactions from a CSV file with a header row.
+
+    Args:
+        file_path (str): The CSV file to read
+        encoding (str): The file encoding (default: utf-8)
+        deduplicator (Optional[Deduplicator]): Drops transactions it has already seen
+        validate (bool): Also reject rows that parse but fail validation (e.g.
+            non-positive amounts); rows are validated in batches
+
+    Yields:
+        Transaction: One transaction per data row (per new row when deduplicating)
+
+    Raises:
+        ValueError: If a row cannot be parsed or is invalid (the line number is included)
+    """
+    if deduplicator is not None:
+        yield from deduplicator.filter(iter_transactions_csv(file_path, encoding, validate=validate))
+        return
+
+    with open(file_path, "r", encoding=encoding, newline="") as file:
+        reader = csv.DictReader(file)
+        batch = []  # type: List[Transaction]
+        lines = []  # type: List[int]
+        for row in reader:
+            try:
+                transaction = parse_transaction_row(row)
+            except ValueError as e:
+                raise ValueError(f"{file_path}:{reader.line_num}: {e}") from None
+            if not validate:
+                yield transaction
+                continue
+            batch.append(transaction)
+            lines.append(reader.line_num)
+            if len(batch) >= _VALIDATION_BATCH:
+                yield from _validated(batch, lines, file_path)
+                batch, lines = [], []
+        if batch:
+            yield from _validated(batch, lines, file_path)
+
+
+def import_transactions(file_path: str, encoding: str = "utf-8",
+                        deduplicator: Optional["Deduplicator"] = None,
+                        validate: bool = False) -> List[Transaction]:
+    """
+    Imports all transactions from a CSV file.
+
+    Args:
+        file_path (str): The CSV file to read
+        encoding (str): The file encoding (default: utf-8)
+        deduplicator (Optional[Deduplicator]): Drops transactions it has already seen;
+            its dropped attribute holds the number of duplicates afterwards
+        validate (bool): Also reject rows that fail validation (see iter_transactions_csv)
+
+    Returns:
+        List[Transaction]: The imported transactions
+
+    Raises:
+        ValueError: If a row cannot be parsed or is invalid (the line number is included)
+    """
+    return list(iter_transactions_csv(file_path, encoding, deduplicator, validate))
+
+
+def transaction_to_row(transaction: Transaction) -> List[str]:
+    """
+    Converts a transaction to a CSV row in CSV_FIELDS order.
+
+    Args:
+        transaction (Transaction): The transaction to convert
+
+    Returns:
+        List[str]: The column values
+    """
+    return [
+        str(transaction.transaction_id),
+        str(transaction.user_id),
+        repr(transaction.amount),
+        transaction.transaction_type.value,
+        transaction.status.value,
+        transaction.description,
+        transaction.created_at.isoformat(),
+        transaction.currency,
+    ]
+
+
+def export_transactions(transactions: Iterable[Transaction], file_path: str,
+                        encoding: str = "utf-8") -> int:
+    """
+    Exports transactions to a CSV file with a header row.
+
+    Args:
+        transactions (Iterable[Transaction]): Transactions to export
+        file_path (str): The CSV file to write
+        encoding (str): The file encoding (default: utf-8)
+
+    Returns:
+        int: Number of exported transactions
+    """
+    count = 0
+    with open(file_path, "w", encoding=encoding, newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(CSV_FIELDS)
+        for transaction in transactions:
+            writer.writerow(transaction_to_row(transaction))
+            count += 1
+    return count
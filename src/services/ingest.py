@@ -0,0 +1,258 @@
+"""
+Ingest Service
+
+Tails a drop directory of CSV bank exports and imports only the rows
+appended since the last poll.
+
+Every file has a cursor: the byte offset just past the last complete
+line that was parsed, the file's header row, and its inode, size and
+modification time at that point. A poll lists the directory, skips files
+whose size and mtime are unchanged without opening them, and reads the
+other files from their offset to the last newline; a partly written
+final line stays on disk until its newline arrives. A file that was
+replaced (new inode) or shrank below its offset is read again from the
+start.
+
+Polling only uses os.scandir() and stat results, so it works the same on
+every platform and filesystem. Cursors can be persisted to a JSON state
+file so a restarted watcher resumes where it stopped.
+"""
+
+import csv
+import fnmatch
+import io
+import json
+import logging
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional
+
+from models.transaction import Transaction
+from models.validation import validate_transactions
+from services.import_service import parse_transaction_row
+from utils.file_ops import write_file_atomic
+from utils.metrics import get_registry
+
+if TYPE_CHECKING:
+    from services.dedup_service import Deduplicator
+
+logger = logging.getLogger(__name__)
+
+_metrics = get_registry()
+_polls = _metrics.counter("ingest.polls", "Directory polls")
+_files_read = _metrics.counter("ingest.files_read", "Files read because they changed")
+_bytes_read = _metrics.counter("ingest.bytes_read", "New bytes read from watched files")
+_rows_ingested = _metrics.counter("ingest.rows_ingested", "Transactions ingested from watched files")
+_rows_rejected = _metrics.counter("ingest.rows_rejected", "Rows of watched files that could not be parsed")
+_poll_latency = _metrics.histogram("ingest.poll_seconds", "Wall time spent polling and parsing")
+
+DEFAULT_PATTERN = "*.csv"
+DEFAULT_INTERVAL = 0.25
+
+
+class FileCursor:
+    """
+    Read position in one watched file.
+    """
+
+    __slots__ = ("offset", "line", "header", "inode", "size", "mtime_ns")
+
+    def __init__(self, offset: int = 0, line: int = 0, header: Optional[List[str]] = None,
+                 inode: int = 0, size: int = -1, mtime_ns: int = -1):
+        """
+        Initialize a new FileCursor instance.
+
+        Args:
+            offset (int): Byte offset just past the last parsed line
+            line (int): Number of lines parsed, including the header
+            header (Optional[List[str]]): The file's column names, once read
+            inode (int): File serial number when last read
+            size (int): File size when last read
+            mtime_ns (int): File modification time when last read
+        """
+        self.offset = offset
+        self.line = line
+        self.header = header
+        self.inode = inode
+        self.size = size
+        self.mtime_ns = mtime_ns
+
+    def to_dict(self) -> Dict[str, object]:
+        """
+        Converts the cursor to its state file form.
+
+        Returns:
+            Dict[str, object]: JSON-serializable cursor
+        """
+        return {"offset": self.offset, "line": self.line, "header": self.header,
+                "inode": self.inode, "size": self.size, "mtime_ns": self.mtime_ns}
+
+
+class DirectoryTailer:
+    """
+    Incremental reader of the CSV files in a directory.
+    """
+
+    def __init__(self, directory: str, pattern: str = DEFAULT_PATTERN, encoding: str = "utf-8",
+                 state_path: Optional[str] = None, deduplicator: Optional["Deduplicator"] = None,
+                 validate: bool = False):
+        """
+        Initialize a new DirectoryTailer instance.
+
+        Args:
+            directory (str): The drop directory
+            pattern (str): Glob pattern of the file names to read
+            encoding (str): The file encoding (default: utf-8)
+            state_path (Optional[str]): JSON file the cursors are loaded from and saved to
+            deduplicator (Optional[Deduplicator]): Drops transactions it has already seen
+            validate (bool): Also skip rows that parse but fail validation
+
+        Raises:
+            ValueError: If the state file is invalid
+        """
+        self.directory = directory
+        self.pattern = pattern
+        self.encoding = encoding
+        self.state_path = state_path
+        self.deduplicator = deduplicator
+        self.validate = validate
+        self.cursors = {}  # type: Dict[str, FileCursor]
+        if state_path and os.path.exists(state_path):
+            try:
+                with open(state_path, "r", encoding="utf-8") as file:
+                    state = json.load(file)
+                self.cursors = {name: FileCursor(**cursor) for name, cursor in state["files"].items()}
+            except (KeyError, TypeError, ValueError) as e:
+                raise ValueError(f"Invalid ingest state file '{state_path}': {e}") from None
+
+    def _read_new_rows(self, name: str, cursor: FileCursor) -> List[Transaction]:
+        with open(os.path.join(self.directory, name), "rb") as file:
+            file.seek(cursor.offset)
+            data = file.read()
+        end = data.rfind(b"\n") + 1
+        if not end:
+            return []
+        text = data[:end].decode(self.encoding)
+        _bytes_read.inc(end)
+        cursor.offset += end
+
+        transactions = []
+        lines = []
+        reader = csv.reader(io.StringIO(text, newline=""))
+        for row in reader:
+            cursor.line += 1
+            if cursor.header is None:
+                cursor.header = row
+                continue
+            if not row:
+                continue
+            try:
+                transactions.append(parse_transaction_row(dict(zip(cursor.header, row))))
+                lines.append(cursor.line)
+            except ValueError as e:
+                _rows_rejected.inc()
+                logger.warning("%s:%d: skipped row: %s", name, cursor.line, e)
+        if self.validate and transactions:
+            result = validate_transactions(transactions)
+            for position, reason in sorted(result.reasons.items()):
+                logger.warning("%s:%d: skipped row: %s", name, lines[position], reason)
+            _rows_rejected.inc(len(result.reasons))
+            transactions = result.select(transactions)
+        return transactions
+
+    def poll(self, save: bool = True) -> List[Transaction]:
+        """
+        Reads the rows appended to the watched files since the last poll.
+
+        Args:
+            save (bool): Save the cursors to the state file afterwards
+
+        Returns:
+            List[Transaction]: The new transactions, file by file in name order
+        """
+        start = time.perf_counter()
+        try:
+            entries = sorted((entry for entry in os.scandir(self.directory)
+                              if entry.is_file() and fnmatch.fnmatch(entry.name, self.pattern)),
+                             key=lambda entry: entry.name)
+        except FileNotFoundError:
+            entries = []
+        transactions = []  # type: List[Transaction]
+        for entry in entries:
+            stat = entry.stat()
+            cursor = self.cursors.get(entry.name)
+            if cursor is None:
+                cursor = self.cursors[entry.name] = FileCursor()
+            elif (stat.st_ino, stat.st_size, stat.st_mtime_ns) == (cursor.inode, cursor.size, cursor.mtime_ns):
+                continue
+            elif cursor.size >= 0 and (stat.st_ino != cursor.inode or stat.st_size < cursor.offset):
+                logger.info("'%s' was replaced; reading it again from the start", entry.name)
+                cursor = self.cursors[entry.name] = FileCursor()
+            _files_read.inc()
+            try:
+                transactions.extend(self._read_new_rows(entry.name, cursor))
+            except (OSError, UnicodeDecodeError) as e:
+                # The stat stays stale, so the next poll tries again
+                logger.warning("Could not read '%s': %s", entry.name, e)
+                continue
+            cursor.inode, cursor.size, cursor.mtime_ns = stat.st_ino, stat.st_size, stat.st_mtime_ns
+        for name in set(self.cursors) - {entry.name for entry in entries}:
+            del self.cursors[name]
+
+        if self.deduplicator is not None:
+            transactions = list(self.deduplicator.filter(transactions))
+        if save and self.state_path:
+            self.save_state()
+        _polls.inc()
+        _rows_ingested.inc(len(transactions))
+        _poll_latency.observe(time.perf_counter() - start)
+        return transactions
+
+    def save_state(self) -> bool:
+        """
+        Saves the cursors to the state file, atomically.
+
+        Returns:
+            bool: True if the state was written successfully, False otherwise
+        """
+        state = {"files": {name: cursor.to_dict() for name, cursor in self.cursors.items()}}
+        return write_file_atomic(self.state_path, json.dumps(state))
+
+
+def watch(tailer: DirectoryTailer, sink: Callable[[List[Transaction]], None],
+          interval: float = DEFAULT_INTERVAL, stop: Optional[threading.Event] = None,
+          max_polls: Optional[int] = None) -> int:
+    """
+    Polls a directory and passes every non-empty batch of new transactions to a sink.
+
+    New rows reach the sink within one interval (plus parsing time) of
+    being written. Cursors are only saved once the sink has returned, so
+    a batch the sink did not finish with is read again after a restart.
+
+    Args:
+        tailer (DirectoryTailer): The directory reader
+        sink (Callable[[List[Transaction]], None]): Receives each batch, e.g.
+            DataContext.add_transactions
+        interval (float): Seconds between polls
+        stop (Optional[threading.Event]): Stops watching when set
+        max_polls (Optional[int]): Stop after this many polls (None: until stopped)
+
+    Returns:
+        int: Number of transactions ingested
+    """
+    stop = stop or threading.Event()
+    ingested = 0
+    polls = 0
+    while not stop.is_set():
+        batch = tailer.poll(save=False)
+        if batch:
+            sink(batch)
+            ingested += len(batch)
+        if tailer.state_path:
+            tailer.save_state()
+        polls += 1
+        if max_polls is not None and polls >= max_polls:
+            break
+        stop.wait(interval)
+    return ingested
@@ -0,0 +1,269 @@
+"""
+Ledger Service
+
+Maintains per-user running balances from completed transactions.
+
+Each user's entries are kept in created_at order together with the running
+balance after every entry (a prefix sum of signed amounts), so the balance
+at any point in time is a binary search away. Deposits add to the balance;
+withdrawals and payments subtract from it. A transfer is posted as two
+legs: a debit for the sender and, when the counterparty is known, a credit
+for the recipient.
+
+Old entries can be folded into a checkpoint with compact(), which bounds
+memory for long histories while keeping current balances exact.
+"""
+
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from models.transaction import Transaction, TransactionType
+
+# Sign of the amount for the initiating user
+SIGNS = {
+    TransactionType.DEPOSIT: 1.0,
+    TransactionType.WITHDRAWAL: -1.0,
+    TransactionType.PAYMENT: -1.0,
+    TransactionType.TRANSFER: -1.0,
+}  # type: Dict[TransactionType, float]
+
+
+class UserLedger:
+    """
+    Running balance history of a single user.
+
+    times[i] is the time of the i-th entry and balances[i] the balance
+    right after it. Entries before checkpoint_time have been compacted
+    into checkpoint_balance.
+    """
+
+    __slots__ = ("user_id", "times", "balances", "checkpoint_time", "checkpoint_balance")
+
+    def __init__(self, user_id: int):
+        """
+        Initialize a new UserLedger instance.
+
+        Args:
+            user_id (int): The ID of the user
+        """
+        self.user_id = user_id
+        self.times = []  # type: List[datetime]
+        self.balances = []  # type: List[float]
+        self.checkpoint_time = None  # type: Optional[datetime]
+        self.checkpoint_balance = 0.0
+
+    def post(self, when: datetime, amount: float) -> None:
+        """
+        Records a signed amount at a point in time.
+
+        Entries arriving in time order are appended in O(1); a late entry
+        is inserted in place and the balances after it are shifted.
+
+        Args:
+            when (datetime): Time of the entry
+            amount (float): Signed amount (positive credits the user)
+        """
+        times = self.times
+        balances = self.balances
+        if self.checkpoint_time is not None and when < self.checkpoint_time:
+            # Belongs to the compacted history: fold it into the checkpoint
+            self.checkpoint_balance += amount
+            for i in range(len(balances)):
+                balances[i] += amount
+            return
+
+        if not times or when >= times[-1]:
+            times.append(when)
+            balances.append((balances[-1] if balances else self.checkpoint_balance) + amount)
+            return
+
+        position = bisect_right(times, when)
+        previous = balances[position - 1] if position else self.checkpoint_balance
+        times.insert(position, when)
+        balances.insert(position, previous + amount)
+        for i in range(position + 1, len(balances)):
+            balances[i] += amount
+
+    @property
+    def balance(self) -> float:
+        """Current balance."""
+        return self.balances[-1] if self.balances else self.checkpoint_balance
+
+    def balance_at(self, when: datetime) -> float:
+        """
+        Returns the balance including every entry at or before a point in time.
+
+        Args:
+            when (datetime): The point in time
+
+        Returns:
+            float: The balance at that time
+
+        Raises:
+            ValueError: If the time lies before the compaction checkpoint
+        """
+        if self.checkpoint_time is not None and when < self.checkpoint_time:
+            raise ValueError(f"Balance history of user {self.user_id} before "
+                             f"{self.checkpoint_time.isoformat()} has been compacted")
+        position = bisect_right(self.times, when)
+        return self.balances[position - 1] if position else self.checkpoint_balance
+
+    def compact(self, before: datetime) -> int:
+        """
+        Folds all entries before a point in time into the checkpoint.
+
+        Args:
+            before (datetime): Entries strictly before this time are folded
+
+        Returns:
+            int: Number of entries removed
+        """
+        if self.checkpoint_time is not None and before <= self.checkpoint_time:
+            return 0
+        # Entries at exactly `before` are kept so balance_at(before) stays answerable
+        position = bisect_left(self.times, before)
+        if position:
+            self.checkpoint_balance = self.balances[position - 1]
+            del self.times[:position]
+            del self.balances[:position]
+        self.checkpoint_time = before
+        return position
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+
+class Ledger:
+    """
+    Per-user running balance ledger built from completed transactions.
+
+    Only completed transactions are posted; callers add a transaction once
+    it completes. Transfers need a counterparty to post the credit leg.
+    """
+
+    def __init__(self, transactions: Iterable[Transaction] = (),
+                 counterparties: Optional[Dict[int, int]] = None):
+        """
+        Initialize a new Ledger instance.
+
+        Args:
+            transactions (Iterable[Transaction]): Transactions to post
+            counterparties (Optional[Dict[int, int]]): Recipient user ID per transfer transaction ID
+        """
+        self._users = {}  # type: Dict[int, UserLedger]
+        self.add_many(transactions, counterparties)
+
+    def _user(self, user_id: int) -> UserLedger:
+        ledger = self._users.get(user_id)
+        if ledger is None:
+            ledger = self._users[user_id] = UserLedger(user_id)
+        return ledger
+
+    def add(self, transaction: Transaction, counterparty_id: Optional[int] = None) -> int:
+        """
+        Posts a completed transaction.
+
+        Args:
+            transaction (Transaction): The transaction to post
+            counterparty_id (Optional[int]): Recipient of a transfer
+
+        Returns:
+            int: Number of legs posted (0 if the transaction is not completed)
+        """
+        if not transaction.is_completed():
+            return 0
+        amount = transaction.amount
+        self._user(transaction.user_id).post(transaction.created_at,
+                                             SIGNS[transaction.transaction_type] * amount)
+        if transaction.transaction_type == TransactionType.TRANSFER and counterparty_id is not None:
+            self._user(counterparty_id).post(transaction.created_at, amount)
+            return 2
+        return 1
+
+    def add_many(self, transactions: Iterable[Transaction],
+                 counterparties: Optional[Dict[int, int]] = None) -> int:
+        """
+        Posts several transactions, sorting them by time first so that
+        every entry is a cheap append.
+
+        Args:
+            transactions (Iterable[Transaction]): Transactions to post
+            counterparties (Optional[Dict[int, int]]): Recipient user ID per transfer transaction ID
+
+        Returns:
+            int: Number of legs posted
+        """
+        counterparties = counterparties or {}
+        completed = sorted((t for t in transactions if t.is_completed()), key=lambda t: t.created_at)
+        return sum(self.add(t, counterparties.get(t.transaction_id)) for t in completed)
+
+    def balance(self, user_id: int) -> float:
+        """
+        Returns a user's current balance.
+
+        Args:
+            user_id (int): The ID of the user
+
+        Returns:
+            float: The balance (0.0 for users without entries)
+        """
+        ledger = self._users.get(user_id)
+        return ledger.balance if ledger is not None else 0.0
+
+    def balance_at(self, user_id: int, when: datetime) -> float:
+        """
+        Returns a user's balance at a point in time in O(log N).
+
+        Args:
+            user_id (int): The ID of the user
+            when (datetime): The point in time (entries at exactly this time are included)
+
+        Returns:
+            float: The balance at that time
+
+        Raises:
+            ValueError: If the time lies before the user's compaction checkpoint
+        """
+        ledger = self._users.get(user_id)
+        return ledger.balance_at(when) if ledger is not None else 0.0
+
+    def balances(self) -> Dict[int, float]:
+        """
+        Returns every user's current balance.
+
+        Returns:
+            Dict[int, float]: Balance per user ID
+        """
+        return {user_id: ledger.balance for user_id, ledger in self._users.items()}
+
+    def compact(self, before: datetime, user_id: Optional[int] = None) -> int:
+        """
+        Folds entries before a point in time into per-user checkpoints.
+
+        Args:
+            before (datetime): Entries strictly before this time are folded
+            user_id (Optional[int]): Only compact this user's history
+
+        Returns:
+            int: Number of entries removed
+        """
+        if user_id is not None:
+            ledger = self._users.get(user_id)
+            return ledger.compact(before) if ledger is not None else 0
+        return sum(ledger.compact(before) for ledger in self._users.values())
+
+    def entry_count(self, user_id: Optional[int] = None) -> int:
+        """
+        Returns the number of entries held in memory.
+
+        Args:
+            user_id (Optional[int]): Only count this user's entries
+
+        Returns:
+            int: Number of entries
+        """
+        if user_id is not None:
+            ledger = self._users.get(user_id)
+            return len(ledger) if ledger is not None else 0
+        return sum(len(ledger) for ledger in self._users.values())
@@ -0,0 +1,445 @@
+"""
+Partitioned Transaction Storage
+
+Persists transactions in partitions by month and, optionally, by a hash
+bucket of the user ID, so that queries such as "the last 30 days of user
+42" only open the partitions that can hold matching rows.
+
+Every partition is a snapshot file (see services.snapshot). A JSON
+manifest lists the partitions with their row count, the range of their
+creation times, their currencies and their per-type counts and completed
+totals. Queries prune partitions using the manifest alone; summaries take
+the totals of partitions that lie entirely inside the queried range
+straight from the manifest and only scan the columns of partitions that
+are cut by the range or a user filter. Totals are only ever added up
+within one currency.
+
+Partition files are never rewritten in place: a changed partition is
+written under a new generation number, the manifest is replaced
+atomically, and only then is the old file removed. A crash at any point
+leaves the previous manifest and every file it references intact.
+"""
+
+import json
+import math
+import os
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from models.transaction import Transaction, TransactionType
+from services.aggregation import (
+    aggregate_transactions,
+    datetime_to_micros,
+    micros_to_datetime,
+    single_currency,
+)
+from services.data_context import DataContext
+from services.snapshot import Snapshot, build_snapshot
+from utils.file_ops import write_file_atomic
+from utils.metrics import get_registry
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 2
+
+_metrics = get_registry()
+_opened = _metrics.counter("partitions.opened", "Partition files opened by queries")
+_pruned = _metrics.counter("partitions.pruned", "Partitions skipped using the manifest")
+_from_manifest = _metrics.counter("partitions.summarized_from_manifest",
+                                  "Partitions summarized from manifest totals alone")
+
+# (month, user bucket)
+PartitionKey = Tuple[str, int]
+
+
+def month_key(when: datetime) -> str:
+    """
+    Returns the month partition of a time.
+
+    Args:
+        when (datetime): The time
+
+    Returns:
+        str: The month as YYYY-MM
+    """
+    return f"{when.year:04d}-{when.month:02d}"
+
+
+def user_bucket(user_id: int, buckets: int) -> int:
+    """
+    Returns the hash bucket of a user.
+
+    Args:
+        user_id (int): The ID of the user
+        buckets (int): Number of buckets
+
+    Returns:
+        int: The bucket, from 0 to buckets - 1
+    """
+    # Fibonacci hashing spreads sequential user IDs evenly
+    return ((user_id * 2654435761) & 0xFFFFFFFF) % buckets
+
+
+class PartitionInfo:
+    """
+    Manifest entry of one partition.
+    """
+
+    __slots__ = ("file", "month", "bucket", "rows", "min_created_at", "max_created_at",
+                 "type_counts", "completed_count", "completed_type_totals", "currencies")
+
+    def __init__(self, file: str, month: str, bucket: int, rows: int,
+                 min_created_at: int, max_created_at: int,
+                 type_counts: Dict[TransactionType, int], completed_count: int,
+                 completed_type_totals: Dict[TransactionType, float], currencies: List[str]):
+        """
+        Initialize a new PartitionInfo instance.
+
+        Args:
+            file (str): Partition file name, relative to the store directory
+            month (str): Month of the rows (YYYY-MM)
+            bucket (int): User hash bucket of the rows
+            rows (int): Number of rows
+            min_created_at (int): Earliest creation time in microseconds since the epoch
+            max_created_at (int): Latest creation time in microseconds since the epoch
+            type_counts (Dict[TransactionType, int]): Rows per type
+            completed_count (int): Number of completed rows
+            completed_type_totals (Dict[TransactionType, float]): Completed amounts per type
+            currencies (List[str]): Currencies of the rows (totals only add up within one)
+        """
+        self.file = file
+        self.month = month
+        self.bucket = bucket
+        self.rows = rows
+        self.min_created_at = min_created_at
+        self.max_created_at = max_created_at
+        self.type_counts = type_counts
+        self.completed_count = completed_count
+        self.completed_type_totals = completed_type_totals
+        self.currencies = currencies
+
+    @property
+    def key(self) -> PartitionKey:
+        """The partition's (month, bucket) key."""
+        return (self.month, self.bucket)
+
+    def to_dict(self) -> Dict[str, object]:
+        """
+        Converts the entry to its manifest form.
+
+        Returns:
+            Dict[str, object]: JSON-serializable entry
+        """
+        return {
+            "file": self.file,
+            "month": self.month,
+            "bucket": self.bucket,
+            "rows": self.rows,
+            "min_created_at": self.min_created_at,
+            "max_created_at": self.max_created_at,
+            "type_counts": {t.value: count for t, count in self.type_counts.items()},
+            "completed_count": self.completed_count,
+            "completed_type_totals": {t.value: total for t, total in self.completed_type_totals.items()},
+            "currencies": self.currencies,
+        }
+
+    @classmethod
+    def from_dict(cls, entry: Dict[str, object]) -> "PartitionInfo":
+        """
+        Reads an entry from its manifest form.
+
+        Args:
+            entry (Dict[str, object]): The manifest entry
+
+        Returns:
+            PartitionInfo: The entry
+        """
+        return cls(entry["file"], entry["month"], entry["bucket"], entry["rows"],
+                   entry["min_created_at"], entry["max_created_at"],
+                   {TransactionType(t): count for t, count in entry["type_counts"].items()},
+                   entry["completed_count"],
+                   {TransactionType(t): total for t, total in entry["completed_type_totals"].items()},
+                   entry["currencies"])
+
+
+class RangeSummary:
+    """
+    Counts and completed totals of the transactions matching a query.
+    """
+
+    __slots__ = ("count", "type_counts", "completed_count", "completed_type_totals", "currencies",
+                 "partitions_scanned", "partitions_from_manifest")
+
+    def __init__(self):
+        """
+        Initialize an empty RangeSummary instance.
+        """
+        self.count = 0
+        self.type_counts = {}  # type: Dict[TransactionType, int]
+        self.completed_count = 0
+        self.completed_type_totals = {}  # type: Dict[TransactionType, float]
+        self.currencies = set()  # type: Set[str]
+        self.partitions_scanned = 0
+        self.partitions_from_manifest = 0
+
+    @property
+    def completed_total(self) -> float:
+        """Sum of the completed amounts of all types."""
+        return math.fsum(self.completed_type_totals.values())
+
+    @property
+    def currency(self) -> str:
+        """
+        Currency of the totals.
+
+        Raises:
+            ValueError: If the matching transactions are in several currencies
+        """
+        return single_currency(self.currencies)
+
+    def _add(self, type_counts: Dict[TransactionType, int], completed_count: int,
+             completed_type_totals: Dict[TransactionType, float], currencies: Iterable[str]) -> None:
+        self.currencies.update(currencies)
+        for transaction_type, count in type_counts.items():
+            self.type_counts[transaction_type] = self.type_counts.get(transaction_type, 0) + count
+            self.count += count
+        self.completed_count += completed_count
+        for transaction_type, total in completed_type_totals.items():
+            self.completed_type_totals[transaction_type] = math.fsum(
+                (self.completed_type_totals.get(transaction_type, 0.0), total))
+
+    def to_dict(self) -> Dict[str, object]:
+        """
+        Converts the summary to a JSON-serializable dictionary.
+
+        Returns:
+            Dict[str, object]: The summary
+        """
+        return {
+            "count": self.count,
+            "type_counts": {t.value: count for t, count in self.type_counts.items()},
+            "completed_count": self.completed_count,
+            "completed_total": self.completed_total,
+            "completed_type_totals": {t.value: total for t, total in self.completed_type_totals.items()},
+            "currency": self.currency,
+            "partitions_scanned": self.partitions_scanned,
+            "partitions_from_manifest": self.partitions_from_manifest,
+        }
+
+
+class PartitionedStore:
+    """
+    Transactions stored in month and user bucket partitions under one directory.
+    """
+
+    def __init__(self, directory: str, user_buckets: int = 1):
+        """
+        Opens the store in a directory, reading its manifest if there is one.
+
+        Args:
+            directory (str): The store directory
+            user_buckets (int): User hash buckets per month for a new store
+                (an existing store keeps its own)
+
+        Raises:
+            ValueError: If user_buckets is not positive or the manifest is invalid
+        """
+        if user_buckets < 1:
+            raise ValueError("user_buckets must be positive")
+        self.directory = directory
+        self.user_buckets = user_buckets
+        self._generation = 0
+        self._partitions = {}  # type: Dict[PartitionKey, PartitionInfo]
+        manifest_path = os.path.join(directory, MANIFEST_NAME)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, "r", encoding="utf-8") as file:
+                manifest = json.load(file)
+            if manifest.get("version") != MANIFEST_VERSION:
+                raise ValueError(f"Unsupported partition manifest version in {manifest_path}")
+            self.user_buckets = manifest["user_buckets"]
+            self._generation = manifest["generation"]
+            for entry in manifest["partitions"]:
+                info = PartitionInfo.from_dict(entry)
+                self._partitions[info.key] = info
+
+    def __len__(self) -> int:
+        return sum(info.rows for info in self._partitions.values())
+
+    def _key(self, transaction: Transaction) -> PartitionKey:
+        return (month_key(transaction.created_at), user_bucket(transaction.user_id, self.user_buckets))
+
+    def _write_partition(self, key: PartitionKey, transactions: List[Transaction]) -> PartitionInfo:
+        month, bucket = key
+        context = DataContext(users=[], transactions=transactions)
+        name = f"{month}.b{bucket:03d}.g{self._generation}.snap"
+        if not write_file_atomic(os.path.join(self.directory, name), build_snapshot(context)):
+            raise OSError(f"Could not write partition '{name}'")
+        aggregate = context.aggregate()
+        created_at = context.columns.created_at
+        return PartitionInfo(name, month, bucket, len(transactions), min(created_at), max(created_at),
+                             aggregate.type_counts, aggregate.completed_count, aggregate.completed_type_totals,
+                             context.currencies)
+
+    def _write_manifest(self) -> None:
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "user_buckets": self.user_buckets,
+            "generation": self._generation,
+            "partitions": [self._partitions[key].to_dict() for key in sorted(self._partitions)],
+        }
+        if not write_file_atomic(os.path.join(self.directory, MANIFEST_NAME), json.dumps(manifest, indent=1)):
+            raise OSError(f"Could not write the partition manifest in '{self.directory}'")
+
+    def add(self, transactions: Iterable[Transaction]) -> int:
+        """
+        Adds transactions, rewriting only the partitions they fall into.
+
+        Args:
+            transactions (Iterable[Transaction]): The transactions to add
+
+        Returns:
+            int: Number of transactions added
+
+        Raises:
+            OSError: If a partition or the manifest cannot be written
+        """
+        by_key = {}  # type: Dict[PartitionKey, List[Transaction]]
+        for transaction in transactions:
+            by_key.setdefault(self._key(transaction), []).append(transaction)
+        if not by_key:
+            return 0
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._generation += 1
+        replaced = []
+        for key, added in by_key.items():
+            old = self._partitions.get(key)
+            rows = added
+            if old is not None:
+                rows = Snapshot(os.path.join(self.directory, old.file)).transactions() + added
+                replaced.append(old.file)
+            self._partitions[key] = self._write_partition(key, rows)
+        self._write_manifest()
+        for name in replaced:
+            os.remove(os.path.join(self.directory, name))
+        return sum(len(added) for added in by_key.values())
+
+    def partitions(self, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                   user_id: Optional[int] = None) -> List[PartitionInfo]:
+        """
+        Lists the partitions that can hold rows matching a query, using the manifest only.
+
+        Args:
+            start (Optional[datetime]): Earliest creation time (inclusive)
+            end (Optional[datetime]): Latest creation time (exclusive)
+            user_id (Optional[int]): Only this user's rows
+
+        Returns:
+            List[PartitionInfo]: Matching partitions ordered by month and bucket
+        """
+        low = datetime_to_micros(start) if start is not None else None
+        high = datetime_to_micros(end) if end is not None else None
+        bucket = user_bucket(user_id, self.user_buckets) if user_id is not None else None
+        selected = [self._partitions[key] for key in sorted(self._partitions)
+                    if (low is None or self._partitions[key].max_created_at >= low)
+                    and (high is None or self._partitions[key].min_created_at < high)
+                    and (bucket is None or key[1] == bucket)]
+        _pruned.inc(len(self._partitions) - len(selected))
+        return selected
+
+    def _matching_rows(self, snapshot: Snapshot, low: Optional[int], high: Optional[int],
+                       user_id: Optional[int]) -> List[int]:
+        columns = snapshot.columns()
+        low = low if low is not None else -(1 << 63)
+        high = high if high is not None else 1 << 63
+        if user_id is None:
+            return [position for position, created_at in enumerate(columns.created_at)
+                    if low <= created_at < high]
+        return [position for position, (created_at, row_user) in enumerate(zip(columns.created_at,
+                                                                               columns.user_ids))
+                if row_user == user_id and low <= created_at < high]
+
+    def transactions(self, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                     user_id: Optional[int] = None) -> List[Transaction]:
+        """
+        Loads the transactions matching a query from the partitions that can hold them.
+
+        Only matching rows are built into Transaction objects.
+
+        Args:
+            start (Optional[datetime]): Earliest creation time (inclusive)
+            end (Optional[datetime]): Latest creation time (exclusive)
+            user_id (Optional[int]): Only this user's transactions
+
+        Returns:
+            List[Transaction]: Matching transactions, by partition and then in stored order
+        """
+        low = datetime_to_micros(start) if start is not None else None
+        high = datetime_to_micros(end) if end is not None else None
+        result = []  # type: List[Transaction]
+        for info in self.partitions(start, end, user_id):
+            snapshot = Snapshot(os.path.join(self.directory, info.file))
+            _opened.inc()
+            if self._covers(info, low, high) and user_id is None:
+                result.extend(snapshot.transactions())
+            else:
+                result.extend(snapshot.transactions(self._matching_rows(snapshot, low, high, user_id)))
+        return result
+
+    @staticmethod
+    def _covers(info: PartitionInfo, low: Optional[int], high: Optional[int]) -> bool:
+        return (low is None or info.min_created_at >= low) and (high is None or info.max_created_at < high)
+
+    def summary(self, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                user_id: Optional[int] = None) -> RangeSummary:
+        """
+        Counts and totals the transactions matching a query.
+
+        Partitions inside the range are summarized from the manifest; only
+        partitions cut by the range or holding other users' rows are scanned,
+        and then only their columns are read.
+
+        Args:
+            start (Optional[datetime]): Earliest creation time (inclusive)
+            end (Optional[datetime]): Latest creation time (exclusive)
+            user_id (Optional[int]): Only this user's transactions
+
+        Returns:
+            RangeSummary: The counts and completed totals
+
+        Raises:
+            ValueError: If the matching transactions are in several currencies
+        """
+        low = datetime_to_micros(start) if start is not None else None
+        high = datetime_to_micros(end) if end is not None else None
+        summary = RangeSummary()
+        for info in self.partitions(start, end, user_id):
+            if self._covers(info, low, high) and user_id is None:
+                summary._add(info.type_counts, info.completed_count, info.completed_type_totals,
+                             info.currencies)
+                summary.partitions_from_manifest += 1
+                _from_manifest.inc()
+                continue
+            snapshot = Snapshot(os.path.join(self.directory, info.file))
+            _opened.inc()
+            positions = self._matching_rows(snapshot, low, high, user_id)
+            summary.partitions_scanned += 1
+            if positions:
+                columns = snapshot.columns().take(positions)
+                aggregate = aggregate_transactions(columns)
+                summary._add(aggregate.type_counts, aggregate.completed_count, aggregate.completed_type_totals,
+                             columns.used_currencies())
+        # Totals in different currencies cannot be added up as they are
+        single_currency(summary.currencies)
+        return summary
+
+    def time_range(self) -> Optional[Tuple[datetime, datetime]]:
+        """
+        Returns the earliest and latest creation times in the store.
+
+        Returns:
+            Optional[Tuple[datetime, datetime]]: The range, or None if the store is empty
+        """
+        if not self._partitions:
+            return None
+        return (micros_to_datetime(min(info.min_created_at for info in self._partitions.values())),
+                micros_to_datetime(max(info.max_created_at for info in self._partitions.values())))
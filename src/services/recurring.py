@@ -0,0 +1,260 @@
+"""
+Recurring Transaction Detection
+
+Finds recurring payments such as rent and subscriptions.
+
+Completed transactions are grouped by user, type, normalized description
+(digits removed, so "Netflix #1042" and "Netflix #1187" group together)
+and amount bucket. Amount buckets are logarithmic, so amounts that
+differ by less than the tolerance usually share a bucket. Each group
+keeps its times in sorted order, and one sweep over the gaps between
+consecutive transactions decides whether the group is regular. Grouping
+is a hash lookup per transaction and each group is sorted at most once
+per batch, so detection costs O(N log N) overall instead of comparing
+every pair of transactions.
+
+The detector is incremental: groups keep their state between calls, and
+only groups that received new transactions are swept again.
+"""
+
+import math
+import re
+from bisect import insort
+from functools import lru_cache
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from models.string_pool import DESCRIPTIONS, Code
+from models.transaction import Transaction, TransactionType
+from services.dedup_service import normalized_description
+
+# Named cadences (days) used to label detected series
+CADENCES = (
+    ("weekly", 7.0),
+    ("biweekly", 14.0),
+    ("monthly", 30.44),
+    ("quarterly", 91.31),
+    ("yearly", 365.25),
+)  # type: Tuple[Tuple[str, float], ...]
+
+DEFAULT_MIN_OCCURRENCES = 3
+DEFAULT_AMOUNT_TOLERANCE = 0.05
+DEFAULT_INTERVAL_TOLERANCE = 0.2
+
+_DIGITS = re.compile(r"\d+")
+
+_SECONDS_PER_DAY = 86400.0
+
+GroupKey = Tuple[int, TransactionType, str, int]
+
+
+@lru_cache(maxsize=65536)
+def _group_description(code: Code) -> str:
+    # Real histories repeat a small set of descriptions, so this is memoized per code
+    return _DIGITS.sub("#", normalized_description(code))
+
+
+def group_key(transaction: Transaction, amount_tolerance: float = DEFAULT_AMOUNT_TOLERANCE) -> GroupKey:
+    """
+    Computes the recurrence group of a transaction.
+
+    Args:
+        transaction (Transaction): The transaction
+        amount_tolerance (float): Relative amount difference covered by one bucket
+
+    Returns:
+        GroupKey: User ID, type, normalized description and amount bucket
+    """
+    description = _group_description(transaction.description_code)
+    bucket = round(math.log(max(transaction.amount, 0.01)) / math.log1p(amount_tolerance))
+    return (transaction.user_id, transaction.transaction_type, description, bucket)
+
+
+class RecurringSeries:
+    """
+    A detected recurring series of transactions.
+    """
+
+    __slots__ = ("user_id", "transaction_type", "description", "amount", "period_days",
+                 "occurrences", "last_seen")
+
+    def __init__(self, user_id: int, transaction_type: TransactionType, description: str,
+                 amount: float, period_days: float, occurrences: int, last_seen: datetime):
+        """
+        Initialize a new RecurringSeries instance.
+
+        Args:
+            user_id (int): The ID of the user
+            transaction_type (TransactionType): Type of the transactions
+            description (str): Description of the most recent transaction
+            amount (float): Average amount
+            period_days (float): Average interval between transactions in days
+            occurrences (int): Number of transactions in the series
+            last_seen (datetime): Time of the most recent transaction
+        """
+        self.user_id = user_id
+        self.transaction_type = transaction_type
+        self.description = description
+        self.amount = amount
+        self.period_days = period_days
+        self.occurrences = occurrences
+        self.last_seen = last_seen
+
+    @property
+    def cadence(self) -> str:
+        """Name of the nearest cadence, or "every N days" if none is close."""
+        for name, days in CADENCES:
+            if abs(self.period_days - days) <= days * 0.1:
+                return name
+        return f"every {self.period_days:.0f} days"
+
+    @property
+    def next_expected(self) -> datetime:
+        """Expected time of the next transaction."""
+        return self.last_seen + timedelta(days=self.period_days)
+
+    def __repr__(self) -> str:
+        return (f"RecurringSeries(user={self.user_id}, {self.description!r}, "
+                f"{self.amount:.2f} {self.cadence}, n={self.occurrences})")
+
+
+class _Group:
+    """Sorted times and amounts of one recurrence group."""
+
+    __slots__ = ("times", "amount_total", "description_code", "series")
+
+    def __init__(self):
+        self.times = []  # type: List[float]
+        self.amount_total = 0.0
+        self.description_code = 0  # type: Code
+        self.series = None  # type: Optional[RecurringSeries]
+
+
+class RecurringDetector:
+    """
+    Incremental detector of recurring transactions.
+    """
+
+    def __init__(self, transactions: Iterable[Transaction] = (),
+                 min_occurrences: int = DEFAULT_MIN_OCCURRENCES,
+                 amount_tolerance: float = DEFAULT_AMOUNT_TOLERANCE,
+                 interval_tolerance: float = DEFAULT_INTERVAL_TOLERANCE):
+        """
+        Initialize a new RecurringDetector instance.
+
+        Args:
+            transactions (Iterable[Transaction]): Transactions to add
+            min_occurrences (int): Transactions needed before a group counts as recurring
+            amount_tolerance (float): Relative amount difference covered by one amount bucket
+            interval_tolerance (float): Largest allowed deviation of an interval from the
+                average interval, relative to the average
+
+        Raises:
+            ValueError: If min_occurrences is below 2 or a tolerance is not positive
+        """
+        if min_occurrences < 2:
+            raise ValueError("min_occurrences must be at least 2")
+        if amount_tolerance <= 0 or interval_tolerance <= 0:
+            raise ValueError("Tolerances must be positive")
+        self.min_occurrences = min_occurrences
+        self.amount_tolerance = amount_tolerance
+        self.interval_tolerance = interval_tolerance
+        self._groups = {}  # type: Dict[GroupKey, _Group]
+        self._dirty = set()  # type: Set[GroupKey]
+        self.add_many(transactions)
+
+    def add(self, transaction: Transaction) -> bool:
+        """
+        Adds a transaction to its group.
+
+        Args:
+            transaction (Transaction): The transaction
+
+        Returns:
+            bool: True if the transaction was added (only completed transactions are)
+        """
+        if not transaction.is_completed():
+            return False
+        self._add(transaction)
+        return True
+
+    def _add(self, transaction: Transaction) -> None:
+        key = group_key(transaction, self.amount_tolerance)
+        group = self._groups.get(key)
+        if group is None:
+            group = self._groups[key] = _Group()
+        when = transaction.created_at.timestamp()
+        if not group.times or when >= group.times[-1]:
+            group.times.append(when)
+            group.description_code = transaction.description_code
+        else:
+            insort(group.times, when)
+        group.amount_total += transaction.amount
+        self._dirty.add(key)
+
+    def add_many(self, transactions: Iterable[Transaction]) -> int:
+        """
+        Adds several transactions, sorting them by time first so that
+        every group is extended by appends.
+
+        Args:
+            transactions (Iterable[Transaction]): The transactions
+
+        Returns:
+            int: Number of transactions added
+        """
+        completed = sorted((t for t in transactions if t.is_completed()), key=lambda t: t.created_at)
+        for transaction in completed:
+            self._add(transaction)
+        return len(completed)
+
+    def _sweep(self, key: GroupKey, group: _Group) -> Optional[RecurringSeries]:
+        times = group.times
+        count = len(times)
+        if count < self.min_occurrences:
+            return None
+        period = (times[-1] - times[0]) / (count - 1)
+        if period <= 0:
+            return None
+        limit = period * self.interval_tolerance
+        previous = times[0]
+        for when in times[1:]:
+            if abs(when - previous - period) > limit:
+                return None
+            previous = when
+        user_id, transaction_type = key[0], key[1]
+        description = DESCRIPTIONS.decode(group.description_code)
+        return RecurringSeries(user_id, transaction_type, description, group.amount_total / count,
+                               period / _SECONDS_PER_DAY, count, datetime.fromtimestamp(times[-1]))
+
+    def detect(self) -> List[RecurringSeries]:
+        """
+        Returns the recurring series, sweeping only groups changed since the last call.
+
+        Returns:
+            List[RecurringSeries]: Series ordered by user ID and description
+        """
+        for key in self._dirty:
+            group = self._groups[key]
+            group.series = self._sweep(key, group)
+        self._dirty.clear()
+        series = [group.series for group in self._groups.values() if group.series is not None]
+        series.sort(key=lambda s: (s.user_id, s.description.casefold(), s.amount))
+        return series
+
+    def __len__(self) -> int:
+        return len(self._groups)
+
+
+def detect_recurring(transactions: Iterable[Transaction], **options) -> List[RecurringSeries]:
+    """
+    Detects recurring series in a batch of transactions.
+
+    Args:
+        transactions (Iterable[Transaction]): The transactions
+        **options: RecurringDetector options
+
+    Returns:
+        List[RecurringSeries]: The detected series
+    """
+    return RecurringDetector(transactions, **options).detect()
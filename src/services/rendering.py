@@ -0,0 +1,170 @@
+"""
+Rendering
+
+Building blocks for rendering large text reports.
+
+A RowTemplate is a str.format template compiled once per report layout
+into its literal text and fields. A batch of rows is rendered column by
+column: each field's values are formatted with one map() over the
+column, the literals and values are interleaved with extended slice
+assignment and the batch is joined with a single str.join, so no Python
+code runs per row. Each batch is written straight to the output stream.
+
+Dates are rendered through a DayFormatter, which caches the formatted
+text per calendar day: reports span few distinct days compared to their
+rows, so strftime runs once per day rather than once per row.
+"""
+
+from datetime import date, datetime
+from itertools import islice, repeat
+from string import Formatter
+from typing import Callable, Dict, Iterable, List, Optional, TextIO, Tuple, Union
+
+DAY_FORMAT = "%Y-%m-%d"
+
+# Rows formatted and written to the stream at a time
+RENDER_BATCH = 4096
+
+_CONVERSIONS = {"s": str, "r": repr, "a": ascii}  # type: Dict[str, Callable[[object], str]]
+
+
+class _DayCache(dict):
+    """Formatted days by date; formats days on first lookup."""
+
+    __slots__ = ("day_format",)
+
+    def __init__(self, day_format: str):
+        super().__init__()
+        self.day_format = day_format
+
+    def __missing__(self, day: date) -> str:
+        text = self[day] = day.strftime(self.day_format)
+        return text
+
+
+class DayFormatter:
+    """
+    Formats datetimes as days, caching the text per day.
+    """
+
+    __slots__ = ("day_format", "_cache")
+
+    def __init__(self, day_format: str = DAY_FORMAT):
+        """
+        Initialize a new DayFormatter instance.
+
+        Args:
+            day_format (str): strftime format using date fields only
+        """
+        self.day_format = day_format
+        self._cache = _DayCache(day_format)  # type: Dict[date, str]
+
+    def __call__(self, moment: datetime) -> str:
+        """
+        Formats one datetime.
+
+        Args:
+            moment (datetime): The datetime
+
+        Returns:
+            str: The formatted day, the same as moment.strftime(day_format)
+        """
+        return self._cache[moment.date()]
+
+    def format_all(self, moments: Iterable[datetime]) -> Iterable[str]:
+        """
+        Formats datetimes lazily, without calling back into Python for cached days.
+
+        Args:
+            moments (Iterable[datetime]): The datetimes
+
+        Returns:
+            Iterable[str]: The formatted days, in order
+        """
+        return map(self._cache.__getitem__, map(datetime.date, moments))
+
+
+class RowTemplate:
+    """
+    Row layout compiled once and rendered over columns of values.
+    """
+
+    __slots__ = ("template", "_slots")
+
+    def __init__(self, template: str):
+        """
+        Initialize a new RowTemplate instance.
+
+        Args:
+            template (str): str.format template with one automatically numbered field
+                ("{}", optionally with a conversion and format spec) per column, including
+                the row's line breaks
+
+        Raises:
+            ValueError: If a field is named or numbered
+        """
+        self.template = template
+        # Per piece of a row: its literal text, or the (conversion, spec) of a field
+        self._slots = []  # type: List[Union[str, Tuple[Optional[str], str]]]
+        for literal, field_name, spec, conversion in Formatter().parse(template):
+            if literal:
+                self._slots.append(literal)
+            if field_name is None:
+                continue
+            if field_name:
+                raise ValueError(f"Row templates take positional fields only, got {{{field_name}}}")
+            self._slots.append((conversion, spec))
+
+    @property
+    def field_count(self) -> int:
+        """Number of columns the template takes."""
+        return sum(1 for slot in self._slots if not isinstance(slot, str))
+
+    def _render_batch(self, columns: List[List[object]]) -> str:
+        rows = len(columns[0]) if columns else 0
+        width = len(self._slots)
+        # Literals are in place from the start; fields are filled in column by column
+        pieces = [slot if isinstance(slot, str) else "" for slot in self._slots] * rows
+        fields = iter(columns)
+        for position, slot in enumerate(self._slots):
+            if isinstance(slot, str):
+                continue
+            conversion, spec = slot
+            values = next(fields)  # type: Iterable[object]
+            if conversion:
+                values = map(_CONVERSIONS[conversion], values)
+            pieces[position::width] = list(map(format, values, repeat(spec, rows)) if spec else map(format, values))
+        return "".join(pieces)
+
+    def write(self, stream: TextIO, *columns: Iterable[object], batch_size: int = RENDER_BATCH) -> int:
+        """
+        Renders rows and writes them to a stream in batches.
+
+        Each batch is assembled by interleaving the template's literal text
+        with the formatted columns and joined with a single str.join.
+
+        Args:
+            stream (TextIO): Destination, e.g. io.StringIO or a buffered text file
+            *columns (Iterable[object]): One iterable of field values per template field
+            batch_size (int): Rows joined into one write
+
+        Returns:
+            int: Number of rows written
+
+        Raises:
+            ValueError: If the number of columns does not match the template or the
+                columns have different lengths
+        """
+        if len(columns) != self.field_count:
+            raise ValueError(f"Template takes {self.field_count} columns, got {len(columns)}")
+        iterators = [iter(column) for column in columns]
+        written = 0
+        while True:
+            batch = [list(islice(iterator, batch_size)) for iterator in iterators]
+            rows = len(batch[0]) if batch else 0
+            if any(len(values) != rows for values in batch):
+                raise ValueError("Template columns have different lengths")
+            if not rows:
+                return written
+            stream.write(self._render_batch(batch))
+            written += rows
@@ -0,0 +1,381 @@
+"""
+Report Formats
+
+Machine-readable report outputs: JSON Lines and CSV with one row per user
+or transaction, and a compact JSON document for report summaries.
+
+user_report_writer and transaction_report_writer prepare a report in any
+of OUTPUT_FORMATS (including the text reports of services.report_service)
+as a function that writes it to a stream; the summaries are built from
+the same aggregate as the text reports.
+
+Rows are streamed to the output in batches and never turned into dicts:
+each field is serialized column by column with C-level functions
+(json's string encoder, repr, datetime.isoformat) and interleaved into a
+precompiled RowTemplate, or zipped into rows for csv.writer.writerows.
+JSON Lines output is equal to json.dumps of each row with the default
+settings, and transaction CSV output is the import/export format, so
+the files can be read back with import_transactions.
+"""
+
+import csv
+import json
+from datetime import datetime
+from functools import partial
+from itertools import tee
+from json.encoder import encode_basestring_ascii
+from operator import attrgetter
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Mapping, Optional, Sequence, TextIO
+
+from models.transaction import Transaction, transaction_descriptions
+from models.user import User
+from models.validation import validate_users
+from services.import_service import CSV_FIELDS
+from services.rendering import RowTemplate
+from services.report_service import (
+    TEXT_FORMAT,
+    generate_transaction_summary,
+    generate_user_report,
+    summary_aggregate,
+    write_user_report,
+)
+
+if TYPE_CHECKING:
+    from services.anomaly import Anomaly
+    from services.currency import RateTable
+    from services.recurring import RecurringSeries
+
+OUTPUT_FORMATS = (TEXT_FORMAT, "json", "jsonl", "csv")
+
+USER_FIELDS = ["user_id", "username", "email", "first_name", "last_name", "is_active", "created_at",
+               "email_valid"]
+TRANSACTION_FIELDS = CSV_FIELDS
+
+_JSON_BOOLEANS = {True: "true", False: "false"}
+# repr of non-finite floats -> the tokens json.dumps writes for them
+_JSON_FLOATS = {"nan": "NaN", "inf": "Infinity", "-inf": "-Infinity"}
+
+
+def _jsonl_template(fields: Sequence[str]) -> RowTemplate:
+    """Compiles a JSON object row template with one pre-serialized value per field."""
+    # Field names are plain identifiers, so they need no brace escaping
+    members = ", ".join(f"{encode_basestring_ascii(field)}: {{}}" for field in fields)
+    return RowTemplate("{{" + members + "}}\n")
+
+
+_USER_JSONL = _jsonl_template(USER_FIELDS)
+_TRANSACTION_JSONL = _jsonl_template(TRANSACTION_FIELDS)
+
+
+def check_output_format(output_format: str) -> None:
+    """
+    Checks that an output format is supported.
+
+    Args:
+        output_format (str): One of OUTPUT_FORMATS
+
+    Raises:
+        ValueError: If the format is unknown
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format {output_format!r}; expected one of {', '.join(OUTPUT_FORMATS)}")
+
+
+def _json_numbers(values: Iterable[float]) -> Iterable[str]:
+    """Numbers as json.dumps writes them, without calling back into Python per value."""
+    texts, defaults = tee(map(repr, values))
+    return map(_JSON_FLOATS.get, texts, defaults)
+
+
+def _user_columns(users: Sequence[User], email_valid: bytes) -> List[Iterable[object]]:
+    """USER_FIELDS columns of users, before serialization."""
+    return [
+        map(attrgetter("user_id"), users),
+        map(attrgetter("username"), users),
+        map(attrgetter("email"), users),
+        map(attrgetter("first_name"), users),
+        map(attrgetter("last_name"), users),
+        map(bool, map(attrgetter("is_active"), users)),
+        map(datetime.isoformat, map(attrgetter("created_at"), users)),
+        map(bool, email_valid),
+    ]
+
+
+def _transaction_columns(transactions: Sequence[Transaction],
+                         escape: Optional[Callable[[str], str]] = None) -> List[Iterable[object]]:
+    """TRANSACTION_FIELDS columns of transactions, before serialization (except escaped descriptions)."""
+    return [
+        map(attrgetter("transaction_id"), transactions),
+        map(attrgetter("user_id"), transactions),
+        map(attrgetter("amount"), transactions),
+        # The enums' plain _value_ strings: reading .value runs Python code
+        map(attrgetter("transaction_type._value_"), transactions),
+        map(attrgetter("status._value_"), transactions),
+        # Decoded and escaped once per distinct description
+        transaction_descriptions(transactions, escape),
+        map(datetime.isoformat, map(attrgetter("created_at"), transactions)),
+        map(attrgetter("currency"), transactions),
+    ]
+
+
+def write_users_jsonl(users: Sequence[User], email_valid: bytes, stream: TextIO) -> int:
+    """
+    Writes one JSON object per user.
+
+    Args:
+        users (Sequence[User]): The users
+        email_valid (bytes): Email validation mask, e.g. validate_users(users).mask
+        stream (TextIO): Destination
+
+    Returns:
+        int: Number of rows written
+    """
+    ids, usernames, emails, first_names, last_names, active, created, valid = _user_columns(users, email_valid)
+    return _USER_JSONL.write(
+        stream,
+        ids,
+        map(encode_basestring_ascii, usernames),
+        map(encode_basestring_ascii, emails),
+        map(encode_basestring_ascii, first_names),
+        map(encode_basestring_ascii, last_names),
+        map(_JSON_BOOLEANS.__getitem__, active),
+        map(encode_basestring_ascii, created),
+        map(_JSON_BOOLEANS.__getitem__, valid),
+    )
+
+
+def write_users_csv(users: Sequence[User], email_valid: bytes, stream: TextIO) -> int:
+    """
+    Writes a CSV header and one row per user.
+
+    Args:
+        users (Sequence[User]): The users
+        email_valid (bytes): Email validation mask, e.g. validate_users(users).mask
+        stream (TextIO): Destination, opened with newline=""
+
+    Returns:
+        int: Number of rows written
+    """
+    columns = _user_columns(users, email_valid)
+    columns[5] = map(_JSON_BOOLEANS.__getitem__, columns[5])
+    columns[7] = map(_JSON_BOOLEANS.__getitem__, columns[7])
+    writer = csv.writer(stream)
+    writer.writerow(USER_FIELDS)
+    writer.writerows(zip(*columns))
+    return len(users)
+
+
+def write_transactions_jsonl(transactions: Sequence[Transaction], stream: TextIO) -> int:
+    """
+    Writes one JSON object per transaction.
+
+    Args:
+        transactions (Sequence[Transaction]): The transactions
+        stream (TextIO): Destination
+
+    Returns:
+        int: Number of rows written
+    """
+    ids, user_ids, amounts, types, statuses, descriptions, created, currencies = _transaction_columns(
+        transactions, encode_basestring_ascii)
+    return _TRANSACTION_JSONL.write(
+        stream,
+        ids,
+        user_ids,
+        _json_numbers(amounts),
+        map(encode_basestring_ascii, types),
+        map(encode_basestring_ascii, statuses),
+        descriptions,
+        map(encode_basestring_ascii, created),
+        map(encode_basestring_ascii, currencies),
+    )
+
+
+def write_transactions_csv(transactions: Sequence[Transaction], stream: TextIO) -> int:
+    """
+    Writes transactions in the import/export CSV format.
+
+    Args:
+        transactions (Sequence[Transaction]): The transactions
+        stream (TextIO): Destination, opened with newline=""
+
+    Returns:
+        int: Number of rows written
+    """
+    columns = _transaction_columns(transactions)
+    columns[2] = map(repr, columns[2])
+    writer = csv.writer(stream)
+    writer.writerow(TRANSACTION_FIELDS)
+    writer.writerows(zip(*columns))
+    return len(transactions)
+
+
+def write_json_summary(summary: Mapping[str, object], stream: TextIO) -> None:
+    """
+    Writes a report summary as one compact JSON document.
+
+    Args:
+        summary (Mapping[str, object]): JSON-serializable summary, e.g. from
+            transaction_summary_data
+        stream (TextIO): Destination
+    """
+    json.dump(summary, stream, separators=(",", ":"))
+    stream.write("\n")
+
+
+def user_summary_data(users: List[User]) -> Dict[str, object]:
+    """
+    Computes the statistics of the user report as JSON-serializable data.
+
+    Args:
+        users (List[User]): List of users to summarize
+
+    Returns:
+        Dict[str, object]: User counts, the active rate in percent and the number
+            of invalid email addresses
+    """
+    total_users = len(users)
+    active_users = sum(map(bool, map(attrgetter("is_active"), users)))
+    return {
+        "total_users": total_users,
+        "active_users": active_users,
+        "inactive_users": total_users - active_users,
+        "active_rate": (active_users / total_users) * 100 if total_users else 0.0,
+        "invalid_emails": len(validate_users(users).reasons),
+    }
+
+
+def transaction_summary_data(transactions: List[Transaction],
+                             workers: Optional[int] = None,
+                             recurring: Optional[List["RecurringSeries"]] = None,
+                             anomalies: Optional[List["Anomaly"]] = None,
+                             rates: Optional["RateTable"] = None) -> Dict[str, object]:
+    """
+    Computes the statistics of the transaction summary as JSON-serializable data.
+
+    The numbers come from the same aggregate as generate_transaction_summary
+    (summary_aggregate), unrounded.
+
+    Args:
+        transactions (List[Transaction]): List of transactions to analyze
+        workers (Optional[int]): Aggregate in this many processes, each over a range of rows
+        recurring (Optional[List[RecurringSeries]]): Detected recurring series to
+            include (omitted when None)
+        anomalies (Optional[List[Anomaly]]): Flagged transactions to include
+            (omitted when None)
+        rates (Optional[RateTable]): Convert amounts into the rate table's base currency
+            before summing (needed if the transactions are in several currencies)
+
+    Returns:
+        Dict[str, object]: Counts by status and type, completed totals and their
+            currency, the IDs of the most recent transactions and the optional sections
+
+    Raises:
+        ValueError: If the transactions are in several currencies and no rates are
+            given, or a row has no rate on or before its date
+    """
+    aggregate, currency = summary_aggregate(transactions, workers, rates)
+    summary = {
+        "total_transactions": aggregate.total_count,
+        "status_counts": {status.value: count for status, count in aggregate.status_counts.items()},
+        "currency": currency,
+        "completed_total": aggregate.completed_total,
+        "completed_average": aggregate.completed_average,
+        "type_counts": {trans_type.value: count for trans_type, count in aggregate.type_counts.items()},
+        "completed_type_totals": {trans_type.value: total
+                                  for trans_type, total in aggregate.completed_type_totals.items()},
+        "recent_transaction_ids": [transactions[row].transaction_id for row in aggregate.recent_rows],
+    }  # type: Dict[str, object]
+    if recurring is not None:
+        summary["recurring"] = [{
+            "user_id": series.user_id,
+            "type": series.transaction_type.value,
+            "description": series.description,
+            "amount": series.amount,
+            "cadence": series.cadence,
+            "occurrences": series.occurrences,
+            "next_expected": series.next_expected.isoformat(),
+        } for series in recurring]
+    if anomalies is not None:
+        summary["anomalies"] = [{
+            "transaction_id": anomaly.transaction.transaction_id,
+            "user_id": anomaly.transaction.user_id,
+            "amount": anomaly.transaction.amount,
+            "currency": anomaly.transaction.currency,
+            "z_score": anomaly.z_score,
+            "usual_amount": anomaly.ewma,
+        } for anomaly in anomalies]
+    return summary
+
+
+def _write_text(content: str, stream: TextIO) -> None:
+    stream.write(content)
+
+
+def user_report_writer(users: List[User], output_format: str = TEXT_FORMAT) -> Callable[[TextIO], object]:
+    """
+    Prepares the user report in an output format for streaming.
+
+    "text" is the report of generate_user_report, "json" the compact
+    user_summary_data document, "jsonl" one JSON object per user and
+    "csv" a header and one row per user.
+
+    Args:
+        users (List[User]): List of users to include in the report
+        output_format (str): One of OUTPUT_FORMATS (default: "text")
+
+    Returns:
+        Callable[[TextIO], object]: Writes the report to a stream (CSV expects
+            newline="" streams)
+
+    Raises:
+        ValueError: If the output format is unknown
+    """
+    check_output_format(output_format)
+    if output_format == TEXT_FORMAT:
+        if not users:
+            return partial(_write_text, generate_user_report(users))
+        return partial(write_user_report, users)
+    if output_format == "json":
+        return partial(write_json_summary, user_summary_data(users))
+    writer = write_users_jsonl if output_format == "jsonl" else write_users_csv
+    return partial(writer, users, validate_users(users).mask)
+
+
+def transaction_report_writer(transactions: List[Transaction], output_format: str = TEXT_FORMAT,
+                              workers: Optional[int] = None,
+                              recurring: Optional[List["RecurringSeries"]] = None,
+                              anomalies: Optional[List["Anomaly"]] = None,
+                              rates: Optional["RateTable"] = None) -> Callable[[TextIO], object]:
+    """
+    Prepares the transaction summary in an output format for streaming.
+
+    "text" is the report of generate_transaction_summary and "json" the
+    compact transaction_summary_data document; "jsonl" (one JSON object per
+    transaction) and "csv" (the import/export format) stream the rows
+    themselves, so the summary options do not apply to them.
+
+    Args:
+        transactions (List[Transaction]): List of transactions to analyze
+        output_format (str): One of OUTPUT_FORMATS (default: "text")
+        workers (Optional[int]): Aggregate in this many processes, each over a range of rows
+        recurring (Optional[List[RecurringSeries]]): Detected recurring series to include
+        anomalies (Optional[List[Anomaly]]): Flagged transactions to include
+        rates (Optional[RateTable]): Convert amounts into the rate table's base currency
+
+    Returns:
+        Callable[[TextIO], object]: Writes the report to a stream (CSV expects
+            newline="" streams)
+
+    Raises:
+        ValueError: If the output format is unknown, the transactions are in several
+            currencies and no rates are given, or rates lack a rate needed for the conversion
+    """
+    check_output_format(output_format)
+    if output_format == TEXT_FORMAT:
+        return partial(_write_text, generate_transaction_summary(transactions, workers, recurring, anomalies, rates))
+    if output_format == "json":
+        return partial(write_json_summary,
+                       transaction_summary_data(transactions, workers, recurring, anomalies, rates))
+    writer = write_transactions_jsonl if output_format == "jsonl" else write_transactions_csv
+    return partial(writer, transactions)
@@ -0,0 +1,336 @@
+"""
+Report Server
+
+Long-running report service that keeps users, transactions and derived
+views resident in memory and serves reports and spending analyses over a
+local HTTP endpoint (stdlib http.server).
+
+Rendered outputs are cached and only rebuilt after new transactions
+arrive, so repeated dashboard requests are answered from memory.
+
+Endpoints:
+    GET  /health                  Liveness check with row counts
+    GET  /reports/users           User report (text/plain)
+    GET  /reports/transactions    Transaction summary with flagged transactions (text/plain;
+                                  409 if the transactions are in several currencies)
+    GET  /analysis                Spending analysis (JSON; 409 if the transactions are in
+                                  several currencies)
+    GET  /metrics                 Metrics registry (JSON)
+    GET  /debug/memory            Memory checkpoints and footprints of the resident data (JSON;
+                                  needs FINANCE_TRACKER_MEMORY=1)
+    POST /transactions            Add one transaction (JSON object) or several (JSON array);
+                                  the response lists the IDs flagged as anomalous (bodies
+                                  over MAX_BODY_BYTES are refused with 413)
+"""
+
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Optional, Tuple
+
+from models.transaction import Transaction
+from services.aggregation import single_currency
+from services.data_context import DataContext
+from services.import_service import parse_transaction_row
+from services.report_service import generate_transaction_summary, generate_user_report
+from utils.metrics import get_registry
+
+if TYPE_CHECKING:
+    from utils.memory import MemoryDiagnostics
+
+logger = logging.getLogger(__name__)
+
+_metrics = get_registry()
+_requests = _metrics.counter("report_server.requests", "HTTP requests handled")
+_request_errors = _metrics.counter("report_server.request_errors", "HTTP requests answered with an error")
+_request_latency = _metrics.histogram("report_server.request_seconds", "Time spent handling a request")
+_cache_misses = _metrics.counter("report_server.cache_misses", "Outputs rebuilt after a data change")
+_ingested = _metrics.counter("report_server.transactions_ingested", "Transactions added through the server")
+
+# Largest request body read into memory
+MAX_BODY_BYTES = 16 << 20
+
+
+class WarmReportState:
+    """
+    Resident application state with cached report outputs.
+
+    Every output is cached together with the data version it was built
+    from. Adding transactions bumps the version, so outputs are rebuilt
+    lazily on their next request.
+    """
+
+    def __init__(self, context: Optional[DataContext] = None):
+        """
+        Initialize a new WarmReportState instance.
+
+        Args:
+            context (Optional[DataContext]): Data to serve (sample data is loaded if omitted)
+        """
+        self.context = context or DataContext()
+        self._version = 0
+        self._cache = {}  # type: Dict[str, Tuple[int, object]]
+        self._lock = threading.RLock()
+
+    @property
+    def version(self) -> int:
+        """Data version, incremented on every change."""
+        return self._version
+
+    def _cached(self, name: str, build: Callable[[], object]):
+        with self._lock:
+            entry = self._cache.get(name)
+            if entry is not None and entry[0] == self._version:
+                return entry[1]
+            _cache_misses.inc()
+            value = build()
+            self._cache[name] = (self._version, value)
+            return value
+
+    def warm(self) -> None:
+        """
+        Loads the data and builds every cached output ahead of the first request.
+        """
+        self.user_report()
+        self.transaction_summary()
+        self.analysis()
+
+    def user_report(self) -> str:
+        """
+        Returns the user report.
+
+        Returns:
+            str: The cached or freshly generated report
+        """
+        return self._cached("user_report", lambda: generate_user_report(self.context.users))
+
+    def transaction_summary(self) -> str:
+        """
+        Returns the transaction summary report.
+
+        Returns:
+            str: The cached or freshly generated report
+        """
+        def build():
+            # The resident aggregate is merged incrementally, unlike a fresh summary_aggregate()
+            context = self.context
+            aggregated = (context.aggregate(), single_currency(context.currencies))
+            return generate_transaction_summary(context.transactions, anomalies=context.anomalies,
+                                                aggregated=aggregated)
+        return self._cached("transaction_summary", build)
+
+    def analysis(self) -> dict:
+        """
+        Returns the spending analysis.
+
+        Returns:
+            dict: The cached or freshly computed analysis
+        """
+        return self._cached("analysis", self.context.spending_analysis)
+
+    def add_transactions(self, transactions: Iterable[Transaction]) -> int:
+        """
+        Adds transactions and invalidates the cached outputs.
+
+        Args:
+            transactions (Iterable[Transaction]): Transactions to add
+
+        Returns:
+            int: Number of transactions added
+        """
+        with self._lock:
+            count = self.context.add_transactions(transactions)
+            self._version += 1
+        _ingested.inc(count)
+        return count
+
+    def memory_diagnostics(self, memory: "MemoryDiagnostics") -> Dict[str, object]:
+        """
+        Estimates the footprint of the resident data and cached outputs.
+        
+        Args:
+            memory (MemoryDiagnostics): Enabled diagnostics to record the footprints in
+        
+        Returns:
+            Dict[str, object]: The diagnostics document
+        """
+        with self._lock:
+            reports = {name: value for name, (_, value) in self._cache.items() if isinstance(value, str)}
+            self.context.record_memory_footprints(memory, reports)
+        return memory.to_dict()
+
+    def health(self) -> Dict[str, object]:
+        """
+        Returns a small status document.
+
+        Returns:
+            Dict[str, object]: Status, row counts and data version
+        """
+        return {
+            "status": "ok",
+            "users": len(self.context.users),
+            "transactions": len(self.context.transactions),
+            "version": self._version,
+        }
+
+
+class ReportRequestHandler(BaseHTTPRequestHandler):
+    """
+    HTTP handler serving a WarmReportState attached to the server.
+    """
+
+    server_version = "FinanceTrackerReportServer/1.0"
+
+    @property
+    def state(self) -> WarmReportState:
+        """The state shared by all requests."""
+        return self.server.state
+
+    def do_GET(self):
+        """Serves reports, analyses and metrics."""
+        routes = {
+            "/health": lambda: self._send_json(self.state.health()),
+            "/reports/users": lambda: self._send_text(self.state.user_report()),
+            "/reports/transactions": self._send_summary,
+            "/analysis": self._send_analysis,
+            "/metrics": lambda: self._send_json(_metrics.to_dict()),
+            "/debug/memory": self._send_memory,
+        }
+        self._dispatch(routes)
+
+    def do_POST(self):
+        """Accepts new transactions."""
+        self._dispatch({"/transactions": self._post_transactions})
+
+    def _dispatch(self, routes):
+        start = time.perf_counter()
+        _requests.inc()
+        route = routes.get(self.path.split("?", 1)[0].rstrip("/") or "/")
+        try:
+            if route is None:
+                self._send_error(404, f"Unknown path: {self.path}")
+            else:
+                route()
+        except Exception:
+            logger.exception("Error handling %s %s", self.command, self.path)
+            self._send_error(500, "Internal server error")
+        finally:
+            _request_latency.observe(time.perf_counter() - start)
+
+    def _send_summary(self):
+        try:
+            summary = self.state.transaction_summary()
+        except ValueError as e:
+            # Mixed currencies: the server has no rates to total them with
+            self._send_error(409, str(e))
+            return
+        self._send_text(summary)
+
+    def _send_analysis(self):
+        try:
+            analysis = self.state.analysis()
+        except ValueError as e:
+            self._send_error(409, str(e))
+            return
+        self._send_json(analysis)
+
+    def _send_memory(self):
+        from utils.memory import MEMORY_ENV_VAR, get_memory_diagnostics
+        memory = get_memory_diagnostics()
+        if not memory.enabled:
+            self._send_error(404, f"Memory diagnostics are disabled; set {MEMORY_ENV_VAR}=1")
+            return
+        self._send_json(self.state.memory_diagnostics(memory))
+
+    def _post_transactions(self):
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            if length < 0:
+                raise ValueError(f"Invalid Content-Length: {length}")
+            if length > MAX_BODY_BYTES:
+                # The body is left unread, so the connection cannot be reused
+                self.close_connection = True
+                self._send_error(413, f"Request body of {length} bytes exceeds {MAX_BODY_BYTES} bytes")
+                return
+            payload = json.loads(self.rfile.read(length) or b"null")
+            rows = payload if isinstance(payload, list) else [payload]
+            transactions = [parse_transaction_row(_as_row(row)) for row in rows]
+        except ValueError as e:
+            self._send_error(400, str(e))
+            return
+        added = self.state.add_transactions(transactions)
+        new = {id(transaction) for transaction in transactions}
+        flagged = [anomaly.transaction.transaction_id for anomaly in self.state.context.anomalies
+                   if id(anomaly.transaction) in new]
+        self._send_json({"added": added, "flagged": flagged, "version": self.state.version}, status=201)
+
+    def _send_text(self, text: str, status: int = 200):
+        self._send(status, "text/plain; charset=utf-8", text.encode("utf-8"))
+
+    def _send_json(self, document, status: int = 200):
+        self._send(status, "application/json", json.dumps(document).encode("utf-8"))
+
+    def _send_error(self, status: int, message: str):
+        _request_errors.inc()
+        self._send_json({"error": message}, status=status)
+
+    def _send(self, status: int, content_type: str, body: bytes):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """Routes access logs through the logging module instead of stderr."""
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+
+def _as_row(row) -> Dict[str, str]:
+    """Converts a JSON transaction object to the string row parse_transaction_row expects."""
+    if not isinstance(row, dict):
+        raise ValueError(f"Expected a JSON object, got {type(row).__name__}")
+    return {key: "" if value is None else str(value) for key, value in row.items()}
+
+
+def create_server(state: WarmReportState, host: str = "127.0.0.1",
+                  port: int = 8080) -> ThreadingHTTPServer:
+    """
+    Creates a threaded HTTP server for a report state.
+
+    Args:
+        state (WarmReportState): The state to serve
+        host (str): Interface to bind (default: localhost only)
+        port (int): Port to bind (0 picks a free port)
+
+    Returns:
+        ThreadingHTTPServer: The bound, not yet running server
+    """
+    server = ThreadingHTTPServer((host, port), ReportRequestHandler)
+    server.daemon_threads = True
+    server.state = state
+    return server
+
+
+def serve(host: str = "127.0.0.1", port: int = 8080,
+          transactions: Optional[List[Transaction]] = None) -> None:
+    """
+    Loads and warms the data, then serves requests until interrupted.
+
+    Args:
+        host (str): Interface to bind (default: localhost only)
+        port (int): Port to bind
+        transactions (Optional[List[Transaction]]): Transactions to serve (sample data if omitted)
+    """
+    state = WarmReportState(DataContext(transactions=transactions))
+    state.warm()
+    server = create_server(state, host, port)
+    logger.info("Serving reports on http://%s:%d", *server.server_address[:2])
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
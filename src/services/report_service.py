@@ -3,37 +3,88 @@ Report Service
 
 Generates various types of reports using data from the data service
 and utility functions for calculations and file operations.
+
+Row layouts are compiled once at import into RowTemplates and rendered
+in batches into a stream; dates go through a shared DayFormatter. The
+save_*_to_file functions also stream the machine-readable formats of
+services.report_formats, which is imported only when a report is saved.
 """
 
-from typing import List
+import io
+from operator import attrgetter
+from typing import TYPE_CHECKING, Callable, Iterable, List, Optional, TextIO, Tuple
 from datetime import datetime
 
 from models.user import User
-from models.transaction import Transaction, TransactionStatus
+from models.transaction import (
+    DEFAULT_CURRENCY,
+    Transaction,
+    TransactionStatus,
+    TransactionType,
+    format_amount,
+)
+from models.validation import validate_users
+from services.aggregation import (
+    TransactionAggregate,
+    TransactionColumns,
+    aggregate_sharded,
+    aggregate_transactions,
+    single_currency,
+)
+from services.rendering import DayFormatter, RowTemplate
 from utils.math_ops import calculate_average, add
-from utils.file_ops import write_file
+from utils.file_ops import write_stream
+from utils.profiling import profiled
 
+if TYPE_CHECKING:
+    from services.anomaly import Anomaly
+    from services.currency import RateTable
+    from services.recurring import RecurringSeries
 
-def generate_user_report(users: List[User]) -> str:
+
+_USER_ROW = RowTemplate(
+    "\nID: {} | {} {}\n"
+    "  Username: {}\n"
+    "  Email: {}\n"
+    "  Status: {}\n"
+    "  Created: {}\n"
+    "  Email Valid: {}\n"
+)
+_RECENT_ROW = RowTemplate("\n  {} {} - {} (User {}) - {}")
+_RECURRING_ROW = RowTemplate("\n  {} - ${:.2f} {} (User {}, {}x) - next {}")
+_FLAGGED_ROW = RowTemplate("\n  ! {} - {} (User {}) - {} - usually {}")
+
+_ACTIVE_TEXT = {True: "Active", False: "Inactive"}
+_YES_NO = ("No", "Yes")
+_STATUS_INDICATORS = {
+    TransactionStatus.COMPLETED: "✓",
+    TransactionStatus.PENDING: "⏳",
+    TransactionStatus.FAILED: "✗",
+    TransactionStatus.CANCELLED: "✗",
+}
+_TYPE_TITLES = {trans_type: trans_type.value.title() for trans_type in TransactionType}
+
+_days = DayFormatter()
+
+# Output format of the human-readable reports (see report_formats.OUTPUT_FORMATS)
+TEXT_FORMAT = "text"
+
+
+def write_user_report(users: List[User], stream: TextIO) -> None:
     """
-    Generates a comprehensive report about users in the system.
+    Renders the user report into a stream, user details in batches.
     
     Args:
-        users (List[User]): List of users to include in the report
-    
-    Returns:
-        str: A formatted report containing user statistics and details
+        users (List[User]): Users to include in the report (at least one)
+        stream (TextIO): Destination, e.g. io.StringIO or a buffered text file
     """
-    if not users:
-        return "No users found in the system."
-    
     # Calculate statistics
     total_users = len(users)
-    active_users = len([user for user in users if user.is_active])
+    active = list(map(bool, map(attrgetter("is_active"), users)))
+    active_users = sum(active)
     inactive_users = total_users - active_users
     
-    # Build the report
-    report_lines = [
+    stream.write("\n".join([
         "=" * 50,
         "USER REPORT",
         "=" * 50,
@@ -47,56 +98,124 @@ def generate_user_report(users: List[User]) -> str:
         "",
         "USER DETAILS:",
         "-" * 30
-    ]
+    ]))
     
     # Add individual user details
-    for user in users:
-        report_lines.extend([
-            f"ID: {user.user_id} | {user.get_full_name()}",
-            f"  Username: {user.username}",
-            f"  Email: {user.email}",
-            f"  Status: {'Active' if user.is_active else 'Inactive'}",
-            f"  Created: {user.created_at.strftime('%Y-%m-%d')}",
-            f"  Email Valid: {'Yes' if user.is_valid_email() else 'No'}",
-            ""
-        ])
+    email_valid = validate_users(users).mask
+    _USER_ROW.write(
+        stream,
+        map(attrgetter("user_id"), users),
+        map(attrgetter("first_name"), users),
+        map(attrgetter("last_name"), users),
+        map(attrgetter("username"), users),
+        map(attrgetter("email"), users),
+        map(_ACTIVE_TEXT.__getitem__, active),
+        _days.format_all(map(attrgetter("created_at"), users)),
+        map(_YES_NO.__getitem__, email_valid),
+    )
+
+
+@profiled("generate_user_report", rows="arg")
+def generate_user_report(users: List[User]) -> str:
+    """
+    Generates a comprehensive report about users in the system.
+    
+    Args:
+        users (List[User]): List of users to include in the report
+    
+    Returns:
+        str: A formatted report containing user statistics and details
+    """
+    if not users:
+        return "No users found in the system."
+    
+    buffer = io.StringIO()
+    write_user_report(users, buffer)
+    return buffer.getvalue()
+
+
+def _transaction_columns(transactions: List[Transaction]) -> Tuple[Iterable[str], ...]:
+    """Type title, formatted amount, user and day columns of transaction rows."""
+    return (
+        map(_TYPE_TITLES.__getitem__, map(attrgetter("transaction_type"), transactions)),
+        map(format_amount, map(attrgetter("amount"), transactions), map(attrgetter("currency"), transactions)),
+        map(attrgetter("user_id"), transactions),
+        _days.format_all(map(attrgetter("created_at"), transactions)),
+    )
+
+
+def summary_aggregate(transactions: List[Transaction], workers: Optional[int] = None,
+                      rates: Optional["RateTable"] = None) -> Tuple[TransactionAggregate, str]:
+    """
+    Aggregates transactions for the transaction summary.
+    
+    Args:
+        transactions (List[Transaction]): List of transactions to analyze
+        workers (Optional[int]): Aggregate in this many processes, each over a range of rows
+        rates (Optional[RateTable]): Convert amounts into the rate table's base currency
     
-    return "\n".join(report_lines)
+    Returns:
+        Tuple[TransactionAggregate, str]: The statistics every summary format is built
+            from, and the currency of their amounts
+    
+    Raises:
+        ValueError: If the transactions are in several currencies and no rates are
+            given, or a row has no rate on or before its date
+    """
+    columns = TransactionColumns.from_transactions(transactions)
+    if rates is not None:
+        columns = rates.convert_columns(columns)
+        currency = rates.base
+    else:
+        # Amounts in different currencies cannot be added up as they are
+        currency = single_currency(columns.used_currencies())
+    if workers and workers > 1:
+        return aggregate_sharded(columns, workers), currency
+    return aggregate_transactions(columns), currency
 
 
-def generate_transaction_summary(transactions: List[Transaction]) -> str:
+@profiled("generate_transaction_summary", rows="arg")
+def generate_transaction_summary(transactions: List[Transaction],
+                                 workers: Optional[int] = None,
+                                 recurring: Optional[List["RecurringSeries"]] = None,
+                                 anomalies: Optional[List["Anomaly"]] = None,
+                                 rates: Optional["RateTable"] = None,
+                                 aggregated: Optional[Tuple[TransactionAggregate, str]] = None) -> str:
     """
     Generates a summary report of transaction data with statistics.
     
     Args:
         transactions (List[Transaction]): List of transactions to analyze
+        workers (Optional[int]): Aggregate in this many processes, each over a range of rows
+            (None or 1 aggregates on the current core)
+        recurring (Optional[List[RecurringSeries]]): Detected recurring series to list
+            in a RECURRING PAYMENTS section (omitted when None)
+        anomalies (Optional[List[Anomaly]]): Flagged transactions to list in a
+            FLAGGED TRANSACTIONS section (omitted when None)
+        rates (Optional[RateTable]): Convert amounts into the rate table's base currency
+            before summing (None sums the amounts as they are, which needs them to be
+            in one currency)
+        aggregated (Optional[Tuple[TransactionAggregate, str]]): The aggregate of the
+            transactions and its currency, as returned by summary_aggregate, when it is
+            already known (workers and rates are then not used)
     
     Returns:
         str: A formatted summary report of transaction statistics
+    
+    Raises:
+        ValueError: If the transactions are in several currencies and no rates are
+            given, or a row has no rate on or before its date
     """
     if not transactions:
         return "No transactions found in the system."
     
     # Calculate statistics
-    total_transactions = len(transactions)
-    completed_transactions = [t for t in transactions if t.status == TransactionStatus.COMPLETED]
-    pending_transactions = [t for t in transactions if t.status == TransactionStatus.PENDING]
-    failed_transactions = [t for t in transactions if t.status == TransactionStatus.FAILED]
+    aggregate, currency = aggregated or summary_aggregate(transactions, workers, rates)
+    total_transactions = aggregate.total_count
     
     # Calculate amounts
-    total_amount = sum(t.amount for t in completed_transactions)
-    if completed_transactions:
-        average_amount = calculate_average([t.amount for t in completed_transactions])
-    else:
-        average_amount = 0.0
-    
-    # Group by transaction type
-    transaction_types = {}
-    for transaction in transactions:
-        trans_type = transaction.transaction_type.value
-        if trans_type not in transaction_types:
-            transaction_types[trans_type] = 0
-        transaction_types[trans_type] += 1
+    total_amount = aggregate.completed_total
+    average_amount = aggregate.completed_average
     
     # Build the report
     report_lines = [
@@ -107,68 +226,129 @@ def generate_transaction_summary(transactions: List[Transaction]) -> str:
         "",
         "TRANSACTION STATISTICS:",
         f"  Total Transactions: {total_transactions}",
-        f"  Completed: {len(completed_transactions)}",
-        f"  Pending: {len(pending_transactions)}",
-        f"  Failed: {len(failed_transactions)}",
+        f"  Completed: {aggregate.status_counts[TransactionStatus.COMPLETED]}",
+        f"  Pending: {aggregate.status_counts[TransactionStatus.PENDING]}",
+        f"  Failed: {aggregate.status_counts[TransactionStatus.FAILED]}",
         "",
         "FINANCIAL SUMMARY:",
-        f"  Total Completed Amount: ${total_amount:.2f}",
-        f"  Average Transaction: ${average_amount:.2f}",
+    ]
+    if rates is None and currency == DEFAULT_CURRENCY:
+        report_lines.extend([
+            f"  Total Completed Amount: ${total_amount:.2f}",
+            f"  Average Transaction: ${average_amount:.2f}",
+        ])
+    else:
+        report_lines.extend([
+            f"  Currency: {currency}",
+            f"  Total Completed Amount: {format_amount(total_amount, currency)}",
+            f"  Average Transaction: {format_amount(average_amount, currency)}",
+        ])
+    report_lines.extend([
         "",
         "BY TRANSACTION TYPE:",
         "-" * 25
-    ]
+    ])
     
     # Add transaction type breakdown
-    for trans_type, count in transaction_types.items():
+    for trans_type, count in aggregate.type_counts.items():
         percentage = (count / total_transactions) * 100
-        report_lines.append(f"  {trans_type.title()}: {count} ({percentage:.1f}%)")
+        report_lines.append(f"  {trans_type.value.title()}: {count} ({percentage:.1f}%)")
     
     report_lines.extend([
         "",
         "RECENT TRANSACTIONS:",
         "-" * 25
     ])
+    buffer = io.StringIO()
+    buffer.write("\n".join(report_lines))
     
     # Add recent transactions (sorted by creation date)
-    recent_transactions = sorted(transactions, key=lambda t: t.created_at, reverse=True)[:5]
-    for transaction in recent_transactions:
-        status_indicator = "✓" if transaction.is_completed() else "⏳" if transaction.status == TransactionStatus.PENDING else "✗"
-        report_lines.append(
-            f"  {status_indicator} {transaction.transaction_type.value.title()} - "
-            f"${transaction.amount:.2f} (User {transaction.user_id}) - "
-            f"{transaction.created_at.strftime('%Y-%m-%d')}"
+    recent_transactions = [transactions[row] for row in aggregate.recent_rows]
+    _RECENT_ROW.write(buffer,
+                      map(_STATUS_INDICATORS.__getitem__, map(attrgetter("status"), recent_transactions)),
+                      *_transaction_columns(recent_transactions))
+    
+    if recurring is not None:
+        buffer.write("\n\nRECURRING PAYMENTS:\n" + "-" * 25)
+        _RECURRING_ROW.write(
+            buffer,
+            map(attrgetter("description"), recurring),
+            map(attrgetter("amount"), recurring),
+            map(attrgetter("cadence"), recurring),
+            map(attrgetter("user_id"), recurring),
+            map(attrgetter("occurrences"), recurring),
+            _days.format_all(map(attrgetter("next_expected"), recurring)),
         )
+        if not recurring:
+            buffer.write("\n  None detected")
+    
+    if anomalies is not None:
+        buffer.write("\n\nFLAGGED TRANSACTIONS:\n" + "-" * 25)
+        flagged = [anomaly.transaction for anomaly in anomalies]
+        _FLAGGED_ROW.write(buffer, *_transaction_columns(flagged),
+                           map(format_amount, map(attrgetter("ewma"), anomalies),
+                               map(attrgetter("currency"), flagged)))
+        if not anomalies:
+            buffer.write("\n  None flagged")
+    
+    return buffer.getvalue()
+
+
+def save_report(filename: str, render: Callable[[TextIO], object], output_format: str = TEXT_FORMAT) -> bool:
+    """
+    Streams a prepared report to a file.
     
-    return "\n".join(report_lines)
+    Args:
+        filename (str): Name of the file to save the report to
+        render (Callable[[TextIO], object]): From report_formats.user_report_writer
+            or report_formats.transaction_report_writer
+        output_format (str): The format render writes; CSV files are opened
+            without newline translation
+    
+    Returns:
+        bool: True if the report was saved successfully, False otherwise
+    """
+    return write_stream(filename, render, newline="" if output_format == "csv" else None)
 
 
-def save_user_report_to_file(users: List[User], filename: str = "user_report.txt") -> bool:
+def save_user_report_to_file(users: List[User], filename: str = "user_report.txt",
+                             output_format: str = TEXT_FORMAT) -> bool:
     """
     Generates a user report and saves it to a file.
     
     Args:
         users (List[User]): List of users to include in the report
         filename (str): Name of the file to save the report to
+        output_format (str): "text", "json", "jsonl" or "csv" (see
+            report_formats.user_report_writer)
     
     Returns:
         bool: True if the report was saved successfully, False otherwise
+    
+    Raises:
+        ValueError: If the output format is unknown
     """
-    report_content = generate_user_report(users)
-    return write_file(filename, report_content)
+    from services.report_formats import user_report_writer
+    return save_report(filename, user_report_writer(users, output_format), output_format)
 
 
 def save_transaction_summary_to_file(transactions: List[Transaction], 
-                                   filename: str = "transaction_summary.txt") -> bool:
+                                   filename: str = "transaction_summary.txt",
+                                   output_format: str = TEXT_FORMAT) -> bool:
     """
     Generates a transaction summary and saves it to a file.
     
     Args:
         transactions (List[Transaction]): List of transactions to analyze
         filename (str): Name of the file to save the summary to
+        output_format (str): "text", "json", "jsonl" or "csv" (see
+            report_formats.transaction_report_writer)
     
     Returns:
         bool: True if the summary was saved successfully, False otherwise
+    
+    Raises:
+        ValueError: If the output format is unknown
     """
-    summary_content = generate_transaction_summary(transactions)
-    return write_file(filename, summary_content)
\ No newline at end of file
+    from services.report_formats import transaction_report_writer
+    return save_report(filename, transaction_report_writer(transactions, output_format), output_format)
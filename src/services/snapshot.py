@@ -0,0 +1,413 @@
+"""
+Snapshot Service
+
+Saves the in-memory state (users, transactions and their running
+summaries) to a binary snapshot file and restores it at startup.
+
+A snapshot is a header, a section table and the section payloads. The
+header and table are covered by a CRC-32 checksum and every section has
+its own, so a damaged file is detected before it is used. Transactions
+are stored column by column as raw typed arrays, so the numeric columns
+load with a single copy each; strings are stored UTF-8 encoded and
+NUL-separated. The aggregate partial and per-category totals are stored
+as well, so aggregates and analyses are available without rebuilding
+anything.
+
+Opening a snapshot only reads the header and section table. Sections are
+read and checked when first used: aggregates come from the summary
+section, TransactionColumns from the numeric columns, and Transaction
+objects are only built when something needs them. Changes made after the
+snapshot are kept in a write-ahead log (see services.wal) and replayed on
+top of it; compact_log() folds the log into a new snapshot and trims it.
+"""
+
+import json
+import os
+import struct
+import sys
+import zlib
+from array import array
+from datetime import datetime
+from itertools import compress
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from models.transaction import Transaction, transaction_descriptions
+from models.user import User
+from services.aggregation import (
+    MAX_BYTE_CURRENCIES,
+    STATUS_ORDER,
+    TYPE_ORDER,
+    Partial,
+    TransactionAggregate,
+    TransactionColumns,
+    aggregate_partial,
+    datetime_to_micros,
+    micros_to_datetime,
+)
+from services.data_context import DataContext
+from services.wal import WriteAheadLog, read_log, replay
+from utils.file_ops import write_file_atomic
+from utils.profiling import profiled
+
+SNAPSHOT_MAGIC = b"FTSNAP01"
+SNAPSHOT_VERSION = 1
+
+_HEADER = struct.Struct(">8sHHI")  # magic, format version, byte order of the arrays, section count
+_SECTION = struct.Struct(">16sQQI")  # name, offset, length, CRC-32
+_CHECKSUM = struct.Struct(">I")
+
+_LITTLE_ENDIAN = 0
+_BIG_ENDIAN = 1
+_NATIVE_ORDER = _LITTLE_ENDIAN if sys.byteorder == "little" else _BIG_ENDIAN
+
+_STATUS_BITS = 2
+
+
+def _pack_strings(values: List[str]) -> bytes:
+    """Joins strings with NUL separators (strings must not contain NUL)."""
+    joined = "\x00".join(values)
+    if joined.count("\x00") != max(len(values) - 1, 0):
+        raise ValueError("Strings containing NUL characters cannot be stored in a snapshot")
+    return joined.encode("utf-8")
+
+
+def _unpack_strings(data: bytes, count: int) -> List[str]:
+    return data.decode("utf-8").split("\x00") if count else []
+
+
+def _dictionary_encode(values: List[Optional[str]]) -> Tuple[array, List[Optional[str]]]:
+    """Encodes repetitive values as codes into a table of distinct values."""
+    table = {}  # type: Dict[Optional[str], int]
+    codes = array("I", [table.setdefault(value, len(table)) for value in values])
+    return codes, list(table)
+
+
+def build_snapshot(context: DataContext, wal_seq: int = 0) -> bytes:
+    """
+    Serializes the state of a data context.
+
+    Args:
+        context (DataContext): The state to save
+        wal_seq (int): Sequence number of the last write-ahead log record the state contains
+
+    Returns:
+        bytes: The snapshot file contents
+
+    Raises:
+        ValueError: If a string contains a NUL character
+    """
+    users = context.users
+    transactions = context.transactions
+    columns = context.columns
+    categories = context.completed_by_category
+    category_codes, category_table = _dictionary_encode([t.category for t in transactions])
+
+    meta = {
+        "created_at": datetime.now().isoformat(),
+        "users": len(users),
+        "transactions": len(transactions),
+        "wal_seq": wal_seq,
+        "currencies": list(columns.currencies),
+        "categories": category_table,
+    }
+    summary = {
+        "partial": aggregate_partial(columns),
+        "completed_by_category": list(categories.items()),
+    }
+    sections = [
+        ("meta", json.dumps(meta).encode("utf-8")),
+        ("summary", json.dumps(summary).encode("utf-8")),
+        ("user.ids", array("q", [u.user_id for u in users]).tobytes()),
+        ("user.created", array("q", [datetime_to_micros(u.created_at) for u in users]).tobytes()),
+        ("user.active", bytes(bool(u.is_active) for u in users)),
+        ("user.text", _pack_strings([value for u in users
+                                     for value in (u.username, u.email, u.first_name, u.last_name)])),
+        ("tx.ids", columns.transaction_ids.tobytes()),
+        ("tx.users", columns.user_ids.tobytes()),
+        ("tx.amounts", columns.amounts.tobytes()),
+        ("tx.kinds", bytes(columns.kinds)),
+        ("tx.created", columns.created_at.tobytes()),
+        ("tx.currency", bytes(columns.currency_codes)),
+        ("tx.category", category_codes.tobytes()),
+        ("tx.description", _pack_strings(transaction_descriptions(transactions))),
+    ]
+
+    header_size = _HEADER.size + _SECTION.size * len(sections) + _CHECKSUM.size
+    table = [_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, _NATIVE_ORDER, len(sections))]
+    offset = header_size
+    for name, payload in sections:
+        table.append(_SECTION.pack(name.encode("ascii"), offset, len(payload), zlib.crc32(payload)))
+        offset += len(payload)
+    head = b"".join(table)
+    return b"".join([head, _CHECKSUM.pack(zlib.crc32(head))] + [payload for _, payload in sections])
+
+
+@profiled("save_snapshot")
+def save_snapshot(context: DataContext, file_path: str, wal_seq: int = 0) -> bool:
+    """
+    Saves the state of a data context to a snapshot file, atomically.
+
+    Args:
+        context (DataContext): The state to save
+        file_path (str): The snapshot file
+        wal_seq (int): Sequence number of the last write-ahead log record the state contains
+
+    Returns:
+        bool: True if the snapshot was written successfully, False otherwise
+
+    Raises:
+        ValueError: If a string contains a NUL character
+    """
+    return write_file_atomic(file_path, build_snapshot(context, wal_seq))
+
+
+class Snapshot:
+    """
+    A snapshot file opened for lazy, section-by-section reading.
+    """
+
+    def __init__(self, file_path: str):
+        """
+        Opens a snapshot and checks its header and section table.
+
+        Args:
+            file_path (str): The snapshot file
+
+        Raises:
+            ValueError: If the file is not a snapshot, has an unsupported version or is damaged
+            OSError: If the file cannot be read
+        """
+        self.file_path = file_path
+        with open(file_path, "rb") as file:
+            header = file.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                raise ValueError(f"Not a snapshot file: {file_path}")
+            magic, version, byte_order, count = _HEADER.unpack(header)
+            if magic != SNAPSHOT_MAGIC:
+                raise ValueError(f"Not a snapshot file: {file_path}")
+            if version != SNAPSHOT_VERSION:
+                raise ValueError(f"Unsupported snapshot version {version} in {file_path}")
+            table = file.read(_SECTION.size * count)
+            checksum = file.read(_CHECKSUM.size)
+        if len(checksum) < _CHECKSUM.size or _CHECKSUM.unpack(checksum)[0] != zlib.crc32(header + table):
+            raise ValueError(f"Snapshot header is damaged: {file_path}")
+
+        self._swap = byte_order != _NATIVE_ORDER
+        self._sections = {}  # type: Dict[str, Tuple[int, int, int]]
+        for position in range(0, len(table), _SECTION.size):
+            name, offset, length, crc = _SECTION.unpack_from(table, position)
+            self._sections[name.rstrip(b"\x00").decode("ascii")] = (offset, length, crc)
+        self._cache = {}  # type: Dict[str, object]
+        self.meta = json.loads(self._read("meta"))  # type: Dict[str, object]
+
+    def _read(self, name: str) -> bytes:
+        try:
+            offset, length, crc = self._sections[name]
+        except KeyError:
+            raise ValueError(f"Snapshot {self.file_path} has no {name!r} section") from None
+        with open(self.file_path, "rb") as file:
+            file.seek(offset)
+            data = file.read(length)
+        if len(data) != length or zlib.crc32(data) != crc:
+            raise ValueError(f"Snapshot section {name!r} is damaged: {self.file_path}")
+        return data
+
+    def _array(self, name: str, typecode: str) -> array:
+        values = array(typecode)
+        values.frombytes(self._read(name))
+        if self._swap:
+            values.byteswap()
+        return values
+
+    def _cached(self, name: str, build: Callable[[], object]):
+        value = self._cache.get(name)
+        if value is None:
+            value = self._cache[name] = build()
+        return value
+
+    @property
+    def wal_seq(self) -> int:
+        """Sequence number of the last write-ahead log record in the snapshot."""
+        return self.meta["wal_seq"]
+
+    def __len__(self) -> int:
+        return self.meta["transactions"]
+
+    def _summary(self) -> Dict[str, object]:
+        return self._cached("summary", lambda: json.loads(self._read("summary")))
+
+    def partial(self) -> Partial:
+        """
+        Returns the partial aggregate of the saved transactions from the summary section.
+
+        Returns:
+            Partial: The mergeable partial aggregate
+        """
+        kind_counts, kind_first, completed, recent = self._summary()["partial"]
+        return kind_counts, kind_first, completed, [tuple(pair) for pair in recent]
+
+    def aggregate(self) -> TransactionAggregate:
+        """
+        Returns the aggregate of the saved transactions from the summary section.
+
+        Returns:
+            TransactionAggregate: The aggregate
+        """
+        return TransactionAggregate(self.partial())
+
+    def completed_by_category(self) -> Dict[str, float]:
+        """
+        Returns the saved completed amounts per category.
+
+        Returns:
+            Dict[str, float]: Amounts per category, in first-seen order
+        """
+        return dict(self._summary()["completed_by_category"])
+
+    def columns(self) -> TransactionColumns:
+        """
+        Returns the saved transactions as columns without building Transaction objects.
+
+        Returns:
+            TransactionColumns: The columns
+        """
+        def build():
+            currencies = self.meta["currencies"]
+            return TransactionColumns(
+                array("q", range(len(self))),
+                self._array("tx.ids", "q"),
+                self._array("tx.users", "q"),
+                self._array("tx.amounts", "d"),
+                self._read("tx.kinds"),
+                self._array("tx.created", "q"),
+                (self._read("tx.currency") if len(currencies) <= MAX_BYTE_CURRENCIES
+                 else self._array("tx.currency", "I")),
+                currencies,
+            )
+        return self._cached("columns", build)
+
+    def transactions(self, positions: Optional[Iterable[int]] = None) -> List[Transaction]:
+        """
+        Builds the saved transactions (a new list on every call).
+
+        Args:
+            positions (Optional[Iterable[int]]): Only build the rows at these positions
+
+        Returns:
+            List[Transaction]: The transactions in saved order
+        """
+        columns = self.columns()
+        descriptions = _unpack_strings(self._read("tx.description"), len(self))
+        categories = self.meta["categories"]
+        currencies = columns.currencies
+        types = [TYPE_ORDER[kind >> _STATUS_BITS] if kind >> _STATUS_BITS < len(TYPE_ORDER) else None
+                 for kind in range(256)]
+        statuses = [STATUS_ORDER[kind & ((1 << _STATUS_BITS) - 1)] for kind in range(256)]
+        rows = zip(columns.transaction_ids, columns.user_ids, columns.amounts, columns.kinds,
+                   columns.created_at, columns.currency_codes, self._array("tx.category", "I"), descriptions)
+        if positions is not None:
+            selected = bytearray(len(self))
+            for position in positions:
+                selected[position] = 1
+            rows = compress(rows, selected)
+        transactions = []
+        append = transactions.append
+        for transaction_id, user_id, amount, kind, created_at, currency, category, description in rows:
+            transaction = Transaction(transaction_id, user_id, amount, types[kind], description,
+                                      micros_to_datetime(created_at), categories[category], currencies[currency])
+            transaction.status = statuses[kind]
+            append(transaction)
+        return transactions
+
+    def users(self) -> List[User]:
+        """
+        Builds the saved users (a new list on every call).
+
+        Returns:
+            List[User]: The users in saved order
+        """
+        texts = _unpack_strings(self._read("user.text"), 4 * self.meta["users"])
+        users = []
+        for position, (user_id, created_at, active) in enumerate(zip(
+                self._array("user.ids", "q"), self._array("user.created", "q"), self._read("user.active"))):
+            username, email, first_name, last_name = texts[4 * position:4 * position + 4]
+            user = User(user_id, username, email, first_name, last_name, micros_to_datetime(created_at))
+            user.is_active = bool(active)
+            users.append(user)
+        return users
+
+
+@profiled("load_snapshot")
+def load_context(file_path: str, wal_path: Optional[str] = None) -> DataContext:
+    """
+    Restores a data context from a snapshot and the write-ahead log after it.
+
+    Users and transactions are only built when first accessed. Without
+    log records to replay, aggregates, columns and per-category totals
+    come straight from the snapshot.
+
+    Args:
+        file_path (str): The snapshot file
+        wal_path (Optional[str]): Write-ahead log continuing the snapshot
+
+    Returns:
+        DataContext: The restored context
+
+    Raises:
+        ValueError: If the snapshot or log is damaged
+        OSError: If the snapshot cannot be read
+    """
+    snapshot = Snapshot(file_path)
+    records = list(read_log(wal_path, after_seq=snapshot.wal_seq)) if wal_path else []
+
+    def load_transactions():
+        transactions = snapshot.transactions()
+        replay(transactions, records)
+        return transactions
+
+    context = DataContext(user_loader=snapshot.users, transaction_loader=load_transactions)
+    if not records:
+        context.provide_view("columns", snapshot.columns)
+        context.provide_view("partial", snapshot.partial)
+        context.provide_view("completed_by_category", snapshot.completed_by_category)
+    return context
+
+
+@profiled("compact_log")
+def compact_log(file_path: str, wal: WriteAheadLog, context: Optional[DataContext] = None,
+            min_log_bytes: int = 0) -> bool:
+    """
+    Folds the committed log records into the snapshot and drops them from the log.
+
+    The new snapshot is written atomically before the log is trimmed, so
+    a crash in between only leaves records that replay skips. Meant to be
+    called periodically; min_log_bytes keeps small logs as they are.
+
+    Args:
+        file_path (str): The snapshot file (created if missing)
+        wal (WriteAheadLog): The open log continuing the snapshot
+        context (Optional[DataContext]): In-memory state containing exactly the
+            committed records; without it the state is restored from the files
+        min_log_bytes (int): Only compact logs at least this large
+
+    Returns:
+        bool: True if the log was compacted
+
+    Raises:
+        ValueError: If the snapshot or log is damaged
+        OSError: If the snapshot or the trimmed log cannot be written
+    """
+    seq = wal.commit()
+    if wal.size < min_log_bytes:
+        return False
+    if context is None:
+        users, transactions, after_seq = [], [], 0  # type: List[User], List[Transaction], int
+        if os.path.exists(file_path):
+            snapshot = Snapshot(file_path)
+            users, transactions, after_seq = snapshot.users(), snapshot.transactions(), snapshot.wal_seq
+        replay(transactions, read_log(wal.file_path, after_seq=after_seq, through_seq=seq))
+        context = DataContext(users=users, transactions=transactions)
+    if not save_snapshot(context, file_path, wal_seq=seq):
+        raise OSError(f"Could not write snapshot '{file_path}'")
+    wal.discard_through(seq)
+    return True
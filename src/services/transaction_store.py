@@ -0,0 +1,627 @@
+"""
+Transaction Store
+
+Thread-safe home for transactions whose status changes concurrently.
+
+Writers are serialized per lock stripe (transactions are assigned to a
+stripe by user ID), so threads working on different users do not contend.
+Status transitions are atomic compare-and-set operations and can be
+committed in batches. As with Transaction itself, only pending
+transactions change status.
+
+Statuses are also kept in copy-on-write maps that are published as one
+immutable tuple, so readers take a consistent snapshot with a single
+attribute read and never wait for a writer. Each stripe's recent changes
+are kept in layers whose sizes at least double from newest to oldest, as
+in a log-structured merge tree: a commit copies only the small layers it
+merges, and so copies O(log n) entries per change on average.
+
+A status index (status -> transaction IDs, plus pending IDs per user) and
+running per-status counts and completed totals are maintained with every
+transition, so bulk operations such as settling all pending transactions
+never scan the full store.
+
+With a write-ahead log attached, every insert and transition is logged
+while its stripe lock is held and committed before the call returns;
+concurrent writers share the log's fsyncs through group commit.
+"""
+
+import math
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+from models.transaction import Transaction, TransactionStatus
+from services.wal import WriteAheadLog
+from utils.metrics import get_registry
+
+DEFAULT_STRIPES = 16
+
+# Changes buffered per stripe (at least this many, or an eighth of the
+# stripe) before they are folded into the base map
+_MIN_DELTA = 64
+
+_metrics = get_registry()
+_transitions = _metrics.counter("transaction_store.transitions", "Status transitions applied")
+_conflicts = _metrics.counter("transaction_store.conflicts",
+                              "Transitions rejected because the status had changed")
+
+_STATUSES = list(TransactionStatus)
+_STATUS_POSITIONS = {status: position for position, status in enumerate(_STATUSES)}
+
+# One stripe's statuses: (base map, layers of recent changes from oldest to newest);
+# none of the maps are mutated once published
+_StripeState = Tuple[Dict[int, TransactionStatus], Tuple[Dict[int, TransactionStatus], ...]]
+
+# A status transition: (transaction_id, expected status, new status)
+Transition = Tuple[int, TransactionStatus, TransactionStatus]
+
+
+def _with_changes(state: _StripeState, changes: Dict[int, TransactionStatus]) -> _StripeState:
+    """Returns a new stripe state with changes applied, leaving state untouched."""
+    base, layers = state
+    layers = list(layers)
+    merged = dict(changes)
+    # Merge newer layers until the next older one is at least twice as large,
+    # so an entry is copied O(log n) times before it reaches the base
+    while layers and len(layers[-1]) < 2 * len(merged):
+        older = dict(layers.pop())
+        older.update(merged)
+        merged = older
+    layers.append(merged)
+    if sum(map(len, layers)) > max(_MIN_DELTA, len(base) >> 3):
+        # Fold the changes in once they outgrow a fraction of the base, so
+        # copying the base costs a constant per change on average
+        base = dict(base)
+        for layer in layers:
+            base.update(layer)
+        layers = []
+    return base, tuple(layers)
+
+
+def _stripe_status(state: _StripeState, transaction_id: int) -> Optional[TransactionStatus]:
+    """Latest status of a transaction in one stripe state, or None."""
+    base, layers = state
+    for layer in reversed(layers):
+        status = layer.get(transaction_id)
+        if status is not None:
+            return status
+    return base.get(transaction_id)
+
+
+class StoreSnapshot:
+    """
+    Immutable, point-in-time view of the statuses in a TransactionStore.
+
+    Later transitions are not visible through the snapshot; transitions
+    committed together are either all visible or none are.
+    """
+
+    def __init__(self, version: int, states: Sequence[_StripeState],
+                 counts: Sequence[int] = (), completed_total: float = 0.0):
+        """
+        Initialize a new StoreSnapshot instance.
+
+        Args:
+            version (int): Store version the snapshot was taken at
+            states (Sequence[_StripeState]): Published per-stripe status maps
+            counts (Sequence[int]): Transactions per status, in TransactionStatus order
+            completed_total (float): Sum of the completed amounts
+        """
+        self.version = version
+        self._states = states
+        self._counts = tuple(counts) or (0,) * len(_STATUSES)
+        self.completed_total = completed_total
+
+    def status(self, transaction_id: int) -> Optional[TransactionStatus]:
+        """
+        Returns a transaction's status at snapshot time.
+
+        Args:
+            transaction_id (int): The ID of the transaction
+
+        Returns:
+            Optional[TransactionStatus]: The status, or None if the transaction was not stored
+        """
+        for state in self._states:
+            status = _stripe_status(state, transaction_id)
+            if status is not None:
+                return status
+        return None
+
+    def items(self) -> Iterator[Tuple[int, TransactionStatus]]:
+        """
+        Iterates over (transaction_id, status) pairs, grouped by stripe.
+
+        Yields:
+            Tuple[int, TransactionStatus]: A transaction ID and its status
+        """
+        for base, layers in self._states:
+            delta = {}  # type: Dict[int, TransactionStatus]
+            for layer in layers:
+                delta.update(layer)
+            for transaction_id, status in base.items():
+                yield transaction_id, delta.get(transaction_id, status)
+            for transaction_id, status in delta.items():
+                if transaction_id not in base:
+                    yield transaction_id, status
+
+    def status_counts(self) -> Dict[TransactionStatus, int]:
+        """
+        Returns the number of transactions per status.
+
+        Returns:
+            Dict[TransactionStatus, int]: Number of transactions for every status
+        """
+        return dict(zip(_STATUSES, self._counts))
+
+    def __len__(self) -> int:
+        return sum(self._counts)
+
+
+class TransactionStore:
+    """
+    Concurrent transaction store with per-user lock striping.
+
+    Transaction objects are updated in place as well, so code holding the
+    objects (reports, DataContext) sees the new statuses; callers that
+    need a consistent view across transactions should use snapshot().
+    """
+
+    def __init__(self, transactions: Iterable[Transaction] = (), stripes: int = DEFAULT_STRIPES,
+                 log: Optional[WriteAheadLog] = None):
+        """
+        Initialize a new TransactionStore instance.
+
+        Args:
+            transactions (Iterable[Transaction]): Initial transactions (not logged)
+            stripes (int): Number of lock stripes
+            log (Optional[WriteAheadLog]): Log that later inserts and transitions are written to
+        """
+        if stripes <= 0:
+            raise ValueError("stripes must be positive")
+        self._locks = [threading.Lock() for _ in range(stripes)]
+        self._transactions = {}  # type: Dict[int, Transaction]
+        # IDs are not tied to a stripe, so claiming them takes a lock of its own
+        self._ids_lock = threading.Lock()
+        # Per-stripe status index; a stripe's sets only change under its lock
+        self._index = [{status: set() for status in _STATUSES} for _ in range(stripes)]  # type: List[Dict[TransactionStatus, Set[int]]]
+        self._pending_by_user = {}  # type: Dict[int, Set[int]]
+        self._publish_lock = threading.Lock()
+        # (version, per-stripe states, per-status counts, completed total)
+        self._published = (0, tuple(({}, ()) for _ in range(stripes)), (0,) * len(_STATUSES), 0.0)
+        self._log = None  # type: Optional[WriteAheadLog]
+        self.add_many(transactions)
+        self._log = log
+
+    @property
+    def stripes(self) -> int:
+        """Number of lock stripes."""
+        return len(self._locks)
+
+    @property
+    def version(self) -> int:
+        """Store version, incremented on every published change."""
+        return self._published[0]
+
+    def _stripe(self, user_id: int) -> int:
+        return hash(user_id) % len(self._locks)
+
+    def _publish(self, batch: "_Batch") -> None:
+        # Callers hold the locks of every stripe in the batch, so no other
+        # writer can replace those stripes' states in the meantime
+        with self._publish_lock:
+            version, states, counts, completed_total = self._published
+            states = list(states)
+            for stripe, stripe_changes in batch.changes.items():
+                states[stripe] = _with_changes(states[stripe], stripe_changes)
+            counts = tuple(count + delta for count, delta in zip(counts, batch.count_deltas))
+            if batch.completed_amounts:
+                completed_total = math.fsum([completed_total] + batch.completed_amounts)
+            self._published = (version + 1, tuple(states), counts, completed_total)
+
+    def _locked(self, stripes: Iterable[int]) -> List[threading.Lock]:
+        # Always acquire in stripe order to rule out deadlocks between batches
+        return [self._locks[stripe] for stripe in sorted(set(stripes))]
+
+    def add(self, transaction: Transaction) -> None:
+        """
+        Adds a transaction to the store.
+
+        Args:
+            transaction (Transaction): The transaction to add
+
+        Raises:
+            ValueError: If a transaction with the same ID is already stored
+        """
+        self.add_many([transaction])
+
+    def add_many(self, transactions: Iterable[Transaction]) -> int:
+        """
+        Adds several transactions, publishing them in one step.
+
+        Args:
+            transactions (Iterable[Transaction]): Transactions to add
+
+        Returns:
+            int: Number of transactions added
+
+        Raises:
+            ValueError: If a transaction ID is already stored or repeated
+        """
+        by_stripe = {}  # type: Dict[int, Dict[int, Transaction]]
+        seen = set()  # type: Set[int]
+        for transaction in transactions:
+            # IDs are unique across stripes, so repeats are checked for the whole batch
+            if transaction.transaction_id in seen:
+                raise ValueError(f"Duplicate transaction ID: {transaction.transaction_id}")
+            seen.add(transaction.transaction_id)
+            by_stripe.setdefault(self._stripe(transaction.user_id), {})[transaction.transaction_id] = transaction
+        if not by_stripe:
+            return 0
+
+        locks = self._locked(by_stripe)
+        for lock in locks:
+            lock.acquire()
+        try:
+            with self._ids_lock:
+                for stripe_rows in by_stripe.values():
+                    for transaction_id in stripe_rows:
+                        if transaction_id in self._transactions:
+                            raise ValueError(f"Duplicate transaction ID: {transaction_id}")
+                for stripe_rows in by_stripe.values():
+                    self._transactions.update(stripe_rows)
+            batch = _Batch()
+            for stripe, stripe_rows in by_stripe.items():
+                index = self._index[stripe]
+                changes = batch.changes[stripe] = {}
+                for transaction_id, transaction in stripe_rows.items():
+                    status = transaction.status
+                    index[status].add(transaction_id)
+                    if status == TransactionStatus.PENDING:
+                        self._pending_by_user.setdefault(transaction.user_id, set()).add(transaction_id)
+                    elif status == TransactionStatus.COMPLETED:
+                        batch.completed_amounts.append(transaction.amount)
+                    batch.count_deltas[_STATUS_POSITIONS[status]] += 1
+                    changes[transaction_id] = status
+                    if self._log is not None:
+                        self._log.append_insert(transaction)
+            self._publish(batch)
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+        if self._log is not None:
+            self._log.commit()
+        return sum(len(stripe_rows) for stripe_rows in by_stripe.values())
+
+    def get(self, transaction_id: int) -> Optional[Transaction]:
+        """
+        Retrieves a stored transaction.
+
+        Args:
+            transaction_id (int): The ID of the transaction
+
+        Returns:
+            Optional[Transaction]: The transaction, or None if not stored
+        """
+        return self._transactions.get(transaction_id)
+
+    def __len__(self) -> int:
+        return len(self._transactions)
+
+    def status(self, transaction_id: int) -> Optional[TransactionStatus]:
+        """
+        Returns the latest published status of a transaction.
+
+        Args:
+            transaction_id (int): The ID of the transaction
+
+        Returns:
+            Optional[TransactionStatus]: The status, or None if not stored
+        """
+        transaction = self._transactions.get(transaction_id)
+        if transaction is None:
+            return None
+        return _stripe_status(self._published[1][self._stripe(transaction.user_id)], transaction_id)
+
+    def snapshot(self) -> StoreSnapshot:
+        """
+        Takes a consistent snapshot of all statuses without blocking writers.
+
+        Returns:
+            StoreSnapshot: The statuses and summary as of the latest published change
+        """
+        version, states, counts, completed_total = self._published
+        return StoreSnapshot(version, states, counts, completed_total)
+
+    def status_counts(self) -> Dict[TransactionStatus, int]:
+        """
+        Returns the running number of transactions per status.
+
+        Returns:
+            Dict[TransactionStatus, int]: Number of transactions for every status
+        """
+        return self.snapshot().status_counts()
+
+    @property
+    def completed_total(self) -> float:
+        """Running sum of the completed amounts."""
+        return self._published[3]
+
+    def ids_with_status(self, status: TransactionStatus, user_id: Optional[int] = None) -> Set[int]:
+        """
+        Looks up transaction IDs by status in the status index.
+
+        Stripes are read one after another, so transitions committed while
+        the lookup runs may or may not be reflected.
+
+        Args:
+            status (TransactionStatus): The status to look up
+            user_id (Optional[int]): Only return this user's transactions
+
+        Returns:
+            Set[int]: IDs of the transactions with the status
+        """
+        if user_id is not None:
+            if status == TransactionStatus.PENDING:
+                return set(self._pending_by_user.get(user_id, ()))
+            stripe_ids = self._index[self._stripe(user_id)][status]
+            return {transaction_id for transaction_id in set(stripe_ids)
+                    if self._transactions[transaction_id].user_id == user_id}
+        ids = set()
+        for index in self._index:
+            ids.update(set(index[status]))
+        return ids
+
+    def _move(self, transaction: Transaction, stripe: int, new: TransactionStatus,
+              reason: str, batch: "_Batch") -> None:
+        # Applies one transition out of PENDING; the caller holds the stripe's lock
+        transaction_id = transaction.transaction_id
+        old = transaction.status
+        if new == TransactionStatus.FAILED:
+            transaction.fail_transaction(reason)
+        else:
+            transaction.status = new
+
+        index = self._index[stripe]
+        index[old].discard(transaction_id)
+        index[new].add(transaction_id)
+        self._pending_by_user[transaction.user_id].discard(transaction_id)
+        if new == TransactionStatus.COMPLETED:
+            batch.completed_amounts.append(transaction.amount)
+
+        batch.count_deltas[_STATUS_POSITIONS[old]] -= 1
+        batch.count_deltas[_STATUS_POSITIONS[new]] += 1
+        batch.changes.setdefault(stripe, {})[transaction_id] = new
+        if self._log is not None:
+            self._log.append_status(transaction_id, new, reason if new == TransactionStatus.FAILED else "")
+
+    def commit(self, transitions: Iterable[Transition], reason: str = "") -> List[bool]:
+        """
+        Applies a batch of compare-and-set transitions and publishes them together.
+
+        Each transition succeeds or fails on its own, in order. Snapshots
+        see either none or all of the batch's successful transitions.
+
+        Args:
+            transitions (Iterable[Transition]): (transaction_id, expected, new) triples
+            reason (str): Failure reason for transitions to FAILED
+
+        Returns:
+            List[bool]: Whether each transition was applied
+
+        Raises:
+            ValueError: If a transition does not move a transaction out of PENDING
+        """
+        transitions = list(transitions)
+        for _, expected, new in transitions:
+            if expected != TransactionStatus.PENDING or new == TransactionStatus.PENDING:
+                raise ValueError(f"Invalid status transition: {expected.value} -> {new.value}; "
+                                 f"only pending transactions change status")
+        targets = [self._transactions.get(transaction_id) for transaction_id, _, _ in transitions]
+        stripes = [None if transaction is None else self._stripe(transaction.user_id) for transaction in targets]
+
+        results = []
+        batch = _Batch()
+        locks = self._locked(stripe for stripe in stripes if stripe is not None)
+        for lock in locks:
+            lock.acquire()
+        try:
+            for (_, expected, new), transaction, stripe in zip(transitions, targets, stripes):
+                if transaction is None or transaction.status != expected:
+                    results.append(False)
+                    continue
+                self._move(transaction, stripe, new, reason, batch)
+                results.append(True)
+            if batch.changes:
+                self._publish(batch)
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+        applied = sum(results)
+        if applied and self._log is not None:
+            self._log.commit()
+        _transitions.inc(applied)
+        _conflicts.inc(len(results) - applied)
+        return results
+
+    def _transition_many(self, transaction_ids: Iterable[int], new: TransactionStatus,
+                         reason: str = "") -> int:
+        # Moves every listed transaction that is still pending, in one batch.
+        # Works a stripe at a time with set operations instead of per-row _move()
+        by_stripe = {}  # type: Dict[int, Dict[int, Transaction]]
+        requested = 0
+        stripes = len(self._locks)
+        lookup = self._transactions.get
+        for transaction_id in transaction_ids:
+            requested += 1
+            transaction = lookup(transaction_id)
+            if transaction is not None:
+                stripe = hash(transaction.user_id) % stripes
+                stripe_rows = by_stripe.get(stripe)
+                if stripe_rows is None:
+                    stripe_rows = by_stripe[stripe] = {}
+                stripe_rows[transaction_id] = transaction
+
+        pending = TransactionStatus.PENDING
+        batch = _Batch()
+        applied = 0
+        locks = self._locked(by_stripe)
+        for lock in locks:
+            lock.acquire()
+        try:
+            for stripe, transactions in by_stripe.items():
+                moved = [transaction for transaction in transactions.values() if transaction.status == pending]
+                if not moved:
+                    continue
+                ids = [transaction.transaction_id for transaction in moved]
+                if new == TransactionStatus.FAILED:
+                    for transaction in moved:
+                        transaction.fail_transaction(reason)
+                else:
+                    for transaction in moved:
+                        transaction.status = new
+                if new == TransactionStatus.COMPLETED:
+                    batch.completed_amounts.extend(transaction.amount for transaction in moved)
+
+                index = self._index[stripe]
+                index[pending].difference_update(ids)
+                index[new].update(ids)
+                for transaction in moved:
+                    self._pending_by_user[transaction.user_id].discard(transaction.transaction_id)
+
+                batch.count_deltas[_STATUS_POSITIONS[pending]] -= len(moved)
+                batch.count_deltas[_STATUS_POSITIONS[new]] += len(moved)
+                batch.changes[stripe] = dict.fromkeys(ids, new)
+                applied += len(moved)
+                if self._log is not None:
+                    append_status = self._log.append_status
+                    for transaction_id in ids:
+                        append_status(transaction_id, new, reason)
+            if batch.changes:
+                self._publish(batch)
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+        if applied and self._log is not None:
+            self._log.commit()
+
+        _transitions.inc(applied)
+        _conflicts.inc(requested - applied)
+        return applied
+
+    def compare_and_set(self, transaction_id: int, expected: TransactionStatus,
+                        new: TransactionStatus, reason: str = "") -> bool:
+        """
+        Atomically changes a transaction's status if it still has the expected one.
+
+        Args:
+            transaction_id (int): The ID of the transaction
+            expected (TransactionStatus): Status the transaction must currently have
+            new (TransactionStatus): Status to set
+            reason (str): Failure reason appended to the description when new is FAILED
+
+        Returns:
+            bool: True if the status was changed, False if it did not match (or the
+                transaction is not stored)
+
+        Raises:
+            ValueError: If expected is not PENDING, or new is PENDING
+        """
+        return self.commit([(transaction_id, expected, new)], reason)[0]
+
+    def complete(self, transaction_id: int) -> bool:
+        """
+        Completes a pending transaction.
+
+        Args:
+            transaction_id (int): The ID of the transaction
+
+        Returns:
+            bool: True if the transaction was pending and is now completed
+        """
+        return self.compare_and_set(transaction_id, TransactionStatus.PENDING, TransactionStatus.COMPLETED)
+
+    def cancel(self, transaction_id: int) -> bool:
+        """
+        Cancels a pending transaction.
+
+        Args:
+            transaction_id (int): The ID of the transaction
+
+        Returns:
+            bool: True if the transaction was pending and is now cancelled
+        """
+        return self.compare_and_set(transaction_id, TransactionStatus.PENDING, TransactionStatus.CANCELLED)
+
+    def fail(self, transaction_id: int, reason: str = "") -> bool:
+        """
+        Fails a pending transaction.
+
+        Args:
+            transaction_id (int): The ID of the transaction
+            reason (str): Optional reason for the failure
+
+        Returns:
+            bool: True if the transaction was pending and is now failed
+        """
+        return self.compare_and_set(transaction_id, TransactionStatus.PENDING,
+                                    TransactionStatus.FAILED, reason)
+
+    def complete_many(self, transaction_ids: Iterable[int]) -> int:
+        """
+        Completes the listed transactions that are still pending, in one batch.
+
+        Args:
+            transaction_ids (Iterable[int]): IDs of the transactions to complete
+
+        Returns:
+            int: Number of transactions completed
+        """
+        return self._transition_many(transaction_ids, TransactionStatus.COMPLETED)
+
+    def fail_many(self, transaction_ids: Iterable[int], reason: str = "") -> int:
+        """
+        Fails the listed transactions that are still pending, in one batch.
+
+        Args:
+            transaction_ids (Iterable[int]): IDs of the transactions to fail
+            reason (str): Optional reason for the failure
+
+        Returns:
+            int: Number of transactions failed
+        """
+        return self._transition_many(transaction_ids, TransactionStatus.FAILED, reason)
+
+    def cancel_all_pending(self, user_id: Optional[int] = None) -> int:
+        """
+        Cancels every pending transaction, or every pending transaction of one user.
+
+        Args:
+            user_id (Optional[int]): Only cancel this user's transactions
+
+        Returns:
+            int: Number of transactions cancelled
+        """
+        pending = self.ids_with_status(TransactionStatus.PENDING, user_id)
+        return self._transition_many(pending, TransactionStatus.CANCELLED)
+
+    def transactions(self) -> List[Transaction]:
+        """
+        Returns the stored transactions in insertion order.
+
+        Returns:
+            List[Transaction]: The stored transactions
+        """
+        return list(self._transactions.values())
+
+
+class _Batch:
+    """Changes collected while stripe locks are held, published in one step."""
+
+    __slots__ = ("changes", "count_deltas", "completed_amounts")
+
+    def __init__(self):
+        self.changes = {}  # type: Dict[int, Dict[int, TransactionStatus]]
+        self.count_deltas = [0] * len(_STATUSES)
+        self.completed_amounts = []  # type: List[float]
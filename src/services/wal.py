@@ -0,0 +1,430 @@
+"""
+Write-Ahead Log
+
+Append-only log of changes to the transaction set: inserted transactions
+and status changes. A snapshot (see services.snapshot) records the
+sequence number of the last change it contains; on startup the snapshot
+is loaded and only the log records after it are replayed.
+
+The file starts with a header holding the sequence number the log
+continues from, so numbering resumes correctly when a trimmed log is
+reopened. Every record is framed as a little-endian header (payload length,
+sequence number, CRC-32 of the sequence number and payload) followed by
+the payload: an operation byte and the operation's fields. A record cut
+short or garbled by a crash fails its length or checksum test and is
+ignored, together with anything after it.
+
+Appended records are buffered in memory until commit() writes them with
+a single write and fsync. Threads committing at the same time share one
+fsync (group commit): whoever gets to the disk first writes every record
+buffered so far, and the others find their records already durable.
+
+compact_log() in services.snapshot folds the log into a snapshot, after
+which discard_through() drops the records the snapshot contains by
+atomically replacing the log file.
+"""
+
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from models.transaction import Transaction, TransactionStatus
+from services.aggregation import STATUS_ORDER, TYPE_ORDER, datetime_to_micros, micros_to_datetime
+from utils.file_ops import write_file_atomic
+from utils.metrics import get_registry
+
+logger = logging.getLogger(__name__)
+
+_metrics = get_registry()
+_records_appended = _metrics.counter("wal.records_appended", "Records appended to write-ahead logs")
+_commits = _metrics.counter("wal.commits", "Write-ahead log commits (one fsync each)")
+_commit_latency = _metrics.histogram("wal.commit_seconds", "Wall time spent writing and syncing a commit")
+
+WAL_MAGIC = b"FTWAL003"
+
+OP_INSERT = 1
+OP_STATUS = 2
+
+_HEADER = struct.Struct("<8sQ")  # magic, last sequence number before the first record
+_FRAME = struct.Struct("<IQI")  # payload length, sequence number, CRC-32
+_SEQ = struct.Struct("<Q")
+# op, id, user, amount, type, status, created_at, then the byte lengths of the
+# currency, description and category that follow (0xFFFF: no category)
+_INSERT = struct.Struct("<BqqdBBqHIH")
+_STATUS = struct.Struct("<BqBH")  # op, transaction id, status, byte length of the failure reason
+_NO_CATEGORY = 0xFFFF
+
+_TYPE_CODES = {transaction_type: code for code, transaction_type in enumerate(TYPE_ORDER)}
+_STATUS_CODES = {status: code for code, status in enumerate(STATUS_ORDER)}
+
+
+class WalRecord:
+    """
+    A single decoded log record.
+    """
+
+    __slots__ = ("seq", "op", "transaction", "transaction_id", "status", "reason")
+
+    def __init__(self, seq: int, op: int, transaction: Optional[Transaction] = None,
+                 transaction_id: Optional[int] = None, status: Optional[TransactionStatus] = None,
+                 reason: str = ""):
+        """
+        Initialize a new WalRecord instance.
+
+        Args:
+            seq (int): Sequence number of the record
+            op (int): OP_INSERT or OP_STATUS
+            transaction (Optional[Transaction]): The inserted transaction (OP_INSERT)
+            transaction_id (Optional[int]): The ID of the changed transaction
+            status (Optional[TransactionStatus]): The new status (OP_STATUS)
+            reason (str): Failure reason of a change to FAILED
+        """
+        self.seq = seq
+        self.op = op
+        self.transaction = transaction
+        self.transaction_id = transaction_id
+        self.status = status
+        self.reason = reason
+
+
+def encode_insert(transaction: Transaction) -> bytes:
+    """
+    Encodes an insert record payload.
+
+    Args:
+        transaction (Transaction): The inserted transaction
+
+    Returns:
+        bytes: The payload
+    """
+    currency = transaction.currency.encode("utf-8")
+    description = transaction.description.encode("utf-8")
+    category = transaction.category.encode("utf-8") if transaction.category is not None else b""
+    return _INSERT.pack(
+        OP_INSERT, transaction.transaction_id, transaction.user_id, transaction.amount,
+        _TYPE_CODES[transaction.transaction_type], _STATUS_CODES[transaction.status],
+        datetime_to_micros(transaction.created_at), len(currency), len(description),
+        len(category) if transaction.category is not None else _NO_CATEGORY,
+    ) + currency + description + category
+
+
+def encode_status(transaction_id: int, status: TransactionStatus, reason: str = "") -> bytes:
+    """
+    Encodes a status change record payload.
+
+    Args:
+        transaction_id (int): The ID of the changed transaction
+        status (TransactionStatus): The new status
+        reason (str): Failure reason of a change to FAILED
+
+    Returns:
+        bytes: The payload
+    """
+    encoded_reason = reason.encode("utf-8")
+    return _STATUS.pack(OP_STATUS, transaction_id, _STATUS_CODES[status], len(encoded_reason)) + encoded_reason
+
+
+def decode_record(seq: int, payload: bytes) -> WalRecord:
+    """
+    Decodes a record payload.
+
+    Args:
+        seq (int): Sequence number of the record
+        payload (bytes): The payload
+
+    Returns:
+        WalRecord: The decoded record
+
+    Raises:
+        ValueError: If the payload is malformed
+    """
+    if not payload:
+        raise ValueError(f"Empty WAL record {seq}")
+    op = payload[0]
+    try:
+        if op == OP_STATUS:
+            _, transaction_id, status, reason_length = _STATUS.unpack_from(payload)
+            reason = payload[_STATUS.size:_STATUS.size + reason_length].decode("utf-8")
+            return WalRecord(seq, op, transaction_id=transaction_id, status=STATUS_ORDER[status], reason=reason)
+        if op == OP_INSERT:
+            (_, transaction_id, user_id, amount, type_code, status, created_at,
+             currency_length, description_length, category_length) = _INSERT.unpack_from(payload)
+            position = _INSERT.size
+            currency = payload[position:position + currency_length].decode("utf-8")
+            position += currency_length
+            description = payload[position:position + description_length].decode("utf-8")
+            position += description_length
+            category = None
+            if category_length != _NO_CATEGORY:
+                category = payload[position:position + category_length].decode("utf-8")
+            transaction = Transaction(transaction_id, user_id, amount, TYPE_ORDER[type_code], description,
+                                      micros_to_datetime(created_at), category, currency)
+            transaction.status = STATUS_ORDER[status]
+            return WalRecord(seq, op, transaction=transaction, transaction_id=transaction_id)
+    except (struct.error, IndexError, UnicodeDecodeError) as e:
+        raise ValueError(f"Malformed WAL record {seq}: {e}") from None
+    raise ValueError(f"Unknown WAL operation {op} in record {seq}")
+
+
+class WriteAheadLog:
+    """
+    Appends change records to a log file with group commit.
+
+    Appending is thread-safe. Records become durable when commit()
+    returns; records still buffered are lost if the process dies.
+    """
+
+    def __init__(self, file_path: str, start_seq: int = 0):
+        """
+        Opens a log for appending, creating it if necessary.
+
+        A torn or corrupt record at the end of an existing log is cut off
+        so new records follow the last intact one.
+
+        Args:
+            file_path (str): The log file
+            start_seq (int): Last sequence number already used, e.g. by the
+                snapshot the log continues (numbering never goes backwards)
+
+        Raises:
+            ValueError: If the file is not a write-ahead log
+        """
+        self.file_path = file_path
+        self.last_seq = start_seq
+        self._pending = []  # type: List[bytes]
+        self._lock = threading.Lock()  # guards last_seq and the buffer
+        self._commit_lock = threading.Lock()  # serializes writes to the file
+        if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
+            with open(file_path, "rb") as file:
+                data = file.read()
+            end, base_seq = _read_header(data, file_path)
+            self.last_seq = max(self.last_seq, base_seq)
+            for seq, _, end in _frames(data, file_path):
+                self.last_seq = max(self.last_seq, seq)
+            if end < len(data):
+                logger.warning("Discarding %d bytes of torn or corrupt records at the end of '%s'",
+                               len(data) - end, file_path)
+            self._file = open(file_path, "r+b")
+            self._file.truncate(end)
+            self._file.seek(end)
+        else:
+            self._file = open(file_path, "wb")
+            self._file.write(_HEADER.pack(WAL_MAGIC, start_seq))
+            self._file.flush()
+            end = _HEADER.size
+        self.durable_seq = self.last_seq
+        self._size = end
+
+    def _append(self, payload: bytes) -> int:
+        with self._lock:
+            self.last_seq += 1
+            header = _FRAME.pack(len(payload), self.last_seq,
+                                 zlib.crc32(payload, zlib.crc32(_SEQ.pack(self.last_seq))))
+            self._pending.append(header + payload)
+            seq = self.last_seq
+        _records_appended.inc()
+        return seq
+
+    def append_insert(self, transaction: Transaction) -> int:
+        """
+        Logs an inserted transaction.
+
+        Args:
+            transaction (Transaction): The transaction
+
+        Returns:
+            int: Sequence number of the record
+        """
+        return self._append(encode_insert(transaction))
+
+    def append_status(self, transaction_id: int, status: TransactionStatus, reason: str = "") -> int:
+        """
+        Logs a status change.
+
+        Args:
+            transaction_id (int): The ID of the changed transaction
+            status (TransactionStatus): The new status
+            reason (str): Failure reason of a change to FAILED
+
+        Returns:
+            int: Sequence number of the record
+        """
+        return self._append(encode_status(transaction_id, status, reason))
+
+    def commit(self) -> int:
+        """
+        Writes and syncs every buffered record.
+
+        If another thread is syncing, this waits for it and then writes
+        whatever is still buffered, so concurrent committers share fsyncs.
+
+        Returns:
+            int: Sequence number of the last durable record
+        """
+        with self._lock:
+            target = self.last_seq
+        with self._commit_lock:
+            if self.durable_seq >= target:
+                return self.durable_seq
+            start = time.perf_counter()
+            with self._lock:
+                data = b"".join(self._pending)
+                self._pending.clear()
+                seq = self.last_seq
+            self._file.write(data)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._size += len(data)
+            self.durable_seq = seq
+            _commit_latency.observe(time.perf_counter() - start)
+        _commits.inc()
+        return seq
+
+    @property
+    def size(self) -> int:
+        """Bytes of committed records in the log file, including the header."""
+        return self._size
+
+    def discard_through(self, seq: int) -> int:
+        """
+        Drops the committed records up to a sequence number, e.g. once a
+        snapshot contains them.
+
+        The remaining records are written to a new file that atomically
+        replaces the log, so a crash leaves either the old or the new log.
+        Sequence numbering continues where it left off, also when the log
+        is reopened: the new header records the last dropped sequence number.
+
+        Args:
+            seq (int): Last sequence number to drop
+
+        Returns:
+            int: Number of records kept
+
+        Raises:
+            OSError: If the new log cannot be written
+        """
+        with self._commit_lock:
+            self._file.flush()
+            with open(self.file_path, "rb") as file:
+                data = file.read(self._size)
+            base_seq = max(_read_header(data, self.file_path)[1], seq)
+            kept = [(start, end) for record_seq, start, end in _frames(data, self.file_path) if record_seq > seq]
+            content = _HEADER.pack(WAL_MAGIC, base_seq) + b"".join(data[start:end] for start, end in kept)
+            if not write_file_atomic(self.file_path, content):
+                raise OSError(f"Could not rewrite write-ahead log '{self.file_path}'")
+            self._file.close()
+            self._file = open(self.file_path, "r+b")
+            self._file.seek(len(content))
+            self._size = len(content)
+        return len(kept)
+
+    def reset(self) -> None:
+        """
+        Discards all records, e.g. once a snapshot contains them.
+
+        Sequence numbering continues where it left off.
+        """
+        self.discard_through(self.commit())
+
+    def close(self) -> None:
+        """
+        Commits buffered records and closes the log.
+        """
+        if not self._file.closed:
+            self.commit()
+            self._file.close()
+
+    def __enter__(self) -> "WriteAheadLog":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def _read_header(data: bytes, file_path: str) -> Tuple[int, int]:
+    """Returns the header size and the sequence number a log's content continues from."""
+    if data[:len(WAL_MAGIC)] == WAL_MAGIC and len(data) >= _HEADER.size:
+        return _HEADER.size, _HEADER.unpack_from(data)[1]
+    raise ValueError(f"Not a write-ahead log: {file_path}")
+
+
+def _frames(data: bytes, file_path: str) -> Iterator[Tuple[int, int, int]]:
+    """Yields (sequence number, start, end) of the intact records in a log's content."""
+    position = _read_header(data, file_path)[0]
+    while position + _FRAME.size <= len(data):
+        length, seq, checksum = _FRAME.unpack_from(data, position)
+        end = position + _FRAME.size + length
+        if end > len(data):
+            break
+        payload = data[position + _FRAME.size:end]
+        if zlib.crc32(payload, zlib.crc32(_SEQ.pack(seq))) != checksum:
+            break
+        yield seq, position, end
+        position = end
+
+
+def read_log(file_path: str, after_seq: int = 0, through_seq: Optional[int] = None) -> Iterator[WalRecord]:
+    """
+    Reads the intact records of a log.
+
+    Args:
+        file_path (str): The log file (a missing file has no records)
+        after_seq (int): Skip records up to and including this sequence number
+        through_seq (Optional[int]): Stop after this sequence number
+
+    Yields:
+        WalRecord: The records in log order
+
+    Raises:
+        ValueError: If the file is not a write-ahead log or a record is malformed
+    """
+    if not os.path.exists(file_path):
+        return
+    with open(file_path, "rb") as file:
+        data = file.read()
+    header_size = _FRAME.size
+    for seq, start, end in _frames(data, file_path):
+        if through_seq is not None and seq > through_seq:
+            break
+        if seq > after_seq:
+            yield decode_record(seq, data[start + header_size:end])
+
+
+def replay(transactions: List[Transaction], records: Iterator[WalRecord]) -> int:
+    """
+    Applies log records to a list of transactions in place.
+
+    Status changes go through the same Transaction methods as the
+    original change, so failure reasons end up in the descriptions again.
+
+    Args:
+        transactions (List[Transaction]): The transactions to update
+        records (Iterator[WalRecord]): Records in log order
+
+    Returns:
+        int: Number of records applied
+    """
+    by_id = None  # type: Optional[Dict[int, Transaction]]
+    applied = 0
+    for record in records:
+        if record.op == OP_INSERT:
+            transactions.append(record.transaction)
+            if by_id is not None:
+                by_id[record.transaction_id] = record.transaction
+        else:
+            if by_id is None:
+                by_id = {transaction.transaction_id: transaction for transaction in transactions}
+            transaction = by_id.get(record.transaction_id)
+            if transaction is None:
+                continue
+            if record.status == TransactionStatus.FAILED:
+                transaction.fail_transaction(record.reason)
+            else:
+                transaction.status = record.status
+        applied += 1
+    return applied
@@ -1,10 +1,45 @@
 """
 Utilities Package
 
-Contains helper functions for file operations and mathematical calculations.
+Contains helper functions for file operations, mathematical calculations,
+metrics collection, pipeline profiling and memory diagnostics.
+
+Submodules are imported lazily on first attribute access.
 """
 
-from .file_ops import read_file, write_file
-from .math_ops import add, multiply, calculate_average
+import importlib
+
+# Public name -> submodule that defines it
+_EXPORTS = {
+    "read_file": "file_ops",
+    "write_file": "file_ops",
+    "write_file_atomic": "file_ops",
+    "write_stream": "file_ops",
+    "add": "math_ops",
+    "multiply": "math_ops",
+    "calculate_average": "math_ops",
+    "MetricsRegistry": "metrics",
+    "get_registry": "metrics",
+    "Profiler": "profiling",
+    "get_profiler": "profiling",
+    "profile_stage": "profiling",
+    "profiled": "profiling",
+    "MemoryDiagnostics": "memory",
+    "get_memory_diagnostics": "memory",
+    "enable_memory_diagnostics": "memory",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module_name}", __name__), name)
+    globals()[name] = value
+    return value
+
 
-__all__ = ["read_file", "write_file", "add", "multiply", "calculate_average"]
\ No newline at end of file
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
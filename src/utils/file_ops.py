@@ -5,8 +5,25 @@ Provides helper functions for reading and writing files.
 These utilities handle common file operations with error handling.
 """
 
+import logging
 import os
-from typing import Optional
+import threading
+import time
+from typing import Callable, Optional, TextIO, Union
+
+from .metrics import get_registry
+from .profiling import profiled
+
+logger = logging.getLogger(__name__)
+
+_metrics = get_registry()
+_files_read = _metrics.counter("file_ops.files_read", "Files read successfully")
+_bytes_read = _metrics.counter("file_ops.bytes_read", "Characters read from files")
+_read_errors = _metrics.counter("file_ops.read_errors", "Failed file reads")
+_files_written = _metrics.counter("file_ops.files_written", "Files written successfully")
+_bytes_written = _metrics.counter("file_ops.bytes_written", "Bytes written to files")
+_write_errors = _metrics.counter("file_ops.write_errors", "Failed file writes")
+_write_latency = _metrics.histogram("file_ops.write_seconds", "Wall time spent writing a file")
 
 
 def read_file(file_path: str, encoding: str = "utf-8") -> Optional[str]:
@@ -26,15 +43,22 @@ def read_file(file_path: str, encoding: str = "utf-8") -> Optional[str]:
     """
     try:
         with open(file_path, 'r', encoding=encoding) as file:
-            return file.read()
+            content = file.read()
     except FileNotFoundError:
-        print(f"Error: File '{file_path}' not found")
+        _read_errors.inc()
+        logger.warning("File '%s' not found", file_path)
         return None
     except IOError as e:
-        print(f"Error reading file '{file_path}': {e}")
+        _read_errors.inc()
+        logger.error("Error reading file '%s': %s", file_path, e)
         return None
 
+    _files_read.inc()
+    _bytes_read.inc(len(content))
+    return content
 
+
+@profiled("write_file")
 def write_file(file_path: str, content: str, encoding: str = "utf-8") -> bool:
     """
     Writes content to a file, creating directories if necessary.
@@ -47,6 +71,7 @@ def write_file(file_path: str, content: str, encoding: str = "utf-8") -> bool:
     Returns:
         bool: True if the file was written successfully, False otherwise
     """
+    start = time.perf_counter()
     try:
         # Create directory if it doesn't exist
         directory = os.path.dirname(file_path)
@@ -55,14 +80,104 @@ def write_file(file_path: str, content: str, encoding: str = "utf-8") -> bool:
         
         with open(file_path, 'w', encoding=encoding) as file:
             file.write(content)
+            file.flush()
+            size = os.fstat(file.fileno()).st_size
+    
+    except IOError as e:
+        _write_errors.inc()
+        logger.error("Error writing file '%s': %s", file_path, e)
+        return False
+    
+    _write_latency.observe(time.perf_counter() - start)
+    _files_written.inc()
+    _bytes_written.inc(size)
+    logger.debug("Wrote %d bytes to '%s'", size, file_path)
+    return True
+
+
+@profiled("write_stream")
+def write_stream(file_path: str, render: Callable[[TextIO], object], encoding: str = "utf-8",
+                 newline: Optional[str] = None) -> bool:
+    """
+    Writes a file by streaming content into it, creating directories if necessary.
+    
+    The content is never held in memory as a whole: render writes it
+    piece by piece to the buffered file.
+    
+    Args:
+        file_path (str): The path where the file should be written
+        render (Callable[[TextIO], object]): Writes the content to the open file
+        encoding (str): The file encoding (default: utf-8)
+        newline (Optional[str]): Newline translation, as for open() ("" for csv writers)
+    
+    Returns:
+        bool: True if the file was written successfully, False otherwise
+    """
+    start = time.perf_counter()
+    try:
+        directory = os.path.dirname(file_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
         
-        print(f"Successfully wrote file: {file_path}")
-        return True
+        with open(file_path, 'w', encoding=encoding, newline=newline) as file:
+            render(file)
+            file.flush()
+            size = os.fstat(file.fileno()).st_size
     
     except IOError as e:
-        print(f"Error writing file '{file_path}': {e}")
+        _write_errors.inc()
+        logger.error("Error writing file '%s': %s", file_path, e)
+        return False
+    
+    _write_latency.observe(time.perf_counter() - start)
+    _files_written.inc()
+    _bytes_written.inc(size)
+    logger.debug("Streamed %d bytes to '%s'", size, file_path)
+    return True
+
+
+def write_file_atomic(file_path: str, content: Union[str, bytes], encoding: str = "utf-8") -> bool:
+    """
+    Writes content to a file so that readers see either the old or the new file.
+
+    The content is written to a temporary file in the same directory,
+    flushed to disk and then renamed over the destination.
+
+    Args:
+        file_path (str): The path where the file should be written
+        content (Union[str, bytes]): Text (encoded with encoding) or raw bytes
+        encoding (str): The file encoding for text content (default: utf-8)
+
+    Returns:
+        bool: True if the file was written successfully, False otherwise
+    """
+    start = time.perf_counter()
+    data = content.encode(encoding) if isinstance(content, str) else content
+    directory = os.path.dirname(file_path)
+    # Unique per process and thread; created with os.open so the umask applies as for open()
+    temp_path = os.path.join(directory, f".{os.path.basename(file_path)}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0), 0o666)
+        with os.fdopen(fd, "wb") as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, file_path)
+    except OSError as e:
+        _write_errors.inc()
+        logger.error("Error writing file '%s': %s", file_path, e)
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
         return False
 
+    _write_latency.observe(time.perf_counter() - start)
+    _files_written.inc()
+    _bytes_written.inc(len(data))
+    logger.debug("Atomically wrote %d bytes to '%s'", len(data), file_path)
+    return True
+
 
 def file_exists(file_path: str) -> bool:
     """
@@ -0,0 +1,457 @@
+"""
+Memory Diagnostics
+
+Finds out where the memory of a pipeline run goes.
+
+MemoryDiagnostics takes a tracemalloc snapshot at every checkpoint and
+records the allocation sites that grew the most since the previous one.
+Attached to a Profiler, it checkpoints after every profiled stage, so a
+run of main.main or of any instrumented service is broken down stage by
+stage. Per-type footprints (User and Transaction objects, description
+strings, report buffers) are estimated from a sample of the objects, and
+the process's peak resident set size is read from the OS.
+
+Everything is collected into a JSON document with stable keys, so the
+artifacts of two runs can be diffed or compared in benchmarks.
+Diagnostics are disabled by default and can be switched on with
+enable_memory_diagnostics(); the entry points (main.py and the serve
+command) do so when the FINANCE_TRACKER_MEMORY environment variable is
+set. Importing this module or utils.profiling never enables them, so
+worker processes do not start tracemalloc.
+"""
+
+import os
+import sys
+import threading
+from datetime import date, datetime, time, timedelta
+from enum import Enum
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Sequence
+
+if TYPE_CHECKING:
+    from .profiling import Profiler
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Environment variable that enables memory diagnostics ("1", "true", "yes" or "on")
+MEMORY_ENV_VAR = "FINANCE_TRACKER_MEMORY"
+
+# Allocation sites kept per checkpoint
+DEFAULT_TOP_SITES = 10
+
+# Objects measured per footprint estimate
+DEFAULT_SAMPLE_SIZE = 1000
+
+_TRUTHY = {"1", "true", "yes", "on"}
+
+# Attribute values owned by their instance (shared values such as Enum members are not counted)
+_OWNED_TYPES = (str, bytes, int, float, date, datetime, time, timedelta, list, dict, tuple)
+
+# Sources whose allocations are bookkeeping, not application memory
+_IGNORED_SOURCES = ("<frozen importlib._bootstrap>", "<frozen importlib._bootstrap_external>", "<unknown>")
+
+_SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def peak_rss_bytes() -> Optional[int]:
+    """
+    Returns the peak resident set size of the process.
+
+    Returns:
+        Optional[int]: Peak RSS in bytes, or None where the resource module is unavailable
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS and in KiB elsewhere
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class TypeFootprint:
+    """
+    Estimated memory held by a collection of objects of one kind.
+    """
+
+    __slots__ = ("name", "count", "sampled", "bytes_per_object", "total_bytes")
+
+    def __init__(self, name: str, count: int, sampled: int, bytes_per_object: float, total_bytes: int):
+        """
+        Initialize a new TypeFootprint instance.
+
+        Args:
+            name (str): What the objects are, e.g. "Transaction"
+            count (int): Number of objects
+            sampled (int): Number of objects that were measured
+            bytes_per_object (float): Average measured size of one object
+            total_bytes (int): Estimated size of all objects and their container
+        """
+        self.name = name
+        self.count = count
+        self.sampled = sampled
+        self.bytes_per_object = bytes_per_object
+        self.total_bytes = total_bytes
+
+    def to_dict(self) -> Dict[str, object]:
+        """
+        Returns the footprint as a JSON-serializable dictionary.
+
+        Returns:
+            Dict[str, object]: The footprint
+        """
+        return {
+            "count": self.count,
+            "sampled": self.sampled,
+            "bytes_per_object": self.bytes_per_object,
+            "total_bytes": self.total_bytes,
+        }
+
+
+def _owned_size(value: object, seen: set) -> int:
+    """Size of an attribute value owned by its instance, counted once per identity."""
+    if not isinstance(value, _OWNED_TYPES) or isinstance(value, (bool, Enum)) or id(value) in seen:
+        return 0
+    if isinstance(value, int) and -5 <= value <= 256:
+        return 0  # small ints are shared by the interpreter
+    seen.add(id(value))
+    return sys.getsizeof(value)
+
+
+def estimate_footprint(name: str, objects: Sequence[object], sample_size: int = DEFAULT_SAMPLE_SIZE,
+                       exclude: Iterable[str] = ()) -> TypeFootprint:
+    """
+    Estimates the memory held by a sequence of objects from an evenly spaced sample.
+
+    An object's size is its own size plus its __dict__ and the attribute
+    values it owns (strings, numbers, dates and containers, each counted
+    once even if several objects share it). Enum members and other shared
+    objects are not counted.
+
+    Args:
+        name (str): What the objects are, e.g. "Transaction"
+        objects (Sequence[object]): The objects
+        sample_size (int): Maximum number of objects to measure
+        exclude (Iterable[str]): Attributes not to count, e.g. those estimated
+            as a footprint of their own
+
+    Returns:
+        TypeFootprint: The estimate
+    """
+    count = len(objects)
+    step = max(1, count // max(1, sample_size))
+    sample = objects[::step][:sample_size]
+    excluded = set(exclude)
+    seen = set()  # type: set
+    measured = 0
+    for obj in sample:
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        measured += sys.getsizeof(obj)
+        attributes = getattr(obj, "__dict__", None)
+        if attributes is not None:
+            measured += sys.getsizeof(attributes)
+            values = [value for key, value in attributes.items() if key not in excluded]
+        else:
+            values = [getattr(obj, slot, None) for slot in getattr(type(obj), "__slots__", ())
+                      if slot not in excluded]
+        measured += sum(_owned_size(value, seen) for value in values)
+    per_object = measured / len(sample) if sample else 0.0
+    return TypeFootprint(name, count, len(sample), per_object,
+                         int(per_object * count) + sys.getsizeof(objects))
+
+
+class Checkpoint:
+    """
+    Memory state recorded at one point of a run.
+    """
+
+    __slots__ = ("name", "traced_bytes", "peak_rss_bytes", "top_sites")
+
+    def __init__(self, name: str, traced_bytes: int, peak_rss_bytes: Optional[int],
+                 top_sites: List[Dict[str, object]]):
+        """
+        Initialize a new Checkpoint instance.
+
+        Args:
+            name (str): Stage that just finished
+            traced_bytes (int): Memory allocated through Python and still alive
+            peak_rss_bytes (Optional[int]): Peak resident set size of the process so far
+            top_sites (List[Dict[str, object]]): Allocation sites that grew the most
+                since the previous checkpoint
+        """
+        self.name = name
+        self.traced_bytes = traced_bytes
+        self.peak_rss_bytes = peak_rss_bytes
+        self.top_sites = top_sites
+
+    def to_dict(self) -> Dict[str, object]:
+        """
+        Returns the checkpoint as a JSON-serializable dictionary.
+
+        Returns:
+            Dict[str, object]: The checkpoint
+        """
+        return {
+            "name": self.name,
+            "traced_bytes": self.traced_bytes,
+            "peak_rss_bytes": self.peak_rss_bytes,
+            "top_sites": self.top_sites,
+        }
+
+
+def _site_name(filename: str, lineno: int) -> str:
+    """Allocation site as a path relative to the source tree when inside it."""
+    path = os.path.abspath(filename)
+    if path.startswith(_SRC_DIR + os.sep):
+        path = os.path.relpath(path, _SRC_DIR)
+    else:
+        path = os.path.basename(path)
+    return f"{path}:{lineno}"
+
+
+class MemoryDiagnostics:
+    """
+    Collects tracemalloc checkpoints and footprint estimates for a run.
+    """
+
+    def __init__(self, top_sites: int = DEFAULT_TOP_SITES, frames: int = 1):
+        """
+        Initialize a new MemoryDiagnostics instance.
+
+        Args:
+            top_sites (int): Allocation sites kept per checkpoint
+            frames (int): Stack frames tracemalloc stores per allocation (more
+                frames cost more memory while tracing)
+        """
+        self.top_sites = top_sites
+        self.frames = frames
+        self.enabled = False
+        self._checkpoints = []  # type: List[Checkpoint]
+        self._footprints = {}  # type: Dict[str, TypeFootprint]
+        self._previous = None
+        self._lock = threading.Lock()
+        self._started_tracemalloc = False
+
+    def start(self) -> None:
+        """
+        Starts tracing allocations and takes the baseline snapshot.
+        """
+        # Imported on demand: tracemalloc pulls in pickle and friends
+        import tracemalloc
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self._started_tracemalloc = True
+        self.enabled = True
+        with self._lock:
+            self._previous = self._snapshot()
+
+    def stop(self) -> None:
+        """
+        Stops collecting, and stops tracemalloc if these diagnostics started it.
+        """
+        self.enabled = False
+        self._previous = None
+        if self._started_tracemalloc:
+            import tracemalloc
+            tracemalloc.stop()
+        self._started_tracemalloc = False
+
+    def reset(self) -> None:
+        """
+        Discards all checkpoints and footprints.
+        """
+        with self._lock:
+            self._checkpoints = []
+            self._footprints = {}
+
+    @property
+    def checkpoints(self) -> List[Checkpoint]:
+        """Recorded checkpoints in order."""
+        return list(self._checkpoints)
+
+    @property
+    def footprints(self) -> Dict[str, TypeFootprint]:
+        """Recorded footprints by name."""
+        return dict(self._footprints)
+
+    def _snapshot(self):
+        import tracemalloc
+        ignored = [tracemalloc.Filter(False, source) for source in _IGNORED_SOURCES]
+        ignored.append(tracemalloc.Filter(False, tracemalloc.__file__))
+        ignored.append(tracemalloc.Filter(False, __file__))  # the previous snapshot's own bookkeeping
+        return tracemalloc.take_snapshot().filter_traces(ignored)
+
+    def checkpoint(self, name: str) -> Optional[Checkpoint]:
+        """
+        Records the memory state and the allocation sites that grew since the last checkpoint.
+
+        Args:
+            name (str): Name of the stage that just finished
+
+        Returns:
+            Optional[Checkpoint]: The checkpoint, or None when disabled
+        """
+        if not self.enabled:
+            return None
+        import tracemalloc
+        with self._lock:
+            snapshot = self._snapshot()
+            statistics = snapshot.compare_to(self._previous, "lineno") if self._previous else []
+            top_sites = [{
+                "site": _site_name(stat.traceback[0].filename, stat.traceback[0].lineno),
+                "size_diff": stat.size_diff,
+                "count_diff": stat.count_diff,
+                "size": stat.size,
+            } for stat in statistics[:self.top_sites] if stat.size_diff > 0]
+            checkpoint = Checkpoint(name, tracemalloc.get_traced_memory()[0], peak_rss_bytes(), top_sites)
+            self._previous = snapshot
+            self._checkpoints.append(checkpoint)
+        return checkpoint
+
+    def add_footprint(self, name: str, objects: Sequence[object], sample_size: int = DEFAULT_SAMPLE_SIZE,
+                      exclude: Iterable[str] = ()) -> TypeFootprint:
+        """
+        Estimates and records the footprint of a kind of object.
+
+        Args:
+            name (str): What the objects are, e.g. "Transaction"
+            objects (Sequence[object]): The objects
+            sample_size (int): Maximum number of objects to measure
+            exclude (Iterable[str]): Attributes not to count
+
+        Returns:
+            TypeFootprint: The estimate
+        """
+        footprint = estimate_footprint(name, objects, sample_size, exclude)
+        with self._lock:
+            self._footprints[name] = footprint
+        return footprint
+
+    def add_buffer(self, name: str, buffer: str) -> TypeFootprint:
+        """
+        Records the exact size of a rendered buffer, e.g. a report.
+
+        Args:
+            name (str): What the buffer holds
+            buffer (str): The buffer
+
+        Returns:
+            TypeFootprint: Its footprint
+        """
+        size = sys.getsizeof(buffer)
+        footprint = TypeFootprint(name, 1, 1, float(size), size)
+        with self._lock:
+            self._footprints[name] = footprint
+        return footprint
+
+    def attach(self, profiler: "Profiler") -> None:
+        """
+        Checkpoints after every stage recorded by a profiler.
+
+        Args:
+            profiler (Profiler): The profiler whose stages delimit checkpoints
+        """
+        profiler.memory = self
+
+    def to_dict(self) -> Dict[str, object]:
+        """
+        Returns the collected diagnostics as a JSON-serializable dictionary.
+
+        Returns:
+            Dict[str, object]: Checkpoints, footprints (sorted by name) and peak RSS
+        """
+        import tracemalloc
+        checkpoints = self.checkpoints
+        footprints = self.footprints
+        return {
+            "checkpoints": [checkpoint.to_dict() for checkpoint in checkpoints],
+            "footprints": {name: footprints[name].to_dict() for name in sorted(footprints)},
+            "traced_peak_bytes": tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else None,
+            "peak_rss_bytes": peak_rss_bytes(),
+        }
+
+    def to_json(self, indent: Optional[int] = 2) -> str:
+        """
+        Serializes the diagnostics to a JSON document.
+
+        Args:
+            indent (Optional[int]): JSON indentation (None for compact output)
+
+        Returns:
+            str: The diagnostics as JSON
+        """
+        import json
+        return json.dumps(self.to_dict(), indent=indent)
+
+    def format_table(self, sites: int = 3) -> str:
+        """
+        Formats checkpoints and footprints as fixed-width tables.
+
+        Args:
+            sites (int): Top allocation sites listed under each checkpoint
+
+        Returns:
+            str: The tables
+        """
+        header = f"{'Checkpoint':<32} {'Traced KiB':>12} {'Peak RSS KiB':>13}"
+        lines = [header, "-" * len(header)]
+        for checkpoint in self.checkpoints:
+            rss = "-" if checkpoint.peak_rss_bytes is None else f"{checkpoint.peak_rss_bytes / 1024:.0f}"
+            lines.append(f"{checkpoint.name:<32} {checkpoint.traced_bytes / 1024:>12.1f} {rss:>13}")
+            for site in checkpoint.top_sites[:sites]:
+                lines.append(f"    +{site['size_diff'] / 1024:>10.1f} KiB  {site['site']}")
+
+        footprints = self.footprints
+        if footprints:
+            header = f"{'Footprint':<32} {'Objects':>10} {'Bytes/obj':>10} {'Total KiB':>12}"
+            lines.extend(["", header, "-" * len(header)])
+            for name in sorted(footprints, key=lambda key: -footprints[key].total_bytes):
+                footprint = footprints[name]
+                lines.append(f"{name:<32} {footprint.count:>10} {footprint.bytes_per_object:>10.1f} "
+                             f"{footprint.total_bytes / 1024:>12.1f}")
+        return "\n".join(lines)
+
+
+def memory_diagnostics_requested(environ: Optional[Dict[str, str]] = None) -> bool:
+    """
+    Checks whether memory diagnostics are requested through the environment.
+
+    Args:
+        environ (Optional[Dict[str, str]]): Environment to inspect (defaults to os.environ)
+
+    Returns:
+        bool: True if FINANCE_TRACKER_MEMORY is set to a truthy value
+    """
+    environ = os.environ if environ is None else environ
+    return environ.get(MEMORY_ENV_VAR, "").strip().lower() in _TRUTHY
+
+
+# Process-wide default diagnostics, checkpointed by the default profiler's stages
+_default_diagnostics = MemoryDiagnostics()
+
+
+def get_memory_diagnostics() -> MemoryDiagnostics:
+    """
+    Returns the process-wide default memory diagnostics.
+
+    Returns:
+        MemoryDiagnostics: The shared diagnostics
+    """
+    return _default_diagnostics
+
+
+def enable_memory_diagnostics() -> MemoryDiagnostics:
+    """
+    Starts the default memory diagnostics and checkpoints after every stage of
+    the default profiler, which is enabled as well.
+
+    Returns:
+        MemoryDiagnostics: The shared diagnostics
+    """
+    from .profiling import enable_profiling
+    _default_diagnostics.attach(enable_profiling())
+    if not _default_diagnostics.enabled:
+        _default_diagnostics.start()
+    return _default_diagnostics
@@ -0,0 +1,291 @@
+"""
+Metrics Utilities
+
+Provides a lightweight, in-process metrics registry with counters and
+histograms. Recording a value is a lock-protected integer or float update,
+so the instruments are cheap enough to leave enabled in production.
+The whole registry can be exported as a dictionary or JSON document.
+"""
+
+import threading
+from bisect import bisect_left
+from typing import Dict, Optional, Sequence, Union
+
+Number = Union[int, float]
+
+# Default latency buckets in seconds (upper bounds, inclusive)
+DEFAULT_LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+
+class Counter:
+    """
+    A monotonically increasing counter.
+    """
+
+    __slots__ = ("name", "description", "_value", "_lock")
+
+    def __init__(self, name: str, description: str = ""):
+        """
+        Initialize a new Counter instance.
+
+        Args:
+            name (str): Unique metric name
+            description (str): Human readable description of the metric
+        """
+        self.name = name
+        self.description = description
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: Number = 1) -> None:
+        """
+        Increments the counter.
+
+        Args:
+            amount (Number): Amount to add (must not be negative)
+
+        Raises:
+            ValueError: If the amount is negative
+        """
+        if amount < 0:
+            raise ValueError("Counter can only be incremented by a non-negative amount")
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> Number:
+        """Current value of the counter."""
+        return self._value
+
+    def reset(self) -> None:
+        """
+        Resets the counter to zero.
+        """
+        with self._lock:
+            self._value = 0
+
+    def to_dict(self) -> Dict[str, object]:
+        """
+        Returns the counter as a JSON-serializable dictionary.
+
+        Returns:
+            Dict[str, object]: The counter type, description and value
+        """
+        return {"type": "counter", "description": self.description, "value": self._value}
+
+
+class Histogram:
+    """
+    A histogram with fixed bucket boundaries.
+
+    Tracks the count, sum, minimum and maximum of observed values along with
+    per-bucket counts, which is enough to derive averages and approximate
+    percentiles without keeping individual samples.
+    """
+
+    __slots__ = ("name", "description", "buckets", "_bucket_counts",
+                 "_count", "_sum", "_min", "_max", "_lock")
+
+    def __init__(self, name: str, description: str = "",
+                 buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        """
+        Initialize a new Histogram instance.
+
+        Args:
+            name (str): Unique metric name
+            description (str): Human readable description of the metric
+            buckets (Sequence[float]): Sorted upper bounds of the buckets
+        """
+        self.name = name
+        self.description = description
+        self.buckets = tuple(sorted(buckets))
+        # One extra bucket collects values above the last boundary
+        self._bucket_counts = [0] * (len(self.buckets) + 1)
+        self._count = 0
+        self._sum = 0.0
+        self._min = None  # type: Optional[float]
+        self._max = None  # type: Optional[float]
+        self._lock = threading.Lock()
+
+    def observe(self, value: Number) -> None:
+        """
+        Records a single observation.
+
+        Args:
+            value (Number): The observed value
+        """
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self._bucket_counts[index] += 1
+            self._count += 1
+            self._sum += value
+            if self._min is None or value < self._min:
+                self._min = value
+            if self._max is None or value > self._max:
+                self._max = value
+
+    @property
+    def count(self) -> int:
+        """Number of recorded observations."""
+        return self._count
+
+    @property
+    def total(self) -> float:
+        """Sum of all recorded observations."""
+        return self._sum
+
+    def reset(self) -> None:
+        """
+        Clears all recorded observations.
+        """
+        with self._lock:
+            self._bucket_counts = [0] * (len(self.buckets) + 1)
+            self._count = 0
+            self._sum = 0.0
+            self._min = None
+            self._max = None
+
+    def to_dict(self) -> Dict[str, object]:
+        """
+        Returns the histogram as a JSON-serializable dictionary.
+
+        Returns:
+            Dict[str, object]: Summary statistics and bucket counts
+        """
+        with self._lock:
+            bucket_counts = list(self._bucket_counts)
+            count, total = self._count, self._sum
+            minimum, maximum = self._min, self._max
+
+        buckets = {str(bound): n for bound, n in zip(self.buckets, bucket_counts)}
+        buckets["+Inf"] = bucket_counts[-1]
+        return {
+            "type": "histogram",
+            "description": self.description,
+            "count": count,
+            "sum": total,
+            "min": minimum,
+            "max": maximum,
+            "mean": total / count if count else 0.0,
+            "buckets": buckets,
+        }
+
+
+class MetricsRegistry:
+    """
+    A named collection of counters and histograms.
+
+    Instruments are created on first use and shared afterwards, so modules
+    can look up their metrics at import time and record values cheaply.
+    """
+
+    def __init__(self):
+        """
+        Initialize an empty MetricsRegistry.
+        """
+        self._metrics = {}  # type: Dict[str, Union[Counter, Histogram]]
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, description: str = "") -> Counter:
+        """
+        Returns the counter with the given name, creating it if necessary.
+
+        Args:
+            name (str): Unique metric name
+            description (str): Description used when the counter is created
+
+        Returns:
+            Counter: The registered counter
+
+        Raises:
+            TypeError: If a metric of another type is registered under the name
+        """
+        return self._get_or_create(name, Counter, lambda: Counter(name, description))
+
+    def histogram(self, name: str, description: str = "",
+                  buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS) -> Histogram:
+        """
+        Returns the histogram with the given name, creating it if necessary.
+
+        Args:
+            name (str): Unique metric name
+            description (str): Description used when the histogram is created
+            buckets (Sequence[float]): Bucket upper bounds used when the histogram is created
+
+        Returns:
+            Histogram: The registered histogram
+
+        Raises:
+            TypeError: If a metric of another type is registered under the name
+        """
+        return self._get_or_create(name, Histogram,
+                                   lambda: Histogram(name, description, buckets))
+
+    def _get_or_create(self, name, metric_type, factory):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = factory()
+                self._metrics[name] = metric
+            elif not isinstance(metric, metric_type):
+                raise TypeError(f"Metric '{name}' is already registered as {type(metric).__name__}")
+            return metric
+
+    def get(self, name: str) -> Optional[Union[Counter, Histogram]]:
+        """
+        Looks up a metric by name.
+
+        Args:
+            name (str): The metric name
+
+        Returns:
+            Optional[Union[Counter, Histogram]]: The metric, or None if it is not registered
+        """
+        return self._metrics.get(name)
+
+    def reset(self) -> None:
+        """
+        Resets every registered metric without unregistering it.
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.reset()
+
+    def to_dict(self) -> Dict[str, Dict[str, object]]:
+        """
+        Returns every registered metric as a JSON-serializable dictionary.
+
+        Returns:
+            Dict[str, Dict[str, object]]: Metric dictionaries keyed by metric name
+        """
+        with self._lock:
+            metrics = sorted(self._metrics.items())
+        return {name: metric.to_dict() for name, metric in metrics}
+
+    def to_json(self, indent: Optional[int] = 2) -> str:
+        """
+        Serializes the registry to a JSON document.
+
+        Args:
+            indent (Optional[int]): JSON indentation (None for compact output)
+
+        Returns:
+            str: The metrics as JSON
+        """
+        import json
+        return json.dumps(self.to_dict(), indent=indent, sort_keys=True)
+
+
+# Process-wide default registry
+_default_registry = MetricsRegistry()
+
+
+def get_registry() -> MetricsRegistry:
+    """
+    Returns the process-wide default metrics registry.
+
+    Returns:
+        MetricsRegistry: The shared registry
+    """
+    return _default_registry
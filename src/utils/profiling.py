@@ -0,0 +1,328 @@
+"""
+Profiling Utilities
+
+Provides per-stage instrumentation for the application pipeline.
+Each profiled stage records wall time, CPU time, an optional row count and
+the memory allocated while it ran (via tracemalloc). Profiling is disabled
+by default and can be switched on with the FINANCE_TRACKER_PROFILE
+environment variable or programmatically with enable_profiling().
+Attached MemoryDiagnostics (utils.memory) take a tracemalloc snapshot
+after every stage.
+"""
+
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, List, Optional
+
+if TYPE_CHECKING:
+    from .memory import MemoryDiagnostics
+
+# Environment variable that enables profiling ("1", "true", "yes" or "on")
+PROFILE_ENV_VAR = "FINANCE_TRACKER_PROFILE"
+
+_TRUTHY = {"1", "true", "yes", "on"}
+
+
+class StageTiming:
+    """
+    Measurements collected for a single run of a pipeline stage.
+    """
+
+    __slots__ = ("name", "wall_seconds", "cpu_seconds", "rows",
+                 "allocated_bytes", "peak_bytes")
+
+    def __init__(self, name: str):
+        """
+        Initialize a new StageTiming instance.
+
+        Args:
+            name (str): Name of the stage
+        """
+        self.name = name
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.rows = None  # type: Optional[int]
+        self.allocated_bytes = 0
+        self.peak_bytes = 0
+
+    def to_dict(self) -> Dict[str, object]:
+        """
+        Returns the measurements as a JSON-serializable dictionary.
+
+        Returns:
+            Dict[str, object]: The stage measurements
+        """
+        return {
+            "name": self.name,
+            "wall_seconds": self.wall_seconds,
+            "cpu_seconds": self.cpu_seconds,
+            "rows": self.rows,
+            "allocated_bytes": self.allocated_bytes,
+            "peak_bytes": self.peak_bytes,
+        }
+
+
+class Profiler:
+    """
+    Collects StageTiming records for a pipeline run.
+
+    When disabled, stage() and the profiled() decorator reduce to a single
+    attribute check so instrumented functions pay almost nothing.
+    """
+
+    def __init__(self, enabled: bool = False, trace_memory: bool = True):
+        """
+        Initialize a new Profiler instance.
+
+        Args:
+            enabled (bool): Whether stages are recorded
+            trace_memory (bool): Whether tracemalloc is used to measure allocations
+        """
+        self.enabled = enabled
+        self.trace_memory = trace_memory
+        self._stages = []  # type: List[StageTiming]
+        self._lock = threading.Lock()
+        self._started_tracemalloc = False
+        # Highest traced memory seen so far by each open stage, outermost first
+        self._peaks = []  # type: List[int]
+        # Checkpointed after every recorded stage (see MemoryDiagnostics.attach)
+        self.memory = None  # type: Optional[MemoryDiagnostics]
+
+    def enable(self) -> None:
+        """
+        Enables stage recording.
+        """
+        self.enabled = True
+
+    def disable(self) -> None:
+        """
+        Disables stage recording and stops tracemalloc if this profiler started it.
+        """
+        self.enabled = False
+        if self._started_tracemalloc:
+            import tracemalloc
+            tracemalloc.stop()
+        self._started_tracemalloc = False
+
+    @property
+    def stages(self) -> List[StageTiming]:
+        """Recorded stages in completion order."""
+        return list(self._stages)
+
+    def reset(self) -> None:
+        """
+        Discards all recorded stages.
+        """
+        with self._lock:
+            self._stages = []
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[Optional[StageTiming]]:
+        """
+        Context manager that measures the enclosed block as a named stage.
+
+        The yielded StageTiming may be used to set the row count. When the
+        profiler is disabled, None is yielded and nothing is recorded.
+
+        Args:
+            name (str): Name of the stage
+
+        Yields:
+            Optional[StageTiming]: The record being filled in, or None when disabled
+        """
+        if not self.enabled:
+            yield None
+            return
+
+        timing = StageTiming(name)
+        tracing = self.trace_memory
+        if tracing:
+            # Imported on demand: tracemalloc pulls in pickle and friends
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracemalloc = True
+            memory_before, peak = tracemalloc.get_traced_memory()
+            resets_peak = hasattr(tracemalloc, "reset_peak")
+            if resets_peak:
+                # Resetting erases the enclosing stage's peak so far: keep it on the stack
+                with self._lock:
+                    if self._peaks:
+                        self._peaks[-1] = max(self._peaks[-1], peak)
+                    self._peaks.append(memory_before)
+                tracemalloc.reset_peak()
+
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield timing
+        finally:
+            timing.cpu_seconds = time.process_time() - cpu_start
+            timing.wall_seconds = time.perf_counter() - wall_start
+            if tracing:
+                current, peak = tracemalloc.get_traced_memory()
+                if resets_peak:
+                    with self._lock:
+                        peak = max(self._peaks.pop(), peak)
+                        if self._peaks:
+                            self._peaks[-1] = max(self._peaks[-1], peak)
+                timing.allocated_bytes = current - memory_before
+                timing.peak_bytes = max(peak - memory_before, 0)
+            with self._lock:
+                self._stages.append(timing)
+            if self.memory is not None:
+                self.memory.checkpoint(name)
+
+    def profiled(self, name: Optional[str] = None,
+                 rows: Optional[str] = None) -> Callable[[Callable], Callable]:
+        """
+        Decorator that records every call of the wrapped function as a stage.
+
+        Args:
+            name (Optional[str]): Stage name (defaults to the function name)
+            rows (Optional[str]): How to count rows: "result" uses len() of the
+                return value, "arg" uses len() of the first positional argument,
+                None records no row count
+
+        Returns:
+            Callable[[Callable], Callable]: The decorator
+        """
+        def decorator(func: Callable) -> Callable:
+            stage_name = name or func.__name__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with self.stage(stage_name) as timing:
+                    result = func(*args, **kwargs)
+                    if rows == "result":
+                        timing.rows = _safe_len(result)
+                    elif rows == "arg" and args:
+                        timing.rows = _safe_len(args[0])
+                    return result
+
+            return wrapper
+
+        return decorator
+
+    def to_dict(self) -> Dict[str, object]:
+        """
+        Returns the recorded run as a JSON-serializable dictionary.
+
+        Returns:
+            Dict[str, object]: Per-stage records and run totals
+        """
+        stages = self.stages
+        return {
+            "stages": [stage.to_dict() for stage in stages],
+            "total_wall_seconds": sum(stage.wall_seconds for stage in stages),
+            "total_cpu_seconds": sum(stage.cpu_seconds for stage in stages),
+        }
+
+    def to_json(self, indent: Optional[int] = 2) -> str:
+        """
+        Serializes the recorded run to a JSON document.
+
+        Args:
+            indent (Optional[int]): JSON indentation (None for compact output)
+
+        Returns:
+            str: The profile as JSON
+        """
+        import json
+        return json.dumps(self.to_dict(), indent=indent)
+
+    def format_table(self) -> str:
+        """
+        Formats the recorded stages as a fixed-width timing table.
+
+        Returns:
+            str: The timing table
+        """
+        header = f"{'Stage':<32} {'Wall ms':>10} {'CPU ms':>10} {'Rows':>10} {'Alloc KiB':>11} {'Peak KiB':>10}"
+        lines = [header, "-" * len(header)]
+        for stage in self.stages:
+            row_count = "-" if stage.rows is None else str(stage.rows)
+            lines.append(
+                f"{stage.name:<32} {stage.wall_seconds * 1000:>10.2f} "
+                f"{stage.cpu_seconds * 1000:>10.2f} {row_count:>10} "
+                f"{stage.allocated_bytes / 1024:>11.1f} {stage.peak_bytes / 1024:>10.1f}"
+            )
+        return "\n".join(lines)
+
+
+def _safe_len(value) -> Optional[int]:
+    try:
+        return len(value)
+    except TypeError:
+        return None
+
+
+def profiling_requested(environ: Optional[Dict[str, str]] = None) -> bool:
+    """
+    Checks whether profiling is requested through the environment.
+
+    Args:
+        environ (Optional[Dict[str, str]]): Environment to inspect (defaults to os.environ)
+
+    Returns:
+        bool: True if FINANCE_TRACKER_PROFILE is set to a truthy value
+    """
+    environ = os.environ if environ is None else environ
+    return environ.get(PROFILE_ENV_VAR, "").strip().lower() in _TRUTHY
+
+
+# Process-wide default profiler
+_default_profiler = Profiler(enabled=profiling_requested())
+
+
+def get_profiler() -> Profiler:
+    """
+    Returns the process-wide default profiler.
+
+    Returns:
+        Profiler: The shared profiler
+    """
+    return _default_profiler
+
+
+def enable_profiling() -> Profiler:
+    """
+    Enables the process-wide default profiler.
+
+    Returns:
+        Profiler: The shared profiler
+    """
+    _default_profiler.enable()
+    return _default_profiler
+
+
+def profile_stage(name: str):
+    """
+    Measures a block as a stage of the process-wide default profiler.
+
+    Args:
+        name (str): Name of the stage
+
+    Returns:
+        ContextManager[Optional[StageTiming]]: The stage context manager
+    """
+    return _default_profiler.stage(name)
+
+
+def profiled(name: Optional[str] = None, rows: Optional[str] = None) -> Callable[[Callable], Callable]:
+    """
+    Decorator recording calls as stages of the process-wide default profiler.
+
+    Args:
+        name (Optional[str]): Stage name (defaults to the function name)
+        rows (Optional[str]): Row counting mode ("result", "arg" or None)
+
+    Returns:
+        Callable[[Callable], Callable]: The decorator
+    """
+    return _default_profiler.profiled(name, rows)
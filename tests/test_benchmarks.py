@@ -0,0 +1,72 @@
+"""
+Unit tests for the benchmark harness.
+
+Tests result collection and baseline comparison.
+"""
+
+import unittest
+import os
+import sys
+
+# Add the repository root to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from benchmarks.harness import compare_results, format_comparison, run_benchmarks
+import benchmarks.bench_pipeline  # noqa: F401  (registers benchmarks)
+
+
+class TestBenchmarkHarness(unittest.TestCase):
+    """Test cases for the benchmark harness."""
+    
+    def test_run_benchmarks_small(self):
+        """Test running the registered benchmarks at a tiny size."""
+        results = run_benchmarks([20], repeat=1)
+        
+        self.assertIn("meta", results)
+        self.assertIn("generate_transaction_summary[20]", results["results"])
+        self.assertIn("file_ops.write_file[20]", results["results"])
+        for result in results["results"].values():
+            self.assertEqual(result["size"], 20)
+            self.assertGreaterEqual(result["median"], 0.0)
+    
+    def test_compare_results_flags_regression(self):
+        """Test that slowdowns beyond the threshold are flagged."""
+        baseline = {"results": {
+            "a[10]": {"median": 1.0},
+            "b[10]": {"median": 1.0},
+            "c[10]": {"median": 1.0},
+        }}
+        current = {"results": {
+            "a[10]": {"median": 1.05},
+            "b[10]": {"median": 1.5},
+            "d[10]": {"median": 9.0},
+        }}
+        
+        comparisons = compare_results(current, baseline, threshold=0.10)
+        
+        self.assertEqual([entry["case"] for entry in comparisons], ["a[10]", "b[10]"])
+        self.assertFalse(comparisons[0]["regression"])
+        self.assertTrue(comparisons[1]["regression"])
+        self.assertAlmostEqual(comparisons[1]["ratio"], 1.5)
+    
+    def test_memory_is_recorded_and_compared(self):
+        """Test that peak memory is recorded on request and memory growth is flagged."""
+        results = run_benchmarks([20], repeat=1, names=["generate_transaction_summary"], memory=True)
+        self.assertGreater(results["results"]["generate_transaction_summary[20]"]["peak_bytes"], 0)
+        
+        baseline = {"results": {"a[10]": {"median": 1.0, "peak_bytes": 1000},
+                                "b[10]": {"median": 1.0}}}
+        current = {"results": {"a[10]": {"median": 1.0, "peak_bytes": 1500},
+                               "b[10]": {"median": 1.0, "peak_bytes": 1500}}}
+        
+        comparisons = compare_results(current, baseline, threshold=0.10)
+        
+        self.assertFalse(comparisons[0]["regression"])
+        self.assertTrue(comparisons[0]["memory_regression"])
+        self.assertAlmostEqual(comparisons[0]["memory_ratio"], 1.5)
+        self.assertNotIn("memory_ratio", comparisons[1])
+        self.assertIn("MEMORY REGRESSION", format_comparison(comparisons))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
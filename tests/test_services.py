@@ -5,17 +5,80 @@ Tests the data service and report service functionality.
 """
 
 import unittest
-from datetime import datetime
+import asyncio
+import csv
+import io
+import time
+from datetime import datetime, timedelta, timezone
+import http.client
+import json
+import math
 import os
+import pickle
 import sys
+import tempfile
+import threading
+import urllib.error
+import urllib.request
+from unittest import mock
 
 # Add src to path for imports
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 
 from services.data_service import load_users, load_transactions, create_sample_user, create_sample_transaction
-from services.report_service import generate_user_report, generate_transaction_summary
+from services.report_service import (
+    generate_transaction_summary,
+    generate_user_report,
+    save_transaction_summary_to_file,
+    save_user_report_to_file,
+)
+from services.report_formats import transaction_report_writer, transaction_summary_data, write_transactions_jsonl
+from services.data_context import DataContext
+from services.report_server import MAX_BODY_BYTES, WarmReportState, create_server
+from services.async_data_service import (
+    BoundedExecutor,
+    aiter_transactions,
+    async_get_transactions_by_user,
+    async_get_user_by_id,
+    async_load,
+)
+from services.aggregation import (
+    TransactionAggregate,
+    TransactionColumns,
+    aggregate_partial,
+    aggregate_transactions,
+    datetime_to_micros,
+    exact_partials,
+    merge_partials,
+    micros_to_datetime,
+)
+from services.data_service import generate_transactions
+from services.transaction_store import TransactionStore
+from services.ledger import Ledger
+from services.dedup_service import (
+    BloomFilter,
+    Deduplicator,
+    FingerprintIndex,
+    fingerprint,
+    normalize_description,
+)
+from services.categorizer import UNCATEGORIZED, Categorizer, Rule
+from services.recurring import RecurringDetector, detect_recurring
+from services.anomaly import AnomalyDetector
+from services.currency import RateTable
+from services.snapshot import Snapshot, compact_log, load_context, save_snapshot
+from services.wal import WriteAheadLog, read_log
+from services.partitions import MANIFEST_NAME, PartitionedStore
+from services.ingest import DirectoryTailer, watch
+from services.import_service import CSV_FIELDS, export_transactions, import_transactions, transaction_to_row
+from main import analyze_spending_patterns
 from models.user import User
-from models.transaction import Transaction, TransactionType, TransactionStatus
+from models.string_pool import DESCRIPTIONS, StringPool
+from models.transaction import Transaction, TransactionType, TransactionStatus, transaction_descriptions
+from models import validation
+from models.validation import is_valid_email_address, validate_amounts, validate_emails, validate_users
+from utils.memory import get_memory_diagnostics
+from services.rendering import DayFormatter, RowTemplate
 
 
 class TestDataService(unittest.TestCase):
@@ -114,6 +177,19 @@ class TestReportService(unittest.TestCase):
         report = generate_user_report([])
         self.assertEqual(report, "No users found in the system.")
     
+    def test_summary_status_indicators(self):
+        """Test that recent rows of every status get an indicator."""
+        transactions = [Transaction(i, 1, 10.0, TransactionType.PAYMENT, f"Row {i}") for i in range(1, 5)]
+        transactions[0].complete_transaction()
+        transactions[2].fail_transaction("Declined")
+        transactions[3].cancel_transaction()
+        
+        summary = generate_transaction_summary(transactions)
+        
+        self.assertEqual(summary.count("✓ "), 1)
+        self.assertEqual(summary.count("⏳ "), 1)
+        self.assertEqual(summary.count("✗ "), 2)
+    
     def test_generate_transaction_summary(self):
         """Test generating a transaction summary."""
         summary = generate_transaction_summary(self.test_transactions)
@@ -131,6 +207,1480 @@ class TestReportService(unittest.TestCase):
         """Test generating a transaction summary with no transactions."""
         summary = generate_transaction_summary([])
         self.assertEqual(summary, "No transactions found in the system.")
+    
+    def test_structured_user_outputs(self):
+        """Test the JSON Lines, CSV and JSON summary outputs of the user report."""
+        self.test_users[0].email = "not-an-email"
+        with tempfile.TemporaryDirectory() as temp_dir:
+            paths = {fmt: os.path.join(temp_dir, f"users.{fmt}") for fmt in ("text", "json", "jsonl", "csv")}
+            for fmt, path in paths.items():
+                self.assertTrue(save_user_report_to_file(self.test_users, path, fmt))
+            
+            with open(paths["jsonl"], encoding="utf-8") as file:
+                lines = file.read().splitlines()
+            self.assertEqual(lines[1], json.dumps({
+                "user_id": 2, "username": "jane", "email": "jane@test.com", "first_name": "Jane",
+                "last_name": "Smith", "is_active": False,
+                "created_at": self.test_users[1].created_at.isoformat(), "email_valid": True,
+            }))
+            self.assertFalse(json.loads(lines[0])["email_valid"])
+            
+            with open(paths["csv"], encoding="utf-8", newline="") as file:
+                rows = list(csv.DictReader(file))
+            self.assertEqual([row["username"] for row in rows], ["john", "jane"])
+            self.assertEqual(rows[1]["is_active"], "false")
+            
+            with open(paths["json"], encoding="utf-8") as file:
+                self.assertEqual(json.load(file), {"total_users": 2, "active_users": 1, "inactive_users": 1,
+                                                   "active_rate": 50.0, "invalid_emails": 1})
+            with open(paths["text"], encoding="utf-8") as file:
+                self.assertIn("Inactive Users: 1", file.read())
+        
+        with self.assertRaises(ValueError):
+            save_user_report_to_file(self.test_users, "unused.xml", "xml")
+    
+    def test_structured_transaction_outputs(self):
+        """Test that transaction rows stream as exact JSON and re-importable CSV."""
+        transactions = generate_transactions(50, user_count=5, seed=3)
+        transactions[0].description = 'Café "au lait", to go'
+        transactions[1].amount = float("nan")
+        stream = io.StringIO()
+        self.assertEqual(write_transactions_jsonl(transactions, stream), 50)
+        expected = [json.dumps(dict(zip(CSV_FIELDS, [
+            t.transaction_id, t.user_id, t.amount, t.transaction_type.value, t.status.value,
+            t.description, t.created_at.isoformat(), t.currency]))) for t in transactions]
+        self.assertEqual(stream.getvalue().splitlines(), expected)
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "transactions.csv")
+            self.assertTrue(save_transaction_summary_to_file(transactions, path, "csv"))
+            exported = os.path.join(temp_dir, "exported.csv")
+            export_transactions(transactions, exported)
+            with open(path, "rb") as saved, open(exported, "rb") as reference:
+                self.assertEqual(saved.read(), reference.read())
+    
+    def test_json_summary_matches_text_summary(self):
+        """Test that the JSON summary carries the numbers of the text summary."""
+        summary = transaction_summary_data(self.test_transactions, recurring=[], anomalies=[])
+        self.assertEqual(summary["total_transactions"], 3)
+        self.assertEqual(summary["status_counts"]["completed"], 2)
+        self.assertEqual(summary["type_counts"], {"deposit": 1, "withdrawal": 1, "payment": 1})
+        self.assertEqual(summary["completed_total"], 125.0)
+        self.assertEqual(summary["completed_average"], 62.5)
+        self.assertEqual(summary["recurring"], [])
+        self.assertIn("Total Completed Amount: $125.00", generate_transaction_summary(self.test_transactions))
+        
+        stream = io.StringIO()
+        transaction_report_writer(self.test_transactions, "json")(stream)
+        self.assertNotIn(" ", stream.getvalue())
+        self.assertEqual(json.loads(stream.getvalue())["completed_total"], 125.0)
+        self.assertEqual(transaction_summary_data([])["total_transactions"], 0)
+
+
+class TestDataContext(unittest.TestCase):
+    """Test cases for the shared data context."""
+    
+    def setUp(self):
+        """Set up test fixtures before each test method."""
+        self.load_calls = 0
+        self.transactions = [
+            Transaction(1, 1, 100.0, TransactionType.DEPOSIT, "Salary"),
+            Transaction(2, 2, 40.0, TransactionType.PAYMENT, "Groceries"),
+            Transaction(3, 1, 60.0, TransactionType.PAYMENT, "Utilities"),
+        ]
+        self.transactions[0].complete_transaction()
+        self.transactions[2].complete_transaction()
+    
+    def _load(self):
+        self.load_calls += 1
+        return list(self.transactions)
+    
+    def test_loads_once(self):
+        """Test that several analyses share a single load."""
+        context = DataContext(users=[], transaction_loader=self._load)
+        
+        first = analyze_spending_patterns(context)
+        second = analyze_spending_patterns(context)
+        
+        self.assertEqual(self.load_calls, 1)
+        self.assertEqual(first, second)
+        self.assertEqual(first["transaction_count"], 2)
+        self.assertEqual(first["spending_by_type"], {"deposit": 100.0, "payment": 60.0})
+    
+    def test_derived_views(self):
+        """Test cached completed, by-type and by-user views."""
+        context = DataContext(users=[User(1, "john", "john@test.com", "John", "Doe")],
+                              transactions=list(self.transactions))
+        
+        self.assertEqual([t.transaction_id for t in context.completed_transactions], [1, 3])
+        self.assertIs(context.completed_transactions, context.completed_transactions)
+        self.assertEqual(len(context.transactions_by_type[TransactionType.PAYMENT]), 2)
+        self.assertEqual([t.transaction_id for t in context.get_transactions_for_user(1)], [1, 3])
+        self.assertEqual(context.get_user(1).username, "john")
+        self.assertIsNone(context.get_user(42))
+    
+    def test_add_transactions_invalidates_views(self):
+        """Test that adding transactions refreshes derived views."""
+        context = DataContext(users=[], transactions=list(self.transactions))
+        self.assertEqual(len(context.completed_transactions), 2)
+        
+        new_transaction = Transaction(4, 2, 10.0, TransactionType.DEPOSIT)
+        new_transaction.complete_transaction()
+        context.add_transactions([new_transaction])
+        
+        self.assertEqual(len(context.completed_transactions), 3)
+        self.assertEqual(len(context.get_transactions_for_user(2)), 2)
+    
+    def test_add_transactions_keeps_ledger(self):
+        """Test that the ledger is appended to, and the caller's list is left alone."""
+        context = DataContext(users=[], transactions=self.transactions)
+        ledger = context.ledger
+        
+        new_transaction = Transaction(4, 2, 10.0, TransactionType.DEPOSIT)
+        new_transaction.complete_transaction()
+        context.add_transactions([new_transaction])
+        
+        self.assertIs(context.ledger, ledger)
+        self.assertEqual(ledger.balances(), Ledger(context.transactions).balances())
+        self.assertEqual(len(self.transactions), 3)
+        self.assertEqual(len(context.transactions), 4)
+    
+    def test_add_transactions_merges_category_totals(self):
+        """Test that only new rows are categorized and the totals match a rebuild."""
+        transactions = generate_transactions(300, user_count=10, seed=5)
+        context = DataContext(users=[], transactions=transactions[:200])
+        self.assertTrue(context.completed_by_category)
+        
+        with mock.patch.object(context, "_category_partials", wraps=context._category_partials) as spy:
+            context.add_transactions(transactions[200:250])
+            context.add_transactions(transactions[250:])
+            categories = context.completed_by_category
+        self.assertEqual([len(call.args[0]) for call in spy.call_args_list], [50, 50])
+        self.assertEqual(categories, DataContext(users=[], transactions=transactions).completed_by_category)
+    
+    def test_spending_analysis_needs_one_currency(self):
+        """Test that spending analysis refuses to total several currencies."""
+        context = DataContext(users=[], transactions=self.transactions)
+        self.assertEqual(context.spending_analysis()["currency"], "USD")
+        
+        context.add_transactions([Transaction(4, 2, 10.0, TransactionType.DEPOSIT, currency="EUR")])
+        self.assertEqual(context.currencies, ["USD", "EUR"])
+        with self.assertRaises(ValueError):
+            context.spending_analysis()
+
+
+class TestReportServer(unittest.TestCase):
+    """Test cases for the long-running report server."""
+    
+    def setUp(self):
+        """Start a server on a free port with a small dataset."""
+        transactions = [
+            Transaction(1, 1, 100.0, TransactionType.DEPOSIT, "Salary"),
+            Transaction(2, 2, 40.0, TransactionType.PAYMENT, "Groceries"),
+        ]
+        transactions[0].complete_transaction()
+        self.state = WarmReportState(DataContext(
+            users=[User(1, "john", "john@test.com", "John", "Doe")],
+            transactions=transactions
+        ))
+        self.server = create_server(self.state, port=0)
+        self.base_url = "http://127.0.0.1:%d" % self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+    
+    def tearDown(self):
+        """Stop the server."""
+        self.server.shutdown()
+        self.server.server_close()
+    
+    def _get(self, path):
+        with urllib.request.urlopen(self.base_url + path) as response:
+            return response.read().decode("utf-8")
+    
+    def test_reports_are_cached(self):
+        """Test that repeated requests reuse the rendered report."""
+        first = self._get("/reports/transactions")
+        self.assertIn("Total Transactions: 2", first)
+        self.assertEqual(self._get("/reports/transactions"), first)
+        self.assertIn("USER REPORT", self._get("/reports/users"))
+        
+        analysis = json.loads(self._get("/analysis"))
+        self.assertEqual(analysis["transaction_count"], 1)
+    
+    def test_post_transactions_invalidates_cache(self):
+        """Test that new transactions are reflected in later responses."""
+        self._get("/reports/transactions")
+        body = json.dumps([
+            {"transaction_id": 3, "user_id": 1, "amount": 25.5, "type": "payment", "status": "completed"},
+            {"transaction_id": 4, "user_id": 2, "amount": 10, "type": "deposit"},
+        ]).encode("utf-8")
+        request = urllib.request.Request(self.base_url + "/transactions", data=body, method="POST",
+                                         headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request) as response:
+            self.assertEqual(response.status, 201)
+            result = json.loads(response.read())
+            self.assertEqual(result["added"], 2)
+            self.assertEqual(result["flagged"], [])
+        
+        self.assertIn("Total Transactions: 4", self._get("/reports/transactions"))
+        self.assertEqual(json.loads(self._get("/analysis"))["transaction_count"], 2)
+        self.assertEqual(json.loads(self._get("/health"))["transactions"], 4)
+    
+    def test_summary_is_rendered_from_the_merged_aggregate(self):
+        """Test that a summary after new transactions only converts the new rows."""
+        self.state.transaction_summary()
+        added = generate_transactions(20, user_count=3, seed=4)
+        self.state.add_transactions(added)
+        
+        with mock.patch.object(TransactionColumns, "from_transactions",
+                               wraps=TransactionColumns.from_transactions) as spy:
+            summary = self.state.transaction_summary()
+            self.state.analysis()
+        self.assertEqual(spy.call_count, 0)
+        
+        context = self.state.context
+        expected = generate_transaction_summary(context.transactions, anomalies=context.anomalies)
+        self.assertEqual(summary.splitlines()[4:], expected.splitlines()[4:])
+        self.assertIn("Total Transactions: 22", summary)
+    
+    def test_invalid_requests(self):
+        """Test error responses for unknown paths and bad payloads."""
+        with self.assertRaises(urllib.error.HTTPError) as context:
+            self._get("/nope")
+        self.assertEqual(context.exception.code, 404)
+        
+        request = urllib.request.Request(self.base_url + "/transactions", data=b'{"amount": 1}',
+                                         method="POST")
+        with self.assertRaises(urllib.error.HTTPError) as context:
+            urllib.request.urlopen(request)
+        self.assertEqual(context.exception.code, 400)
+        
+        for length, status in (("abc", 400), ("-1", 400), (str(MAX_BODY_BYTES + 1), 413)):
+            connection = http.client.HTTPConnection("127.0.0.1", self.server.server_address[1])
+            try:
+                connection.putrequest("POST", "/transactions")
+                connection.putheader("Content-Length", length)
+                connection.endheaders()
+                self.assertEqual(connection.getresponse().status, status)
+            finally:
+                connection.close()
+        
+        self.state.add_transactions([Transaction(3, 1, 5.0, TransactionType.PAYMENT, "Café", currency="EUR")])
+        with self.assertRaises(urllib.error.HTTPError) as context:
+            self._get("/reports/transactions")
+        self.assertEqual(context.exception.code, 409)
+    
+    def test_memory_endpoint(self):
+        """Test that /debug/memory needs memory diagnostics and reports resident data."""
+        memory = get_memory_diagnostics()
+        if not memory.enabled:
+            with self.assertRaises(urllib.error.HTTPError) as context:
+                self._get("/debug/memory")
+            self.assertEqual(context.exception.code, 404)
+        
+        self._get("/reports/users")
+        memory.start()
+        try:
+            data = json.loads(self._get("/debug/memory"))
+        finally:
+            memory.stop()
+            memory.reset()
+        self.assertEqual(data["footprints"]["transactions"]["count"], 2)
+        self.assertEqual(data["footprints"]["users"]["count"], 1)
+        self.assertIn("buffer:user_report", data["footprints"])
+
+
+class TestAsyncDataService(unittest.TestCase):
+    """Test cases for the asyncio data service."""
+    
+    def setUp(self):
+        """Set up a dedicated executor for each test."""
+        self.executor = BoundedExecutor(max_workers=2)
+    
+    def tearDown(self):
+        """Shut down the executor."""
+        self.executor.shutdown()
+    
+    def test_async_load_is_concurrent(self):
+        """Test that users and transactions load at the same time."""
+        def slow_users():
+            time.sleep(0.2)
+            return load_users()
+        
+        def slow_transactions():
+            time.sleep(0.2)
+            return load_transactions()
+        
+        start = time.perf_counter()
+        users, transactions = asyncio.run(async_load(slow_users, slow_transactions, self.executor))
+        elapsed = time.perf_counter() - start
+        
+        self.assertEqual(len(users), 5)
+        self.assertEqual(len(transactions), 15)
+        self.assertLess(elapsed, 0.35)
+    
+    def test_batches_apply_back_pressure(self):
+        """Test that a slow consumer bounds how far the producer runs ahead."""
+        produced = []
+        
+        def source():
+            for i in range(1, 101):
+                produced.append(i)
+                yield Transaction(i, 1, 1.0, TransactionType.DEPOSIT)
+        
+        async def consume():
+            sizes, max_ahead, consumed = [], 0, 0
+            async for batch in aiter_transactions(source, batch_size=10, max_buffered_batches=2,
+                                                  executor=self.executor):
+                consumed += len(batch)
+                sizes.append(len(batch))
+                max_ahead = max(max_ahead, len(produced) - consumed)
+                await asyncio.sleep(0.01)
+            return sizes, max_ahead
+        
+        sizes, max_ahead = asyncio.run(consume())
+        
+        self.assertEqual(sum(sizes), 100)
+        self.assertEqual(set(sizes), {10})
+        # Two buffered batches plus the one being filled
+        self.assertLessEqual(max_ahead, 30)
+    
+    def test_async_lookups(self):
+        """Test async user and transaction lookups against a context."""
+        context = DataContext(users=[User(7, "amy", "amy@test.com", "Amy", "Lee")],
+                              transactions=[Transaction(1, 7, 5.0, TransactionType.PAYMENT)])
+        
+        async def lookup():
+            return (await async_get_user_by_id(7, context, self.executor),
+                    await async_get_transactions_by_user(7, context, self.executor))
+        
+        user, transactions = asyncio.run(lookup())
+        self.assertEqual(user.username, "amy")
+        self.assertEqual(len(transactions), 1)
+
+
+class TestAggregation(unittest.TestCase):
+    """Test cases for the columnar and sharded aggregation."""
+    
+    def setUp(self):
+        """Set up test fixtures before each test method."""
+        self.transactions = generate_transactions(500, user_count=20, seed=7)
+    
+    def test_matches_row_by_row_statistics(self):
+        """Test that the aggregate matches a plain pass over the transactions."""
+        aggregate = aggregate_transactions(self.transactions)
+        completed = [t for t in self.transactions if t.is_completed()]
+        
+        self.assertEqual(aggregate.total_count, len(self.transactions))
+        self.assertEqual(aggregate.completed_count, len(completed))
+        self.assertAlmostEqual(aggregate.completed_total, sum(t.amount for t in completed), places=6)
+        self.assertEqual(aggregate.status_counts[TransactionStatus.PENDING],
+                         sum(1 for t in self.transactions if t.status == TransactionStatus.PENDING))
+        
+        # Types are reported in first-seen order
+        first_seen = []
+        for transaction in self.transactions:
+            if transaction.transaction_type not in first_seen:
+                first_seen.append(transaction.transaction_type)
+        self.assertEqual(list(aggregate.type_counts), first_seen)
+        
+        recent = sorted(self.transactions, key=lambda t: t.created_at, reverse=True)[:5]
+        self.assertEqual([self.transactions[row] for row in aggregate.recent_rows], recent)
+    
+    def test_merged_shards_match_single_pass(self):
+        """Test that merging per-shard partials gives the single-pass result."""
+        columns = TransactionColumns.from_transactions(self.transactions)
+        single = aggregate_transactions(columns)
+        shards = columns.split(7)
+        self.assertEqual([len(shard) for shard in shards], [len(shards[0])] * 6 + [len(shards[6])])
+        self.assertEqual([row for shard in shards for row in shard.row_ids], list(columns.row_ids))
+        self.assertEqual(TransactionColumns.from_transactions([]).split(4), [])
+        
+        merged = TransactionAggregate(merge_partials([aggregate_partial(shard) for shard in shards]))
+        self.assertEqual(merged.status_counts, single.status_counts)
+        self.assertEqual(merged.type_counts, single.type_counts)
+        self.assertEqual(merged.completed_type_totals, single.completed_type_totals)
+        self.assertEqual(merged.completed_total, single.completed_total)
+        self.assertEqual(merged.recent_rows, single.recent_rows)
+    
+    def test_sharded_report_is_identical(self):
+        """Test that a multi-process summary matches the single-core summary."""
+        single = generate_transaction_summary(self.transactions).splitlines()
+        sharded = generate_transaction_summary(self.transactions, workers=2).splitlines()
+        
+        # Skip the generation timestamp
+        self.assertEqual(single[3:], sharded[3:])
+    
+    def test_exact_partials(self):
+        """Test that partial sums do not lose precision."""
+        values = [1e16, 1.0, -1e16, 0.1] * 3
+        partials = exact_partials(values)
+        self.assertEqual(partials[0], 3.3)
+        self.assertEqual(math.fsum(partials + exact_partials([0.7, 0.2])), math.fsum(values + [0.7, 0.2]))
+        self.assertEqual(exact_partials([]), [])
+    
+    def test_non_finite_amounts(self):
+        """Test that NaN and infinite completed amounts give plain sums instead of hanging or raising."""
+        for amounts, expected in (([1.0, float("nan")], "nan"), ([float("inf"), 2.0], "inf"),
+                                  ([float("inf"), float("-inf")], "nan"), ([1e308, 1e308], "inf")):
+            transactions = [Transaction(i, 1, amount, TransactionType.PAYMENT) for i, amount in enumerate(amounts)]
+            for transaction in transactions:
+                transaction.complete_transaction()
+            self.assertEqual(str(aggregate_transactions(transactions).completed_total), expected)
+            self.assertIn(f"Total Completed Amount: ${expected}", generate_transaction_summary(transactions))
+    
+    def test_aware_datetimes(self):
+        """Test that time zone aware creation times are stored as naive UTC."""
+        aware = datetime(2024, 1, 1, 12, tzinfo=timezone(timedelta(hours=2)))
+        transactions = [Transaction(1, 1, 5.0, TransactionType.PAYMENT, "Tea", aware),
+                        Transaction(2, 1, 5.0, TransactionType.PAYMENT, "Tea", datetime(2024, 1, 1, 11))]
+        
+        columns = TransactionColumns.from_transactions(transactions)
+        
+        self.assertEqual(micros_to_datetime(columns.created_at[0]), datetime(2024, 1, 1, 10))
+        self.assertEqual(datetime_to_micros(aware), columns.created_at[0])
+        self.assertEqual(aggregate_transactions(columns).recent_rows, [1, 0])
+        
+        # The log stores the same instant
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "aware.wal")
+            with WriteAheadLog(path) as wal:
+                wal.append_insert(transactions[0])
+            self.assertEqual(next(read_log(path)).transaction.created_at, datetime(2024, 1, 1, 10))
+    
+    def test_context_caches_aggregate(self):
+        """Test that DataContext reuses the aggregate until data changes."""
+        context = DataContext(users=[], transactions=list(self.transactions))
+        aggregate = context.aggregate()
+        self.assertIs(context.aggregate(), aggregate)
+        
+        context.add_transactions(generate_transactions(3, seed=1))
+        self.assertEqual(context.aggregate().total_count, len(self.transactions) + 3)
+
+
+class TestTransactionStore(unittest.TestCase):
+    """Test cases for the concurrent transaction store."""
+    
+    def setUp(self):
+        """Set up test fixtures before each test method."""
+        self.transactions = generate_transactions(200, user_count=10, seed=3)
+        for transaction in self.transactions:
+            transaction.status = TransactionStatus.PENDING
+        self.store = TransactionStore(self.transactions, stripes=4)
+    
+    def test_compare_and_set(self):
+        """Test that transitions only apply from the expected status."""
+        self.assertTrue(self.store.complete(1))
+        self.assertEqual(self.store.status(1), TransactionStatus.COMPLETED)
+        self.assertEqual(self.store.get(1).status, TransactionStatus.COMPLETED)
+        
+        self.assertFalse(self.store.cancel(1))
+        self.assertFalse(self.store.complete(9999))
+        
+        self.assertTrue(self.store.fail(2, "Insufficient funds"))
+        self.assertIn("[Failed: Insufficient funds]", self.store.get(2).description)
+    
+    def test_duplicate_ids_rejected(self):
+        """Test that a transaction ID can only be stored once."""
+        with self.assertRaises(ValueError):
+            self.store.add(create_sample_transaction(1, 1, 10.0, TransactionType.DEPOSIT))
+        self.assertEqual(len(self.store), 200)
+        
+        # Repeated within one batch, across stripes
+        with self.assertRaises(ValueError):
+            self.store.add_many([create_sample_transaction(500, 1, 10.0, TransactionType.DEPOSIT),
+                                 create_sample_transaction(500, 2, 10.0, TransactionType.DEPOSIT)])
+        self.assertEqual((len(self.store), len(self.store.snapshot())), (200, 200))
+    
+    def test_many_single_transitions(self):
+        """Test that statuses stay exact across many small commits and folds."""
+        transactions = generate_transactions(1000, user_count=10, seed=4)
+        for transaction in transactions:
+            transaction.status = TransactionStatus.PENDING
+        store = TransactionStore(transactions, stripes=4)
+        snapshot = store.snapshot()
+        outcomes = (TransactionStatus.COMPLETED, TransactionStatus.CANCELLED, TransactionStatus.FAILED)
+        expected = {}
+        for transaction in transactions:
+            new = expected[transaction.transaction_id] = outcomes[transaction.transaction_id % 3]
+            self.assertTrue(store.compare_and_set(transaction.transaction_id, TransactionStatus.PENDING, new))
+        
+        final = store.snapshot()
+        ids = [t.transaction_id for t in transactions]
+        self.assertEqual(dict(final.items()), expected)
+        self.assertEqual(final.status(ids[7]), expected[ids[7]])
+        self.assertEqual(store.status(ids[7]), expected[ids[7]])
+        self.assertEqual(snapshot.status(ids[7]), TransactionStatus.PENDING)
+        self.assertEqual(final.status_counts()[TransactionStatus.PENDING], 0)
+        self.assertAlmostEqual(store.completed_total, sum(t.amount for t in transactions
+                                                          if expected[t.transaction_id] == TransactionStatus.COMPLETED))
+    
+    def test_only_pending_transactions_change_status(self):
+        """Test that same-status and non-pending transitions are rejected without side effects."""
+        self.assertTrue(self.store.complete(1))
+        total = self.store.completed_total
+        with self.assertRaises(ValueError):
+            self.store.compare_and_set(1, TransactionStatus.COMPLETED, TransactionStatus.COMPLETED)
+        self.assertEqual(self.store.completed_total, total)
+        
+        user_id = self.store.get(2).user_id
+        pending = self.store.ids_with_status(TransactionStatus.PENDING, user_id)
+        with self.assertRaises(ValueError):
+            self.store.compare_and_set(2, TransactionStatus.PENDING, TransactionStatus.PENDING)
+        self.assertEqual(self.store.ids_with_status(TransactionStatus.PENDING, user_id), pending)
+        self.assertIn(2, self.store.ids_with_status(TransactionStatus.PENDING))
+        
+        self.assertTrue(self.store.fail(3))
+        with self.assertRaises(ValueError):
+            self.store.compare_and_set(1, TransactionStatus.COMPLETED, TransactionStatus.PENDING)
+        with self.assertRaises(ValueError):
+            self.store.commit([(4, TransactionStatus.PENDING, TransactionStatus.COMPLETED),
+                               (3, TransactionStatus.FAILED, TransactionStatus.COMPLETED)])
+        self.assertEqual((self.store.status(1), self.store.status(3), self.store.status(4)),
+                         (TransactionStatus.COMPLETED, TransactionStatus.FAILED, TransactionStatus.PENDING))
+        self.assertEqual(self.store.completed_total, total)
+    
+    def test_concurrent_duplicate_ids_have_one_winner(self):
+        """Test that racing inserts of one ID under different users cannot both succeed."""
+        class SlowLookups(dict):
+            # Widens the window between checking an ID and storing it
+            def __contains__(self, key):
+                found = dict.__contains__(self, key)
+                time.sleep(0.001)
+                return found
+        
+        self.store._transactions = SlowLookups(self.store._transactions)
+        for attempt in range(5):
+            transaction_id = 1000 + attempt
+            added = []
+            barrier = threading.Barrier(8)
+            
+            def insert(user_id):
+                barrier.wait()
+                try:
+                    self.store.add(create_sample_transaction(transaction_id, user_id, 1.0, TransactionType.DEPOSIT))
+                    added.append(user_id)
+                except ValueError:
+                    pass
+            
+            threads = [threading.Thread(target=insert, args=(user_id,)) for user_id in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(len(added), 1)
+        self.assertEqual(len(self.store.snapshot()), 205)
+    
+    def test_snapshot_is_isolated(self):
+        """Test that snapshots do not see later transitions."""
+        snapshot = self.store.snapshot()
+        results = self.store.commit([
+            (3, TransactionStatus.PENDING, TransactionStatus.COMPLETED),
+            (4, TransactionStatus.PENDING, TransactionStatus.CANCELLED),
+            (3, TransactionStatus.PENDING, TransactionStatus.CANCELLED),
+        ])
+        
+        self.assertEqual(results, [True, True, False])
+        self.assertEqual(snapshot.status(3), TransactionStatus.PENDING)
+        self.assertEqual(snapshot.status_counts()[TransactionStatus.PENDING], 200)
+        
+        counts = self.store.snapshot().status_counts()
+        self.assertEqual(counts[TransactionStatus.COMPLETED], 1)
+        self.assertEqual(counts[TransactionStatus.CANCELLED], 1)
+        self.assertGreater(self.store.version, snapshot.version)
+    
+    def test_many_changes_fold_into_base(self):
+        """Test that snapshots stay correct once buffered changes are folded in."""
+        self.store.commit((t.transaction_id, TransactionStatus.PENDING, TransactionStatus.COMPLETED)
+                          for t in self.transactions[:150])
+        snapshot = self.store.snapshot()
+        
+        self.assertEqual(len(snapshot), 200)
+        self.assertEqual(snapshot.status_counts()[TransactionStatus.COMPLETED], 150)
+        self.assertEqual(dict(snapshot.items())[self.transactions[-1].transaction_id], TransactionStatus.PENDING)
+    
+    def test_status_index_and_running_summary(self):
+        """Test that the status index and summaries follow every transition."""
+        self.store.complete(1)
+        self.store.fail(2)
+        
+        self.assertNotIn(1, self.store.ids_with_status(TransactionStatus.PENDING))
+        self.assertEqual(self.store.ids_with_status(TransactionStatus.FAILED), {2})
+        self.assertEqual(self.store.completed_total, self.store.get(1).amount)
+        
+        user_id = self.store.get(3).user_id
+        user_pending = {t.transaction_id for t in self.transactions
+                        if t.user_id == user_id and t.status == TransactionStatus.PENDING}
+        self.assertEqual(self.store.ids_with_status(TransactionStatus.PENDING, user_id), user_pending)
+    
+    def test_bulk_transitions(self):
+        """Test complete_many, fail_many and cancel_all_pending."""
+        self.assertEqual(self.store.complete_many([1, 2, 3, 3, 9999]), 3)
+        self.assertEqual(self.store.fail_many([3, 4, 5], "Card declined"), 2)
+        self.assertIn("[Failed: Card declined]", self.store.get(4).description)
+        
+        user_id = self.store.get(6).user_id
+        cancelled = self.store.cancel_all_pending(user_id=user_id)
+        self.assertGreater(cancelled, 0)
+        self.assertEqual(self.store.ids_with_status(TransactionStatus.PENDING, user_id), set())
+        
+        remaining = self.store.cancel_all_pending()
+        counts = self.store.status_counts()
+        self.assertEqual(counts[TransactionStatus.PENDING], 0)
+        self.assertEqual(counts[TransactionStatus.COMPLETED], 3)
+        self.assertEqual(counts[TransactionStatus.FAILED], 2)
+        self.assertEqual(counts[TransactionStatus.CANCELLED], cancelled + remaining)
+        self.assertAlmostEqual(self.store.completed_total,
+                               sum(self.store.get(i).amount for i in (1, 2, 3)))
+        self.assertEqual(self.store.snapshot().status_counts(), counts)
+    
+    def test_concurrent_cancel_has_one_winner(self):
+        """Test that racing threads cannot both cancel the same transaction."""
+        winners = []
+        barrier = threading.Barrier(8)
+        
+        def race():
+            barrier.wait()
+            for transaction in self.transactions:
+                if self.store.cancel(transaction.transaction_id):
+                    winners.append(transaction.transaction_id)
+        
+        threads = [threading.Thread(target=race) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(sorted(winners), sorted(t.transaction_id for t in self.transactions))
+
+
+class TestLedger(unittest.TestCase):
+    """Test cases for the running balance ledger."""
+    
+    def setUp(self):
+        """Set up test fixtures before each test method."""
+        self.start = datetime(2024, 1, 1)
+        self.transactions = []
+        for i, (trans_type, amount) in enumerate([
+            (TransactionType.DEPOSIT, 500.0),
+            (TransactionType.PAYMENT, 120.0),
+            (TransactionType.WITHDRAWAL, 80.0),
+            (TransactionType.TRANSFER, 100.0),
+            (TransactionType.DEPOSIT, 50.0),
+        ], start=1):
+            transaction = Transaction(i, 1, amount, trans_type, created_at=self.start + timedelta(days=i))
+            transaction.complete_transaction()
+            self.transactions.append(transaction)
+        self.ledger = Ledger(self.transactions, counterparties={4: 2})
+    
+    def test_signed_balances(self):
+        """Test that credits and debits are applied per leg."""
+        self.assertAlmostEqual(self.ledger.balance(1), 500 - 120 - 80 - 100 + 50)
+        self.assertAlmostEqual(self.ledger.balance(2), 100.0)
+        self.assertEqual(self.ledger.balance(99), 0.0)
+    
+    def test_balance_at(self):
+        """Test point-in-time balances, including entries at the exact time."""
+        self.assertEqual(self.ledger.balance_at(1, self.start), 0.0)
+        self.assertAlmostEqual(self.ledger.balance_at(1, self.start + timedelta(days=2)), 380.0)
+        self.assertAlmostEqual(self.ledger.balance_at(1, self.start + timedelta(days=3, hours=12)), 300.0)
+        self.assertAlmostEqual(self.ledger.balance_at(2, self.start + timedelta(days=3)), 0.0)
+    
+    def test_late_and_pending_entries(self):
+        """Test that late entries shift later balances and pending ones are skipped."""
+        late = Transaction(6, 1, 30.0, TransactionType.DEPOSIT, created_at=self.start + timedelta(days=1, hours=1))
+        self.assertEqual(self.ledger.add(late), 0)
+        
+        late.complete_transaction()
+        self.assertEqual(self.ledger.add(late), 1)
+        self.assertAlmostEqual(self.ledger.balance_at(1, self.start + timedelta(days=2)), 410.0)
+        self.assertAlmostEqual(self.ledger.balance(1), 280.0)
+    
+    def test_compact(self):
+        """Test that compaction keeps balances after the checkpoint."""
+        checkpoint = self.start + timedelta(days=3)
+        self.assertEqual(self.ledger.compact(checkpoint, user_id=1), 2)
+        self.assertEqual(self.ledger.entry_count(1), 3)
+        self.assertAlmostEqual(self.ledger.balance_at(1, checkpoint), 300.0)
+        self.assertAlmostEqual(self.ledger.balance(1), 250.0)
+        with self.assertRaises(ValueError):
+            self.ledger.balance_at(1, self.start)
+        
+        # Late entries from the compacted period land in the checkpoint
+        early = Transaction(7, 1, 10.0, TransactionType.PAYMENT, created_at=self.start)
+        early.complete_transaction()
+        self.ledger.add(early)
+        self.assertAlmostEqual(self.ledger.balance(1), 240.0)
+    
+    def test_context_ledger(self):
+        """Test that DataContext exposes a ledger of its completed transactions."""
+        context = DataContext(users=[], transactions=self.transactions)
+        self.assertAlmostEqual(context.ledger.balance(1), 250.0)
+
+
+class TestDeduplication(unittest.TestCase):
+    """Test cases for import deduplication."""
+    
+    def setUp(self):
+        """Set up test fixtures before each test method."""
+        self.transactions = generate_transactions(50, user_count=5, seed=11)
+    
+    def _copy(self, transaction, transaction_id, description=None):
+        copy = Transaction(transaction_id, transaction.user_id, transaction.amount,
+                           transaction.transaction_type,
+                           transaction.description if description is None else description,
+                           transaction.created_at.replace(hour=(transaction.created_at.hour + 1) % 24))
+        return copy
+    
+    def test_fingerprint_ignores_id_time_and_formatting(self):
+        """Test that re-exported transactions get the same fingerprint."""
+        original = self.transactions[0]
+        copy = self._copy(original, 999, "  " + original.description.upper() + " [Failed: timeout]")
+        
+        self.assertEqual(normalize_description("  Coffee   SHOP "), "coffee shop")
+        self.assertEqual(fingerprint(copy), fingerprint(original))
+        copy.amount += 0.01
+        self.assertNotEqual(fingerprint(copy), fingerprint(original))
+    
+    def test_overlapping_imports(self):
+        """Test that overlapping exports are only imported once."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            first = os.path.join(temp_dir, "first.csv")
+            second = os.path.join(temp_dir, "second.csv")
+            export_transactions(self.transactions[:30], first)
+            overlap = [self._copy(t, 1000 + i) for i, t in enumerate(self.transactions[20:30])]
+            export_transactions(overlap + self.transactions[30:], second)
+            
+            history = FingerprintIndex()
+            deduplicator = Deduplicator(history=history, bloom=BloomFilter(1000))
+            self.assertEqual(len(import_transactions(first, deduplicator=deduplicator)), 30)
+            deduplicator.remember()
+            
+            path = os.path.join(temp_dir, "history.fp")
+            self.assertTrue(history.save(path))
+            deduplicator = Deduplicator(history=FingerprintIndex.load(path), bloom=deduplicator.bloom)
+            imported = import_transactions(second, deduplicator=deduplicator)
+        
+        self.assertEqual([t.transaction_id for t in imported], [t.transaction_id for t in self.transactions[30:]])
+        self.assertEqual(deduplicator.dropped, 10)
+        self.assertEqual(deduplicator.previously_imported, 10)
+    
+    def test_duplicates_within_one_import(self):
+        """Test that repeated rows in one stream are dropped."""
+        deduplicator = Deduplicator(known=self.transactions[:5])
+        stream = self.transactions[:10] + [self._copy(self.transactions[7], 500)]
+        
+        kept = list(deduplicator.filter(stream))
+        
+        self.assertEqual(kept, self.transactions[5:10])
+        self.assertEqual(deduplicator.dropped, 6)
+    
+    def test_bloom_filter_round_trip(self):
+        """Test Bloom filter membership and persistence."""
+        bloom = BloomFilter(capacity=500, error_rate=0.01)
+        values = [fingerprint(t) for t in self.transactions]
+        for value in values:
+            bloom.add(value)
+        
+        restored = BloomFilter.from_bytes(bloom.to_bytes())
+        self.assertTrue(all(value in restored for value in values))
+        self.assertEqual(restored.count, bloom.count)
+        with self.assertRaises(ValueError):
+            BloomFilter.from_bytes(b"not a filter")
+    
+    def test_bloom_only_marks_probable_duplicates(self):
+        """Test that without a history index, Bloom hits are kept but reported."""
+        bloom = BloomFilter(capacity=500)
+        list(Deduplicator(bloom=bloom).filter(self.transactions))
+        
+        deduplicator = Deduplicator(bloom=bloom)
+        self.assertEqual(len(list(deduplicator.filter(self.transactions))), 50)
+        self.assertEqual(deduplicator.probable, 50)
+        
+        strict = Deduplicator(bloom=bloom, drop_probable=True)
+        self.assertEqual(list(strict.filter(self.transactions)), [])
+
+
+class TestCategorizer(unittest.TestCase):
+    """Test cases for description-based categorization."""
+    
+    def setUp(self):
+        """Set up test fixtures before each test method."""
+        self.categorizer = Categorizer()
+    
+    def test_keywords_match_whole_words(self):
+        """Test case-insensitive keyword matching on word boundaries."""
+        self.assertEqual(self.categorizer.categorize("STARBUCKS #123 Seattle"), "dining")
+        self.assertEqual(self.categorizer.categorize("Monthly rent - March"), "housing")
+        self.assertEqual(self.categorizer.categorize("Ubered home"), UNCATEGORIZED)
+        self.assertEqual(self.categorizer.categorize("Parental leave"), UNCATEGORIZED)
+    
+    def test_longest_keyword_and_regex_rules(self):
+        """Test that longer keywords win and regex rules are supported."""
+        categorizer = Categorizer([
+            Rule("astronomy", "star"),
+            Rule("dining", "starbucks"),
+            Rule("transfers", r"xfer\s+to\s+\d+", is_regex=True),
+        ], default="other")
+        
+        self.assertEqual(categorizer.categorize("Starbucks reserve"), "dining")
+        self.assertEqual(categorizer.categorize("Star party"), "astronomy")
+        self.assertEqual(categorizer.categorize("XFER TO 1234"), "transfers")
+        self.assertEqual(categorizer.categorize("nothing"), "other")
+        with self.assertRaises(ValueError):
+            Categorizer([Rule("broken", "(", is_regex=True)])
+        
+        # Group numbers are shared by the combined pattern
+        with self.assertRaises(ValueError):
+            Categorizer([Rule("repeat", r"(\w)\1", is_regex=True)])
+        with self.assertRaises(ValueError):
+            Categorizer([Rule("a", "(?P<x>a)", is_regex=True), Rule("b", "(?P<x>b)", is_regex=True)])
+        named = Categorizer([Rule("other", "(?P<w>[a-z])x", is_regex=True),
+                             Rule("repeat", r"(?P<c>[a-z])(?P=c)", is_regex=True)])
+        self.assertEqual(named.categorize("zz top"), "repeat")
+        
+        # Only keywords must start a word; regex rules may match mid-word
+        mid_word = Categorizer([Rule("x", r"ing\b", is_regex=True), Rule("m", r"\$\d+", is_regex=True),
+                                Rule("k", "park")], default="other")
+        self.assertEqual(mid_word.categorize("parking"), "x")
+        self.assertEqual(mid_word.categorize("cost$5"), "m")
+        self.assertEqual(mid_word.categorize("skypark"), "other")
+    
+    def test_matches_naive_rule_loop(self):
+        """Test that the combined pattern agrees with checking rules one by one."""
+        rules = [Rule(f"c{i % 7}", f"merchant{i}") for i in range(500)]
+        categorizer = Categorizer(rules, cache_size=0)
+        descriptions = [f"POS merchant{i * 3} store" for i in range(200)]
+        
+        for description in descriptions:
+            expected = next((rule.category for rule in rules
+                             if description.lower().split().count(rule.pattern)), UNCATEGORIZED)
+            self.assertEqual(categorizer.categorize(description), expected)
+    
+    def test_categorize_transactions_and_cache(self):
+        """Test that transactions get categories and each description is looked up once per batch."""
+        transactions = [create_sample_transaction(i, 1, 10.0, TransactionType.PAYMENT, "Netflix")
+                        for i in range(1, 4)]
+        transactions[0].category = "manual"
+        
+        self.assertEqual(self.categorizer.categorize_transactions(transactions), 2)
+        self.assertEqual([t.category for t in transactions], ["manual", "entertainment", "entertainment"])
+        self.assertEqual(self.categorizer.cache_info()[:2], (0, 1))
+        
+        self.assertEqual(self.categorizer.categorize_transactions(transactions, overwrite=True), 3)
+        self.assertEqual(self.categorizer.cache_info()[:2], (1, 1))
+    
+    def test_spending_by_category(self):
+        """Test that the spending analysis totals completed amounts per category."""
+        transactions = [
+            create_sample_transaction(1, 1, 30.0, TransactionType.PAYMENT, "Kroger #12"),
+            create_sample_transaction(2, 1, 20.0, TransactionType.PAYMENT, "Cafe Luna"),
+            create_sample_transaction(3, 1, 5.0, TransactionType.PAYMENT, "Kroger fuel"),
+            create_sample_transaction(4, 1, 99.0, TransactionType.PAYMENT, "Pizza"),
+        ]
+        for transaction in transactions[:3]:
+            transaction.complete_transaction()
+        
+        analysis = analyze_spending_patterns(DataContext(users=[], transactions=transactions))
+        self.assertEqual(analysis["spending_by_category"], {"groceries": 35.0, "dining": 20.0})
+
+
+class TestRecurringDetection(unittest.TestCase):
+    """Test cases for recurring transaction detection."""
+    
+    def setUp(self):
+        """Set up test fixtures before each test method."""
+        self.start = datetime(2024, 1, 5, 9, 0)
+        self.next_id = 1
+    
+    def _series(self, user_id, description, amount, days, count, start=None):
+        transactions = []
+        when = start or self.start
+        for i in range(count):
+            transaction = Transaction(self.next_id, user_id, amount, TransactionType.PAYMENT,
+                                      description.format(i), when + timedelta(days=days * i))
+            transaction.complete_transaction()
+            transactions.append(transaction)
+            self.next_id += 1
+        return transactions
+    
+    def test_detects_monthly_and_weekly_series(self):
+        """Test that regular payments are detected and irregular ones are not."""
+        rent = self._series(1, "Rent March", 1200.0, 30, 6)
+        gym = self._series(2, "GYM #{0}", 25.0, 7, 5)
+        irregular = self._series(1, "Coffee", 4.5, 1, 2) + self._series(1, "Coffee", 4.5, 20, 2,
+                                                                         start=self.start + timedelta(days=3))
+        
+        series = detect_recurring(irregular + gym + rent)
+        
+        self.assertEqual([(s.user_id, s.cadence, s.occurrences) for s in series],
+                         [(1, "monthly", 6), (2, "weekly", 5)])
+        self.assertAlmostEqual(series[0].amount, 1200.0)
+        self.assertEqual(series[0].next_expected, rent[-1].created_at + timedelta(days=30))
+    
+    def test_amount_buckets_and_pending(self):
+        """Test that different amounts and uncompleted transactions do not form a series."""
+        small = self._series(1, "Spotify", 9.99, 30, 3)
+        large = self._series(1, "Spotify", 19.99, 30, 3, start=self.start + timedelta(days=1))
+        large[1].status = TransactionStatus.PENDING
+        
+        series = detect_recurring(small + large)
+        
+        self.assertEqual(len(series), 1)
+        self.assertAlmostEqual(series[0].amount, 9.99)
+    
+    def test_incremental_updates(self):
+        """Test that new transactions extend existing groups, also out of order."""
+        netflix = self._series(3, "Netflix", 15.49, 30, 5)
+        detector = RecurringDetector(netflix[:2])
+        self.assertEqual(detector.detect(), [])
+        
+        detector.add(netflix[4])
+        detector.add_many(netflix[2:4])
+        series = detector.detect()
+        self.assertEqual(len(series), 1)
+        self.assertEqual(series[0].occurrences, 5)
+        
+        late = self._series(3, "Netflix", 15.49, 1, 1, start=self.start + timedelta(days=45))
+        detector.add(late[0])
+        self.assertEqual(detector.detect(), [])
+    
+    def test_report_section(self):
+        """Test the recurring payments section of the transaction summary."""
+        transactions = self._series(1, "Rent", 1200.0, 30, 3)
+        context = DataContext(users=[], transactions=transactions[:2])
+        self.assertEqual(context.recurring, [])
+        context.add_transactions(transactions[2:])
+        
+        summary = generate_transaction_summary(transactions, recurring=context.recurring)
+        self.assertIn("RECURRING PAYMENTS:", summary)
+        self.assertIn("  Rent - $1200.00 monthly (User 1, 3x) - next 2024-04-04", summary)
+        self.assertIn("None detected", generate_transaction_summary(transactions, recurring=[]))
+        self.assertNotIn("RECURRING", generate_transaction_summary(transactions))
+
+
+class TestAnomalyDetection(unittest.TestCase):
+    """Test cases for streaming anomaly detection."""
+    
+    def _payments(self, user_id, amounts, start_id=1):
+        return [Transaction(start_id + i, user_id, amount, TransactionType.PAYMENT, "Card payment",
+                            datetime(2024, 1, 1) + timedelta(hours=i))
+                for i, amount in enumerate(amounts)]
+    
+    def test_running_statistics(self):
+        """Test that Welford statistics match the batch mean and deviation."""
+        amounts = [12.5, 40.0, 7.25, 19.0, 33.3, 8.0]
+        detector = AnomalyDetector()
+        detector.observe_many(self._payments(1, amounts))
+        
+        stats = detector.stats(1)
+        mean = sum(amounts) / len(amounts)
+        std = math.sqrt(sum((a - mean) ** 2 for a in amounts) / (len(amounts) - 1))
+        self.assertEqual(stats.count, 6)
+        self.assertAlmostEqual(stats.mean, mean)
+        self.assertAlmostEqual(stats.std, std)
+    
+    def test_flags_amounts_far_above_norm(self):
+        """Test that only large outliers after enough history are flagged."""
+        detector = AnomalyDetector(min_history=5)
+        early = detector.observe_many(self._payments(1, [10.0, 11.0, 60.0]))
+        normal = detector.observe_many(self._payments(1, [11.0, 9.5, 10.5, 12.0, 9.0], start_id=4))
+        spike = detector.observe(self._payments(1, [400.0], start_id=9)[0])
+        deposit = Transaction(10, 1, 5000.0, TransactionType.DEPOSIT, "Bonus")
+        
+        self.assertEqual(early + normal, [])
+        self.assertIsNotNone(spike)
+        self.assertGreater(spike.z_score, 3.0)
+        self.assertIsNone(detector.observe(deposit))
+        self.assertEqual(list(detector.flagged), [spike])
+    
+    def test_lru_eviction(self):
+        """Test that the state table is bounded by evicting the coldest user."""
+        detector = AnomalyDetector(max_users=2)
+        detector.observe_many(self._payments(1, [10.0]) + self._payments(2, [10.0]))
+        detector.observe(self._payments(1, [10.0])[0])
+        detector.observe(self._payments(3, [10.0])[0])
+        
+        self.assertEqual(len(detector), 2)
+        self.assertIsNone(detector.stats(2))
+        self.assertEqual(detector.stats(1).count, 2)
+    
+    def test_summary_lists_flagged_transactions(self):
+        """Test that flagged transactions appear in the transaction summary."""
+        transactions = self._payments(1, [20.0, 22.0, 19.0, 21.0, 20.5, 18.0])
+        context = DataContext(users=[], transactions=transactions)
+        self.assertEqual(context.anomalies, [])
+        
+        spike = self._payments(1, [950.0], start_id=7)
+        context.add_transactions(spike)
+        summary = generate_transaction_summary(context.transactions, anomalies=context.anomalies)
+        
+        self.assertIn("FLAGGED TRANSACTIONS:", summary)
+        self.assertIn("  ! Payment - $950.00 (User 1) - 2024-01-01 - usually $", summary)
+
+
+class TestCurrency(unittest.TestCase):
+    """Test cases for exchange rates and currency conversion."""
+    
+    def setUp(self):
+        """Set up test fixtures before each test method."""
+        self.rates = RateTable()
+        self.rates.add_rates([
+            ("EUR", datetime(2024, 1, 1), 1.10),
+            ("EUR", datetime(2024, 2, 1), 1.08),
+            ("GBP", datetime(2024, 1, 1), 1.25),
+        ])
+    
+    def _transaction(self, transaction_id, amount, currency, when):
+        transaction = Transaction(transaction_id, 1, amount, TransactionType.PAYMENT, "", when,
+                                  currency=currency)
+        transaction.complete_transaction()
+        return transaction
+    
+    def test_rate_lookup(self):
+        """Test that the latest rate on or before a date applies."""
+        self.assertEqual(self.rates.rate("EUR", datetime(2024, 1, 31, 23, 59)), 1.10)
+        self.assertEqual(self.rates.rate("EUR", datetime(2024, 2, 1)), 1.08)
+        self.assertEqual(self.rates.rate("USD", datetime(2000, 1, 1)), 1.0)
+        self.assertAlmostEqual(self.rates.convert(10.0, "GBP", datetime(2024, 6, 1)), 12.5)
+        
+        self.rates.add_rate("EUR", datetime(2024, 1, 15), 1.20)
+        self.assertEqual(self.rates.rate("EUR", datetime(2024, 1, 20)), 1.20)
+        with self.assertRaises(ValueError):
+            self.rates.rate("EUR", datetime(2023, 12, 31))
+        with self.assertRaises(ValueError):
+            self.rates.rate("JPY", datetime(2024, 1, 1))
+    
+    def test_convert_columns_matches_per_row(self):
+        """Test that batch conversion equals converting each transaction."""
+        transactions = [
+            self._transaction(i, 10.0 + i, ("USD", "EUR", "GBP")[i % 3], datetime(2024, 1, 1) + timedelta(days=i))
+            for i in range(60)
+        ]
+        columns = self.rates.convert_columns(TransactionColumns.from_transactions(transactions))
+        
+        expected = [self.rates.convert(t.amount, t.currency, t.created_at) for t in transactions]
+        self.assertEqual(list(columns.amounts), expected)
+        self.assertEqual(columns.currencies, ("USD",))
+        self.assertEqual(list(columns.take([3, 4]).amounts), expected[3:5])
+    
+    def test_summary_in_base_currency(self):
+        """Test that the summary converts totals into the base currency."""
+        transactions = [
+            self._transaction(1, 100.0, "USD", datetime(2024, 3, 1)),
+            self._transaction(2, 100.0, "EUR", datetime(2024, 3, 2)),
+        ]
+        summary = generate_transaction_summary(transactions, rates=self.rates)
+        
+        self.assertIn("  Currency: USD", summary)
+        self.assertIn("  Total Completed Amount: $208.00", summary)
+        self.assertIn("  ✓ Payment - €100.00 (User 1) - 2024-03-02", summary)
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "rates.csv")
+            with open(path, "w") as file:
+                file.write("currency,date,rate\neur,2024-01-01,0.5\n")
+            rates = RateTable.load(path)
+        self.assertIn("Total Completed Amount: $150.00", generate_transaction_summary(transactions, rates=rates))
+    
+    def test_summary_needs_rates_for_mixed_currencies(self):
+        """Test that amounts in different currencies are not added up without rates."""
+        transactions = [
+            self._transaction(1, 100.0, "USD", datetime(2024, 3, 1)),
+            self._transaction(2, 100.0, "EUR", datetime(2024, 3, 2)),
+        ]
+        with self.assertRaises(ValueError):
+            generate_transaction_summary(transactions)
+        with self.assertRaises(ValueError):
+            transaction_summary_data(transactions)
+        
+        euros = transactions[1:] + [self._transaction(3, 50.0, "EUR", datetime(2024, 3, 3))]
+        summary = generate_transaction_summary(euros)
+        self.assertIn("  Currency: EUR", summary)
+        self.assertIn("  Total Completed Amount: €150.00", summary)
+        self.assertEqual(transaction_summary_data(euros)["currency"], "EUR")
+        self.assertEqual(transaction_summary_data(transactions[:1])["currency"], "USD")
+    
+    def test_many_currencies(self):
+        """Test that columns and snapshots hold more currencies than fit in a byte."""
+        codes = [f"C{i:03d}" for i in range(300)]
+        transactions = [self._transaction(i + 1, 1.0, code, datetime(2024, 1, 1)) for i, code in enumerate(codes)]
+        columns = TransactionColumns.from_transactions(transactions)
+        self.assertEqual(columns.used_currencies(), codes)
+        taken = columns.take([299, 0])
+        self.assertEqual([taken.currencies[code] for code in taken.currency_codes], ["C299", "C000"])
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "state.snap")
+            self.assertTrue(save_snapshot(DataContext(users=[], transactions=transactions), path))
+            self.assertEqual(list(Snapshot(path).columns().currency_codes), list(columns.currency_codes))
+            self.assertEqual([t.currency for t in load_context(path).transactions], codes)
+    
+    def test_csv_currency_column(self):
+        """Test that currencies survive export and that older files default to USD."""
+        transactions = [self._transaction(1, 5.0, "GBP", datetime(2024, 1, 1)),
+                        self._transaction(2, 6.0, "USD", datetime(2024, 1, 2))]
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "transactions.csv")
+            export_transactions(transactions, path)
+            self.assertEqual([t.currency for t in import_transactions(path)], ["GBP", "USD"])
+            
+            with open(path, "w") as file:
+                file.write("transaction_id,user_id,amount,type\n1,1,2.5,deposit\n")
+            self.assertEqual(import_transactions(path)[0].currency, "USD")
+
+
+class TestSnapshot(unittest.TestCase):
+    """Test cases for binary snapshots and the write-ahead log."""
+    
+    def setUp(self):
+        """Set up test fixtures before each test method."""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "state.snap")
+        self.wal_path = os.path.join(self.temp_dir.name, "state.wal")
+        self.users = [User(1, "john", "john@test.com", "John", "Doe", datetime(2024, 1, 2, 3, 4, 5))]
+        self.users[0].is_active = False
+        self.transactions = generate_transactions(200, user_count=10, seed=5)
+        self.transactions[0].currency = "EUR"
+        self.transactions[1].description = "Café crème ☕"
+        self.context = DataContext(users=self.users, transactions=self.transactions)
+    
+    def tearDown(self):
+        """Remove the temporary files."""
+        self.temp_dir.cleanup()
+    
+    def _fields(self, transactions):
+        return [(t.transaction_id, t.user_id, t.amount, t.transaction_type, t.status, t.description,
+                 t.created_at, t.category, t.currency) for t in transactions]
+    
+    def test_round_trip(self):
+        """Test that a snapshot restores users, transactions and analyses."""
+        def analysis(context):
+            aggregate = context.aggregate()
+            return (aggregate.completed_total, aggregate.type_counts, dict(context.completed_by_category),
+                    context.currencies)
+        
+        expected = analysis(self.context)
+        self.assertTrue(save_snapshot(self.context, self.path))
+        
+        restored = load_context(self.path)
+        self.assertEqual(analysis(restored), expected)
+        self.assertEqual(restored.currencies, ["USD", "EUR"])
+        with self.assertRaises(ValueError):
+            analyze_spending_patterns(restored)
+        self.assertIsNone(restored._transactions)
+        
+        self.assertEqual(self._fields(restored.transactions), self._fields(self.transactions))
+        user = restored.users[0]
+        self.assertEqual((user.username, user.email, user.get_full_name(), user.created_at, user.is_active),
+                         ("john", "john@test.com", "John Doe", datetime(2024, 1, 2, 3, 4, 5), False))
+        self.assertEqual(Snapshot(self.path).columns().amounts, self.context.columns.amounts)
+    
+    def test_damaged_snapshot(self):
+        """Test that corrupted headers and sections are detected."""
+        save_snapshot(self.context, self.path)
+        with open(self.path, "rb") as file:
+            data = bytearray(file.read())
+        
+        damaged = bytearray(data)
+        damaged[-3] ^= 0xFF
+        with open(self.path, "wb") as file:
+            file.write(damaged)
+        snapshot = Snapshot(self.path)
+        snapshot.aggregate()
+        with self.assertRaises(ValueError):
+            snapshot.transactions()
+        
+        data[20] ^= 0xFF
+        with open(self.path, "wb") as file:
+            file.write(data)
+        with self.assertRaises(ValueError):
+            Snapshot(self.path)
+    
+    def test_wal_replay_after_snapshot(self):
+        """Test that log records after the snapshot are replayed on load."""
+        pending = next(t for t in self.transactions if t.status == TransactionStatus.PENDING)
+        with WriteAheadLog(self.wal_path) as wal:
+            wal.append_status(pending.transaction_id, TransactionStatus.COMPLETED)
+            pending.complete_transaction()
+            self.context.invalidate()
+            save_snapshot(self.context, self.path, wal_seq=wal.last_seq)
+        
+        added = Transaction(9999, 1, 12.5, TransactionType.PAYMENT, "Late", datetime(2024, 5, 1), "dining", "GBP")
+        with WriteAheadLog(self.wal_path) as wal:
+            wal.append_insert(added)
+            wal.append_status(added.transaction_id, TransactionStatus.COMPLETED)
+        with open(self.wal_path, "ab") as file:
+            file.write(b"\x10\x00\x00")  # torn record from a crash
+        
+        restored = load_context(self.path, self.wal_path)
+        
+        self.assertEqual(len(restored.transactions), 201)
+        self.assertEqual(self._fields(restored.transactions[-1:]),
+                         [(9999, 1, 12.5, TransactionType.PAYMENT, TransactionStatus.COMPLETED, "Late",
+                           datetime(2024, 5, 1), "dining", "GBP")])
+        self.assertTrue(restored.transactions[self.transactions.index(pending)].is_completed())
+        self.assertEqual(restored.aggregate().completed_count, self.context.aggregate().completed_count + 1)
+        
+        with WriteAheadLog(self.wal_path) as wal:
+            self.assertEqual(wal.last_seq, 3)
+            wal.reset()
+        with WriteAheadLog(self.wal_path, start_seq=3) as wal:
+            self.assertEqual(wal.append_status(1, TransactionStatus.FAILED), 4)
+        self.assertEqual([record.seq for record in read_log(self.wal_path)], [4])
+    
+    def test_wal_corrupt_tail(self):
+        """Test that a record failing its checksum ends the log."""
+        with WriteAheadLog(self.wal_path) as wal:
+            for transaction in self.transactions[:3]:
+                wal.append_status(transaction.transaction_id, TransactionStatus.CANCELLED)
+        with open(self.wal_path, "r+b") as file:
+            file.seek(-1, os.SEEK_END)
+            file.write(b"\x7f")
+        self.assertEqual([record.seq for record in read_log(self.wal_path)], [1, 2])
+        
+        with WriteAheadLog(self.wal_path) as wal:
+            self.assertEqual(wal.append_status(1, TransactionStatus.FAILED, "Declined"), 3)
+        records = list(read_log(self.wal_path))
+        self.assertEqual([record.seq for record in records], [1, 2, 3])
+        self.assertEqual((records[-1].status, records[-1].reason), (TransactionStatus.FAILED, "Declined"))
+    
+    def test_wal_group_commit(self):
+        """Test that concurrent appenders all become durable with shared commits."""
+        wal = WriteAheadLog(self.wal_path)
+        
+        def worker(offset):
+            for i in range(50):
+                wal.append_status(offset + i, TransactionStatus.COMPLETED)
+                if i % 10 == 9:
+                    wal.commit()
+        
+        threads = [threading.Thread(target=worker, args=(n * 1000,)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(wal.durable_seq, 200)
+        self.assertEqual(wal.commit(), 200)
+        wal.close()
+        
+        records = list(read_log(self.wal_path))
+        self.assertEqual([record.seq for record in records], list(range(1, 201)))
+        self.assertEqual(sorted(record.transaction_id for record in records),
+                         sorted(n * 1000 + i for n in range(4) for i in range(50)))
+    
+    def test_store_logging_and_compaction(self):
+        """Test that store changes are logged, replayed and compacted into the snapshot."""
+        save_snapshot(self.context, self.path)
+        pending = [t.transaction_id for t in self.transactions if t.status == TransactionStatus.PENDING]
+        with WriteAheadLog(self.wal_path) as wal:
+            store = TransactionStore(self.transactions, stripes=4, log=wal)
+            self.assertEqual(wal.last_seq, 0)
+            store.add(Transaction(9999, 1, 12.5, TransactionType.PAYMENT, "Late", datetime(2024, 5, 1)))
+            self.assertTrue(store.fail(pending[0], "Declined"))
+            self.assertTrue(store.complete(9999))
+            self.assertEqual(store.cancel_all_pending(), len(pending) - 1)
+            self.assertEqual(wal.durable_seq, len(pending) + 2)
+        
+        expected = self._fields(self.transactions + [store.get(9999)])
+        self.assertEqual(self._fields(load_context(self.path, self.wal_path).transactions), expected)
+        
+        with WriteAheadLog(self.wal_path) as wal:
+            self.assertFalse(compact_log(self.path, wal, min_log_bytes=1 << 20))
+            self.assertTrue(compact_log(self.path, wal))
+            self.assertEqual(wal.size, 16)  # header only
+            self.assertEqual(wal.append_status(9999, TransactionStatus.CANCELLED), len(pending) + 3)
+        self.assertEqual(Snapshot(self.path).wal_seq, len(pending) + 2)
+        restored = load_context(self.path, self.wal_path)
+        self.assertEqual(self._fields(restored.transactions)[:-1], expected[:-1])
+        self.assertEqual(restored.transactions[-1].status, TransactionStatus.CANCELLED)
+        self.assertIn("[Failed: Declined]", restored.transactions[self.transactions.index(
+            store.get(pending[0]))].description)
+    
+    def test_reopen_after_compaction(self):
+        """Test that a log reopened after compaction continues numbering after the snapshot."""
+        with WriteAheadLog(self.wal_path) as wal:
+            for transaction_id in (1, 2, 3):
+                wal.append_insert(Transaction(transaction_id, 1, 5.0, TransactionType.PAYMENT, "Tea"))
+            self.assertTrue(compact_log(self.path, wal))
+        self.assertEqual(Snapshot(self.path).wal_seq, 3)
+        
+        with WriteAheadLog(self.wal_path) as wal:
+            self.assertEqual(wal.last_seq, 3)
+            self.assertEqual(wal.append_insert(Transaction(99, 1, 7.5, TransactionType.PAYMENT, "Cake")), 4)
+        
+        restored = load_context(self.path, self.wal_path)
+        self.assertEqual([t.transaction_id for t in restored.transactions], [1, 2, 3, 99])
+
+
+class TestPartitionedStore(unittest.TestCase):
+    """Test cases for month and user bucket partitions."""
+    
+    def setUp(self):
+        """Set up test fixtures before each test method."""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.transactions = generate_transactions(600, user_count=12, seed=8)
+        for i, transaction in enumerate(self.transactions):
+            transaction.created_at = datetime(2024, 1, 1) + timedelta(days=i % 180, hours=i % 24)
+        self.store = PartitionedStore(self.temp_dir.name, user_buckets=4)
+        self.store.add(self.transactions)
+    
+    def tearDown(self):
+        """Remove the temporary files."""
+        self.temp_dir.cleanup()
+    
+    def _expected(self, start=None, end=None, user_id=None):
+        return [t for t in self.transactions
+                if (start is None or t.created_at >= start) and (end is None or t.created_at < end)
+                and (user_id is None or t.user_id == user_id)]
+    
+    def test_layout_and_manifest(self):
+        """Test that partitions follow months and buckets and survive reopening."""
+        partitions = self.store.partitions()
+        self.assertEqual({info.month for info in partitions}, {f"2024-0{month}" for month in range(1, 7)})
+        self.assertLessEqual(len(partitions), 6 * 4)
+        self.assertEqual(sum(info.rows for info in partitions), 600)
+        
+        reopened = PartitionedStore(self.temp_dir.name)
+        self.assertEqual(reopened.user_buckets, 4)
+        self.assertEqual(len(reopened), 600)
+        self.assertEqual(sorted(os.listdir(self.temp_dir.name)),
+                         sorted([info.file for info in partitions] + [MANIFEST_NAME]))
+    
+    def test_pruned_queries(self):
+        """Test that range and user queries match a full scan while opening fewer partitions."""
+        start, end = datetime(2024, 3, 10), datetime(2024, 5, 1)
+        self.assertEqual(len(self.store.partitions(start, end)), 2 * 4)
+        self.assertEqual(len(self.store.partitions(start, end, user_id=5)), 2)
+        
+        for query in [(start, end, None), (start, end, 5), (None, None, 7), (datetime(2024, 2, 1), None, None)]:
+            expected = self._expected(*query)
+            actual = self.store.transactions(*query)
+            self.assertEqual(sorted(t.transaction_id for t in actual), sorted(t.transaction_id for t in expected))
+            
+            summary = self.store.summary(*query)
+            aggregate = aggregate_transactions(expected)
+            self.assertEqual(summary.count, len(expected))
+            self.assertEqual(summary.type_counts, aggregate.type_counts)
+            self.assertEqual(summary.completed_count, aggregate.completed_count)
+            self.assertAlmostEqual(summary.completed_total, aggregate.completed_total, places=6)
+        
+        summary = self.store.summary(datetime(2024, 2, 1), datetime(2024, 4, 1))
+        self.assertEqual((summary.partitions_from_manifest, summary.partitions_scanned), (8, 0))
+        summary = self.store.summary(start, end)
+        self.assertEqual((summary.partitions_from_manifest, summary.partitions_scanned), (4, 4))
+    
+    def test_add_rewrites_affected_partitions(self):
+        """Test that adding rows replaces only the partitions they fall into."""
+        before = {info.key: info.file for info in self.store.partitions()}
+        added = Transaction(9999, 3, 42.0, TransactionType.DEPOSIT, "Late", datetime(2024, 2, 14))
+        self.assertEqual(self.store.add([added]), 1)
+        
+        after = {info.key: info.file for info in self.store.partitions()}
+        changed = [key for key in after if after[key] != before.get(key)]
+        self.assertEqual(len(changed), 1)
+        self.assertEqual(changed[0][0], "2024-02")
+        self.assertNotIn(before[changed[0]], os.listdir(self.temp_dir.name))
+        self.assertIn(9999, [t.transaction_id for t in PartitionedStore(self.temp_dir.name).transactions(
+            datetime(2024, 2, 14), datetime(2024, 2, 15), user_id=3)])
+    
+    def test_mixed_currency_summary_is_refused(self):
+        """Test that a summary never totals amounts in different currencies."""
+        self.assertEqual(self.store.summary().currency, "USD")
+        added = Transaction(9999, 3, 42.0, TransactionType.DEPOSIT, "Abroad", datetime(2024, 2, 14), currency="EUR")
+        self.store.add([added])
+        self.assertIn("EUR", [c for info in PartitionedStore(self.temp_dir.name).partitions() for c in info.currencies])
+        self.assertEqual(self.store.summary(datetime(2024, 3, 1)).currency, "USD")
+        with self.assertRaises(ValueError):
+            self.store.summary(datetime(2024, 2, 1), datetime(2024, 3, 1))
+        with self.assertRaises(ValueError):
+            self.store.summary(datetime(2024, 2, 10), datetime(2024, 2, 20))
+
+
+class TestIngest(unittest.TestCase):
+    """Test cases for tailing a drop directory."""
+    
+    def setUp(self):
+        """Set up test fixtures before each test method."""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.drop = os.path.join(self.temp_dir.name, "drop")
+        os.mkdir(self.drop)
+        self.path = os.path.join(self.drop, "bank.csv")
+        self.state = os.path.join(self.temp_dir.name, "ingest.json")
+        self.transactions = generate_transactions(30, user_count=3, seed=2)
+    
+    def tearDown(self):
+        """Remove the temporary files."""
+        self.temp_dir.cleanup()
+    
+    def _lines(self, transactions):
+        return "".join(",".join(transaction_to_row(t)) + "\n" for t in transactions)
+    
+    def _append(self, text, path=None):
+        with open(path or self.path, "a", encoding="utf-8") as file:
+            file.write(text)
+    
+    def test_reads_only_appended_complete_lines(self):
+        """Test that each poll parses only new complete lines."""
+        tailer = DirectoryTailer(self.drop, state_path=self.state)
+        self._append(",".join(CSV_FIELDS) + "\n" + self._lines(self.transactions[:10]))
+        self.assertEqual([t.transaction_id for t in tailer.poll()], list(range(1, 11)))
+        self.assertEqual(tailer.poll(), [])
+        
+        line = self._lines(self.transactions[10:11])
+        self._append(line[:15])
+        self.assertEqual(tailer.poll(), [])
+        self._append(line[15:] + "1,1,abc,deposit\n")
+        with self.assertLogs("services.ingest", "WARNING") as logs:
+            self.assertEqual([t.transaction_id for t in tailer.poll()], [11])
+        self.assertIn("bank.csv:13", logs.output[0])
+        
+        restarted = DirectoryTailer(self.drop, state_path=self.state)
+        self._append(self._lines(self.transactions[11:15]))
+        other = os.path.join(self.drop, "card.csv")
+        self._append(",".join(CSV_FIELDS) + "\n" + self._lines(self.transactions[15:17]), other)
+        self._append("ignored", os.path.join(self.drop, "notes.txt"))
+        self.assertEqual([t.transaction_id for t in restarted.poll()], [12, 13, 14, 15, 16, 17])
+    
+    def test_replaced_file_is_read_again(self):
+        """Test that a file replaced under the same name is read from the start."""
+        tailer = DirectoryTailer(self.drop)
+        self._append(",".join(CSV_FIELDS) + "\n" + self._lines(self.transactions[:5]))
+        self.assertEqual(len(tailer.poll()), 5)
+        
+        replacement = os.path.join(self.temp_dir.name, "new.csv")
+        self._append(",".join(CSV_FIELDS) + "\n" + self._lines(self.transactions[5:7]), replacement)
+        os.replace(replacement, self.path)
+        self.assertEqual([t.transaction_id for t in tailer.poll()], [6, 7])
+    
+    def test_failed_read_is_retried(self):
+        """Test that a file whose read failed is read again on the next poll."""
+        tailer = DirectoryTailer(self.drop)
+        self._append(",".join(CSV_FIELDS) + "\n" + self._lines(self.transactions[:5]))
+        with mock.patch.object(DirectoryTailer, "_read_new_rows", side_effect=OSError("busy")):
+            with self.assertLogs("services.ingest", "WARNING"):
+                self.assertEqual(tailer.poll(), [])
+        self.assertEqual([t.transaction_id for t in tailer.poll()], [1, 2, 3, 4, 5])
+        
+        self._append(self._lines(self.transactions[5:7]))
+        with mock.patch.object(DirectoryTailer, "_read_new_rows", side_effect=OSError("busy")):
+            with self.assertLogs("services.ingest", "WARNING"):
+                self.assertEqual(tailer.poll(), [])
+        self.assertEqual([t.transaction_id for t in tailer.poll()], [6, 7])
+    
+    def test_watch_feeds_context(self):
+        """Test that watched batches update the context's running aggregate."""
+        context = DataContext(users=[], transactions=list(self.transactions[:20]))
+        context.aggregate()
+        self._append(",".join(CSV_FIELDS) + "\n" + self._lines(self.transactions[20:]))
+        ingested = watch(DirectoryTailer(self.drop), context.add_transactions, interval=0, max_polls=2)
+        
+        self.assertEqual(ingested, 10)
+        expected = aggregate_transactions(self.transactions)
+        actual = context.aggregate()
+        self.assertEqual((actual.total_count, actual.completed_total, actual.type_counts, actual.recent_rows),
+                         (expected.total_count, expected.completed_total, expected.type_counts,
+                          expected.recent_rows))
 
 
 class TestUserModel(unittest.TestCase):
@@ -218,14 +1768,189 @@ class TestTransactionModel(unittest.TestCase):
     def test_formatted_amount(self):
         """Test formatted amount display."""
         self.assertEqual(self.transaction.get_formatted_amount(), "$100.00")
+        self.assertEqual(self.transaction.currency, "USD")
+        self.transaction.currency = "EUR"
+        self.assertEqual(self.transaction.get_formatted_amount(), "€100.00")
+        self.transaction.currency = "CHF"
+        self.assertEqual(self.transaction.get_formatted_amount(), "100.00 CHF")
+    
+    def test_descriptions_are_pooled(self):
+        """Test that equal descriptions share one pooled string and code."""
+        other = Transaction(2, 1, 5.0, TransactionType.PAYMENT, "Test " + "transaction")
+        
+        self.assertEqual(other.description_code, self.transaction.description_code)
+        self.assertIs(other.description, self.transaction.description)
+        self.assertEqual(DESCRIPTIONS.decode(other.description_code), "Test transaction")
+        with self.assertRaises(AttributeError):
+            other.note = "no instance dictionary"
+        
+        pool = StringPool()
+        self.assertEqual(pool.encode_all(["a", "b", "a"]), [0, 1, 0])
+        self.assertEqual(list(pool.decode_all([1, 0])), ["b", "a"])
+        self.assertEqual(len(pool), 2)
+        self.assertIn("a", pool)
+    
+    def test_full_pool_keeps_new_strings_unpooled(self):
+        """Test that a full pool returns new strings as their own codes."""
+        pool = StringPool(max_size=2)
+        self.assertEqual(pool.encode_all(["a", "b", "c", "a"]), [0, 1, "c", 0])
+        self.assertEqual(len(pool), 2)
+        self.assertEqual(list(pool.decode_all([0, "c"])), ["a", "c"])
+        
+        transactions = [Transaction(1, 1, 1.0, TransactionType.PAYMENT, "Rent"),
+                        Transaction(2, 1, 1.0, TransactionType.PAYMENT, "Rent")]
+        transactions[1].description_code = "One-off refund"
+        self.assertEqual(transactions[1].description, "One-off refund")
+        self.assertEqual(transaction_descriptions(transactions), ["Rent", "One-off refund"])
+    
+    def test_pickle_carries_description_text(self):
+        """Test that pickled transactions carry their description, not a process-local code."""
+        self.transaction.fail_transaction("Declined")
+        state = self.transaction.__getstate__()
+        self.assertEqual((state["description_code"], state["failure_reason"]), ("Test transaction", "Declined"))
+        
+        restored = pickle.loads(pickle.dumps(self.transaction))
+        self.assertEqual(restored.description, "Test transaction [Failed: Declined]")
+        self.assertEqual(restored.description_code, self.transaction.description_code)
+        self.assertEqual((restored.transaction_id, restored.status), (1, TransactionStatus.FAILED))
+    
+    def test_failure_reason_kept_separately(self):
+        """Test that failing keeps the pooled description and reports the reason in the description."""
+        code = self.transaction.description_code
+        self.transaction.fail_transaction("Card declined")
+        
+        self.assertEqual(self.transaction.description_code, code)
+        self.assertEqual(self.transaction.failure_reason, "Card declined")
+        self.assertEqual(self.transaction.description, "Test transaction [Failed: Card declined]")
+        
+        self.transaction.fail_transaction("Timeout")
+        self.assertEqual(self.transaction.description,
+                         "Test transaction [Failed: Card declined] [Failed: Timeout]")
+        
+        self.transaction.description = "Renamed"
+        self.assertEqual((self.transaction.description, self.transaction.failure_reason), ("Renamed", ""))
+    
+    def test_transaction_descriptions(self):
+        """Test bulk decoding with and without a transform."""
+        transactions = [Transaction(i, 1, 1.0, TransactionType.PAYMENT, name)
+                        for i, name in enumerate(["Rent", "Coffee", "Rent"])]
+        transactions[1].fail_transaction("Limit")
+        
+        self.assertEqual(transaction_descriptions(transactions), ["Rent", "Coffee [Failed: Limit]", "Rent"])
+        self.assertEqual(transaction_descriptions(transactions, str.upper),
+                         ["RENT", "COFFEE [FAILED: LIMIT]", "RENT"])
+
 
 
+class TestValidation(unittest.TestCase):
+    """Test cases for the bulk validators."""
+    
+    def test_email_masks_and_reasons(self):
+        """Test that email validation matches the per-user rule and explains failures."""
+        emails = ["a@b.com", "no-at-sign", "a@nodot", "a.b@c", "x@y.z@w", "a@b@c.d"]
+        result = validate_emails(emails)
+        self.assertEqual(list(result.mask), [1, 0, 0, 0, 1, 0])
+        self.assertEqual(sorted(result.reasons), [1, 2, 3, 5])
+        self.assertIn("'no-at-sign'", result.reasons[1])
+        self.assertEqual(result.select(emails), ["a@b.com", "x@y.z@w"])
+        
+        users = [User(i, f"u{i}", email, "F", "L") for i, email in enumerate(emails)]
+        self.assertEqual(list(validate_users(users).mask), [int(user.is_valid_email()) for user in users])
+        self.assertFalse(users[0].update_email("broken"))
+        self.assertTrue(users[0].update_email("new@example.org"))
+    
+    def test_email_results_are_memoized(self):
+        """Test that addresses are matched once and the memo stays bounded."""
+        validation._email_memo.clear()
+        self.assertTrue(validate_emails(["same@example.com"] * 100).all_valid)
+        self.assertEqual(validation._email_memo, {"same@example.com": True})
+        
+        validation._email_memo["same@example.com"] = False
+        self.assertFalse(is_valid_email_address("same@example.com"))
+        
+        emails = [f"user{i}@example.com" for i in range(validation.EMAIL_MEMO_SIZE)]
+        self.assertTrue(validate_emails(emails).all_valid)
+        self.assertLessEqual(len(validation._email_memo), validation.EMAIL_MEMO_SIZE)
+        validation._email_memo.clear()
+    
+    def test_amounts(self):
+        """Test that non-positive and NaN amounts are invalid."""
+        result = validate_amounts([10.0, 0.0, -5.0, float("nan"), 0.01])
+        self.assertEqual(list(result.mask), [1, 0, 0, 0, 1])
+        self.assertEqual(result.valid_count, 2)
+        self.assertIn("-5.0", result.reasons[2])
+    
+    def test_import_and_ingest_validation(self):
+        """Test that validating imports reject invalid rows with their line numbers."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "bank.csv")
+            transactions = generate_transactions(5, seed=1)
+            transactions[3].amount = -20.0
+            export_transactions(transactions, path)
+            
+            self.assertEqual(len(import_transactions(path)), 5)
+            with self.assertRaisesRegex(ValueError, r"bank\.csv:5: amount must be positive"):
+                import_transactions(path, validate=True)
+            
+            with self.assertLogs("services.ingest", "WARNING"):
+                ingested = DirectoryTailer(temp_dir, validate=True).poll()
+            self.assertEqual([t.transaction_id for t in ingested], [1, 2, 3, 5])
+
+
+class TestRendering(unittest.TestCase):
+    """Test cases for report templates and cached date formatting."""
+    
+    def test_day_formatter(self):
+        """Test that cached days match strftime for every time of day."""
+        days = DayFormatter()
+        moments = [datetime(2024, 2, 28, 23, 59) + timedelta(hours=7 * i) for i in range(50)]
+        self.assertEqual(list(days.format_all(moments)), [m.strftime("%Y-%m-%d") for m in moments])
+        self.assertEqual(days(moments[0]), "2024-02-28")
+        self.assertEqual(DayFormatter("%d/%m")(moments[0]), "28/02")
+    
+    def test_row_template_matches_str_format(self):
+        """Test that batched rendering equals str.format row by row."""
+        template = "\n{} - ${:.2f} {!r} ({:>4})"
+        columns = [[f"row {i}" for i in range(10)], [i * 1.005 for i in range(10)],
+                   ["a'b", None] * 5, list(range(10))]
+        stream = io.StringIO()
+        self.assertEqual(RowTemplate(template).write(stream, *columns, batch_size=3), 10)
+        self.assertEqual(stream.getvalue(), "".join(map(template.format, *columns)))
+        
+        with self.assertRaises(ValueError):
+            RowTemplate("{name}")
+        with self.assertRaises(ValueError):
+            RowTemplate(template).write(stream, *columns[:3])
+        with self.assertRaises(ValueError):
+            RowTemplate(template).write(stream, columns[0], columns[1], columns[2], [1])
+    
+    def test_user_report_details_unchanged(self):
+        """Test that user details render exactly as the per-user layout."""
+        users = [User(i, f"user{i}", f"user{i}@example.com" if i % 3 else "bad", f"First{i}", f"Last{i}",
+                      datetime(2023, 1, 1) + timedelta(days=i, hours=i)) for i in range(1, 8)]
+        users[2].deactivate()
+        expected = "".join(
+            f"\nID: {user.user_id} | {user.get_full_name()}\n"
+            f"  Username: {user.username}\n"
+            f"  Email: {user.email}\n"
+            f"  Status: {'Active' if user.is_active else 'Inactive'}\n"
+            f"  Created: {user.created_at.strftime('%Y-%m-%d')}\n"
+            f"  Email Valid: {'Yes' if user.is_valid_email() else 'No'}\n"
+            for user in users)
+        self.assertTrue(generate_user_report(users).endswith("-" * 30 + expected))
+
 if __name__ == '__main__':
     # Create a test suite combining all test classes
     suite = unittest.TestSuite()
     
     # Add all test classes
-    test_classes = [TestDataService, TestReportService, TestUserModel, TestTransactionModel]
+    test_classes = [TestDataService, TestReportService, TestDataContext, TestReportServer,
+                    TestAsyncDataService, TestAggregation,
+                    TestTransactionStore, TestLedger,
+                    TestDeduplication, TestCategorizer,
+                    TestRecurringDetection, TestAnomalyDetection,
+                    TestCurrency, TestSnapshot, TestPartitionedStore, TestIngest, TestUserModel, TestTransactionModel,
+                    TestValidation, TestRendering]
     
     for test_class in test_classes:
         suite.addTests(unittest.TestLoader().loadTestsFromTestCase(test_class))
@@ -4,6 +4,7 @@ Unit tests for utility functions.
 Tests the file operations and mathematical operations utilities.
 """
 
+import json
 import unittest
 import tempfile
 import os
@@ -13,8 +14,11 @@ from unittest.mock import patch, mock_open
 import sys
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 
-from utils.file_ops import read_file, write_file, file_exists, get_file_size
+from utils.file_ops import read_file, write_file, write_file_atomic, file_exists, get_file_size
 from utils.math_ops import add, multiply, calculate_average, percentage_change
+from utils.metrics import MetricsRegistry, get_registry
+from utils.memory import MemoryDiagnostics, estimate_footprint, memory_diagnostics_requested
+from utils.profiling import Profiler, profiling_requested
 
 
 class TestFileOps(unittest.TestCase):
@@ -44,9 +48,36 @@ class TestFileOps(unittest.TestCase):
     
     def test_read_nonexistent_file(self):
         """Test reading a file that doesn't exist."""
-        result = read_file("nonexistent_file.txt")
+        with self.assertLogs("utils.file_ops", level="WARNING"):
+            result = read_file("nonexistent_file.txt")
         self.assertIsNone(result)
     
+    def test_write_file_records_metrics(self):
+        """Test that writing a file updates the file_ops metrics."""
+        registry = get_registry()
+        files_before = registry.get("file_ops.files_written").value
+        bytes_before = registry.get("file_ops.bytes_written").value
+        latency_before = registry.get("file_ops.write_seconds").count
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_path = os.path.join(temp_dir, "report.txt")
+            self.assertTrue(write_file(temp_path, self.test_content))
+            size = get_file_size(temp_path)
+        
+        self.assertEqual(registry.get("file_ops.files_written").value, files_before + 1)
+        self.assertEqual(registry.get("file_ops.bytes_written").value, bytes_before + size)
+        self.assertEqual(registry.get("file_ops.write_seconds").count, latency_before + 1)
+    
+    def test_write_file_atomic(self):
+        """Test atomic replacement of text and binary files."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_path = os.path.join(temp_dir, "nested", "state.bin")
+            self.assertTrue(write_file_atomic(temp_path, b"\x00\x01"))
+            self.assertTrue(write_file_atomic(temp_path, self.test_content))
+            
+            self.assertEqual(read_file(temp_path), self.test_content)
+            self.assertEqual(os.listdir(os.path.dirname(temp_path)), ["state.bin"])
+    
     def test_file_exists(self):
         """Test file existence checking."""
         with tempfile.NamedTemporaryFile() as temp_file:
@@ -117,6 +148,192 @@ class TestMathOps(unittest.TestCase):
             percentage_change(0, 10)
 
 
+class TestMetrics(unittest.TestCase):
+    """Test cases for the metrics registry."""
+    
+    def setUp(self):
+        """Set up test fixtures before each test method."""
+        self.registry = MetricsRegistry()
+    
+    def test_counter(self):
+        """Test counter increments and reuse by name."""
+        counter = self.registry.counter("requests", "Handled requests")
+        counter.inc()
+        counter.inc(4)
+        self.assertEqual(counter.value, 5)
+        self.assertIs(self.registry.counter("requests"), counter)
+        
+        with self.assertRaises(ValueError):
+            counter.inc(-1)
+    
+    def test_histogram(self):
+        """Test histogram statistics and buckets."""
+        histogram = self.registry.histogram("latency", buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 2.0):
+            histogram.observe(value)
+        
+        data = histogram.to_dict()
+        self.assertEqual(data["count"], 3)
+        self.assertAlmostEqual(data["sum"], 2.55)
+        self.assertEqual(data["min"], 0.05)
+        self.assertEqual(data["max"], 2.0)
+        self.assertEqual(data["buckets"], {"0.1": 1, "1.0": 1, "+Inf": 1})
+    
+    def test_type_conflict(self):
+        """Test that a name cannot be reused for another metric type."""
+        self.registry.counter("events")
+        with self.assertRaises(TypeError):
+            self.registry.histogram("events")
+    
+    def test_to_json(self):
+        """Test exporting the registry as JSON."""
+        self.registry.counter("files").inc(2)
+        self.registry.histogram("seconds").observe(0.2)
+        
+        data = json.loads(self.registry.to_json())
+        self.assertEqual(data["files"]["value"], 2)
+        self.assertEqual(data["seconds"]["count"], 1)
+        
+        self.registry.reset()
+        self.assertEqual(self.registry.get("files").value, 0)
+
+
+class TestProfiling(unittest.TestCase):
+    """Test cases for the pipeline profiler."""
+    
+    def test_disabled_profiler_records_nothing(self):
+        """Test that a disabled profiler is a pass-through."""
+        profiler = Profiler(enabled=False)
+        
+        @profiler.profiled("double")
+        def double(value):
+            return value * 2
+        
+        self.assertEqual(double(4), 8)
+        with profiler.stage("block") as timing:
+            self.assertIsNone(timing)
+        self.assertEqual(profiler.stages, [])
+    
+    def test_profiled_records_stage(self):
+        """Test that calls are recorded with row counts and memory."""
+        profiler = Profiler(enabled=True)
+        
+        @profiler.profiled("build", rows="result")
+        def build(count):
+            return [str(i) for i in range(count)]
+        
+        @profiler.profiled("consume", rows="arg")
+        def consume(items):
+            return len(items)
+        
+        consume(build(1000))
+        profiler.disable()
+        
+        stages = profiler.stages
+        self.assertEqual([stage.name for stage in stages], ["build", "consume"])
+        self.assertEqual(stages[0].rows, 1000)
+        self.assertEqual(stages[1].rows, 1000)
+        self.assertGreater(stages[0].allocated_bytes, 0)
+        self.assertGreaterEqual(stages[0].wall_seconds, 0.0)
+        
+        data = json.loads(profiler.to_json())
+        self.assertEqual(len(data["stages"]), 2)
+        self.assertIn("build", profiler.format_table())
+    
+    def test_nested_stage_keeps_outer_peak(self):
+        """Test that an inner stage does not erase the peak of the stage around it."""
+        profiler = Profiler(enabled=True)
+        with profiler.stage("outer"):
+            buffer = bytearray(4 << 20)
+            del buffer
+            with profiler.stage("inner"):
+                small = bytearray(1 << 10)
+            del small
+        profiler.disable()
+        
+        inner, outer = profiler.stages
+        self.assertEqual((inner.name, outer.name), ("inner", "outer"))
+        self.assertLess(inner.peak_bytes, 1 << 20)
+        self.assertGreaterEqual(outer.peak_bytes, 4 << 20)
+    
+    def test_profiling_requested(self):
+        """Test the environment toggle."""
+        self.assertTrue(profiling_requested({"FINANCE_TRACKER_PROFILE": "1"}))
+        self.assertTrue(profiling_requested({"FINANCE_TRACKER_PROFILE": "yes"}))
+        self.assertFalse(profiling_requested({"FINANCE_TRACKER_PROFILE": "0"}))
+        self.assertFalse(profiling_requested({}))
+
+
+class TestMemoryDiagnostics(unittest.TestCase):
+    """Test cases for the memory diagnostics."""
+    
+    def setUp(self):
+        """Create diagnostics attached to a fresh profiler."""
+        self.profiler = Profiler(enabled=True)
+        self.memory = MemoryDiagnostics(top_sites=5)
+        self.memory.attach(self.profiler)
+        self.memory.start()
+    
+    def tearDown(self):
+        """Stop tracing."""
+        self.profiler.disable()
+        self.memory.stop()
+    
+    def test_stages_are_checkpointed(self):
+        """Test that every profiled stage records a checkpoint with its allocation sites."""
+        with self.profiler.stage("build"):
+            kept = [str(i) * 10 for i in range(5000)]
+        with self.profiler.stage("idle"):
+            pass
+        
+        checkpoints = self.memory.checkpoints
+        self.assertEqual([checkpoint.name for checkpoint in checkpoints], ["build", "idle"])
+        self.assertGreater(checkpoints[0].traced_bytes, 0)
+        self.assertTrue(checkpoints[0].top_sites)
+        self.assertTrue(all(site["size_diff"] > 0 for site in checkpoints[0].top_sites))
+        self.assertTrue(any("test_utils.py" in site["site"] for site in checkpoints[0].top_sites))
+        self.assertEqual(len(kept), 5000)
+    
+    def test_footprints_and_json(self):
+        """Test footprint estimates and the JSON document."""
+        class Slotted:
+            __slots__ = ("name", "note")
+            
+            def __init__(self, name):
+                self.name = name
+                self.note = name * 20
+        
+        objects = [Slotted(f"object {i}") for i in range(50)]
+        full = self.memory.add_footprint("slotted", objects)
+        without_note = estimate_footprint("slotted", objects, exclude=("note",))
+        self.memory.add_buffer("buffer:report", "y" * 1000)
+        
+        self.assertEqual(full.count, 50)
+        self.assertGreater(full.bytes_per_object, without_note.bytes_per_object + 100)
+        self.assertEqual(estimate_footprint("empty", []).total_bytes, sys.getsizeof([]))
+        
+        data = json.loads(self.memory.to_json())
+        self.assertEqual(list(data["footprints"]), ["buffer:report", "slotted"])
+        self.assertGreaterEqual(data["footprints"]["buffer:report"]["total_bytes"], 1000)
+        self.assertIn("peak_rss_bytes", data)
+        self.assertIn("slotted", self.memory.format_table())
+        
+        self.memory.reset()
+        self.assertEqual(self.memory.footprints, {})
+    
+    def test_disabled_diagnostics_record_nothing(self):
+        """Test that checkpoints are skipped once stopped."""
+        self.memory.stop()
+        self.assertIsNone(self.memory.checkpoint("late"))
+        self.assertEqual(self.memory.checkpoints, [])
+    
+    def test_memory_diagnostics_requested(self):
+        """Test the environment toggle."""
+        self.assertTrue(memory_diagnostics_requested({"FINANCE_TRACKER_MEMORY": "on"}))
+        self.assertFalse(memory_diagnostics_requested({"FINANCE_TRACKER_MEMORY": ""}))
+        self.assertFalse(memory_diagnostics_requested({}))
+
+
 if __name__ == '__main__':
     # Create a test suite combining all test classes
     suite = unittest.TestSuite()
@@ -127,6 +344,15 @@ if __name__ == '__main__':
     # Add all test methods from TestMathOps
     suite.addTests(unittest.TestLoader().loadTestsFromTestCase(TestMathOps))
     
+    # Add all test methods from TestMetrics
+    suite.addTests(unittest.TestLoader().loadTestsFromTestCase(TestMetrics))
+    
+    # Add all test methods from TestProfiling
+    suite.addTests(unittest.TestLoader().loadTestsFromTestCase(TestProfiling))
+    
+    # Add all test methods from TestMemoryDiagnostics
+    suite.addTests(unittest.TestLoader().loadTestsFromTestCase(TestMemoryDiagnostics))
+    
     # Run the tests
     runner = unittest.TextTestRunner(verbosity=2)
     runner.run(suite)
\ No newline at end of file